@@ -81,13 +81,18 @@ class Microarchitecture(object):
         self.features = features
         self.compilers = compilers
         self.generation = generation
+        self._ancestors = None
 
     @property
     def ancestors(self):
-        value = self.parents[:]
-        for parent in self.parents:
-            value.extend(a for a in parent.ancestors if a not in value)
-        return value
+        # Targets are compared very often during concretization, and
+        # comparing them compares their ancestors, so compute those once
+        if self._ancestors is None:
+            value = self.parents[:]
+            for parent in self.parents:
+                value.extend(a for a in parent.ancestors if a not in value)
+            self._ancestors = value
+        return self._ancestors[:]
 
     def _to_set(self):
         """Returns a set of the nodes in this microarchitecture DAG."""
@@ -100,6 +105,9 @@ class Microarchitecture(object):
         if not isinstance(other, Microarchitecture):
             return NotImplemented
 
+        if self is other:
+            return True
+
         return (self.name == other.name and
                 self.vendor == other.vendor and
                 self.features == other.features and
@@ -621,11 +621,12 @@ def replace_directory_transaction(directory_name, tmp_root=None):
         tty.debug('TEMPORARY DIRECTORY DELETED [{0}]'.format(tmp_dir))
 
 
-def hash_directory(directory):
+def hash_directory(directory, ignore=None):
     """Hashes recursively the content of a directory.
 
     Args:
         directory (path): path to a directory to be hashed
+        ignore (function): function indicating which files to ignore
 
     Returns:
         hash of the directory content
@@ -638,6 +639,8 @@ def hash_directory(directory):
     for root, dirs, files in os.walk(directory):
         for name in sorted(files):
             filename = os.path.join(root, name)
+            if ignore and ignore(filename):
+                continue
             # TODO: if caching big files becomes an issue, convert this to
             # TODO: read in chunks. Currently it's used only for testing
             # TODO: purposes.
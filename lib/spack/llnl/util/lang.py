@@ -12,6 +12,7 @@ import collections
 import inspect
 from datetime import datetime, timedelta
 from six import string_types
+from ordereddict_backport import OrderedDict
 import sys
 
 
@@ -188,6 +189,42 @@ def memoized(func):
     return _memoized_function
 
 
+class LRUCache(object):
+    """Dictionary-like cache that holds at most ``maxsize`` items.
+
+    When the cache is full, storing a new item evicts the one that was
+    least recently stored or looked up.  Unlike ``memoized``, this is
+    safe to use for functions called on an unbounded set of arguments.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
 def list_modules(directory, **kwargs):
     """Lists all of the modules, excluding ``__init__.py``, in a
        particular directory.  Listed packages have no particular
@@ -12,12 +12,40 @@ import shutil
 import filecmp
 
 from llnl.util.filesystem import traverse_tree, mkdirp, touch
+from llnl.util.multiproc import parmap
 import llnl.util.tty as tty
 
-__all__ = ['LinkTree']
+__all__ = ['LinkTree', 'map_file_pairs']
 
 empty_file_name = '.spack-empty'
 
+#: Number of files each thread handles at a time in map_file_pairs()
+_chunk_size = 64
+
+
+def map_file_pairs(function, pairs, jobs=None):
+    """Call ``function(src, dest)`` for each pair, with a pool of threads.
+
+    Creating and removing links is mostly waiting for the filesystem,
+    especially on parallel filesystems, so it is done by several threads
+    at once.  Pairs are handed out in chunks, so that small trees don't
+    pay for more threads than they need.
+
+    Arguments:
+        function (callable): called with the source and destination paths
+        pairs (iterable): ``(src, dest)`` tuples
+        jobs (int, optional): maximum number of threads (see ``parmap``)
+    """
+    pairs = list(pairs)
+    chunks = [pairs[i:i + _chunk_size]
+              for i in range(0, len(pairs), _chunk_size)]
+
+    def apply(chunk):
+        for src, dest in chunk:
+            function(src, dest)
+
+    parmap(apply, chunks, jobs)
+
 
 def remove_link(src, dest):
     if not os.path.islink(dest):
@@ -141,16 +169,17 @@ class LinkTree(object):
 
         self.merge_directories(dest_root, ignore)
         existing = []
+        links = []
         for src, dst in self.get_file_map(dest_root, ignore).items():
             if os.path.exists(dst):
                 existing.append(dst)
             elif relative:
                 abs_src = os.path.abspath(src)
                 dst_dir = os.path.dirname(os.path.abspath(dst))
-                rel = os.path.relpath(abs_src, dst_dir)
-                link(rel, dst)
+                links.append((os.path.relpath(abs_src, dst_dir), dst))
             else:
-                link(src, dst)
+                links.append((src, dst))
+        map_file_pairs(link, links)
 
         for c in existing:
             tty.warn("Could not merge: %s" % c)
@@ -163,8 +192,8 @@ class LinkTree(object):
         if ignore is None:
             ignore = lambda x: False
 
-        for src, dst in self.get_file_map(dest_root, ignore).items():
-            remove_file(src, dst)
+        file_map = self.get_file_map(dest_root, ignore)
+        map_file_pairs(remove_file, file_map.items())
         self.unmerge_directories(dest_root, ignore)
 
 
@@ -6,17 +6,99 @@
 import os
 import fcntl
 import errno
+import signal
 import time
 import socket
+import weakref
 
 import llnl.util.tty as tty
 
 
 __all__ = ['Lock', 'LockTransaction', 'WriteTransaction', 'ReadTransaction',
-           'LockError', 'LockTimeoutError',
+           'LockError', 'LockTimeoutError', 'LockWaits', 'lock_waits',
            'LockPermissionError', 'LockROFileError', 'CantCreateLockError']
 
 
+class _LockState(object):
+    """State of the locks this process holds on a byte range of a file.
+
+    It is shared by all the ``Lock`` objects on the same range, so that
+    nested transactions through different objects don't lock the range
+    again, and don't release it while others still hold it.
+    """
+
+    def __init__(self):
+        self.file = None
+        self.reads = 0
+        self.writes = 0
+
+
+#: States of the locks of this process, by pid, path and byte range
+_lock_states = weakref.WeakValueDictionary()
+
+
+def _lock_state(path, start, length):
+    # The pid is part of the key because POSIX locks are not inherited by
+    # forked processes.
+    key = (os.getpid(), os.path.abspath(path), start, length)
+    state = _lock_states.get(key)
+    if state is None or not _same_file(state, path):
+        state = _LockState()
+        _lock_states[key] = state
+    return state
+
+
+def _same_file(state, path):
+    """Whether the file a state has open is still the one at ``path``.
+
+    Locks on a lock file that was removed, and maybe created again since,
+    don't lock the new file, so their state isn't shared with new locks.
+    """
+    if state.file is None:
+        return True
+    try:
+        opened, current = os.fstat(state.file.fileno()), os.stat(path)
+    except (OSError, ValueError):
+        # removed, or closed
+        return False
+    return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+
+class LockWaits(object):
+    """Time this process spent waiting for the locks on a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.total = 0.0
+        self.longest = 0.0
+
+        #: pids and hosts of the holders of the lock, when they are known.
+        #: They are only written in lock files in debug mode.
+        self.holders = set()
+
+    def record(self, wait_time, holder=None):
+        self.count += 1
+        self.total += wait_time
+        self.longest = max(self.longest, wait_time)
+        if holder and holder[0] is not None:
+            self.holders.add(holder)
+
+
+#: Waits for contended locks in this process, by path of the lock file
+_lock_waits = {}
+
+
+def lock_waits():
+    """Returns the ``LockWaits`` of the contended locks of this process,
+    the longest total wait first."""
+    return sorted(_lock_waits.values(), key=lambda w: w.total, reverse=True)
+
+
+def _raise_lock_timeout(signum, frame):
+    raise LockTimeoutError("Timed out waiting for lock.")
+
+
 class Lock(object):
     """This is an implementation of a filesystem lock using Python's lockf.
 
@@ -27,12 +109,13 @@ class Lock(object):
 
     Note that this is for managing contention over resources *between*
     processes and not for managing contention between threads in a process: the
-    functions of this object are not thread-safe. A process also must not
-    maintain multiple locks on the same file.
+    functions of this object are not thread-safe.  ``Lock`` objects of the
+    same process on the same byte range of a file share their state: the
+    range is locked once, and released when no object holds it anymore.
     """
 
     def __init__(self, path, start=0, length=0, debug=False,
-                 default_timeout=None):
+                 default_timeout=None, blocking=False):
         """Construct a new lock on the file at ``path``.
 
         By default, the lock applies to the whole file.  Optionally,
@@ -43,16 +126,21 @@ class Lock(object):
         not currently expose the ``whence`` parameter -- ``whence`` is
         always ``os.SEEK_SET`` and ``start`` is always evaluated from the
         beginning of the file.
+
+        If ``blocking`` is True, contended locks are waited for with a
+        blocking call to ``lockf()`` instead of by polling.  Timeouts then
+        use a ``SIGALRM`` interval timer; where it can't be used, e.g. in
+        other threads than the main one, locks are polled as usual.
         """
         self.path = path
-        self._file = None
-        self._reads = 0
-        self._writes = 0
+        self._state = _lock_state(path, start, length)
 
         # byte range parameters
         self._start = start
         self._length = length
 
+        self.blocking = blocking
+
         # enable debug mode
         self.debug = debug
 
@@ -65,6 +153,30 @@ class Lock(object):
         self.pid = self.old_pid = None
         self.host = self.old_host = None
 
+    @property
+    def _file(self):
+        return self._state.file
+
+    @_file.setter
+    def _file(self, value):
+        self._state.file = value
+
+    @property
+    def _reads(self):
+        return self._state.reads
+
+    @_reads.setter
+    def _reads(self, value):
+        self._state.reads = value
+
+    @property
+    def _writes(self):
+        return self._state.writes
+
+    @_writes.setter
+    def _writes(self, value):
+        self._state.writes = value
+
     @staticmethod
     def _poll_interval_generator(_wait_times=None):
         """This implements a backoff scheme for polling a contended resource
@@ -93,7 +205,7 @@ class Lock(object):
         """This takes a lock using POSIX locks (``fcntl.lockf``).
 
         The lock is implemented as a spin lock using a nonblocking call
-        to ``lockf()``.
+        to ``lockf()``, or with a blocking call in blocking mode.
 
         On acquiring an exclusive lock, the lock writes this process's
         pid and host to the lock file, in case the holding process needs
@@ -134,21 +246,30 @@ class Lock(object):
 
         poll_intervals = iter(Lock._poll_interval_generator())
         start_time = time.time()
-        num_attempts = 0
-        while (not timeout) or (time.time() - start_time) < timeout:
+        num_attempts = 1
+        acquired = self._poll_lock(op)
+
+        if not acquired and self.blocking:
             num_attempts += 1
-            if self._poll_lock(op):
-                total_wait_time = time.time() - start_time
-                return total_wait_time, num_attempts
+            acquired = self._block_lock(op, timeout)
 
+        while not acquired and (
+                (not timeout) or (time.time() - start_time) < timeout):
             time.sleep(next(poll_intervals))
+            num_attempts += 1
+            acquired = self._poll_lock(op)
 
-        num_attempts += 1
-        if self._poll_lock(op):
-            total_wait_time = time.time() - start_time
-            return total_wait_time, num_attempts
+        if not acquired:
+            num_attempts += 1
+            acquired = self._poll_lock(op)
+
+        if not acquired:
+            raise LockTimeoutError("Timed out waiting for lock.")
 
-        raise LockTimeoutError("Timed out waiting for lock.")
+        total_wait_time = time.time() - start_time
+        if num_attempts > 1:
+            self._record_wait(op, total_wait_time)
+        return total_wait_time, num_attempts
 
     def _poll_lock(self, op):
         """Attempt to acquire the lock in a non-blocking manner. Return whether
@@ -158,16 +279,7 @@ class Lock(object):
             # Try to get the lock (will raise if not available.)
             fcntl.lockf(self._file, op | fcntl.LOCK_NB,
                         self._length, self._start, os.SEEK_SET)
-
-            # help for debugging distributed locking
-            if self.debug:
-                # All locks read the owner PID and host
-                self._read_debug_data()
-
-                # Exclusive locks write their PID/host
-                if op == fcntl.LOCK_EX:
-                    self._write_debug_data()
-
+            self._acquired(op)
             return True
 
         except IOError as e:
@@ -177,6 +289,83 @@ class Lock(object):
             else:
                 raise
 
+    def _block_lock(self, op, timeout):
+        """Wait for the lock with a blocking call to ``lockf()``.
+
+        Returns False right away if the timeout can't be implemented with
+        an interval timer: outside of the main thread, or if another timer
+        is already set.
+        """
+        previous_handler = None
+        if timeout:
+            try:
+                if signal.getitimer(signal.ITIMER_REAL)[0]:
+                    return False
+                previous_handler = signal.signal(
+                    signal.SIGALRM, _raise_lock_timeout)
+            except ValueError:
+                # signals can only be handled in the main thread
+                return False
+
+        try:
+            if timeout:
+                # The timer may go off right away, so it is set within the
+                # try block.  Shorter times than a microsecond would be
+                # rounded to 0 by some Pythons, which disarms the timer.
+                signal.setitimer(signal.ITIMER_REAL, max(timeout, 1e-6))
+            fcntl.lockf(self._file, op,
+                        self._length, self._start, os.SEEK_SET)
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except LockTimeoutError:
+            # The timer may also have gone off right after lockf() returned
+            self._restore_lock()
+            raise
+        except IOError as e:
+            if e.errno == errno.EDEADLK:
+                raise LockError(
+                    "Waiting for lock on {0} would deadlock".format(
+                        self.path))
+            raise
+        finally:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+
+        self._acquired(op)
+        return True
+
+    def _restore_lock(self):
+        """Undo a lock that may have been taken by an interrupted attempt,
+        keeping the read lock of an attempt to upgrade it."""
+        if self._reads:
+            op = fcntl.LOCK_SH | fcntl.LOCK_NB
+        else:
+            op = fcntl.LOCK_UN
+        fcntl.lockf(self._file, op, self._length, self._start, os.SEEK_SET)
+
+    def _acquired(self, op):
+        # help for debugging distributed locking
+        if self.debug:
+            # All locks read the owner PID and host
+            self._read_debug_data()
+
+            # Exclusive locks write their PID/host
+            if op == fcntl.LOCK_EX:
+                self._write_debug_data()
+
+    def _record_wait(self, op, wait_time):
+        """Record a wait for this lock, and the process that held it."""
+        if op == fcntl.LOCK_EX:
+            holder = (self.old_pid, self.old_host)
+        else:
+            holder = (self.pid, self.host)
+
+        waits = _lock_waits.get(self.path)
+        if waits is None:
+            waits = _lock_waits[self.path] = LockWaits(self.path)
+        waits.record(wait_time, holder)
+
     def _ensure_parent_directory(self):
         parent = os.path.dirname(self.path)
 
@@ -198,6 +387,7 @@ class Lock(object):
         self.old_pid = self.pid
         self.old_host = self.host
 
+        self._file.seek(0)
         line = self._file.read()
         if line:
             pid, host = line.strip().split(',')
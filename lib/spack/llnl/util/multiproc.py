@@ -8,9 +8,73 @@ This implements a parallel map operation but it can accept more values
 than multiprocessing.Pool.apply() can.  For example, apply() will fail
 to pickle functions if they're passed indirectly as parameters.
 """
+import multiprocessing
+import sys
+import threading
 from multiprocessing import Semaphore, Value
 
-__all__ = ['Barrier']
+import six
+from six.moves import queue
+
+__all__ = ['Barrier', 'parmap']
+
+
+def parmap(f, elements, jobs=None):
+    """Apply ``f`` to every element, with a pool of threads.
+
+    ``f`` doesn't need to be picklable, and an exception raised by ``f``
+    (including ``SystemExit`` from ``tty.die()``) is re-raised in the
+    calling thread once the running calls are done.  Threads only run in
+    parallel while they wait for I/O or for subprocesses, so this is best
+    suited for functions that read and write files.
+
+    Arguments:
+        f (callable): function of one argument
+        elements (iterable): arguments to pass to ``f``
+        jobs (int, optional): maximum number of threads.  Defaults to
+            the number of CPUs.
+
+    Returns:
+        (list): the results of ``f``, in the order of ``elements``
+    """
+    elements = list(elements)
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(elements))
+    if jobs <= 1:
+        return [f(e) for e in elements]
+
+    todo = queue.Queue()
+    for item in enumerate(elements):
+        todo.put(item)
+    results = [None] * len(elements)
+    errors = []
+
+    def worker():
+        while not errors:
+            try:
+                i, element = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[i] = f(element)
+            except BaseException:
+                errors.append(sys.exc_info())
+
+    threads = [threading.Thread(target=worker) for i in range(jobs)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    # Join with a timeout so that the main thread still gets
+    # KeyboardInterrupt on Python 2
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(1)
+
+    if errors:
+        six.reraise(*errors[0])
+    return results
 
 
 class Barrier:
@@ -0,0 +1,460 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""This package contains benchmarks of Spack's hot paths.
+
+Each module here defines benchmarks for one part of Spack.  A benchmark
+is a function decorated with ``@benchmark``, that takes a ``Workspace``
+and returns the function to be timed::
+
+    @benchmark
+    def parse(workspace):
+        \"\"\"Parse the specs of the workspace\"\"\"
+        strings = workspace.spec_strings
+
+        def run():
+            for string in strings:
+                Spec(string)
+        return run
+
+Anything done before returning is not timed.  The benchmark above is
+named ``spec.parse``, after its module and function.
+
+Benchmarks run offline, in a ``Workspace`` that uses either the mock
+repository or the builtin one, mock compilers, and a store, caches and
+module roots in a temporary directory.  ``run_benchmarks()`` returns
+results that can be saved as JSON with ``write_results()``, and
+``compare()`` checks them against results from another commit.
+"""
+from __future__ import division
+
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import timeit
+
+import llnl.util.tty as tty
+from llnl.util.filesystem import mkdirp, working_dir
+from llnl.util.lang import list_modules
+
+import spack
+import spack.architecture
+import spack.caches
+import spack.compilers
+import spack.config
+import spack.package_prefs
+import spack.paths
+import spack.repo
+import spack.spec
+import spack.store
+import spack.util.file_cache
+from spack.error import SpackError
+from spack.util.executable import which
+
+#: Version of the format of the results
+results_format = 1
+
+#: Specs used by the benchmarks, for each repository
+spec_strings = {
+    'mock': [
+        'mpileaks ^mpich',
+        'mpileaks ^mpich2',
+        'mpileaks ^zmpi',
+        'dyninst',
+        'dt-diamond',
+        'hypre',
+        'patch-several-dependencies',
+    ],
+    'builtin': [
+        'hdf5+mpi ^mpich',
+        'netcdf ^openmpi',
+        'cmake',
+        'libdwarf',
+    ],
+}
+
+#: Large stacks concretized by ``spec.concretize_stack``, for each
+#: repository.  The mock repository has no stacks, so its largest DAGs
+#: stand in for them.  The builtin stacks conflict with the old mock
+#: compilers, so they use ``stack_compiler``.
+stack_strings = {
+    'mock': [
+        'mpileaks ^zmpi',
+        'patch-several-dependencies',
+    ],
+    'builtin': [
+        'xsdk %gcc@9.2.0',
+        'trilinos+hypre+mumps+superlu-dist %gcc@9.2.0',
+        'ecp-io-sdk %gcc@9.2.0',
+    ],
+}
+
+#: Mock compiler added to the workspace of the builtin repository.  The
+#: other specs still prefer the compilers of the tests.
+stack_compiler = """\
+- compiler:
+    spec: gcc@9.2.0
+    operating_system: {0.name}{0.version}
+    paths:
+      cc: /path/to/gcc92
+      cxx: /path/to/g++92
+      f77: /path/to/gfortran92
+      fc: /path/to/gfortran92
+    modules: 'None'
+"""
+
+#: Where each repository is
+repo_paths = {
+    'mock': spack.paths.mock_packages_path,
+    'builtin': spack.paths.packages_path,
+}
+
+#: Registered benchmarks, by name
+_benchmarks = {}
+
+
+class Benchmark(object):
+    """A function whose run time is measured.
+
+    Attributes:
+        name (str): ``<module>.<function>``, e.g. ``spec.parse``
+        description (str): first line of the docstring of the function
+        prepare (function): takes a ``Workspace`` and returns the function
+            to be timed
+    """
+
+    def __init__(self, name, prepare):
+        self.name = name
+        self.prepare = prepare
+        doc = (prepare.__doc__ or '').strip()
+        self.description = doc.split('\n')[0]
+
+
+def benchmark(prepare):
+    """Decorator that registers a benchmark (see the module docstring)."""
+    module = prepare.__module__.split('.')[-1]
+    name = '{0}.{1}'.format(module, prepare.__name__)
+    _benchmarks[name] = Benchmark(name, prepare)
+    return prepare
+
+
+def all_benchmarks():
+    """All the benchmarks in this package, sorted by name."""
+    for name in list_modules(spack.paths.benchmarks_path):
+        __import__('{0}.{1}'.format(__name__, name), level=0)
+    return [_benchmarks[name] for name in sorted(_benchmarks)]
+
+
+def select_benchmarks(patterns):
+    """Benchmarks whose name matches any of the regular expressions in
+    ``patterns``, or all of them if there are no patterns."""
+    benchmarks = all_benchmarks()
+    if not patterns:
+        return benchmarks
+
+    selected = [b for b in benchmarks
+                if any(re.search(p, b.name) for p in patterns)]
+    if not selected:
+        raise BenchmarkError(
+            'No benchmark matches {0}'.format(', '.join(patterns)))
+    return selected
+
+
+class Workspace(object):
+    """Context manager that sets up an isolated Spack to run benchmarks.
+
+    On entry, the configuration, the package repository, the store, the
+    misc cache and the module roots are replaced with ones in a temporary
+    directory.  Only Spack's default configuration is used, with the mock
+    compilers of the tests, so nothing depends on the user's settings or
+    is detected on the machine.  Everything is restored and the directory
+    is removed on exit.
+
+    Args:
+        repo (str): ``'mock'`` or ``'builtin'``
+    """
+
+    def __init__(self, repo='mock'):
+        if repo not in repo_paths:
+            raise BenchmarkError('Unknown repository: {0}'.format(repo))
+        self.repo = repo
+        self.spec_strings = spec_strings[repo]
+        self.stack_strings = stack_strings[repo]
+        self.root = None
+        self._saved = None
+        self._concrete_specs = None
+        self._installed = False
+
+    def path(self, *parts):
+        """Path of a file in the temporary directory."""
+        return os.path.join(self.root, *parts)
+
+    def _configuration(self):
+        """Default scopes, mock compilers and paths in the workspace."""
+        site = self.path('config')
+        mkdirp(site)
+
+        data = os.path.join(spack.paths.test_path, 'data')
+        with open(os.path.join(data, 'compilers.yaml')) as f:
+            compilers = f.read()
+        if self.repo == 'builtin':
+            compilers += stack_compiler
+        with open(os.path.join(site, 'compilers.yaml'), 'w') as f:
+            f.write(compilers.format(_default_os()))
+        if self.repo == 'mock':
+            shutil.copy(os.path.join(data, 'packages.yaml'), site)
+        else:
+            with open(os.path.join(site, 'packages.yaml'), 'w') as f:
+                f.write('packages:\n  all:\n    compiler: [gcc@4.5.0]\n')
+
+        paths = spack.config.InternalConfigScope('benchmark', {
+            'config': {
+                'install_tree': self.path('store'),
+                'misc_cache': self.path('cache'),
+                'concretization_cache': False,
+                'build_stage': [self.path('stage')],
+                'module_roots': {
+                    'tcl': self.path('modules', 'tcl'),
+                    'lmod': self.path('modules', 'lmod'),
+                },
+            }
+        })
+        return spack.config.Configuration(
+            spack.config.InternalConfigScope(
+                '_builtin', spack.config.config_defaults),
+            spack.config.ConfigScope(
+                'defaults', os.path.join(spack.paths.etc_path, 'spack',
+                                         'defaults')),
+            spack.config.ConfigScope('site', site),
+            paths)
+
+    def __enter__(self):
+        import spack.modules.common as common
+        import spack.modules.tcl as tcl
+
+        self.root = tempfile.mkdtemp(prefix='spack-benchmark-')
+        self._saved = (
+            spack.config.config, spack.repo.path, spack.store.store,
+            spack.caches.misc_cache, spack.compilers._cache_config_file,
+            common.configuration, common.roots, tcl.configuration,
+            tcl.configuration_registry)
+
+        spack.config.config = self._configuration()
+        spack.repo.set_path(spack.repo.RepoPath(repo_paths[self.repo]))
+        spack.store.store = spack.store.Store(self.path('store'))
+        spack.caches.misc_cache = spack.util.file_cache.FileCache(
+            self.path('cache'))
+        spack.compilers._cache_config_file = []
+        spack.package_prefs.PackagePrefs.clear_caches()
+
+        # Module files read their configuration when they are imported
+        common.configuration = spack.config.get('modules')
+        common.roots = spack.config.get('config:module_roots')
+        tcl.configuration = spack.config.get('modules:tcl', {})
+        tcl.configuration_registry = {}
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        import spack.modules.common as common
+        import spack.modules.tcl as tcl
+
+        repo_path = spack.repo.path
+        (spack.config.config, spack.repo.path, spack.store.store,
+         spack.caches.misc_cache, spack.compilers._cache_config_file,
+         common.configuration, common.roots, tcl.configuration,
+         tcl.configuration_registry) = self._saved
+        if repo_path in sys.meta_path:
+            sys.meta_path.remove(repo_path)
+        spack.package_prefs.PackagePrefs.clear_caches()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @property
+    def concrete_specs(self):
+        """The specs of the workspace, concretized once."""
+        if self._concrete_specs is None:
+            self._concrete_specs = [
+                spack.spec.Spec(s).concretized() for s in self.spec_strings]
+        return self._concrete_specs
+
+    def install(self):
+        """Add the concrete specs to the store, with a few files in each
+        prefix, without building anything.
+
+        Returns:
+            (list): the concrete specs
+        """
+        specs = self.concrete_specs
+        if self._installed:
+            return specs
+
+        layout = spack.store.layout
+        db = spack.store.db
+        with db.write_transaction():
+            for spec in specs:
+                for node in spec.traverse(order='post'):
+                    if not os.path.exists(node.prefix):
+                        layout.create_install_directory(node)
+                        _populate_prefix(node)
+                    db.add(node, layout, explicit=node is spec)
+        self._installed = True
+        return specs
+
+
+def _default_os():
+    """Operating system for the mock compilers, as in the tests."""
+    host = spack.architecture.platform()
+    if host.name != 'linux':
+        return spack.architecture.OperatingSystem('debian', '6')
+    return host.operating_system('default_os')
+
+
+def _populate_prefix(spec):
+    """Create a few files in the prefix of ``spec``, like an install."""
+    name = spec.name
+    # Where the default ``libs`` property of packages looks for libraries
+    lib = name if name.startswith('lib') else 'lib' + name
+    files = {
+        os.path.join('bin', name): '#!/bin/sh\nexec {0}/libexec/{1}\n',
+        os.path.join('include', name + '.h'): '#define PREFIX "{0}"\n',
+        os.path.join('lib', lib + '.so'): 'prefix={0}\n',
+        os.path.join('lib', 'pkgconfig', name + '.pc'): 'prefix={0}\n',
+        os.path.join('share', name, 'README'): 'Installed in {0}\n',
+    }
+    for path, content in files.items():
+        path = os.path.join(spec.prefix, path)
+        mkdirp(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content.format(spec.prefix, name))
+
+
+def _time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        function()
+        times.append(timeit.default_timer() - start)
+    return times
+
+
+def _commit():
+    """Git commit of this Spack, if it is a git repository."""
+    git = which('git')
+    if not git or not os.path.isdir(os.path.join(spack.paths.prefix, '.git')):
+        return None
+    with working_dir(spack.paths.prefix):
+        return git('rev-parse', 'HEAD', output=str, error=os.devnull,
+                   fail_on_error=False).strip() or None
+
+
+def run_benchmarks(benchmarks, repo='mock', repeat=5):
+    """Run benchmarks in a new ``Workspace``.
+
+    Each benchmark is run once to warm up, then ``repeat`` times.
+
+    Args:
+        benchmarks (list): ``Benchmark`` objects to run
+        repo (str): repository to use, ``'mock'`` or ``'builtin'``
+        repeat (int): number of timed runs of each benchmark
+
+    Returns:
+        (dict): results, that can be saved with ``write_results()``
+    """
+    results = {
+        'format': results_format,
+        'spack': spack.spack_version,
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'repo': repo,
+        'repeat': repeat,
+        'benchmarks': {},
+    }
+
+    with Workspace(repo) as workspace:
+        for b in benchmarks:
+            tty.debug('Running benchmark {0}'.format(b.name))
+            function = b.prepare(workspace)
+            function()
+            times = _time(function, repeat)
+            results['benchmarks'][b.name] = {
+                'times': times,
+                'min': min(times),
+                'median': sorted(times)[len(times) // 2],
+                'mean': sum(times) / len(times),
+            }
+    return results
+
+
+def write_results(results, path):
+    """Save results of ``run_benchmarks()`` as JSON."""
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True, separators=(',', ': '))
+        f.write('\n')
+
+
+def read_results(path):
+    """Read results saved by ``write_results()``."""
+    try:
+        with open(path) as f:
+            results = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        raise BenchmarkError(
+            'Cannot read benchmark results from {0}'.format(path), str(e))
+
+    if results.get('format') != results_format:
+        raise BenchmarkError(
+            '{0} has results in an unknown format'.format(path))
+    return results
+
+
+class Comparison(object):
+    """Timings of one benchmark in two sets of results.
+
+    Attributes:
+        name (str): name of the benchmark
+        baseline (float): minimum time of the baseline, in seconds
+        current (float): minimum time of the current results, in seconds
+        ratio (float): ``current / baseline``
+        regression (bool): whether the ratio is over the threshold
+    """
+
+    def __init__(self, name, baseline, current, threshold):
+        self.name = name
+        self.baseline = baseline
+        self.current = current
+        self.ratio = current / baseline if baseline else float('inf')
+        self.regression = self.ratio > 1 + threshold
+
+
+def compare(baseline, current, threshold=0.1):
+    """Compare the benchmarks that are in both sets of results.
+
+    The minimum of the times of each benchmark is compared, as it is the
+    least affected by noise from the rest of the machine.
+
+    Args:
+        baseline (dict): results of the reference commit
+        current (dict): results to check
+        threshold (float): relative slowdown above which a benchmark is
+            a regression, e.g. 0.1 for 10%
+
+    Returns:
+        (list): ``Comparison`` of each benchmark, sorted by name
+    """
+    if baseline.get('repo') != current.get('repo'):
+        raise BenchmarkError(
+            'Results are for different repositories: {0} and {1}'.format(
+                baseline.get('repo'), current.get('repo')))
+
+    old, new = baseline['benchmarks'], current['benchmarks']
+    return [Comparison(name, old[name]['min'], new[name]['min'], threshold)
+            for name in sorted(set(old) & set(new))]
+
+
+class BenchmarkError(SpackError):
+    """Raised when benchmarks can't be run or compared."""
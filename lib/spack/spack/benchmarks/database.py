@@ -0,0 +1,53 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Benchmarks of the install database."""
+import spack.database
+import spack.store
+from spack.benchmarks import benchmark
+
+
+@benchmark
+def read(workspace):
+    """Read the database of the store from disk"""
+    workspace.install()
+    root = spack.store.store.root
+
+    def run():
+        spack.database.Database(root).query()
+    return run
+
+
+@benchmark
+def query(workspace):
+    """Query installed specs by name, by spec and by status"""
+    specs = workspace.install()
+    db = spack.store.db
+    names = sorted(set(n.name for s in specs for n in s.traverse()))
+
+    def run():
+        for name in names:
+            db.query(name)
+        for spec in specs:
+            db.query(spec)
+            db.query_one(spec)
+        db.query(explicit=True)
+        db.query(installed=any)
+        db.missing(specs[0])
+    return run
+
+
+@benchmark
+def write(workspace):
+    """Write the whole database index"""
+    workspace.install()
+    db = spack.store.db
+    db.query()
+    path = workspace.path('index.json')
+
+    def run():
+        with open(path, 'w') as f:
+            db._write_to_file(f)
+    return run
@@ -0,0 +1,22 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Benchmarks of module file generation."""
+from spack.benchmarks import benchmark
+import spack.modules
+
+
+@benchmark
+def tcl(workspace):
+    """Write the tcl module file of every installed node"""
+    specs = workspace.install()
+    nodes = dict((n.dag_hash(), n) for s in specs for n in s.traverse())
+    nodes = [nodes[h] for h in sorted(nodes)]
+    writer = spack.modules.module_types['tcl']
+
+    def run():
+        for node in nodes:
+            writer(node).write(overwrite=True)
+    return run
@@ -0,0 +1,72 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Benchmarks of the relocation of installed files."""
+import os
+
+from llnl.util.filesystem import install_tree, mkdirp
+
+import spack.paths
+import spack.relocate
+import spack.store
+from spack.benchmarks import benchmark
+
+
+def _copy_prefixes(specs, root):
+    """Copy the prefixes of all the nodes of specs under root, and return
+    the paths of the copied files."""
+    path_names = []
+    for node in set(n for s in specs for n in s.traverse()):
+        dest = os.path.join(root, node.dag_hash())
+        install_tree(node.prefix, dest)
+        for dirpath, _, filenames in os.walk(dest):
+            path_names.extend(os.path.join(dirpath, f) for f in filenames)
+    return sorted(path_names)
+
+
+@benchmark
+def text(workspace):
+    """Relocate the text files of the installed prefixes back and forth"""
+    specs = workspace.install()
+    path_names = _copy_prefixes(specs, workspace.path('relocate', 'text'))
+    old_dir, new_dir = spack.store.layout.root, workspace.path('moved')
+    old_prefix, new_prefix = spack.paths.prefix, workspace.path('spack')
+
+    def run():
+        spack.relocate.relocate_text(
+            path_names, old_dir, new_dir, old_prefix, new_prefix)
+        spack.relocate.relocate_text(
+            path_names, new_dir, old_dir, new_prefix, old_prefix)
+    return run
+
+
+@benchmark
+def binary(workspace):
+    """Replace the install root in the strings of binary files"""
+    specs = workspace.install()
+    root = workspace.path('relocate', 'binary')
+    mkdirp(root)
+
+    # Prefixes of the same length, so they can be swapped back and forth
+    old_dir, new_dir = workspace.path('store'), workspace.path('moved')
+    strings = b''.join(
+        n.prefix.encode('utf-8') + b'/lib\0'
+        for s in specs for n in s.traverse())
+    filler = bytes(bytearray(range(1, 256))) * 256
+
+    path_names = []
+    for i in range(len(specs)):
+        path = os.path.join(root, 'lib{0}.so'.format(i))
+        with open(path, 'wb') as f:
+            for _ in range(16):
+                f.write(filler + b'\0' + strings)
+        path_names.append(path)
+
+    def run():
+        for path in path_names:
+            spack.relocate.replace_prefix_bin(path, old_dir, new_dir)
+        for path in path_names:
+            spack.relocate.replace_prefix_bin(path, new_dir, old_dir)
+    return run
@@ -0,0 +1,22 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Benchmarks of package repositories."""
+import spack.caches
+import spack.repo
+from spack.benchmarks import benchmark
+
+
+@benchmark
+def index(workspace):
+    """Rebuild the provider, tag, patch and metadata indexes from scratch"""
+    repos = spack.repo.path.repos
+
+    def run():
+        spack.caches.misc_cache.destroy()
+        for repo in repos:
+            repo._repo_index = None
+            repo.index['providers']
+    return run
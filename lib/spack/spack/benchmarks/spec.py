@@ -0,0 +1,90 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Benchmarks of spec parsing, concretization, hashing and comparison."""
+import spack.config
+from spack.benchmarks import benchmark
+from spack.spec import Spec, SpecParser
+
+
+@benchmark
+def parse(workspace):
+    """Parse the abstract specs, and every concrete node in full"""
+    strings = list(workspace.spec_strings)
+    for spec in workspace.concrete_specs:
+        strings.extend(str(node) for node in spec.traverse())
+
+    def run():
+        for string in strings:
+            SpecParser().parse(string)
+    return run
+
+
+@benchmark
+def concretize(workspace):
+    """Concretize the abstract specs"""
+    strings = workspace.spec_strings
+
+    def run():
+        for string in strings:
+            Spec(string).concretized()
+    return run
+
+
+@benchmark
+def concretize_stack(workspace):
+    """Concretize large stacks, like xsdk, trilinos or ecp-io-sdk"""
+    strings = workspace.stack_strings
+
+    def run():
+        for string in strings:
+            Spec(string).concretized()
+    return run
+
+
+@benchmark
+def concretize_cached(workspace):
+    """Concretize the abstract specs again, from the concretization cache"""
+    strings = workspace.spec_strings
+
+    def run():
+        with spack.config.override('config:concretization_cache', True):
+            for string in strings:
+                Spec(string).concretized()
+    run()
+    return run
+
+
+@benchmark
+def dag_hash(workspace):
+    """Compute the DAG hash of every node of the concrete specs"""
+    specs = workspace.concrete_specs
+
+    def run():
+        for spec in specs:
+            for node in spec.traverse():
+                node._hash = None
+        for spec in specs:
+            spec.dag_hash()
+    return run
+
+
+@benchmark
+def satisfies(workspace):
+    """Check concrete nodes against abstract constraints"""
+    nodes = []
+    for spec in workspace.concrete_specs:
+        nodes.extend(spec.traverse())
+
+    constraints = [Spec(s) for s in workspace.spec_strings]
+    constraints += [Spec(n.name) for n in nodes]
+    constraints += [Spec(s) for s in ('%gcc', '%clang@3.3', '@1.0:', '~mpi')]
+
+    def run():
+        for node in nodes:
+            for constraint in constraints:
+                node.satisfies(constraint)
+                node.satisfies(constraint, strict=True)
+    return run
@@ -0,0 +1,29 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Benchmarks of filesystem views."""
+import itertools
+
+from spack.benchmarks import benchmark
+from spack.filesystem_view import YamlFilesystemView
+import spack.store
+
+
+@benchmark
+def add_specs(workspace):
+    """Link the installed specs and their dependencies in a new view"""
+    specs = workspace.install()
+    layout = spack.store.layout
+    count = itertools.count()
+
+    # The specs share names with different hashes, e.g. mpileaks ^mpich
+    # and mpileaks ^zmpi, so each one gets its own directory in the view
+    projections = {'all': '{name}-{hash:7}'}
+
+    def run():
+        root = workspace.path('views', str(next(count)))
+        view = YamlFilesystemView(root, layout, projections=projections)
+        view.add_specs(*specs)
+    return run
@@ -3,11 +3,13 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import io
 import os
 import re
 import tarfile
 import shutil
 import tempfile
+import time
 import hashlib
 from contextlib import closing
 
@@ -16,12 +18,14 @@ import json
 from six.moves.urllib.error import URLError
 
 import llnl.util.tty as tty
-from llnl.util.filesystem import mkdirp, install_tree
+from llnl.util.filesystem import mkdirp
 
 import spack.cmd
 import spack.fetch_strategy as fs
 import spack.util.gpg as gpg_util
 import spack.relocate as relocate
+import spack.util.compression
+import spack.util.prefix_files
 import spack.util.spack_yaml as syaml
 from spack.spec import Spec
 from spack.stage import Stage
@@ -124,10 +128,9 @@ def read_buildinfo_file(prefix):
     return buildinfo
 
 
-def write_buildinfo_file(prefix, workdir, rel=False):
+def get_buildinfo_dict(prefix, rel=False):
     """
-    Create a cache file containing information
-    required for the relocation
+    Create the information required for the relocation
     """
     text_to_relocate = []
     binary_to_relocate = []
@@ -135,31 +138,31 @@ def write_buildinfo_file(prefix, workdir, rel=False):
     blacklist = (".spack", "man")
     # Do this at during tarball creation to save time when tarball unpacked.
     # Used by make_package_relative to determine binaries to change.
-    for root, dirs, files in os.walk(prefix, topdown=True):
-        dirs[:] = [d for d in dirs if d not in blacklist]
-        for filename in files:
-            path_name = os.path.join(root, filename)
-            m_type, m_subtype = relocate.mime_type(path_name)
-            if os.path.islink(path_name):
-                link = os.readlink(path_name)
-                if os.path.isabs(link):
-                    # Relocate absolute links into the spack tree
-                    if link.startswith(spack.store.layout.root):
-                        rel_path_name = os.path.relpath(path_name, prefix)
-                        link_to_relocate.append(rel_path_name)
-                    else:
-                        msg = 'Absolute link %s to %s ' % (path_name, link)
-                        msg += 'outside of stage %s ' % prefix
-                        msg += 'cannot be relocated.'
-                        tty.warn(msg)
-
-            if relocate.needs_binary_relocation(m_type, m_subtype):
-                if not filename.endswith('.o'):
-                    rel_path_name = os.path.relpath(path_name, prefix)
-                    binary_to_relocate.append(rel_path_name)
-            if relocate.needs_text_relocation(m_type, m_subtype):
-                rel_path_name = os.path.relpath(path_name, prefix)
-                text_to_relocate.append(rel_path_name)
+    # The types of files come from the manifest of the prefix, so files
+    # that didn't change since it was written aren't read again.
+    for entry in spack.util.prefix_files.files_in(prefix):
+        path_name = entry.path
+        rel_path_name = os.path.relpath(path_name, prefix)
+        if any(d in blacklist for d in rel_path_name.split(os.sep)[:-1]):
+            continue
+        m_type, m_subtype = entry.mime_type
+        if entry.islink:
+            link = os.readlink(path_name)
+            if os.path.isabs(link):
+                # Relocate absolute links into the spack tree
+                if link.startswith(spack.store.layout.root):
+                    link_to_relocate.append(rel_path_name)
+                else:
+                    msg = 'Absolute link %s to %s ' % (path_name, link)
+                    msg += 'outside of stage %s ' % prefix
+                    msg += 'cannot be relocated.'
+                    tty.warn(msg)
+
+        if relocate.needs_binary_relocation(m_type, m_subtype):
+            if not path_name.endswith('.o'):
+                binary_to_relocate.append(rel_path_name)
+        if relocate.needs_text_relocation(m_type, m_subtype):
+            text_to_relocate.append(rel_path_name)
 
     # Create buildinfo data and write it to disk
     buildinfo = {}
@@ -171,6 +174,15 @@ def write_buildinfo_file(prefix, workdir, rel=False):
     buildinfo['relocate_textfiles'] = text_to_relocate
     buildinfo['relocate_binaries'] = binary_to_relocate
     buildinfo['relocate_links'] = link_to_relocate
+    return buildinfo
+
+
+def write_buildinfo_file(prefix, workdir, rel=False):
+    """
+    Create a cache file containing information
+    required for the relocation
+    """
+    buildinfo = get_buildinfo_dict(prefix, rel=rel)
     filename = buildinfo_file_name(workdir)
     with open(filename, 'w') as outfile:
         outfile.write(syaml.dump(buildinfo, default_flow_style=True))
@@ -210,13 +222,18 @@ def tarball_path_name(spec, ext):
 
 def checksum_tarball(file):
     # calculate sha256 hash of tar file
+    with open(file, 'rb') as tfile:
+        return checksum_fileobj(tfile)
+
+
+def checksum_fileobj(fileobj):
+    # calculate sha256 hash of what is left to read in a file object
     block_size = 65536
     hasher = hashlib.sha256()
-    with open(file, 'rb') as tfile:
-        buf = tfile.read(block_size)
-        while len(buf) > 0:
-            hasher.update(buf)
-            buf = tfile.read(block_size)
+    buf = fileobj.read(block_size)
+    while len(buf) > 0:
+        hasher.update(buf)
+        buf = fileobj.read(block_size)
     return hasher.hexdigest()
 
 
@@ -309,35 +326,30 @@ def build_tarball(spec, outdir, force=False, rel=False, unsigned=False,
         else:
             raise NoOverwriteException(str(specfile_path))
 
-    # make a copy of the install directory to work with
-    workdir = os.path.join(tempfile.mkdtemp(), os.path.basename(spec.prefix))
-    install_tree(spec.prefix, workdir, symlinks=True)
+    # create info for later relocation
+    buildinfo = get_buildinfo_dict(spec.prefix, rel=rel)
 
-    # create info for later relocation and create tar
-    write_buildinfo_file(spec.prefix, workdir, rel=rel)
+    # The tarball is written straight from the install prefix. Only the
+    # binaries made relative are copied to a work directory first.
+    workdir = tempfile.mkdtemp()
+    try:
+        # optionally make the paths in the binaries relative to each other
+        # in the spack install tree before creating tarball
+        if rel:
+            files, links = make_package_relative(
+                workdir, spec, buildinfo, allow_root)
+        else:
+            files = {}
+            links = make_package_placeholder(spec, buildinfo, allow_root)
 
-    # optionally make the paths in the binaries relative to each other
-    # in the spack install tree before creating tarball
-    if rel:
-        try:
-            make_package_relative(workdir, spec, allow_root)
-        except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
-            tty.die(e)
-    else:
-        try:
-            make_package_placeholder(workdir, spec, allow_root)
-        except Exception as e:
-            shutil.rmtree(workdir)
-            shutil.rmtree(tarfile_dir)
-            tty.die(e)
-    # create compressed tarball of the install prefix
-    with closing(tarfile.open(tarfile_path, 'w:gz')) as tar:
-        tar.add(name='%s' % workdir,
-                arcname='%s' % os.path.basename(spec.prefix))
-    # remove copy of install directory
-    shutil.rmtree(workdir)
+        # create compressed tarball of the install prefix
+        write_package_tarball(spec.prefix, tarfile_path, buildinfo,
+                              files=files, links=links)
+    except Exception as e:
+        shutil.rmtree(tarfile_dir)
+        tty.die(e)
+    finally:
+        shutil.rmtree(workdir)
 
     # get the sha256 checksum of the tarball
     checksum = checksum_tarball(tarfile_path)
@@ -411,49 +423,154 @@ def download_tarball(spec):
     return None
 
 
-def make_package_relative(workdir, spec, allow_root):
+def make_package_relative(workdir, spec, buildinfo, allow_root):
     """
-    Change paths in binaries to relative paths. Change absolute symlinks
-    to relative symlinks.
+    Copy the binaries to workdir and change paths in the copies to
+    relative paths. Compute relative sources for absolute symlinks.
+
+    Returns:
+        tuple: the files to take from workdir and the new sources of the
+            links, keyed by their path relative to the prefix
     """
     prefix = spec.prefix
-    buildinfo = read_buildinfo_file(workdir)
     old_path = buildinfo['buildpath']
+    files = {}
     orig_path_names = list()
     cur_path_names = list()
     for filename in buildinfo['relocate_binaries']:
         orig_path_names.append(os.path.join(prefix, filename))
         cur_path_names.append(os.path.join(workdir, filename))
+        mkdirp(os.path.dirname(cur_path_names[-1]))
+        shutil.copy2(orig_path_names[-1], cur_path_names[-1])
+        files[filename] = cur_path_names[-1]
     if spec.architecture.platform == 'darwin':
         relocate.make_macho_binaries_relative(cur_path_names, orig_path_names,
                                               old_path, allow_root)
     else:
         relocate.make_elf_binaries_relative(cur_path_names, orig_path_names,
                                             old_path, allow_root)
-    orig_path_names = list()
-    cur_path_names = list()
+    links = {}
     for filename in buildinfo.get('relocate_links', []):
-        orig_path_names.append(os.path.join(prefix, filename))
-        cur_path_names.append(os.path.join(workdir, filename))
-    relocate.make_link_relative(cur_path_names, orig_path_names)
+        links[filename] = relocate.relative_link_source(
+            os.path.join(prefix, filename))
+    return files, links
 
 
-def make_package_placeholder(workdir, spec, allow_root):
+def make_package_placeholder(spec, buildinfo, allow_root):
     """
     Check if package binaries are relocatable.
-    Change links to placeholder links.
+    Compute placeholder sources for absolute symlinks.
+
+    Returns:
+        dict: the new sources of the links, keyed by their path relative
+            to the prefix
     """
     prefix = spec.prefix
-    buildinfo = read_buildinfo_file(workdir)
     cur_path_names = list()
     for filename in buildinfo['relocate_binaries']:
-        cur_path_names.append(os.path.join(workdir, filename))
+        cur_path_names.append(os.path.join(prefix, filename))
     relocate.check_files_relocatable(cur_path_names, allow_root)
 
-    cur_path_names = list()
+    links = {}
     for filename in buildinfo.get('relocate_links', []):
-        cur_path_names.append(os.path.join(workdir, filename))
-    relocate.make_link_placeholder(cur_path_names, workdir, prefix)
+        links[filename] = relocate.placeholder_link_source(
+            os.path.join(prefix, filename), prefix, prefix)
+    return links
+
+
+def _prefix_entries(prefix):
+    """Paths relative to prefix of everything in it, parents first."""
+    for root, dirs, files in os.walk(prefix):
+        dirs.sort()
+        # os.walk() lists links to directories with the directories
+        for name in sorted(dirs + files):
+            yield os.path.relpath(os.path.join(root, name), prefix)
+
+
+def write_package_tarball(prefix, tarfile_path, buildinfo,
+                          files=None, links=None):
+    """
+    Write a compressed tarball of an install prefix, without copying it.
+
+    Args:
+        prefix (str): install prefix
+        tarfile_path (str): path of the .tar.gz file to write
+        buildinfo (dict): relocation information, written in the tarball
+            in place of the buildinfo file of the prefix
+        files (dict): paths of files to use instead of the ones in the
+            prefix, keyed by their path relative to the prefix
+        links (dict): sources to use for links in the prefix, keyed by
+            their path relative to the prefix
+    """
+    files = files or {}
+    links = links or {}
+    name = os.path.basename(prefix)
+    buildinfo_path = os.path.relpath(buildinfo_file_name(prefix), prefix)
+    buildinfo_data = syaml.dump(
+        buildinfo, default_flow_style=True).encode('utf-8')
+
+    with open(tarfile_path, 'wb') as f:
+        with closing(spack.util.compression.ParallelGzipWriter(f)) as gz:
+            with closing(tarfile.open(fileobj=gz, mode='w|')) as tar:
+                tar.addfile(tar.gettarinfo(prefix, name))
+                for path in _prefix_entries(prefix):
+                    if path == buildinfo_path:
+                        continue
+                    info = tar.gettarinfo(os.path.join(prefix, path),
+                                          os.path.join(name, path))
+                    if path in links:
+                        info.linkname = links[path]
+                    if info.islnk() and (path in files or os.path.relpath(
+                            info.linkname, name) in files):
+                        # Hard links to a file that is replaced aren't
+                        # the same file anymore
+                        info.type = tarfile.REGTYPE
+                        info.linkname = ''
+                    if not info.isreg():
+                        tar.addfile(info)
+                        continue
+
+                    source = files.get(path, os.path.join(prefix, path))
+                    info.size = os.path.getsize(source)
+                    with open(source, 'rb') as data:
+                        tar.addfile(info, data)
+
+                info = tarfile.TarInfo(os.path.join(name, buildinfo_path))
+                info.size = len(buildinfo_data)
+                info.mode = 0o644
+                info.mtime = time.time()
+                tar.addfile(info, io.BytesIO(buildinfo_data))
+
+
+def _package_members(tar, name):
+    """Members of a package tarball, moved under the directory ``name``."""
+    for member in tar:
+        parts = os.path.normpath(member.name).split(os.sep)
+        if os.path.isabs(member.name) or '..' in parts:
+            raise tarfile.ExtractError(
+                'Unsafe path in package tarball: {0}'.format(member.name))
+        member.name = os.path.join(name, *parts[1:])
+        if member.islnk():
+            parts = os.path.normpath(member.linkname).split(os.sep)
+            member.linkname = os.path.join(name, *parts[1:])
+        yield member
+
+
+def extract_package_tarball(fileobj, prefix):
+    """
+    Extract a compressed tarball of an install prefix straight into the
+    prefix, as it is read.
+
+    Args:
+        fileobj: file object to read the .tar.gz data from
+        prefix (str): install prefix to extract into
+    """
+    parent = os.path.dirname(prefix)
+    mkdirp(parent)
+    with closing(tarfile.open(fileobj=fileobj, mode='r|gz')) as tar:
+        tar.extractall(
+            path=parent,
+            members=_package_members(tar, os.path.basename(prefix)))
 
 
 def relocate_package(workdir, spec, allow_root):
@@ -516,27 +633,41 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
     spackfile_name = tarball_name(spec, '.spack')
     spackfile_path = os.path.join(stagepath, spackfile_name)
     tarfile_name = tarball_name(spec, '.tar.gz')
-    tarfile_path = os.path.join(tmpdir, tarfile_name)
     specfile_name = tarball_name(spec, '.spec.yaml')
     specfile_path = os.path.join(tmpdir, specfile_name)
 
-    with closing(tarfile.open(spackfile_path, 'r')) as tar:
-        tar.extractall(tmpdir)
+    # Only the spec file and its signature are extracted, the tarball of
+    # the prefix is read from the .spack archive
+    spackfile = tarfile.open(spackfile_path, 'r')
+    try:
+        _extract_tarball(spackfile, spec, tmpdir, tarfile_name,
+                         specfile_name, allow_root, unsigned)
+    finally:
+        spackfile.close()
+        shutil.rmtree(tmpdir)
+
+
+def _extract_tarball(spackfile, spec, tmpdir, tarfile_name, specfile_name,
+                     allow_root, unsigned):
+    specfile_path = os.path.join(tmpdir, specfile_name)
+    for member in spackfile.getmembers():
+        if member.name in (specfile_name, '%s.asc' % specfile_name):
+            spackfile.extract(member, tmpdir)
+
     if not unsigned:
         if os.path.exists('%s.asc' % specfile_path):
             try:
                 Gpg.verify('%s.asc' % specfile_path, specfile_path)
             except Exception as e:
-                shutil.rmtree(tmpdir)
                 tty.die(e)
         else:
-            shutil.rmtree(tmpdir)
             raise NoVerifyException(
                 "Package spec file failed signature verification.\n"
                 "Use spack buildcache keys to download "
                 "and install a key for verification from the mirror.")
     # get the sha256 checksum of the tarball
-    checksum = checksum_tarball(tarfile_path)
+    tarball = spackfile.getmember(tarfile_name)
+    checksum = checksum_fileobj(spackfile.extractfile(tarball))
 
     # get the sha256 checksum recorded at creation
     spec_dict = {}
@@ -547,7 +678,6 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
 
     # if the checksums don't match don't install
     if bchecksum['hash'] != checksum:
-        shutil.rmtree(tmpdir)
         raise NoChecksumException(
             "Package tarball failed checksum verification.\n"
             "It cannot be installed.")
@@ -560,34 +690,20 @@ def extract_tarball(spec, filename, allow_root=False, unsigned=False,
     # if the original relative prefix and new relative prefix differ the
     # directory layout has changed and the  buildcache cannot be installed
     if old_relative_prefix != new_relative_prefix:
-        shutil.rmtree(tmpdir)
         msg = "Package tarball was created from an install "
         msg += "prefix with a different directory layout.\n"
         msg += "It cannot be relocated."
         raise NewLayoutException(msg)
 
-    # extract the tarball in a temp directory
-    with closing(tarfile.open(tarfile_path, 'r')) as tar:
-        tar.extractall(path=tmpdir)
-    # the base of the install prefix is used when creating the tarball
-    # so the pathname should be the same now that the directory layout
-    # is confirmed
-    workdir = os.path.join(tmpdir, os.path.basename(spec.prefix))
-    install_tree(workdir, spec.prefix, symlinks=True)
-
-    # cleanup
-    os.remove(tarfile_path)
-    os.remove(specfile_path)
-
+    # Create spec.prefix only once verification is complete, then extract
+    # and relocate the package in place.
     try:
+        extract_package_tarball(spackfile.extractfile(tarball), spec.prefix)
         relocate_package(spec.prefix, spec, allow_root)
     except Exception as e:
-        shutil.rmtree(spec.prefix)
+        if os.path.exists(spec.prefix):
+            shutil.rmtree(spec.prefix)
         tty.die(e)
-    # Delay creating spec.prefix until verification is complete
-    # and any relocation has been done.
-    finally:
-        shutil.rmtree(tmpdir)
 
 
 #: Internal cache for get_specs
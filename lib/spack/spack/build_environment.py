@@ -671,6 +671,33 @@ def load_external_modules(pkg):
             load_module(dep.external_module)
 
 
+def modifications_from_dependencies(spec, deptype, spack_env, run_env):
+    """Collects the environment modifications that the dependencies of a
+    spec request for it, for its whole DAG at once.
+
+    Dependencies are visited in post-order, so that packages can use the
+    variables set by their own dependencies.  The modifications are only
+    recorded in ``spack_env`` and ``run_env``; they are coalesced per
+    variable when these are applied.
+
+    Args:
+        spec (Spec): spec whose dependencies are set up
+        deptype (tuple): types of the dependencies to visit
+        spack_env (EnvironmentModifications): modifications of the build
+            environment
+        run_env (EnvironmentModifications): modifications of the run
+            environment
+    """
+    module = spec.package.module
+    for dspec in spec.traverse(order='post', root=False, deptype=deptype):
+        dpkg = dspec.package
+        set_module_variables_for_package(dpkg)
+
+        # Allow dependencies to modify the module
+        dpkg.setup_dependent_package(module, spec)
+        dpkg.setup_dependent_environment(spack_env, run_env, spec)
+
+
 def setup_package(pkg, dirty):
     """Execute all environment setup routines."""
     spack_env = EnvironmentModifications()
@@ -683,17 +710,8 @@ def setup_package(pkg, dirty):
     set_build_environment_variables(pkg, spack_env, dirty)
     pkg.architecture.platform.setup_platform_environment(pkg, spack_env)
 
-    # traverse in postorder so package can use vars from its dependencies
-    spec = pkg.spec
-    for dspec in pkg.spec.traverse(order='post', root=False,
-                                   deptype=('build', 'test')):
-        spkg = dspec.package
-        set_module_variables_for_package(spkg)
-
-        # Allow dependencies to modify the module
-        dpkg = dspec.package
-        dpkg.setup_dependent_package(pkg.module, spec)
-        dpkg.setup_dependent_environment(spack_env, run_env, spec)
+    modifications_from_dependencies(
+        pkg.spec, ('build', 'test'), spack_env, run_env)
 
     if (not dirty) and (not spack_env.is_unset('CPATH')):
         tty.debug("A dependency has updated CPATH, this may lead pkg-config"
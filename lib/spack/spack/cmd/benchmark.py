@@ -0,0 +1,140 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from __future__ import print_function
+
+import sys
+
+import llnl.util.tty as tty
+from llnl.util.tty.color import cescape, colorize
+
+import spack.benchmarks
+
+description = "run benchmarks of spack's hot paths"
+section = "developer"
+level = "long"
+
+
+def setup_parser(subparser):
+    sp = subparser.add_subparsers(metavar='SUBCOMMAND', dest='subcommand')
+
+    # List
+    list_parser = sp.add_parser('list', help='list the benchmarks')
+    list_parser.add_argument(
+        'patterns', nargs='*',
+        help='only list benchmarks matching these regular expressions')
+
+    # Run
+    run_parser = sp.add_parser(
+        'run', help='run benchmarks and print or save their timings')
+    run_parser.add_argument(
+        '-r', '--repo', choices=sorted(spack.benchmarks.repo_paths),
+        default='mock',
+        help='package repository to use (default: mock)')
+    run_parser.add_argument(
+        '-n', '--repeat', type=int, default=5,
+        help='number of timed runs of each benchmark (default: 5)')
+    run_parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='save the results as JSON in FILE')
+    run_parser.add_argument(
+        '-b', '--baseline', metavar='FILE',
+        help='compare the results with results saved in FILE')
+    run_parser.add_argument(
+        '-t', '--threshold', type=float, default=0.1,
+        help='relative slowdown that is a regression (default: 0.1)')
+    run_parser.add_argument(
+        'patterns', nargs='*',
+        help='only run benchmarks matching these regular expressions')
+
+    # Compare
+    compare_parser = sp.add_parser(
+        'compare', help='compare two sets of saved results')
+    compare_parser.add_argument(
+        '-t', '--threshold', type=float, default=0.1,
+        help='relative slowdown that is a regression (default: 0.1)')
+    compare_parser.add_argument(
+        'baseline', help='results of the reference commit')
+    compare_parser.add_argument(
+        'current', help='results to check for regressions')
+
+
+def benchmark(parser, args):
+    action = {
+        'list':    benchmark_list,
+        'run':     benchmark_run,
+        'compare': benchmark_compare,
+    }
+
+    if not args.subcommand:
+        parser.print_help()
+        return
+
+    action[args.subcommand](args)
+
+
+def benchmark_list(args):
+    benchmarks = spack.benchmarks.select_benchmarks(args.patterns)
+    width = max(len(b.name) for b in benchmarks)
+    for b in benchmarks:
+        print('{0:<{1}}  {2}'.format(b.name, width, b.description))
+
+
+def benchmark_run(args):
+    if args.repeat < 1:
+        tty.die('--repeat must be at least 1')
+
+    baseline = None
+    if args.baseline:
+        baseline = spack.benchmarks.read_results(args.baseline)
+
+    benchmarks = spack.benchmarks.select_benchmarks(args.patterns)
+    results = spack.benchmarks.run_benchmarks(
+        benchmarks, repo=args.repo, repeat=args.repeat)
+
+    if args.output:
+        spack.benchmarks.write_results(results, args.output)
+        tty.msg('Results saved in {0}'.format(args.output))
+
+    if baseline:
+        _print_comparison(baseline, results, args.threshold)
+        return
+
+    width = max(len(name) for name in results['benchmarks'])
+    print('{0:<{1}}  {2:>10}  {3:>10}'.format('Benchmark', width,
+                                              'Min (s)', 'Median (s)'))
+    for name, timing in sorted(results['benchmarks'].items()):
+        print('{0:<{1}}  {2:>10.4f}  {3:>10.4f}'.format(
+            name, width, timing['min'], timing['median']))
+
+
+def benchmark_compare(args):
+    baseline = spack.benchmarks.read_results(args.baseline)
+    current = spack.benchmarks.read_results(args.current)
+    _print_comparison(baseline, current, args.threshold)
+
+
+def _print_comparison(baseline, current, threshold):
+    """Print the comparison of two sets of results, and exit with an
+    error if any benchmark is a regression."""
+    comparisons = spack.benchmarks.compare(baseline, current, threshold)
+    if not comparisons:
+        tty.die('The results have no benchmark in common')
+
+    width = max(len(c.name) for c in comparisons)
+    print('{0:<{1}}  {2:>10}  {3:>10}  {4:>7}'.format(
+        'Benchmark', width, 'Base (s)', 'Now (s)', 'Ratio'))
+    for c in comparisons:
+        line = '{0:<{1}}  {2:>10.4f}  {3:>10.4f}  {4:>7.2f}'.format(
+            c.name, width, c.baseline, c.current, c.ratio)
+        if c.regression:
+            line = colorize('@r{%s}' % cescape(line))
+        print(line)
+
+    regressions = [c.name for c in comparisons if c.regression]
+    if regressions:
+        tty.error('{0} benchmark(s) slower by more than {1:.0%}: {2}'.format(
+            len(regressions), threshold, ', '.join(regressions)))
+        sys.exit(1)
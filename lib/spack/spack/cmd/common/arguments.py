@@ -11,7 +11,6 @@ import spack.cmd
 import spack.config
 import spack.dependency as dep
 import spack.environment as ev
-import spack.modules
 import spack.spec
 import spack.store
 from spack.util.pattern import Args
@@ -64,12 +63,14 @@ class ConstraintAction(argparse.Action):
         if not qspecs:
             return spack.store.db.query(**kwargs)
 
-        # Return only matching stuff otherwise.
+        # Return only matching stuff otherwise. Query all the constraints
+        # in a single transaction, so that the database is read only once.
         specs = {}
-        for spec in qspecs:
-            for s in spack.store.db.query(spec, **kwargs):
-                # This is fast for already-concrete specs
-                specs[s.dag_hash()] = s
+        with spack.store.db.read_transaction():
+            for spec in qspecs:
+                for s in spack.store.db.query(spec, **kwargs):
+                    # This is fast for already-concrete specs
+                    specs[s.dag_hash()] = s
 
         return sorted(specs.values())
 
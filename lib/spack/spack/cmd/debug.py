@@ -5,14 +5,21 @@
 
 import os
 import re
+import time
 from datetime import datetime
 from glob import glob
 
 import llnl.util.tty as tty
 from llnl.util.filesystem import working_dir
 
+import spack.cmd
+import spack.hash_types as ht
 import spack.paths
+import spack.repo
+import spack.spec
+import spack.util.spack_yaml
 from spack.util.executable import which
+from spack.version import ver
 
 description = "debugging commands for troubleshooting Spack"
 section = "developer"
@@ -24,6 +31,17 @@ def setup_parser(subparser):
     sp.add_parser('create-db-tarball',
                   help="create a tarball of Spack's installation metadata")
 
+    hashes = sp.add_parser(
+        'spec-hashes', help="compare the fast and YAML spec hash encoders")
+    hashes.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help="number of times each encoder hashes every node (default 3)")
+    hashes.add_argument(
+        'specs', nargs='*',
+        help="specs to concretize and hash (default: every package in the "
+        "builtin repository, with its preferred version and default "
+        "variants)")
+
 
 def _debug_tarball_suffix():
     now = datetime.now()
@@ -78,6 +96,78 @@ def create_db_tarball(args):
     tty.msg('Created %s' % tarball_name)
 
 
+def _default_spec(pkg_cls):
+    """Abstract spec of a package with its preferred version and the
+    default value of its variants."""
+    spec = spack.spec.Spec(pkg_cls.name)
+    versions = pkg_cls.versions
+    if versions:
+        spec.versions = ver([max(versions, key=lambda v: (
+            versions[v].get('preferred', False), not v.isdevelop(), v))])
+    for name, variant in sorted(pkg_cls.variants.items()):
+        spec.variants[name] = variant.make_default()
+    return spec
+
+
+def _hashed_nodes(args):
+    """Node dicts that Spack hashes for the specs on the command line."""
+    nodes = []
+    if args.specs:
+        hash_types = (ht.dag_hash, ht.build_hash, ht.full_hash)
+        for spec in spack.cmd.parse_specs(args.specs, concretize=True):
+            for node in spec.traverse(deptype='all'):
+                for hash_type in hash_types:
+                    nodes.append(node.to_node_dict(hash=hash_type))
+    else:
+        # The package hash needs concrete specs
+        hash_types = (ht.dag_hash, ht.build_hash)
+        for pkg_cls in spack.repo.path.all_packages():
+            spec = _default_spec(pkg_cls)
+            for hash_type in hash_types:
+                nodes.append(spec.to_node_dict(hash=hash_type))
+    return nodes
+
+
+def spec_hashes(args):
+    nodes = _hashed_nodes(args)
+    tty.msg('Hashing {0} nodes {1} times'.format(len(nodes), args.repeat))
+
+    timings = {}
+    digests = {}
+    for name, encode in (('fast', spack.spec.flow_sha1),
+                         ('yaml', spack.spec.yaml_sha1)):
+        start = time.time()
+        for i in range(args.repeat):
+            shas = [encode(node) for node in nodes]
+        timings[name] = time.time() - start
+        digests[name] = [sha and sha.digest() for sha in shas]
+
+    unsupported = digests['fast'].count(None)
+    mismatches = [
+        node for node, fast, yaml in zip(nodes, digests['fast'],
+                                         digests['yaml'])
+        if fast is not None and fast != yaml]
+
+    for name in ('fast', 'yaml'):
+        print('{0:<6}{1:10.3f} s {2:10.1f} us/node'.format(
+            name, timings[name],
+            1e6 * timings[name] / max(1, len(nodes) * args.repeat)))
+    print('speedup {0:.1f}x'.format(
+        timings['yaml'] / max(timings['fast'], 1e-9)))
+    if unsupported:
+        tty.warn('{0} nodes fell back to the YAML encoder'.format(
+            unsupported))
+
+    if mismatches:
+        for node in mismatches:
+            tty.error('Encodings differ for {0}'.format(
+                spack.util.spack_yaml.dump(node, default_flow_style=True)))
+        tty.die('{0} of {1} nodes hash differently'.format(
+            len(mismatches), len(nodes)))
+    tty.msg('All {0} hashes match'.format(len(nodes)))
+
+
 def debug(parser, args):
-    action = {'create-db-tarball': create_db_tarball}
+    action = {'create-db-tarball': create_db_tarball,
+              'spec-hashes': spec_hashes}
     action[args.debug_command](args)
@@ -57,10 +57,10 @@ def dependencies(parser, args):
         spec = specs[0]
 
         if not spec.virtual:
-            packages = [spec.package]
+            packages = [spack.repo.path.get_pkg_metadata(spec.name)]
         else:
             packages = [
-                spack.repo.get(s.name)
+                spack.repo.path.get_pkg_metadata(s.name)
                 for s in spack.repo.path.providers_for(spec)]
 
         dependencies = set()
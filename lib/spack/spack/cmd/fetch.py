@@ -9,6 +9,8 @@ import llnl.util.tty as tty
 
 import spack.cmd
 import spack.config
+import spack.environment as ev
+import spack.fetch_pool
 import spack.repo
 import spack.cmd.common.arguments as arguments
 
@@ -25,6 +27,10 @@ def setup_parser(subparser):
     subparser.add_argument(
         '-D', '--dependencies', action='store_true',
         help="also fetch all dependencies")
+    subparser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help="number of files to download at the same time "
+        "(default: config:fetch_jobs)")
     subparser.add_argument(
         'packages', nargs=argparse.REMAINDER,
         help="specs of packages to fetch")
@@ -32,15 +38,26 @@ def setup_parser(subparser):
 
 def fetch(parser, args):
     if not args.packages:
-        tty.die("fetch requires at least one package argument")
+        env = ev.get_env(args, 'fetch')
+        if not env:
+            tty.die("fetch requires at least one package argument "
+                    "or an active environment")
 
     if args.no_checksum:
         spack.config.set('config:checksum', False, scope='command_line')
 
-    specs = spack.cmd.parse_specs(args.packages, concretize=True)
+    if args.packages:
+        specs = spack.cmd.parse_specs(args.packages, concretize=True)
+        traverse = args.missing or args.dependencies
+    else:
+        tty.msg("Fetching specs from environment %s" % env.name)
+        specs = env.specs_by_hash.values()
+        traverse = True
+
+    packages = []
     for spec in specs:
-        if args.missing or args.dependencies:
-            for s in spec.traverse():
+        if traverse:
+            for s in spec.traverse(root=False):
                 package = spack.repo.get(s)
 
                 # Skip already-installed packages with --missing
@@ -51,7 +68,16 @@ def fetch(parser, args):
                 if package.spec.external:
                     continue
 
-                package.do_fetch()
+                packages.append(package)
+
+        if not spec.external:
+            packages.append(spack.repo.get(spec))
+
+    # Download everything at once, then stage from the fetch cache
+    pool = spack.fetch_pool.FetchPool(jobs=args.jobs)
+    for package in packages:
+        pool.add_package(package)
+    pool.fetch()
 
-        package = spack.repo.get(spec)
+    for package in packages:
         package.do_fetch()
@@ -13,7 +13,6 @@ from llnl.util.tty.colify import colify
 
 import spack.repo
 import spack.spec
-import spack.fetch_strategy as fs
 
 
 description = 'get detailed information on a particular package'
@@ -150,7 +149,7 @@ def print_text_info(pkg):
 
     color.cprint('')
     color.cprint(section_title("Tags: "))
-    if hasattr(pkg, 'tags'):
+    if pkg.tags:
         tags = sorted(pkg.tags)
         colify(tags, indent=4)
     else:
@@ -176,7 +175,7 @@ def print_text_info(pkg):
         preferred = sorted(pkg.versions, key=key_fn).pop()
         url = ''
         if pkg.has_code:
-            url = fs.for_package_version(pkg, preferred)
+            url = pkg.fetch_url(preferred)
 
         line = version('    {0}'.format(pad(preferred))) + color.cescape(url)
         color.cprint(line)
@@ -185,7 +184,7 @@ def print_text_info(pkg):
 
         for v in reversed(sorted(pkg.versions)):
             if pkg.has_code:
-                url = fs.for_package_version(pkg, v)
+                url = pkg.fetch_url(v)
             line = version('    {0}'.format(pad(v))) + color.cescape(url)
             color.cprint(line)
 
@@ -235,5 +234,7 @@ def print_text_info(pkg):
 
 
 def info(parser, args):
-    pkg = spack.repo.get(args.name)
+    # The repository index has everything we print, so the package
+    # file doesn't need to be imported
+    pkg = spack.repo.path.get_pkg_metadata(args.name)
     print_text_info(pkg)
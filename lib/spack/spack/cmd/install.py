@@ -61,6 +61,9 @@ alternatively one can decide to install only the package or only
 the dependencies"""
     )
     arguments.add_common_arguments(subparser, ['jobs', 'install_status'])
+    subparser.add_argument(
+        '--concurrent-builds', type=int, default=None, metavar='N',
+        help="build up to N independent packages at the same time")
     subparser.add_argument(
         '--overwrite', action='store_true',
         help="reinstall an existing spec, even if it has dependents")
@@ -217,6 +220,12 @@ def install_spec(cli_args, kwargs, abstract_spec, spec):
 
 
 def install(parser, args, **kwargs):
+    if args.concurrent_builds is not None:
+        if args.concurrent_builds < 1:
+            tty.die('--concurrent-builds must be a positive integer')
+        spack.config.set('config:concurrent_builds', args.concurrent_builds,
+                         scope='command_line')
+
     if not args.package and not args.specfiles:
         # if there are no args but an active environment or spack.yaml file
         # then install the packages from it.
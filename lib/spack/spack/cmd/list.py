@@ -81,7 +81,7 @@ def filter_by_name(pkgs, args):
                 if f.match(p):
                     return True
 
-                pkg = spack.repo.get(p)
+                pkg = spack.repo.path.get_pkg_metadata(p)
                 if pkg.__doc__:
                     return f.match(pkg.__doc__)
                 return False
@@ -130,7 +130,7 @@ def get_dependencies(pkg):
 @formatter
 def version_json(pkg_names, out):
     """Print all packages with their latest versions."""
-    pkgs = [spack.repo.get(name) for name in pkg_names]
+    pkgs = [spack.repo.path.get_pkg_metadata(name) for name in pkg_names]
 
     out.write('[\n')
 
@@ -169,7 +169,7 @@ def html(pkg_names, out):
     """
 
     # Read in all packages
-    pkgs = [spack.repo.get(name) for name in pkg_names]
+    pkgs = [spack.repo.path.get_pkg_metadata(name) for name in pkg_names]
 
     # Start at 2 because the title of the page from Sphinx is id1.
     span_id = 2
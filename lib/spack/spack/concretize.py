@@ -16,8 +16,12 @@ TODO: make this customizable and allow users to configure
 """
 from __future__ import print_function
 
+import hashlib
+import json
 import platform
+import os
 import os.path
+import re
 import tempfile
 import llnl.util.filesystem as fs
 import llnl.util.tty as tty
@@ -30,19 +34,30 @@ import llnl.util.lang
 import llnl.util.cpu as cpu
 
 import spack.repo
-import spack.abi
 import spack.spec
+import spack.caches
+import spack.config
 import spack.compilers
 import spack.architecture
 import spack.error
+import spack.hash_types as ht
+import spack.paths
 import spack.tengine
+import spack.util.spack_json as sjson
 from spack.config import config
 from spack.version import ver, Version, VersionList, VersionRange
 from spack.package_prefs import PackagePrefs, spec_externals, is_spec_buildable
 
 
+def _make_abi():
+    # spack.abi pulls in the build environment and the build systems,
+    # which commands that don't concretize never need
+    import spack.abi as abi
+    return abi.ABI()
+
+
 #: impements rudimentary logic for ABI compatibility
-_abi = llnl.util.lang.Singleton(lambda: spack.abi.ABI())
+_abi = llnl.util.lang.Singleton(_make_abi)
 
 
 class Concretizer(object):
@@ -663,6 +678,173 @@ def concretize_specs_together(*abstract_specs):
     return concrete_specs
 
 
+#: Directory of the concretization cache in the misc_cache
+_cache_dir = 'concretization'
+
+
+def cache_key(spec, tests=False):
+    """Key of the concrete spec of an abstract spec in the concretization
+    cache, or ``None`` if its concretization can't be cached.
+
+    The key is a hash of everything concretization depends on: the
+    abstract spec, the files of the packages it can reach and of the
+    packages their modules import, the packages and compilers
+    configuration, the host, and Spack's version and code.
+
+    Args:
+        spec (Spec): abstract spec to concretize
+        tests (list or bool): packages that will need test dependencies
+    """
+    if not spack.config.get('config:concretization_cache', True):
+        return None
+
+    # Concrete dependencies are not fully described by their string
+    if any(s.concrete for s in spec.traverse()):
+        return None
+
+    try:
+        names = _imported_packages(_reachable_packages(spec))
+        package_files = [_package_files(name) for name in sorted(names)]
+    except (spack.error.SpackError, EnvironmentError):
+        # Let concretization report unknown packages and the like
+        return None
+
+    if not isinstance(tests, bool):
+        tests = sorted(tests)
+
+    check_compilers = Concretizer.check_for_compiler_existence
+    if check_compilers is None:
+        check_compilers = not spack.config.get(
+            'config:install_missing_compilers', False)
+
+    inputs = [str(spec), tests, package_files,
+              spack.config.get('packages'),
+              spack.compilers.all_compilers_config(),
+              str(spack.architecture.sys_type()),
+              check_compilers,
+              str(spack.spack_version),
+              _spack_code_hash()]
+    text = json.dumps(inputs, sort_keys=True, default=repr)
+    digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    return '{0}/{1}.json'.format(_cache_dir, digest)
+
+
+def _reachable_packages(spec):
+    """Names of all the packages that concretizing a spec could read."""
+    names = set()
+    for node in spec.traverse():
+        if not node.name:
+            continue
+        if spack.repo.path.is_virtual(node.name):
+            providers = [p.name for p in spack.repo.path.providers_for(node)]
+        else:
+            providers = [node.name]
+
+        for name in providers:
+            if name not in names:
+                pkg = spack.repo.path.get_pkg_metadata(name)
+                names.update(pkg.possible_dependencies())
+    return names
+
+
+#: Imports of other package modules in a package file
+_package_import_re = re.compile(r'\b(spack\.pkg\.[\w.]+)')
+
+
+def _imported_packages(names):
+    """Names of the packages in ``names``, and of the packages whose
+    modules they import (e.g. to subclass them), recursively."""
+    names = set(names)
+    todo = list(names)
+    while todo:
+        path = spack.repo.path.filename_for_package_name(todo.pop())
+        with open(path) as f:
+            modules = _package_import_re.findall(f.read())
+
+        for module in modules:
+            namespace, _, module_name = module.rpartition('.')
+            for repo in spack.repo.path.repos:
+                if repo.full_namespace != namespace:
+                    continue
+                name = repo.real_name(module_name)
+                if name and name not in names:
+                    names.add(name)
+                    todo.append(name)
+    return names
+
+
+@llnl.util.lang.memoized
+def _spack_code_hash():
+    """Hash of the content of Spack's modules, except its tests, so that
+    updates of Spack between releases invalidate the cache as well."""
+    checksum = hashlib.sha1()
+    for top in (spack.paths.module_path,
+                os.path.join(spack.paths.lib_path, 'llnl')):
+        for root, dirs, files in os.walk(top):
+            dirs[:] = sorted(d for d in dirs
+                             if os.path.join(root, d) != spack.paths.test_path)
+            for filename in sorted(files):
+                if not filename.endswith('.py'):
+                    continue
+                path = os.path.join(root, filename)
+                checksum.update(
+                    os.path.relpath(path, top).encode('utf-8'))
+                with open(path, 'rb') as f:
+                    checksum.update(f.read())
+    return checksum.hexdigest()
+
+
+def _package_files(name):
+    """Content hash of a package file, and size and modification time of
+    the other files (e.g. patches) in its directory."""
+    pkg_dir = spack.repo.path.dirname_for_package_name(name)
+    files = []
+    for filename in sorted(os.listdir(pkg_dir)):
+        path = os.path.join(pkg_dir, filename)
+        if filename == spack.repo.package_file_name:
+            with open(path, 'rb') as f:
+                files.append((filename, hashlib.sha1(f.read()).hexdigest()))
+        elif os.path.isfile(path):
+            sinfo = os.stat(path)
+            files.append((filename, sinfo.st_size, sinfo.st_mtime))
+    return [name, files]
+
+
+def read_cached_spec(key):
+    """Return the concrete spec cached with a key, or ``None``."""
+    if key is None:
+        return None
+
+    cache = spack.caches.misc_cache
+    try:
+        if not cache.init_entry(key):
+            return None
+        with cache.read_transaction(key) as f:
+            spec = spack.spec.Spec.from_dict(sjson.load(f))
+    except (EnvironmentError, ValueError, KeyError, spack.error.SpackError):
+        tty.debug('Ignoring unreadable concretization cache entry ' + key)
+        return None
+
+    tty.debug('[CONCRETIZATION]: Reusing cached {0}'.format(spec))
+    return spec
+
+
+def cache_spec(key, spec):
+    """Store the concrete spec of a key in the concretization cache."""
+    if key is None:
+        return
+
+    cache = spack.caches.misc_cache
+    try:
+        cache.init_entry(key)
+        with cache.write_transaction(key) as (old, new):
+            sjson.dump(spec.to_dict(hash=ht.build_hash), stream=new)
+    except (EnvironmentError, spack.error.SpackError) as e:
+        # Concretization succeeded; not caching it is no reason to fail
+        tty.debug('Could not cache the concretization of {0}: {1}'.format(
+            spec, str(e)))
+
+
 class NoCompilersForArchError(spack.error.SpackError):
     def __init__(self, arch, available_os_targets):
         err_msg = ("No compilers found"
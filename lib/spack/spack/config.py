@@ -31,12 +31,15 @@ schemas are in submodules of :py:mod:`spack.schema`.
 """
 
 import copy
+import hashlib
+import json
 import os
 import sys
 import multiprocessing
 from contextlib import contextmanager
 from six import string_types
 from six import iteritems
+from six.moves import cPickle
 from ordereddict_backport import OrderedDict
 
 import ruamel.yaml as yaml
@@ -47,7 +50,6 @@ import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp
 
 import spack.paths
-import spack.architecture
 import spack.schema
 import spack.schema.compilers
 import spack.schema.mirrors
@@ -101,10 +103,17 @@ config_defaults = {
         'checksum': True,
         'dirty': False,
         'build_jobs': min(16, multiprocessing.cpu_count()),
+        'concurrent_builds': 1,
+        'fetch_jobs': 8,
         'build_stage': '$tempdir/spack-stage',
     }
 }
 
+#: Directory where the parsed and validated contents of configuration
+#: files are cached, or ``None`` to parse them every time.  This can't be
+#: the ``misc_cache``, since that is itself configured in these files.
+file_cache_path = os.path.join(spack.paths.user_config_path, 'cache', 'config')
+
 #: metavar to use for commands that accept scopes
 #: this is shorter and more readable than listing all choices
 scopes_metavar = '{defaults,system,site,user}[/PLATFORM]'
@@ -320,11 +329,14 @@ class Configuration(object):
 
         """
         self.scopes = OrderedDict()
+        # merged sections, keyed by (section, scope name or None)
+        self._merged_sections = {}
         for scope in scopes:
             self.push_scope(scope)
 
     def push_scope(self, scope):
         """Add a higher precedence scope to the Configuration."""
+        self._merged_sections.clear()
         cmd_line_scope = None
         if self.scopes:
             highest_precedence_scope = list(self.scopes.values())[-1]
@@ -339,10 +351,12 @@ class Configuration(object):
 
     def pop_scope(self):
         """Remove the highest precedence scope and return it."""
+        self._merged_sections.clear()
         name, scope = self.scopes.popitem(last=True)
         return scope
 
     def remove_scope(self, scope_name):
+        self._merged_sections.clear()
         return self.scopes.pop(scope_name)
 
     @property
@@ -388,6 +402,7 @@ class Configuration(object):
         """Clears the caches for configuration files,
 
         This will cause files to be re-read upon the next request."""
+        self._merged_sections.clear()
         for scope in self.scopes.values():
             scope.clear()
 
@@ -405,6 +420,7 @@ class Configuration(object):
         scope = self._validate_scope(scope)  # get ConfigScope object
 
         # read only the requested section's data.
+        self._merged_sections.clear()
         scope.sections[section] = {section: update_data}
         scope.write_section(section)
 
@@ -432,8 +448,23 @@ class Configuration(object):
            }
 
         """
+        # Callers may modify the data, e.g. before writing it back
+        return copy.deepcopy(self._cached_section(section, scope))
+
+    def _cached_section(self, section, scope):
+        """Merged section from the cache, which callers must not modify."""
         _validate_section_name(section)
 
+        # Merging every scope is expensive, and concretization asks for
+        # the same sections over and over.  The cache is cleared whenever
+        # scopes are added or removed, and whenever a section is updated.
+        key = (section, scope)
+        if key not in self._merged_sections:
+            self._merged_sections[key] = self._merge_section(section, scope)
+        return self._merged_sections[key]
+
+    def _merge_section(self, section, scope):
+        """Merge a section across scopes, see ``get_config()``."""
         if scope is None:
             scopes = self.scopes.values()
         else:
@@ -478,16 +509,14 @@ class Configuration(object):
         # TODO: Currently only handles maps. Think about lists if neded.
         section, _, rest = path.partition(':')
 
-        value = self.get_config(section, scope=scope)
-        if not rest:
-            return value
-
-        parts = rest.split(':')
+        # Only the value that is returned is copied from the cache
+        value = self._cached_section(section, scope)
+        parts = rest.split(':') if rest else []
         while parts:
             key = parts.pop(0)
             value = value.get(key, default)
 
-        return value
+        return value if value is default else copy.deepcopy(value)
 
     def set(self, path, value, scope=None):
         """Convenience function for setting single values in config files.
@@ -560,6 +589,8 @@ command_line_scopes = []
 
 def _add_platform_scope(cfg, scope_type, name, path):
     """Add a platform-specific subdirectory for the current platform."""
+    # spack.architecture is imported lazily as it pulls in most of Spack
+    import spack.architecture
     platform = spack.architecture.platform().name
     plat_name = '%s/%s' % (name, platform)
     plat_path = os.path.join(path, platform)
@@ -680,6 +711,12 @@ def _read_config_file(filename, schema):
     elif not os.access(filename, os.R_OK):
         raise ConfigFileError("Config file is not readable: %s" % filename)
 
+    stat = os.stat(filename)
+    cache_key = _file_cache_key(schema, stat)
+    cached = _read_file_cache(filename, cache_key)
+    if cached is not None:
+        return cached[0]
+
     try:
         tty.debug("Reading config file %s" % filename)
         with open(filename) as f:
@@ -687,7 +724,6 @@ def _read_config_file(filename, schema):
 
         if data:
             validate(data, schema)
-        return data
 
     except MarkedYAMLError as e:
         raise ConfigFileError(
@@ -697,6 +733,73 @@ def _read_config_file(filename, schema):
         raise ConfigFileError(
             "Error reading configuration file %s: %s" % (filename, str(e)))
 
+    _write_file_cache(filename, cache_key, data)
+    return data
+
+
+#: Fingerprints of schemas, keyed by id()
+_schema_fingerprints = {}
+
+
+def _file_cache_key(schema, stat):
+    """Everything that the cached contents of a config file depend on."""
+    if id(schema) not in _schema_fingerprints:
+        text = json.dumps(schema, sort_keys=True, default=repr)
+        _schema_fingerprints[id(schema)] = (
+            schema, hashlib.sha1(text.encode('utf-8')).hexdigest())
+    fingerprint = _schema_fingerprints[id(schema)][1]
+
+    return (spack.spack_version, fingerprint,
+            stat.st_mtime, stat.st_size)
+
+
+def _file_cache_entry(filename):
+    """Path of the cache file for a config file."""
+    # Pickles aren't portable between Python 2 and 3
+    name = '{0}-py{1}'.format(os.path.abspath(filename), sys.version_info[0])
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    return os.path.join(file_cache_path, digest)
+
+
+def _read_file_cache(filename, cache_key):
+    """Parsed contents of a config file, if they are in the cache.
+
+    Returns:
+        (tuple or None): ``(data,)``, or ``None`` if the file changed or
+            was never cached
+    """
+    if not file_cache_path:
+        return None
+
+    try:
+        with open(_file_cache_entry(filename), 'rb') as f:
+            key, data = cPickle.load(f)
+    except Exception:
+        # Missing, truncated, written by another version, ...
+        return None
+
+    if key != cache_key:
+        return None
+    return (data,)
+
+
+def _write_file_cache(filename, cache_key, data):
+    """Cache the parsed contents of a config file, if possible."""
+    if not file_cache_path:
+        return
+
+    entry = _file_cache_entry(filename)
+    tmp = '{0}.{1}.tmp'.format(entry, os.getpid())
+    try:
+        mkdirp(file_cache_path)
+        with open(tmp, 'wb') as f:
+            cPickle.dump((cache_key, data), f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, entry)
+    except (IOError, OSError, cPickle.PicklingError) as e:
+        tty.debug("Could not cache config file %s: %s" % (filename, e))
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
 
 def _override(string):
     """Test if a spack YAML string is an override.
@@ -20,7 +20,11 @@ provides a cache and a sanity checking mechanism for what is in the
 filesystem.
 
 """
+import bisect
 import datetime
+import errno
+import functools
+import json
 import time
 import os
 import sys
@@ -33,12 +37,14 @@ from ruamel.yaml.error import MarkedYAMLError, YAMLError
 
 import llnl.util.tty as tty
 from llnl.util.filesystem import mkdirp
+from llnl.util.lang import HashableMap
 
 import spack.store
 import spack.repo
 import spack.spec
 import spack.util.spack_yaml as syaml
 import spack.util.spack_json as sjson
+import spack.util.compact_index as compact_index
 from spack.filesystem_view import YamlFilesystemView
 from spack.util.crypto import bit_length
 from spack.directory_layout import DirectoryLayoutError
@@ -59,6 +65,47 @@ _db_lock_timeout = 120
 # Types of dependencies tracked by the database
 _tracked_deps = ('link', 'run')
 
+# The journal is compacted into the index when it grows larger than this
+# fraction of the index, and larger than the minimum size (in bytes).
+_journal_compaction_ratio = 0.5
+_journal_min_compaction_size = 1 << 20
+
+# Records are split in 2**_db_shard_bits shards by the prefix of their
+# DAG hash.  Each shard has its own journal and its own byte in the lock
+# file, so that writers that change records of different shards can work
+# at the same time.
+_db_shard_bits = 6
+_db_shards = 1 << _db_shard_bits
+
+# Base32 digits of DAG hashes, in the order of their values
+_b32_digits = 'abcdefghijklmnopqrstuvwxyz234567'
+
+
+def _shard_of(key):
+    """Shard of the record with DAG hash ``key``.
+
+    This is the prefix of ``_db_shard_bits`` bits of the hash, read from
+    its first base32 digits only, so that keys that aren't full hashes
+    (or aren't valid base32 past those digits) still have a shard.
+    """
+    digits = (_db_shard_bits + 4) // 5
+    value = 0
+    for c in key[:digits].lower().ljust(digits, 'a'):
+        value = (value << 5) | max(_b32_digits.find(c), 0)
+    return value >> (digits * 5 - _db_shard_bits)
+
+
+class _UnlockedShardError(Exception):
+    """Raised when a transaction on some shards changes a record of a
+    shard that it did not lock."""
+
+
+@contextlib.contextmanager
+def _nested_transaction():
+    """Transaction nested in a transaction on some shards, which already
+    read the database and writes the changes."""
+    yield
+
 
 def _now():
     """Returns the time since the epoch"""
@@ -118,6 +165,23 @@ class InstallRecord(object):
         self.explicit = explicit
         self.installation_time = installation_time or _now()
 
+    #: Whether the spec of this record has been built (always true here;
+    #: see ``LazyInstallRecord``)
+    materialized = True
+
+    @property
+    def name(self):
+        """Name of the package installed by this record."""
+        return self.spec.name
+
+    def node_text(self):
+        """Serialized node dictionary of the spec, as JSON text."""
+        return _node_text(self.spec)
+
+    def dependency_hashes(self):
+        """DAG hashes of the link and run dependencies of the spec."""
+        return [d.dag_hash() for d in self.spec.dependencies(_tracked_deps)]
+
     def to_dict(self):
         return {
             'spec': self.spec.to_node_dict(),
@@ -139,6 +203,364 @@ class InstallRecord(object):
         return InstallRecord(spec, **d)
 
 
+class LazyInstallRecord(InstallRecord):
+    """An install record read from a compact index or from the journal.
+
+    The record metadata is available right away, but the spec is only
+    built (along with the specs of its dependencies) the first time
+    ``spec`` is accessed.
+
+    Args:
+        entry (IndexEntry): entry of the record
+        loader (callable): function building the spec of the record from
+            its hash and node dictionary
+        index (CompactIndex, optional): index the record was read from.
+            If not given, ``entry.spec`` is the node dictionary of the
+            spec as JSON text, rather than a reference into the index.
+    """
+
+    def __init__(self, entry, loader, index=None):
+        self._spec = None
+        self._key = entry.key
+        self._name = entry.name
+        self._index = index
+        self._spec_ref = entry.spec
+        self._dependencies = entry.dependencies
+        self._loader = loader
+        super(LazyInstallRecord, self).__init__(
+            None, entry.path, entry.installed,
+            ref_count=entry.ref_count,
+            explicit=entry.explicit,
+            installation_time=entry.installation_time)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def spec(self):
+        if self._spec is None:
+            self._spec = self._loader(self._key, self.node_dict())
+        return self._spec
+
+    @spec.setter
+    def spec(self, value):
+        self._spec = value
+
+    @property
+    def materialized(self):
+        """Whether the spec of this record has been built already."""
+        return self._spec is not None
+
+    def node_text(self):
+        """Serialized node dictionary of the spec, as JSON text."""
+        if self._spec is not None:
+            return _node_text(self._spec)
+        elif self._index is None:
+            return self._spec_ref
+        return self._index.string(self._spec_ref)
+
+    def dependency_hashes(self):
+        if self._spec is None:
+            return list(self._dependencies)
+        return super(LazyInstallRecord, self).dependency_hashes()
+
+    def node_dict(self):
+        """Node dictionary of the spec, without building the spec."""
+        if self._spec is None:
+            return sjson.load(self.node_text())
+        return self._spec.to_node_dict()
+
+    def to_dict(self):
+        if self._spec is not None:
+            return super(LazyInstallRecord, self).to_dict()
+        return {
+            'spec': self.node_dict(),
+            'path': self.path,
+            'installed': self.installed,
+            'ref_count': self.ref_count,
+            'explicit': self.explicit,
+            'installation_time': self.installation_time
+        }
+
+
+class _LazyDependentMap(HashableMap):
+    """Dependents of a spec built from a lazy record, in place of its
+    ``DependencyMap``.
+
+    The specs of the records that depend on a spec are only built, and
+    connected to it, the first time its dependents are looked at, e.g.
+    by ``Spec.dependents()`` or ``Spec.traverse(direction='parents')``.
+    """
+
+    def __init__(self, complete=None):
+        self._complete = complete
+        super(_LazyDependentMap, self).__init__()
+
+    @property
+    def dict(self):
+        if self._complete is not None:
+            complete, self._complete = self._complete, None
+            complete()
+        return self._dict
+
+    @dict.setter
+    def dict(self, value):
+        self._dict = value
+
+    @property
+    def connected(self):
+        """Dependents connected so far, without building any spec."""
+        return self._dict
+
+    def __setitem__(self, key, value):
+        self._dict[key] = value
+
+    def __delitem__(self, key):
+        del self._dict[key]
+
+    def __getstate__(self):
+        self.dict
+        return {'_complete': None, '_dict': self._dict}
+
+    def __str__(self):
+        return "{deps: %s}" % ', '.join(str(d) for d in sorted(self.values()))
+
+
+def _disconnect_from_dependencies(spec):
+    """Remove ``spec`` from the dependents of its dependencies."""
+    for dspec in spec._dependencies.values():
+        dependents = dspec.spec._dependents
+        if isinstance(dependents, _LazyDependentMap):
+            dependents = dependents.connected
+        if spec.name in dependents and dependents[spec.name].parent is spec:
+            del dependents[spec.name]
+
+
+def _node_text(spec):
+    """Serialize the node dictionary of a spec for the compact index."""
+    return json.dumps(spec.to_node_dict(), separators=(',', ':'))
+
+
+def _spec_index_keys(rec):
+    """Compiler name, platform and OS of the spec of a record.
+
+    Unbuilt lazy records are inspected through their node dictionary,
+    so that building the indexes does not build any spec.  Fields that
+    are missing or cannot be read are ``None``.
+    """
+    if rec.materialized:
+        spec = rec.spec
+        compiler = spec.compiler.name if spec.compiler else None
+        arch = spec.architecture
+        if arch:
+            return compiler, arch.platform, arch.os
+        return compiler, None, None
+
+    node = next(iter(rec.node_dict().values()))
+    compiler = node.get('compiler')
+    compiler = compiler.get('name') if isinstance(compiler, dict) else None
+    arch = node.get('arch')
+    if isinstance(arch, dict):
+        return compiler, arch.get('platform'), arch.get('platform_os')
+    return compiler, None, None
+
+
+class _RecordIndex(object):
+    """Secondary indexes over the install records of a Database.
+
+    Each index maps some property of the records to the set of their
+    DAG hashes, so that queries can narrow down the records to check
+    with ``Spec.satisfies()``.  Records for which a property is unknown
+    are indexed under ``None`` and are always kept as candidates.
+
+    The indexes by name, explicit flag and installation time only use
+    record metadata.  The indexes by compiler and architecture look
+    inside the specs, so they are built the first time they are needed.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self.by_name = {}
+        self.explicit = set()
+        self.by_time = []
+        self._spec_indexes = None
+        self._dependents = None
+        self._by_virtual = None
+
+        for key, rec in data.items():
+            self._add_metadata(key, rec)
+            self.by_time.append((rec.installation_time, key))
+        self.by_time.sort()
+
+    def _add_metadata(self, key, rec):
+        if rec.name not in self.by_name and self._by_virtual is not None:
+            self._add_virtuals(rec.name)
+        self.by_name.setdefault(rec.name, set()).add(key)
+        if rec.explicit:
+            self.explicit.add(key)
+
+    @property
+    def by_virtual(self):
+        """Map from virtual package names to the names in the index that
+        may provide them.  Names of packages that aren't in the current
+        repositories are under ``None``."""
+        if self._by_virtual is None:
+            self._by_virtual = {}
+            for name in self.by_name:
+                self._add_virtuals(name)
+        return self._by_virtual
+
+    def _add_virtuals(self, name):
+        # Read what the package provides from the repository index, so
+        # that installed packages aren't imported
+        try:
+            provided = spack.repo.path.get_pkg_metadata(name).provided
+            virtuals = set(vspec.name for vspec in provided)
+        except spack.repo.UnknownEntityError:
+            virtuals = [None]
+        for vname in virtuals:
+            self._by_virtual.setdefault(vname, set()).add(name)
+
+    @property
+    def spec_indexes(self):
+        """Indexes by compiler name, platform and OS, in this order."""
+        if self._spec_indexes is None:
+            self._spec_indexes = ({}, {}, {})
+            for key, rec in self._data.items():
+                self._add_spec_keys(key, rec)
+        return self._spec_indexes
+
+    @property
+    def dependents(self):
+        """Map from the DAG hash of each record to the DAG hashes of the
+        records that depend on it.  May refer to removed records."""
+        if self._dependents is None:
+            self._dependents = {}
+            for key, rec in self._data.items():
+                self._add_dependents(key, rec)
+        return self._dependents
+
+    def _add_dependents(self, key, rec):
+        for dkey in rec.dependency_hashes():
+            self._dependents.setdefault(dkey, set()).add(key)
+
+    def _add_spec_keys(self, key, rec):
+        for index, value in zip(self._spec_indexes, _spec_index_keys(rec)):
+            index.setdefault(value, set()).add(key)
+
+    def add(self, key, rec):
+        """Index a record that was just inserted in the database."""
+        self._add_metadata(key, rec)
+        bisect.insort(self.by_time, (rec.installation_time, key))
+        if self._spec_indexes is not None:
+            self._add_spec_keys(key, rec)
+        if self._dependents is not None:
+            self._add_dependents(key, rec)
+
+    def remove(self, key, rec):
+        """Forget a record that was just removed from the database."""
+        keys = self.by_name.get(rec.name, set())
+        keys.discard(key)
+        if not keys:
+            self.by_name.pop(rec.name, None)
+            if self._by_virtual is not None:
+                for names in self._by_virtual.values():
+                    names.discard(rec.name)
+        self.explicit.discard(key)
+        i = bisect.bisect_left(self.by_time, (rec.installation_time, key))
+        if i < len(self.by_time) and self.by_time[i][1] == key:
+            del self.by_time[i]
+        if self._spec_indexes is not None:
+            for index in self._spec_indexes:
+                for keys in index.values():
+                    keys.discard(key)
+
+    def set_explicit(self, key, explicit):
+        if explicit:
+            self.explicit.add(key)
+        else:
+            self.explicit.discard(key)
+
+    def names_providing(self, vpkg_name):
+        """Names in the index that may provide a virtual package.
+
+        Names that are not in the current repository are returned too,
+        as only ``Spec.satisfies()`` can tell whether they match.
+        """
+        return (self.by_virtual.get(vpkg_name, set()) |
+                self.by_virtual.get(None, set()))
+
+    def installed_between(self, start_date, end_date):
+        """Keys of records installed in a time window.
+
+        The window is widened by a second on each side to stay clear of
+        rounding issues; callers are expected to check dates exactly.
+        """
+        lo, hi = float('-inf'), float('inf')
+        try:
+            if start_date is not None:
+                lo = time.mktime(start_date.timetuple()) - 1
+            if end_date is not None:
+                hi = time.mktime(end_date.timetuple()) + 1
+        except (OverflowError, ValueError):
+            return set(key for _, key in self.by_time)
+        start = bisect.bisect_left(self.by_time, (lo,))
+        end = bisect.bisect_right(self.by_time, (hi,))
+        return set(key for _, key in self.by_time[start:end])
+
+    def candidates(self, query_spec=any, explicit=any, start_date=None,
+                   end_date=None, hashes=None):
+        """Keys of the records that may match a query.
+
+        This is a superset of the records that ``Database._query()``
+        would return for the same arguments, or ``None`` if the query
+        cannot be narrowed down by any index.
+        """
+        constraints = []
+
+        if hashes is not None:
+            constraints.append(set(hashes))
+
+        if explicit is True:
+            constraints.append(self.explicit)
+
+        if start_date is not None or end_date is not None:
+            constraints.append(self.installed_between(start_date, end_date))
+
+        if isinstance(query_spec, spack.spec.Spec):
+            if query_spec.name:
+                if query_spec.virtual:
+                    names = self.names_providing(query_spec.name)
+                else:
+                    names = [query_spec.name]
+                keys = set()
+                for name in names:
+                    keys.update(self.by_name.get(name, ()))
+                constraints.append(keys)
+
+            compiler = query_spec.compiler and query_spec.compiler.name
+            arch = query_spec.architecture
+            values = (compiler,
+                      arch.platform if arch else None,
+                      arch.os if arch else None)
+            if any(values):
+                for index, value in zip(self.spec_indexes, values):
+                    if value:
+                        keys = set(index.get(value, ()))
+                        keys.update(index.get(None, ()))
+                        constraints.append(keys)
+
+        if not constraints:
+            return None
+
+        constraints.sort(key=len)
+        result = set(constraints[0])
+        for keys in constraints[1:]:
+            result.intersection_update(keys)
+        return result
+
+
 class ForbiddenLockError(SpackError):
     """Raised when an upstream DB attempts to acquire a lock"""
 
@@ -172,6 +594,26 @@ class Database(object):
         Database root for ``spec.yaml`` files according to Spack's
         ``DirectoryLayout``.
 
+        Alongside ``index.json``, the Database keeps a compact binary
+        copy of the index in ``index.bin`` (see
+        ``spack.util.compact_index``).  When it is up to date with the
+        JSON file, it is read instead, and specs are only built for the
+        records that are actually used.
+
+        Changes to the records are not written to ``index.json`` right
+        away: each write transaction appends the records it changed to
+        the journal of their shard, in the ``journal`` directory, which
+        is replayed on top of the index when reading.  The journal is
+        compacted into a new ``index.json`` once it grows large compared
+        to the index.
+
+        The first byte of the ``lock`` file is locked exclusively to
+        write the index, and each shard has its own byte after it.
+        Readers and writers that may change any record lock all of them.
+        ``add()``, ``remove()`` and ``update_explicit()`` only lock the
+        shards of the nodes of a concrete spec, so that several processes
+        can change unrelated records of the same database at once.
+
         Caller may optionally provide a custom ``db_dir`` parameter
         where data will be stored.  This is intended to be used for
         testing the Database class.
@@ -189,6 +631,8 @@ class Database(object):
         # Set up layout of database files within the db dir
         self._old_yaml_index_path = os.path.join(self._db_dir, 'index.yaml')
         self._index_path = os.path.join(self._db_dir, 'index.json')
+        self._compact_index_path = os.path.join(self._db_dir, 'index.bin')
+        self._journal_dir = os.path.join(self._db_dir, 'journal')
         self._lock_path = os.path.join(self._db_dir, 'lock')
 
         # This is for other classes to use to lock prefix directories.
@@ -216,9 +660,24 @@ class Database(object):
                               if self.package_lock_timeout else 'No timeout')
         tty.debug('PACKAGE LOCK TIMEOUT: {0}'.format(
                   str(timeout_format_str)))
-        self.lock = Lock(self._lock_path,
+        self.lock = Lock(self._lock_path, 0, 1 + _db_shards,
                          default_timeout=self.db_lock_timeout)
+
+        # Held shared by writers of some shards, so that the index is not
+        # written while they change the records of their shards.
+        self._index_lock = Lock(self._lock_path, 0, 1,
+                                default_timeout=self.db_lock_timeout)
+
+        # Shards locked by the current transaction, or None if all of them
+        # are locked.
+        self._shards = None
+
         self._data = {}
+        self._index = None
+
+        # Keys of the records changed since the last read or write, to be
+        # appended to the journal.  None if the whole index must be written.
+        self._changes = None
 
         self.upstream_dbs = list(upstream_dbs) if upstream_dbs else []
 
@@ -230,14 +689,128 @@ class Database(object):
         # message)
         self._fail_when_missing_deps = False
 
+    @property
+    def _data(self):
+        """Map from DAG hash to the install record of each spec."""
+        return self._records
+
+    @_data.setter
+    def _data(self, data):
+        # Secondary indexes are built again the next time they're needed
+        self._records = data
+        self._index = None
+
+    def _record_index(self):
+        """Secondary indexes over the current records (see
+        ``_RecordIndex``), built on demand.
+
+        Does not do any locking.
+        """
+        if self._index is None:
+            self._index = _RecordIndex(self._data)
+        return self._index
+
+    def _changed(self, key):
+        """Record that the record with DAG hash ``key`` has changed, so
+        that the next write adds it to the journal."""
+        if self._shards is not None and _shard_of(key) not in self._shards:
+            raise _UnlockedShardError(key)
+        if self._changes is not None:
+            self._changes.add(key)
+
+    def _insert_record(self, key, rec):
+        """Insert a record in the database, keeping indexes up to date."""
+        self._data[key] = rec
+        self._changed(key)
+        if self._index is not None:
+            self._index.add(key, rec)
+
+    def _delete_record(self, key):
+        """Delete a record from the database, keeping indexes up to date."""
+        rec = self._data.pop(key)
+        self._changed(key)
+        if self._index is not None:
+            self._index.remove(key, rec)
+
     def write_transaction(self):
         """Get a write lock context manager for use in a `with` block."""
+        if self._shards is not None:
+            return _nested_transaction()
         return WriteTransaction(self.lock, self._read, self._write)
 
     def read_transaction(self):
         """Get a read lock context manager for use in a `with` block."""
+        if self._shards is not None:
+            return _nested_transaction()
         return ReadTransaction(self.lock, self._read)
 
+    def _in_transaction(self):
+        """Whether this process is already in a transaction."""
+        return (self._shards is not None or
+                self.lock._reads > 0 or self.lock._writes > 0)
+
+    def _shard_lock(self, shard):
+        """Lock of the records of one shard."""
+        return Lock(self._lock_path, 1 + shard, 1,
+                    default_timeout=self.db_lock_timeout)
+
+    @contextlib.contextmanager
+    def _shard_transaction(self, keys):
+        """Write transaction that only locks the shards of the records
+        with DAG hashes ``keys``.
+
+        Transactions on other shards can run at the same time.  Changing
+        a record of another shard raises ``_UnlockedShardError``.
+        """
+        shards = sorted(set(_shard_of(key) for key in keys))
+        held = []
+        try:
+            self._index_lock.acquire_read()
+            held.append(self._index_lock.release_read)
+
+            # Always lock shards in the same order to avoid deadlocks
+            for shard in shards:
+                lock = self._shard_lock(shard)
+                lock.acquire_write()
+                held.append(lock.release_write)
+
+            # Other writers may be appending to the journals of the other
+            # shards, so their records are not checked.
+            self._read_index(check=False)
+            self._shards = set(shards)
+            yield
+
+            if self._changes:
+                self._append_to_journal()
+        finally:
+            self._shards = None
+            for release in reversed(held):
+                release()
+
+    def _write_records(self, spec, function, *args):
+        """Call ``function(*args)`` in a write transaction that locks the
+        shards of the nodes of ``spec``, if it only changes their records,
+        or in a transaction on the whole database otherwise.
+        """
+        if (spec.concrete and not self._in_transaction() and
+                os.path.isfile(self._index_path)):
+            keys = [s.dag_hash() for s in spec.traverse(deptype=_tracked_deps)]
+            try:
+                with self._shard_transaction(keys):
+                    result = function(*args)
+            except _UnlockedShardError as e:
+                tty.debug('Locking the whole database to change {0}'.format(
+                    e.args[0]))
+            else:
+                if self._journal_is_full():
+                    # Compact the journal
+                    with self.write_transaction():
+                        pass
+                return result
+
+        with self.write_transaction():
+            return function(*args)
+
     def prefix_lock(self, spec):
         """Get a lock on a particular spec's installation directory.
 
@@ -366,8 +939,13 @@ class Database(object):
         # form a full spec.
         spec = data[hash_key].spec
         spec_dict = installs[hash_key]['spec']
-        if 'dependencies' in spec_dict[spec.name]:
-            yaml_deps = spec_dict[spec.name]['dependencies']
+        self._connect_dependencies(spec, spec_dict[spec.name], data)
+
+    def _connect_dependencies(self, spec, node, data):
+        """Connect ``spec`` to the records of the dependencies listed in
+        its node dictionary."""
+        if 'dependencies' in node:
+            yaml_deps = node['dependencies']
             for dname, dhash, dtypes in spack.spec.Spec.read_yaml_dep_specs(
                     yaml_deps):
                 # It is important that we always check upstream installations
@@ -393,6 +971,136 @@ class Database(object):
 
                 spec._add_dependency(child, dtypes)
 
+    def _materialize_spec(self, data, hash_key, spec_dict):
+        """Build the spec of a lazy record from its node dictionary.
+
+        Dependencies are taken from the other records in ``data`` (or
+        from upstream databases), building their specs first if needed,
+        so that lazily read specs share nodes like eagerly read ones.
+
+        Does not do any locking.
+        """
+        try:
+            for name in spec_dict:
+                spec_dict[name]['hash'] = hash_key
+
+            spec = spack.spec.Spec.from_node_dict(spec_dict)
+            spec._dependents = _LazyDependentMap(functools.partial(
+                self._build_dependents, data, hash_key))
+            self._connect_dependencies(spec, spec_dict[spec.name], data)
+        except (MissingDependenciesError, CorruptDatabaseError):
+            raise
+        except Exception as e:
+            msg = ("Invalid record in Spack database: "
+                   "hash: %s, cause: %s: %s")
+            msg %= (hash_key, type(e).__name__, str(e))
+            raise CorruptDatabaseError(msg, self._compact_index_path)
+
+        spec._mark_concrete()
+        return spec
+
+    def _build_dependents(self, data, key):
+        """Build the specs of the records of ``data`` that depend on the
+        record with DAG hash ``key``, which connects them to its spec.
+
+        Does not do any locking.
+        """
+        if data is self._data:
+            parents = self._record_index().dependents.get(key, ())
+        else:
+            parents = [k for k, rec in data.items()
+                       if key in rec.dependency_hashes()]
+        for parent in parents:
+            rec = data.get(parent)
+            if rec is not None:
+                rec.spec
+
+    def _index_stamp(self):
+        """String identifying the current contents of the JSON index."""
+        st = os.stat(self._index_path)
+        return '%d:%d:%r' % (st.st_ino, st.st_size, st.st_mtime)
+
+    def _read_from_compact_index(self):
+        """Fill database from the compact index, if it is up to date.
+
+        No spec is built here: records are read lazily (see
+        ``LazyInstallRecord``).  Returns ``True`` if the database was
+        read, ``False`` if the JSON index needs to be read instead.
+
+        Does not do any locking.
+        """
+        try:
+            index = compact_index.CompactIndex(self._compact_index_path)
+        except (IOError, OSError, compact_index.CompactIndexError) as e:
+            tty.debug(e)
+            return False
+
+        if (index.metadata.get('version') != str(_db_version) or
+                index.metadata.get('source') != self._index_stamp()):
+            index.close()
+            return False
+
+        data = {}
+        loader = functools.partial(self._materialize_spec, data)
+        for entry in index:
+            data[entry.key] = LazyInstallRecord(entry, loader, index)
+
+        # Report missing dependencies now, like a full read would
+        self._check_dependencies(data, data)
+
+        self._data = data
+        return True
+
+    def _check_dependencies(self, keys, data):
+        """Warn about the records for ``keys`` in ``data`` that depend
+        on specs that are not in the database, or raise if
+        ``_fail_when_missing_deps`` is set.
+
+        Does not do any locking.
+        """
+        for hash_key in keys:
+            rec = data[hash_key]
+            for dhash in rec.dependency_hashes():
+                upstream, record = self.query_by_spec_hash(dhash, data=data)
+                if not record:
+                    msg = ("Missing dependency not in database: "
+                           "%s/%s needs %s" % (
+                               rec.name, hash_key[:7], dhash[:7]))
+                    if self._fail_when_missing_deps:
+                        raise MissingDependenciesError(msg)
+                    tty.warn(msg)
+
+    def _write_compact_index(self):
+        """Write a compact index matching the current JSON index.
+
+        The compact index is only a cache of ``index.json``, so failing
+        to write it is not an error.
+
+        Does not do any locking.
+        """
+        temp_file = self._compact_index_path + (
+            '.%s.%s.temp' % (socket.getfqdn(), os.getpid()))
+
+        entries = (
+            compact_index.IndexEntry(
+                key, rec.name, rec.path, rec.node_text(),
+                rec.dependency_hashes(), rec.ref_count, rec.installed,
+                rec.explicit, rec.installation_time)
+            for key, rec in self._data.items())
+        metadata = {
+            'version': str(_db_version),
+            'source': self._index_stamp()
+        }
+
+        try:
+            with open(temp_file, 'wb') as f:
+                compact_index.write(f, entries, metadata)
+            os.rename(temp_file, self._compact_index_path)
+        except (IOError, OSError) as e:
+            tty.debug(e)
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
     def _read_from_file(self, stream, format='json'):
         """
         Fill database from file, do not maintain old data
@@ -507,7 +1215,7 @@ class Database(object):
         def _read_suppress_error():
             try:
                 if os.path.isfile(self._index_path):
-                    self._read_from_file(self._index_path)
+                    self._read_index()
             except CorruptDatabaseError as e:
                 self._error = e
                 self._data = {}
@@ -541,8 +1249,10 @@ class Database(object):
         # instead, we would perpetuate errors over a reindex.
 
         with directory_layout.disable_upstream_check():
-            # Initialize data in the reconstructed DB
+            # Initialize data in the reconstructed DB, which needs to be
+            # written out in full.
             self._data = {}
+            self._changes = None
 
             # Start inspecting the installed prefixes
             processed_specs = set()
@@ -650,6 +1360,12 @@ class Database(object):
         if type is not None:
             return
 
+        # Only append the changed records to the journal, if possible
+        if self._changes is not None and not self._journal_is_full():
+            if self._changes:
+                self._append_to_journal()
+            return
+
         temp_file = self._index_path + (
             '.%s.%s.temp' % (socket.getfqdn(), os.getpid()))
 
@@ -665,6 +1381,181 @@ class Database(object):
                 os.remove(temp_file)
             raise
 
+        self._write_compact_index()
+
+        # The new index includes everything in the journal
+        for path in self._journal_paths():
+            os.remove(path)
+        self._changes = set()
+
+    def _journal_path(self, shard):
+        """Path of the journal of a shard."""
+        return os.path.join(self._journal_dir, '%02x' % shard)
+
+    def _journal_paths(self):
+        """Paths of the journals of all the shards that have one."""
+        try:
+            names = os.listdir(self._journal_dir)
+        except OSError:
+            return []
+        return [os.path.join(self._journal_dir, name) for name in sorted(names)
+                if not name.startswith('.')]
+
+    def _journal_is_full(self):
+        """Whether the journal should be compacted into the index."""
+        try:
+            index_size = os.path.getsize(self._index_path)
+        except OSError:
+            return True
+
+        journal_size = 0
+        for path in self._journal_paths():
+            try:
+                journal_size += os.path.getsize(path)
+            except OSError:
+                pass
+
+        return journal_size > max(_journal_min_compaction_size,
+                                  _journal_compaction_ratio * index_size)
+
+    def _append_to_journal(self):
+        """Append the records changed since the last read to the journal.
+
+        Each write transaction appends a single line to the journal of
+        each shard it changed, with the stamp of the index it applies to
+        and, for each changed DAG hash, either the new record or ``null``
+        if the record was removed.
+
+        This routine does no locking.
+        """
+        by_shard = {}
+        for key in self._changes:
+            rec = self._data[key].to_dict() if key in self._data else None
+            by_shard.setdefault(_shard_of(key), {})[key] = rec
+
+        if by_shard and not os.path.isdir(self._journal_dir):
+            mkdirp(self._journal_dir)
+
+        stamp = self._index_stamp()
+        for shard, records in sorted(by_shard.items()):
+            line = json.dumps({'index': stamp, 'records': records},
+                              separators=(',', ':')) + '\n'
+
+            # A single write to a file opened for appending, so that readers
+            # never see part of a line followed by more data.
+            fd = os.open(self._journal_path(shard),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+
+        self._changes = set()
+
+    def _replay_journal(self, check=True):
+        """Apply the entries of the journal to the records just read.
+
+        Each record only appears in the journal of its shard, so the
+        journals of different shards can be replayed in any order.
+
+        This routine does no locking.
+        """
+        stamp = self._index_stamp()
+        added = []
+        for path in self._journal_paths():
+            try:
+                with open(path, 'rb') as f:
+                    text = f.read()
+            except (IOError, OSError) as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+
+            # Only read complete lines: the last one may be partially
+            # written if a process died while appending it.
+            end = text.rfind(b'\n') + 1
+            for line in text[:end].splitlines():
+                try:
+                    entry = sjson.load(line.decode('utf-8'))
+                except Exception as e:
+                    raise CorruptDatabaseError(
+                        "error parsing database journal:", str(e))
+
+                # Skip entries made before the index was last written
+                if entry.get('index') != stamp:
+                    continue
+
+                for key, rec in entry['records'].items():
+                    if self._apply_journal_record(key, rec):
+                        added.append(key)
+
+        if check:
+            self._check_dependencies(
+                [key for key in added if key in self._data], self._data)
+
+    def _apply_journal_record(self, key, rec_dict):
+        """Update the record for ``key`` with a record from the journal.
+
+        Specs are immutable, so if a record for the same hash is already
+        there, only its metadata is updated and its spec is kept.  Returns
+        whether a new record was added.
+
+        This routine does no locking.
+        """
+        if rec_dict is None:
+            rec = self._data.get(key)
+            if rec is not None:
+                self._delete_record(key)
+                if rec.materialized:
+                    _disconnect_from_dependencies(rec.spec)
+            return False
+
+        rec_dict = dict(rec_dict)
+        node = rec_dict.pop('spec')
+        if rec_dict['path'] == 'None':
+            rec_dict['path'] = None
+
+        rec = self._data.get(key)
+        if rec is not None:
+            rec.path = rec_dict['path']
+            rec.installed = rec_dict['installed']
+            rec.ref_count = rec_dict['ref_count']
+            rec.explicit = rec_dict['explicit']
+            rec.installation_time = rec_dict['installation_time']
+            if self._index is not None:
+                self._index.set_explicit(key, rec.explicit)
+            return False
+
+        name = next(iter(node))
+        deps = [dhash for _, dhash, _ in spack.spec.Spec.read_yaml_dep_specs(
+            node[name].get('dependencies', {}))]
+        entry = compact_index.IndexEntry(
+            key, name, rec_dict['path'],
+            json.dumps(node, separators=(',', ':')), deps,
+            rec_dict['ref_count'], rec_dict['installed'],
+            rec_dict['explicit'], rec_dict['installation_time'])
+        loader = functools.partial(self._materialize_spec, self._data)
+        self._insert_record(key, LazyInstallRecord(entry, loader))
+        return True
+
+    def _read_index(self, check=True):
+        """Read the index, from its compact copy if that is up to date,
+        and replay the journal on top of it.
+
+        If ``check`` is False, the records of the journal are not checked
+        for missing dependencies.
+
+        This routine does no locking.
+        """
+        if not self._read_from_compact_index():
+            self._read_from_file(self._index_path, format='json')
+            if (not self.is_upstream) and os.access(
+                    self._db_dir, os.R_OK | os.W_OK):
+                self._write_compact_index()
+
+        self._replay_journal(check)
+        self._changes = set()
+
     def _read(self):
         """Re-read Database from the data in the set location.
 
@@ -674,14 +1565,14 @@ class Database(object):
 
         """
         if os.path.isfile(self._index_path):
-            # Read from JSON file if a JSON database exists
-            self._read_from_file(self._index_path, format='json')
+            self._read_index()
 
         elif os.path.isfile(self._old_yaml_index_path):
             if (not self.is_upstream) and os.access(
                     self._db_dir, os.R_OK | os.W_OK):
                 # if we can write, then read AND write a JSON file.
                 self._read_from_file(self._old_yaml_index_path, format='yaml')
+                self._changes = None
                 with WriteTransaction(self.lock):
                     self._write(None, None, None)
             else:
@@ -695,6 +1586,7 @@ class Database(object):
                     " databases cannot generate an index file")
             # The file doesn't exist, try to traverse the directory.
             # reindex() takes its own write lock, so no lock here.
+            self._changes = None
             with WriteTransaction(self.lock):
                 self._write(None, None, None)
             self.reindex(spack.store.layout)
@@ -772,9 +1664,9 @@ class Database(object):
                 'explicit': explicit,
                 'installation_time': installation_time
             }
-            self._data[key] = InstallRecord(
+            self._insert_record(key, InstallRecord(
                 new_spec, path, installed, ref_count=0, **extra_args
-            )
+            ))
 
             # Connect dependencies from the DB to the new copy.
             for name, dep in iteritems(spec.dependencies_dict(_tracked_deps)):
@@ -783,6 +1675,7 @@ class Database(object):
                 new_spec._add_dependency(record.spec, dep.deptypes)
                 if not upstream:
                     record.ref_count += 1
+                    self._changed(dkey)
 
             # Mark concrete once everything is built, and preserve
             # the original hash of concrete specs.
@@ -794,6 +1687,9 @@ class Database(object):
             self._data[key].installed = True
 
         self._data[key].explicit = explicit
+        self._changed(key)
+        if self._index is not None:
+            self._index.set_explicit(key, explicit)
 
     @_autospec
     def add(self, spec, directory_layout, explicit=False):
@@ -804,8 +1700,8 @@ class Database(object):
         """
         # TODO: ensure that spec is concrete?
         # Entire add is transactional.
-        with self.write_transaction():
-            self._add(spec, directory_layout, explicit=explicit)
+        self._write_records(
+            spec, self._add, spec, directory_layout, explicit)
 
     def _get_matching_spec_key(self, spec, **kwargs):
         """Get the exact spec OR get a single spec that matches."""
@@ -834,9 +1730,10 @@ class Database(object):
 
         rec = self._data[key]
         rec.ref_count -= 1
+        self._changed(key)
 
         if rec.ref_count == 0 and not rec.installed:
-            del self._data[key]
+            self._delete_record(key)
             for dep in spec.dependencies(_tracked_deps):
                 self._decrement_ref_count(dep)
 
@@ -848,9 +1745,10 @@ class Database(object):
 
         if rec.ref_count > 0:
             rec.installed = False
+            self._changed(key)
             return rec.spec
 
-        del self._data[key]
+        self._delete_record(key)
         for dep in rec.spec.dependencies(_tracked_deps):
             self._decrement_ref_count(dep)
 
@@ -871,8 +1769,28 @@ class Database(object):
 
         """
         # Take a lock around the entire removal.
-        with self.write_transaction():
-            return self._remove(spec)
+        return self._write_records(spec, self._remove, spec)
+
+    @_autospec
+    def update_explicit(self, spec, explicit):
+        """Update the explicit flag of the install record of a spec.
+
+        Args:
+            spec (Spec): spec whose install record is being updated
+            explicit (bool): ``True`` if the package was requested
+                explicitly by the user, ``False`` if it was pulled in as
+                a dependency of an explicit package.
+        """
+        self._write_records(spec, self._update_explicit, spec, explicit)
+
+    def _update_explicit(self, spec, explicit):
+        key = self._get_matching_spec_key(spec)
+        rec = self._data[key]
+        if rec.explicit != explicit:
+            rec.explicit = explicit
+            self._changed(key)
+            if self._index is not None:
+                self._index.set_explicit(key, explicit)
 
     @_autospec
     def installed_relatives(self, spec, direction='children', transitive=True,
@@ -967,11 +1885,11 @@ class Database(object):
 
             # check if hash is a prefix of some installed (or previously
             # installed) spec.
-            matches = [record.spec for h, record in self._data.items()
-                       if h.startswith(dag_hash) and
-                       (installed is any or installed == record.installed)]
-            if matches:
-                return matches
+            keys = [h for h, record in self._data.items()
+                    if h.startswith(dag_hash) and
+                    (installed is any or installed == record.installed)]
+            if keys:
+                return [self._data[h].spec for h in keys]
 
             # nothing found
             return default
@@ -1058,6 +1976,10 @@ class Database(object):
         # TODO: like installed and known that can be queried?  Or are
         # TODO: these really special cases that only belong here?
 
+        # Parse query strings once, rather than once per record
+        if isinstance(query_spec, string_types):
+            query_spec = spack.spec.Spec(query_spec)
+
         # Just look up concrete specs with hashes; no fancy search.
         if isinstance(query_spec, spack.spec.Spec) and query_spec.concrete:
             # TODO: handling of hashes restriction is not particularly elegant.
@@ -1068,14 +1990,23 @@ class Database(object):
             else:
                 return []
 
-        # Abstract specs require more work -- currently we test
-        # against everything.
+        # Abstract specs require more work: narrow down the records to
+        # check using the secondary indexes, then test each candidate.
+        candidates = self._record_index().candidates(
+            query_spec, explicit, start_date, end_date, hashes)
+        if candidates is None:
+            candidates = self._data
+
         results = []
         start_date = start_date or datetime.datetime.min
         end_date = end_date or datetime.datetime.max
 
-        for key, rec in self._data.items():
-            if hashes is not None and rec.spec.dag_hash() not in hashes:
+        for key in candidates:
+            rec = self._data.get(key)
+            if rec is None:
+                continue
+
+            if hashes is not None and key not in hashes:
                 continue
 
             if installed is not any and rec.installed != installed:
@@ -1095,9 +2026,9 @@ class Database(object):
                 continue
 
             if query_spec is any or rec.spec.satisfies(query_spec):
-                results.append(rec.spec)
+                results.append(key)
 
-        return results
+        return [self._data[key].spec for key in results]
 
     def query_local(self, *args, **kwargs):
         with self.read_transaction():
@@ -7,8 +7,6 @@
 """
 from six import string_types
 
-import spack.spec
-
 
 #: The types of dependency relationships that Spack understands.
 all_deptypes = ('build', 'link', 'run', 'test')
@@ -78,6 +76,8 @@ class Dependency(object):
             spec (Spec): Spec indicating dependency requirements
             type (sequence): strings describing dependency relationship
         """
+        # Not imported at the top: spack.spec needs this module first
+        import spack.spec
         assert isinstance(spec, spack.spec.Spec)
 
         self.pkg = pkg
@@ -4,6 +4,8 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import collections
+import hashlib
+import multiprocessing
 import os
 import re
 import sys
@@ -20,6 +22,7 @@ import llnl.util.filesystem as fs
 import llnl.util.tty as tty
 from llnl.util.tty.color import colorize
 
+import spack.compilers
 import spack.concretize
 import spack.error
 import spack.hash_types as ht
@@ -78,6 +81,9 @@ valid_environment_name_re = r'^\w[\w-]*$'
 #: version of the lockfile format. Must increase monotonically.
 lockfile_format_version = 2
 
+#: minimum number of specs to concretize before using a process pool
+_process_pool_threshold = 2
+
 #: legal first keys in the spack.yaml manifest file
 env_schema_keys = ('spack', 'env')
 
@@ -433,7 +439,7 @@ def _eval_conditional(string):
 
 class ViewDescriptor(object):
     def __init__(self, root, projections={}, select=[], exclude=[],
-                 link=default_view_link):
+                 link=default_view_link, atomic=False):
         self.root = root
         self.projections = projections
         self.select = select
@@ -442,6 +448,7 @@ class ViewDescriptor(object):
         self.exclude_fn = lambda x: not any(x.satisfies(e)
                                             for e in self.exclude)
         self.link = link
+        self.atomic = atomic
 
     def to_dict(self):
         ret = {'root': self.root}
@@ -453,6 +460,8 @@ class ViewDescriptor(object):
             ret['exclude'] = self.exclude
         if self.link != default_view_link:
             ret['link'] = self.link
+        if self.atomic:
+            ret['atomic'] = self.atomic
         return ret
 
     @staticmethod
@@ -461,44 +470,119 @@ class ViewDescriptor(object):
                               d.get('projections', {}),
                               d.get('select', []),
                               d.get('exclude', []),
-                              d.get('link', default_view_link))
+                              d.get('link', default_view_link),
+                              d.get('atomic', False))
 
-    def view(self):
-        return YamlFilesystemView(self.root, spack.store.layout,
+    def view(self, root=None):
+        return YamlFilesystemView(root or self.root, spack.store.layout,
                                   ignore_conflicts=True,
                                   projections=self.projections)
 
-    def regenerate(self, all_specs, roots):
-        specs_for_view = []
+    def specs_for_view(self, all_specs, roots):
+        """The installed specs that belong in the view, by DAG hash.
+
+        The view does not store build dependencies.  The DAG hash doesn't
+        include them either, so it identifies environment specs (which do
+        store build dependencies) and the specs in the view alike.
+        """
         specs = all_specs if self.link == 'all' else roots
+
+        by_hash = {}
         for spec in specs:
-            # The view does not store build deps, so if we want it to
-            # recognize environment specs (which do store build deps), then
-            # they need to be stripped
             if spec.concrete:  # Do not link unconcretized roots
-                specs_for_view.append(spec.copy(deps=('link', 'run')))
+                by_hash.setdefault(spec.dag_hash(), spec)
 
         if self.select:
-            specs_for_view = list(filter(self.select_fn, specs_for_view))
+            by_hash = dict((h, s) for h, s in by_hash.items()
+                           if self.select_fn(s))
 
         if self.exclude:
-            specs_for_view = list(filter(self.exclude_fn, specs_for_view))
+            by_hash = dict((h, s) for h, s in by_hash.items()
+                           if self.exclude_fn(s))
 
-        installed_specs_for_view = set(s for s in specs_for_view
-                                       if s.package.installed)
+        with spack.store.db.read_transaction():
+            return dict((h, s) for h, s in by_hash.items()
+                        if s.package.installed)
+
+    def regenerate(self, all_specs, roots):
+        """Link and unlink only the packages that changed since the view
+        was last updated."""
+        specs_for_view = self.specs_for_view(all_specs, roots)
+        if self.atomic:
+            self._regenerate_atomic(specs_for_view)
+            return
 
         view = self.view()
+        specs_in_view = dict((s.dag_hash(), s) for s in view.get_all_specs())
+
+        rm_specs = [s for h, s in specs_in_view.items()
+                    if h not in specs_for_view]
+        add_specs = [s.copy(deps=('link', 'run'))
+                     for h, s in specs_for_view.items()
+                     if h not in specs_in_view]
+        if not rm_specs and not add_specs:
+            tty.debug("View at {0} is up to date".format(self.root))
+            return
 
-        view.clean()
-        specs_in_view = set(view.get_all_specs())
         tty.msg("Updating view at {0}".format(self.root))
-
-        rm_specs = specs_in_view - installed_specs_for_view
         view.remove_specs(*rm_specs, with_dependents=False)
-
-        add_specs = installed_specs_for_view - specs_in_view
         view.add_specs(*add_specs, with_dependencies=False)
 
+    def _regenerate_atomic(self, specs_for_view):
+        """Build the view in a new directory, and then point the root of
+        the view, which is a symbolic link, to it.
+
+        Users of the view see either the old or the new view, never one
+        that is being updated.  Each version of the view is stored in a
+        hidden directory next to the root, named after its content.
+        """
+        root = os.path.abspath(self.root)
+        if os.path.isdir(root) and not os.path.islink(root):
+            raise SpackEnvironmentError(
+                'Cannot update the atomic view at {0}, as it is a directory '
+                'and not a symbolic link. Remove it so that Spack can '
+                'create the link.'.format(root))
+
+        versions_dir = os.path.join(
+            os.path.dirname(root), '._' + os.path.basename(root))
+        content = sjson.dump({'specs': sorted(specs_for_view),
+                              'projections': self.projections})
+        new_dir = os.path.join(
+            versions_dir, hashlib.sha1(content.encode('utf-8')).hexdigest())
+
+        # Compare the target of the link as it was written, as parents of
+        # the root may be symbolic links as well
+        old_dir = None
+        if os.path.islink(root):
+            old_dir = os.path.normpath(os.path.join(
+                os.path.dirname(root), os.readlink(root)))
+        if old_dir == new_dir or (
+                old_dir and os.path.exists(old_dir) and
+                os.path.exists(new_dir) and
+                os.path.samefile(old_dir, new_dir)):
+            tty.debug("View at {0} is up to date".format(self.root))
+            return
+
+        tty.msg("Updating view at {0}".format(self.root))
+        if os.path.exists(new_dir):
+            # Left over by an update that failed
+            shutil.rmtree(new_dir)
+        fs.mkdirp(new_dir)
+        self.view(new_dir).add_specs(
+            *[s.copy(deps=('link', 'run')) for s in specs_for_view.values()],
+            with_dependencies=False)
+
+        # Renaming a link over another one replaces it atomically
+        tmp_link = os.path.join(versions_dir, 'root.tmp')
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(new_dir, tmp_link)
+        os.rename(tmp_link, root)
+
+        if old_dir and os.path.exists(old_dir) and os.path.samefile(
+                os.path.dirname(old_dir), versions_dir):
+            shutil.rmtree(old_dir, ignore_errors=True)
+
 
 class Environment(object):
     def __init__(self, path, init_file=None, with_view=None):
@@ -905,6 +989,10 @@ class Environment(object):
     def _concretize_separately(self):
         """Concretization strategy that concretizes separately one
         user spec after the other.
+
+        Specs that are not in the lockfile are looked up in the
+        concretization cache (see ``spack.concretize.cache_key()``), and
+        the remaining ones are concretized in parallel.
         """
         # keep any concretized specs whose user specs are still in the manifest
         old_concretized_user_specs = self.concretized_user_specs
@@ -921,13 +1009,22 @@ class Environment(object):
                 self._add_concrete_spec(s, concrete, new=False)
 
         # Concretize any new user specs that we haven't concretized yet
+        new_specs = [
+            (uspec, uspec_constraints) for uspec, uspec_constraints in zip(
+                self.user_specs, self.user_specs.specs_as_constraints)
+            if uspec not in old_concretized_user_specs]
+
+        cached = [_read_cached_concretization(c) for _, c in new_specs]
+        missing = [c for concrete, (_, c) in zip(cached, new_specs)
+                   if concrete is None]
+        concretized = iter(_concretize_all_from_constraints(missing))
+
         concretized_specs = []
-        for uspec, uspec_constraints in zip(
-                self.user_specs, self.user_specs.specs_as_constraints):
-            if uspec not in old_concretized_user_specs:
-                concrete = _concretize_from_constraints(uspec_constraints)
-                self._add_concrete_spec(uspec, concrete)
-                concretized_specs.append((uspec, concrete))
+        for concrete, (uspec, _) in zip(cached, new_specs):
+            if concrete is None:
+                concrete = next(concretized)
+            self._add_concrete_spec(uspec, concrete)
+            concretized_specs.append((uspec, concrete))
         return concretized_specs
 
     def install(self, user_spec, concrete_spec=None, **install_args):
@@ -1069,18 +1166,26 @@ class Environment(object):
         self.specs_by_hash[h] = concrete
 
     def install_all(self, args=None):
-        """Install all concretized specs in an environment."""
-        for concretized_hash in self.concretized_order:
-            spec = self.specs_by_hash[concretized_hash]
+        """Install all concretized specs in an environment.
+
+        Packages that don't depend on each other may be built at the same
+        time, see ``spack.installer``.
+        """
+        # Parse cli arguments and construct a dictionary
+        # that will be passed to Package.do_install API
+        kwargs = dict()
+        if args:
+            spack.cmd.install.update_kwargs_from_args(args, kwargs)
 
-            # Parse cli arguments and construct a dictionary
-            # that will be passed to Package.do_install API
-            kwargs = dict()
-            if args:
-                spack.cmd.install.update_kwargs_from_args(args, kwargs)
+        # The installer is only needed here, don't load it on startup
+        import spack.installer as installer
+        specs = [self.specs_by_hash[h] for h in self.concretized_order]
+        installer.PackageInstaller(specs).install(**kwargs)
 
-            self._install(spec, **kwargs)
+        # Make sure log directory exists
+        fs.mkdirp(self.log_path)
 
+        for spec in specs:
             if not spec.external:
                 # Link the resulting log file into logs dir
                 build_log_link = os.path.join(
@@ -1387,6 +1492,71 @@ def display_specs(concretized_specs):
         print('')
 
 
+def _read_cached_concretization(spec_constraints):
+    """Concrete spec of the constraints of a user spec from the
+    concretization cache, or ``None`` if it isn't there.
+
+    The constraints are combined as ``_concretize_from_constraints()``
+    does before it concretizes, so the same cache entries are used.
+    """
+    root_spec = [s for s in spec_constraints if s.name]
+    if len(root_spec) != 1:
+        return None
+
+    s = root_spec[0].copy()
+    try:
+        for c in spec_constraints:
+            if c is not root_spec[0]:
+                s.constrain(c)
+    except spack.error.SpackError:
+        # let the concretizer deal with invalid constraints
+        return None
+    return spack.concretize.read_cached_spec(spack.concretize.cache_key(s))
+
+
+def _concretize_task(constraints):
+    """Concretize a spec from its constraints in a worker process.
+
+    The spec is returned as a dictionary, and failures as ``None`` so
+    that the parent can concretize the spec again and raise the error.
+    """
+    try:
+        concrete = _concretize_from_constraints([Spec(c) for c in constraints])
+        return concrete.to_dict(hash=ht.build_hash)
+    except Exception:
+        return None
+
+
+def _concretize_all_from_constraints(constraints_list):
+    """Concretize the specs with each of the constraints in a list, in
+    a pool of processes when there are enough of them.
+
+    Workers are forked after the repository index and the configuration
+    are loaded, so they start with warm caches.  The concrete specs are
+    returned in the order of the constraints.
+    """
+    jobs = min(multiprocessing.cpu_count(), len(constraints_list))
+    if (len(constraints_list) < _process_pool_threshold or jobs < 2 or
+            multiprocessing.current_process().daemon):
+        return [_concretize_from_constraints(c) for c in constraints_list]
+
+    # Load what every concretization reads, before forking
+    spack.repo.path.provider_index
+    spack.compilers.all_compiler_specs()
+
+    args = [[str(c) for c in constraints] for constraints in constraints_list]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.map(_concretize_task, args, chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return [Spec.from_dict(d) if d is not None
+            else _concretize_from_constraints(constraints)
+            for d, constraints in zip(results, constraints_list)]
+
+
 def _concretize_from_constraints(spec_constraints):
     # Accept only valid constraints from list and concretize spec
     # Get the named spec even if out of order
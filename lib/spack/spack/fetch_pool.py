@@ -0,0 +1,316 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Download the sources of many packages at the same time.
+
+Staging a package downloads its archive, its resources and its URL
+patches one after the other, and packages are staged one at a time.
+Before installing a DAG, fetching an environment or creating a mirror,
+a ``FetchPool`` downloads all of these files concurrently into Spack's
+fetch cache (``spack.caches.fetch_cache``).  Staging the packages then
+finds everything in the cache.
+
+Only files with a checksum are cached, so only those are downloaded by
+the pool.  Each file is verified while it is downloaded, and moved into
+the cache only if its checksum matches.  Like ``Stage.fetch()``, the
+pool tries the configured mirrors before the package's own URL.
+
+Downloads are limited to ``config:fetch_jobs`` at a time in total, and
+to ``connections_per_host`` at a time from the same server.  Transient
+errors (timeouts, dropped connections, 5xx responses) are retried with
+exponential backoff.  Anything that still fails is left to the regular
+fetch when the package is staged, which reports errors as usual.
+"""
+import os
+import socket
+import threading
+import time
+
+from six.moves import queue
+from six.moves.http_client import HTTPException
+from six.moves.urllib.error import HTTPError, URLError
+from six.moves.urllib.parse import urlparse
+from six.moves.urllib.request import Request
+
+import llnl.util.tty as tty
+from llnl.util.filesystem import mkdirp
+
+import spack.caches
+import spack.config
+import spack.error
+import spack.fetch_strategy as fs
+import spack.patch
+import spack.stage
+import spack.util.crypto as crypto
+import spack.util.web as web
+
+__all__ = ['FetchPool', 'Download']
+
+#: Maximum number of files downloaded from the same host at the same time
+connections_per_host = 4
+
+#: Number of times a download is retried after a transient error
+retries = 3
+
+#: Seconds to wait before the first retry of a download.  The delay
+#: doubles with every retry.
+retry_delay = 1.0
+
+#: Timeout in seconds for connecting to and reading from a server
+timeout = 30
+
+#: Size of the blocks that are read from the network at a time
+_block_size = 2 ** 16
+
+
+class Download(object):
+    """A file to download into the fetch cache.
+
+    Arguments:
+        urls (list): URLs to try, in order
+        digest (str): checksum of the file
+        cache_path (str): path of the file relative to the fetch cache
+    """
+
+    def __init__(self, urls, digest, cache_path):
+        self.urls = urls
+        self.digest = digest
+        self.cache_path = cache_path
+
+    @property
+    def path(self):
+        """Absolute path of the file in the fetch cache."""
+        return os.path.join(spack.caches.fetch_cache.root, self.cache_path)
+
+    def __repr__(self):
+        return 'Download(%r)' % self.cache_path
+
+
+def _download_for(fetcher, mirror_path):
+    """Download for what ``fetcher`` fetches, if it can be cached."""
+    if not isinstance(fetcher, fs.URLFetchStrategy) or not mirror_path:
+        return None
+    if not fetcher.cachable:
+        return None
+    urls = spack.stage.mirror_urls(mirror_path) + [fetcher.url]
+    return Download(urls, fetcher.digest, mirror_path)
+
+
+def package_downloads(pkg):
+    """Files needed to stage a package: its archive, the archives of its
+    resources and its URL patches.
+
+    Arguments:
+        pkg (PackageBase): package with a concrete spec
+
+    Returns:
+        (list): ``Download`` objects for the files that can be cached
+    """
+    if not pkg.has_code or pkg.spec.external:
+        return []
+
+    downloads = []
+    for stage in pkg.stage:
+        downloads.append(_download_for(stage.default_fetcher,
+                                       stage.mirror_path))
+
+    # URL patches are staged next to the package's archive in mirrors,
+    # see UrlPatch.fetch()
+    root = pkg.stage.mirror_path
+    for patch in pkg.spec.patches:
+        if root and isinstance(patch, spack.patch.UrlPatch):
+            fetcher = fs.URLFetchStrategy(
+                patch.url, patch.archive_sha256 or patch.sha256)
+            mirror_path = os.path.join(
+                os.path.dirname(root), os.path.basename(patch.url))
+            downloads.append(_download_for(fetcher, mirror_path))
+
+    return [d for d in downloads if d is not None]
+
+
+class _TransientError(fs.FetchError):
+    """A download failed for a reason that may go away if retried."""
+
+
+class FetchPool(object):
+    """Downloads files into the fetch cache with a pool of threads.
+
+    Arguments:
+        jobs (int, optional): maximum number of concurrent downloads.
+            Defaults to ``config:fetch_jobs``.
+    """
+
+    def __init__(self, jobs=None):
+        if jobs is None:
+            jobs = spack.config.get('config:fetch_jobs', 8)
+        self.jobs = max(1, jobs)
+        self.downloads = []
+
+        self._cache_paths = set()
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._failed = []
+
+    def add(self, download):
+        """Schedule a download, unless the file is already in the cache."""
+        if download.cache_path in self._cache_paths:
+            return
+        self._cache_paths.add(download.cache_path)
+        if not os.path.exists(download.path):
+            self.downloads.append(download)
+
+    def add_package(self, pkg):
+        """Schedule the downloads needed to stage a package."""
+        try:
+            downloads = package_downloads(pkg)
+        except spack.error.SpackError as e:
+            # Staging the package will report this
+            tty.debug(e)
+            return
+
+        for download in downloads:
+            self.add(download)
+
+    def fetch(self):
+        """Run all the downloads scheduled so far.
+
+        Returns:
+            (list): the downloads that failed
+        """
+        downloads, self.downloads = self.downloads, []
+        if not downloads:
+            return []
+
+        todo = queue.Queue()
+        for download in downloads:
+            todo.put(download)
+
+        verify = spack.config.get('config:checksum')
+        context = web.ssl_context()
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(todo, verify, context))
+            for i in range(min(self.jobs, len(downloads)))]
+
+        tty.msg('Fetching {0} files, {1} at a time'.format(
+            len(downloads), len(threads)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Join with a timeout so that the main thread still gets
+        # KeyboardInterrupt on Python 2
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+
+        failed, self._failed = self._failed, []
+        return failed
+
+    def _worker(self, todo, verify, context):
+        while True:
+            try:
+                download = todo.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                self._fetch(download, verify, context)
+            except Exception as e:
+                # Staging the package will try again and report the error
+                tty.debug(e)
+                with self._lock:
+                    self._failed.append(download)
+
+    def _fetch(self, download, verify, context):
+        """Try the URLs of a download in order until one works."""
+        for url in download.urls:
+            try:
+                self._fetch_url(url, download, verify, context)
+                return
+            except fs.FetchError as e:
+                tty.debug('Fetching {0} failed: {1}'.format(url, e))
+
+        raise fs.FetchError(
+            'All URLs failed for {0}'.format(download.cache_path))
+
+    def _fetch_url(self, url, download, verify, context):
+        """Download from one URL, retrying transient errors."""
+        attempt = 0
+        while True:
+            slot = self._host_slot(url)
+            slot.acquire()
+            try:
+                return _download(url, download, verify, context)
+            except _TransientError as e:
+                if attempt >= retries:
+                    raise fs.FailedDownloadError(url, str(e))
+                tty.debug('Retrying {0}: {1}'.format(url, e))
+            finally:
+                slot.release()
+
+            time.sleep(retry_delay * 2 ** attempt)
+            attempt += 1
+
+    def _host_slot(self, url):
+        """Semaphore limiting the connections to the server of ``url``."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                # Local files don't need a limit beyond the pool's
+                limit = connections_per_host if host else self.jobs
+                self._host_slots[host] = threading.BoundedSemaphore(limit)
+            return self._host_slots[host]
+
+
+def _download(url, download, verify, context):
+    """Stream ``url`` into the fetch cache, checking its checksum."""
+    local = urlparse(url).scheme == 'file'
+    try:
+        response = web._urlopen(Request(url), timeout=timeout,
+                                context=context)
+    except HTTPError as e:
+        if e.code >= 500 or e.code in (408, 429):
+            raise _TransientError(str(e))
+        raise fs.FailedDownloadError(url, str(e))
+    except (URLError, HTTPException, socket.error) as e:
+        # A file missing from a local mirror won't come back
+        if local:
+            raise fs.FailedDownloadError(url, str(e))
+        raise _TransientError(str(e))
+
+    path = download.path
+    mkdirp(os.path.dirname(path))
+    partial = '{0}.{1}.part'.format(path, os.getpid())
+
+    hasher = None
+    if verify:
+        hasher = crypto.hash_fun_for_digest(download.digest)()
+
+    tty.msg('Fetching {0}'.format(url))
+    try:
+        with open(partial, 'wb') as f:
+            while True:
+                block = response.read(_block_size)
+                if not block:
+                    break
+                if hasher:
+                    hasher.update(block)
+                f.write(block)
+    except (HTTPException, socket.error, IOError) as e:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise _TransientError(str(e))
+    finally:
+        response.close()
+
+    if hasher and hasher.hexdigest() != download.digest:
+        os.remove(partial)
+        raise fs.ChecksumError(
+            '{0} checksum failed for {1}'.format(hasher.name, url),
+            'Expected {0} but got {1}'.format(
+                download.digest, hasher.hexdigest()))
+
+    os.rename(partial, path)
@@ -3,6 +3,7 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import contextlib
 import filecmp
 import functools as ft
 import os
@@ -10,13 +11,16 @@ import re
 import shutil
 import sys
 
-from llnl.util.link_tree import LinkTree, MergeConflictError
+from ordereddict_backport import OrderedDict
+
+from llnl.util.link_tree import LinkTree, MergeConflictError, map_file_pairs
 from llnl.util import tty
 from llnl.util.lang import match_predicate, index_by
 from llnl.util.tty.color import colorize
 from llnl.util.filesystem import (
     mkdirp, remove_dead_links, remove_empty_directories)
 
+import spack.util.spack_json as sjson
 import spack.util.spack_yaml as s_yaml
 
 import spack.spec
@@ -34,10 +38,11 @@ if sys.version_info < (3, 0):
     from itertools import ifilter as filter
     from itertools import izip as zip
 
-__all__ = ["FilesystemView", "YamlFilesystemView"]
+__all__ = ["FilesystemView", "YamlFilesystemView", "ViewManifest"]
 
 
 _projections_path = '.spack/projections.yaml'
+_manifest_path = '.spack/manifest.json'
 
 
 class FilesystemView(object):
@@ -227,9 +232,34 @@ class YamlFilesystemView(FilesystemView):
 
         self.extensions_layout = YamlViewExtensionsLayout(self, layout)
 
+        self.manifest = ViewManifest(self._root)
+        self._manifest_depth = 0
+
+        # Merges planned ahead, and links not created yet
+        self._merge_plans = {}
+        self._pending_links = None
+
         self._croot = colorize_root(self._root) + " "
 
+    @contextlib.contextmanager
+    def _update_manifest(self):
+        """Read the manifest before changing the view, and write it once
+        when the outermost change is done."""
+        if not self._manifest_depth:
+            self.manifest.read()
+        self._manifest_depth += 1
+        try:
+            yield
+        finally:
+            self._manifest_depth -= 1
+            if not self._manifest_depth:
+                self.manifest.write()
+
     def add_specs(self, *specs, **kwargs):
+        with self._update_manifest():
+            self._add_specs(*specs, **kwargs)
+
+    def _add_specs(self, *specs, **kwargs):
         assert all((s.concrete for s in specs))
         specs = set(specs)
 
@@ -250,11 +280,26 @@ class YamlFilesystemView(FilesystemView):
         standalones = specs - extensions
 
         set(map(self._check_no_ext_conflicts, extensions))
-        # fail on first error, otherwise link extensions as well
-        if all(map(self.add_standalone, standalones)):
+
+        # Find the file conflicts of all the standalone packages before
+        # linking any of them, and then create all their links at once
+        self._plan_merges(s for s in standalones
+                          if not s.external and not self.check_added(s))
+        try:
+            with self._batch_links():
+                # fail on first error, otherwise link extensions as well
+                standalones_added = all(map(self.add_standalone, standalones))
+        finally:
+            self._merge_plans.clear()
+
+        if standalones_added:
             all(map(self.add_extension, extensions))
 
     def add_extension(self, spec):
+        with self._update_manifest():
+            return self._add_extension(spec)
+
+    def _add_extension(self, spec):
         if not spec.package.is_extension:
             tty.error(self._croot + 'Package %s is not an extension.'
                       % spec.name)
@@ -277,6 +322,10 @@ class YamlFilesystemView(FilesystemView):
         return True
 
     def add_standalone(self, spec):
+        with self._update_manifest():
+            return self._add_standalone(spec)
+
+    def _add_standalone(self, spec):
         if spec.package.is_extension:
             tty.error(self._croot + 'Package %s is an extension.'
                       % spec.name)
@@ -313,7 +362,15 @@ class YamlFilesystemView(FilesystemView):
             tty.info(self._croot + 'Linked package: %s' % colorize_spec(spec))
         return True
 
-    def merge(self, spec, ignore=None):
+    def _plan_merge(self, spec, ignore=None):
+        """Find where the files of ``spec`` go in the view, and what
+        prevents merging them.
+
+        Returns:
+            (tuple): the ``LinkTree`` of the package, its destination, the
+                predicate of ignored files, the map of its files to their
+                destination and a list of conflicts
+        """
         pkg = spec.package
         view_source = pkg.view_source()
         view_dst = pkg.view_destination(self)
@@ -330,16 +387,95 @@ class YamlFilesystemView(FilesystemView):
         merge_map = tree.get_file_map(view_dst, ignore_file)
         if not self.ignore_conflicts:
             conflicts.extend(pkg.view_file_conflicts(self, merge_map))
+            # Files of packages whose links are not created yet
+            pending = self._pending_links or {}
+            conflicts.extend(dst for dst in merge_map.values()
+                             if dst in pending)
+
+        return tree, view_dst, ignore_file, merge_map, conflicts
+
+    def _plan_merges(self, specs):
+        """Plan the merge of several packages at once, so that conflicts
+        between them and with the view are found before anything is linked.
+        """
+        planned = {}
+        for spec in specs:
+            plan = self._plan_merge(spec)
+            merge_map, conflicts = plan[3], plan[4]
+            if not self.ignore_conflicts:
+                conflicts.extend(dst for dst in merge_map.values()
+                                 if dst in planned)
+            if conflicts:
+                raise MergeConflictError(conflicts[0])
+
+            planned.update((dst, spec) for dst in merge_map.values())
+            self._merge_plans[spec.dag_hash()] = plan
+
+    @contextlib.contextmanager
+    def _batch_links(self):
+        """Queue the links that packages create with ``self.link``, and
+        create them all with a pool of threads when the outermost batch is
+        done.  The first link queued for a destination wins.
+        """
+        if self._pending_links is not None:
+            yield
+            return
+
+        link = self.link
+        self._pending_links = OrderedDict()
+
+        def queue_link(src, dst):
+            self._pending_links.setdefault(dst, src)
+        self.link = queue_link
+
+        try:
+            yield
+        finally:
+            pending, self._pending_links = self._pending_links, None
+            self.link = link
+            map_file_pairs(link, ((s, d) for d, s in pending.items()))
+
+    def merge(self, spec, ignore=None):
+        plan = self._merge_plans.pop(spec.dag_hash(), None)
+        if plan is None or ignore is not None:
+            plan = self._plan_merge(spec, ignore)
+        tree, view_dst, ignore_file, merge_map, conflicts = plan
 
         if conflicts:
             raise MergeConflictError(conflicts[0])
 
-        # merge directories with the tree
-        tree.merge_directories(view_dst, ignore_file)
-
-        pkg.add_files_to_view(self, merge_map)
+        pending = self._pending_links or {}
+        with self._update_manifest():
+            # merge directories with the tree
+            tree.merge_directories(view_dst, ignore_file)
+
+            # Only record the files this package added, not the ones
+            # it shares with packages that are already in the view
+            new_files = [dst for dst in merge_map.values()
+                         if not os.path.lexists(dst) and dst not in pending]
+            with self._batch_links():
+                spec.package.add_files_to_view(self, merge_map)
+                pending = self._pending_links
+                self.manifest.add_files(spec, (
+                    dst for dst in new_files
+                    if os.path.lexists(dst) or dst in pending))
 
     def unmerge(self, spec, ignore=None):
+        with self._update_manifest():
+            if os.path.exists(spec.package.view_source()):
+                self._unmerge(spec, ignore)
+            else:
+                # The package was uninstalled, so only the manifest knows
+                # which files it added to the view
+                files = self.manifest.files(spec)
+                for path in files:
+                    if os.path.lexists(path):
+                        os.remove(path)
+                if not files:
+                    self._purge_broken_links()
+            self.manifest.remove_files(spec)
+
+    def _unmerge(self, spec, ignore=None):
         pkg = spec.package
         view_source = pkg.view_source()
         view_dst = pkg.view_destination(self)
@@ -373,6 +509,10 @@ class YamlFilesystemView(FilesystemView):
         return spec == self.get_spec(spec)
 
     def remove_specs(self, *specs, **kwargs):
+        with self._update_manifest():
+            self._remove_specs(*specs, **kwargs)
+
+    def _remove_specs(self, *specs, **kwargs):
         assert all((s.concrete for s in specs))
         with_dependents = kwargs.get("with_dependents", True)
         with_dependencies = kwargs.get("with_dependencies", False)
@@ -419,15 +559,31 @@ class YamlFilesystemView(FilesystemView):
         remove_extension = ft.partial(self.remove_extension,
                                       with_dependents=with_dependents)
 
+        # The manifest tells which directories may become empty, so only
+        # views whose manifest doesn't know the files of some package
+        # need to be walked to find them
+        emptied = [os.path.dirname(self.get_path_meta_folder(s))
+                   for s in to_deactivate]
+        for s in to_deactivate:
+            emptied.extend(os.path.dirname(f) for f in self.manifest.files(s))
+        purge_all = not all(self.manifest.files(s) for s in to_deactivate)
+
         set(map(remove_extension, extensions))
         set(map(self.remove_standalone, standalones))
 
-        self._purge_empty_directories()
+        if purge_all:
+            self._purge_empty_directories()
+        else:
+            self._purge_empty_parents(emptied)
 
     def remove_extension(self, spec, with_dependents=True):
         """
             Remove (unlink) an extension from this view.
         """
+        with self._update_manifest():
+            self._remove_extension(spec, with_dependents)
+
+    def _remove_extension(self, spec, with_dependents):
         if not self.check_added(spec):
             tty.warn(self._croot +
                      'Skipping package not linked in view: %s' % spec.name)
@@ -444,6 +600,10 @@ class YamlFilesystemView(FilesystemView):
         """
             Remove (unlink) a standalone package from this view.
         """
+        with self._update_manifest():
+            self._remove_standalone(spec)
+
+    def _remove_standalone(self, spec):
         if not self.check_added(spec):
             tty.warn(self._croot +
                      'Skipping package not linked in view: %s' % spec.name)
@@ -478,22 +638,10 @@ class YamlFilesystemView(FilesystemView):
         return self._root
 
     def get_all_specs(self):
-        md_dirs = []
-        for root, dirs, files in os.walk(self._root):
-            if spack.store.layout.metadata_dir in dirs:
-                md_dirs.append(os.path.join(root,
-                                            spack.store.layout.metadata_dir))
-
-        specs = []
-        for md_dir in md_dirs:
-            if os.path.exists(md_dir):
-                for name_dir in os.listdir(md_dir):
-                    filename = os.path.join(md_dir, name_dir,
-                                            spack.store.layout.spec_file_name)
-                    spec = get_spec_from_file(filename)
-                    if spec:
-                        specs.append(spec)
-        return specs
+        """
+            Return the specs linked in this view, as recorded in its manifest.
+        """
+        return self.manifest.specs()
 
     def get_conflicts(self, *specs):
         """
@@ -511,11 +659,8 @@ class YamlFilesystemView(FilesystemView):
                             getattr(spec, "name", spec))
 
     def get_spec(self, spec):
-        dotspack = self.get_path_meta_folder(spec)
-        filename = os.path.join(dotspack,
-                                spack.store.layout.spec_file_name)
-
-        return get_spec_from_file(filename)
+        name = getattr(spec, "name", spec)
+        return self.manifest.get_spec(self.get_projection_for_spec(spec), name)
 
     def link_meta_folder(self, spec):
         src = spack.store.layout.metadata_path(spec)
@@ -523,7 +668,9 @@ class YamlFilesystemView(FilesystemView):
 
         tree = LinkTree(src)
         # there should be no conflicts when linking the meta folder
-        tree.merge(tgt, link=self.link)
+        with self._update_manifest():
+            tree.merge(tgt, link=self.link)
+            self.manifest.add_spec(spec, self.get_projection_for_spec(spec))
 
     def print_conflict(self, spec_active, spec_specified, level="error"):
         "Singular print function for spec conflicts."
@@ -594,6 +741,17 @@ class YamlFilesystemView(FilesystemView):
     def _purge_empty_directories(self):
         remove_empty_directories(self._root)
 
+    def _purge_empty_parents(self, paths):
+        """Remove the directories in ``paths`` that are empty, and their
+        parents that become empty, up to the root of the view."""
+        for path in sorted(set(paths), reverse=True):
+            while path.startswith(os.path.join(self._root, '')):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    break
+                path = os.path.dirname(path)
+
     def _purge_broken_links(self):
         remove_dead_links(self._root)
 
@@ -603,8 +761,12 @@ class YamlFilesystemView(FilesystemView):
 
     def unlink_meta_folder(self, spec):
         path = self.get_path_meta_folder(spec)
-        assert os.path.exists(path)
-        shutil.rmtree(path)
+        with self._update_manifest():
+            # The folder is gone if the package was uninstalled and the
+            # view was cleaned since
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            self.manifest.remove_spec(spec)
 
     def _check_no_ext_conflicts(self, spec):
         """
@@ -620,6 +782,217 @@ class YamlFilesystemView(FilesystemView):
                      'Skipping already activated package: %s' % spec.name)
 
 
+class ViewManifest(object):
+    """Record of the specs linked in a view, and of the files each one
+    added to it.
+
+    The manifest is kept in ``.spack/manifest.json`` under the root of the
+    view, so that finding the specs in a view, or the one linked at some
+    projection, doesn't need to walk the whole view and read the
+    ``spec.yaml`` of every package.  Specs are stored like in the install
+    database, as one node dictionary per DAG hash, so dependencies shared
+    by several specs are only stored once.
+
+    Views created before they had a manifest are walked once, the first
+    time the manifest is read, to find the specs they contain.
+    """
+
+    #: Version of the format of the manifest
+    version = 1
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, _manifest_path)
+
+        self._loaded = False
+        self._dirty = False
+        self._entries = {}    # dag hash -> {'name': ..., 'projection': ...}
+        self._files = {}      # dag hash -> files added, relative to root
+        self._nodes = {}      # dag hash -> node dict of all DAG nodes
+        self._locations = {}  # (projection, name) -> dag hash
+        self._specs = {}      # dag hash -> Spec, built on demand
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root)
+
+    def read(self):
+        """Read the manifest from the view, discarding what is in memory."""
+        self._entries, self._files, self._nodes = {}, {}, {}
+        self._specs = {}
+        self._dirty = False
+        self._loaded = True
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = sjson.load(f)['manifest']
+            if data['version'] != self.version:
+                raise ViewManifestError(
+                    'Unknown view manifest version in {0}: {1}'.format(
+                        self.path, data['version']))
+            self._entries = data['specs']
+            self._files = data['files']
+            self._nodes = data['nodes']
+            self._locations = dict(
+                ((e['projection'], e['name']), h)
+                for h, e in self._entries.items())
+            return
+
+        self._locations = {}
+        for projection, spec in self._find_specs():
+            self.add_spec(spec, projection)
+        if self._entries:
+            # Save what was found, so the view is only walked once
+            try:
+                self.write()
+            except (IOError, OSError) as e:
+                tty.debug(e)
+
+    def _ensure_read(self):
+        if not self._loaded:
+            self.read()
+
+    def write(self):
+        """Write the manifest in the view, if it changed since it was read.
+        """
+        if not self._dirty:
+            return
+
+        # Only keep the nodes of the specs that are still in the view
+        reachable = set()
+        stack = list(self._entries)
+        while stack:
+            dag_hash = stack.pop()
+            if dag_hash in reachable:
+                continue
+            reachable.add(dag_hash)
+            name, node = next(iter(self._nodes[dag_hash].items()))
+            stack.extend(h for _, h, _ in spack.spec.Spec.read_yaml_dep_specs(
+                node.get('dependencies', {})))
+        self._nodes = dict(
+            (h, n) for h, n in self._nodes.items() if h in reachable)
+
+        if not self._entries and not self._files:
+            # Nothing is linked in the view anymore
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._dirty = False
+            return
+
+        data = {'manifest': {
+            'version': self.version,
+            'specs': self._entries,
+            'files': self._files,
+            'nodes': self._nodes,
+        }}
+
+        # Write a temporary file and move it into place
+        mkdirp(os.path.dirname(self.path))
+        temp_file = self.path + '.%s.temp' % os.getpid()
+        try:
+            with open(temp_file, 'w') as f:
+                sjson.dump(data, f)
+            os.rename(temp_file, self.path)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        self._dirty = False
+
+    def _find_specs(self):
+        """Walk the view for metadata directories, and yield the
+        projection and spec of each package linked in it."""
+        metadata_dir = spack.store.layout.metadata_dir
+        for root, dirs, files in os.walk(self.root):
+            if metadata_dir not in dirs:
+                continue
+            md_dir = os.path.join(root, metadata_dir)
+            for name_dir in os.listdir(md_dir):
+                filename = os.path.join(md_dir, name_dir,
+                                        spack.store.layout.spec_file_name)
+                spec = get_spec_from_file(filename)
+                if spec:
+                    yield root, spec
+
+    def add_spec(self, spec, projection):
+        """Record that ``spec`` is linked at ``projection`` in the view."""
+        self._ensure_read()
+        dag_hash = spec.dag_hash()
+        projection = self._relative(projection)
+
+        for node_dict in spec.to_dict()['spec']:
+            node = next(iter(node_dict.values()))
+            self._nodes.setdefault(node['hash'], node_dict)
+
+        self._entries[dag_hash] = {'name': spec.name, 'projection': projection}
+        self._locations[(projection, spec.name)] = dag_hash
+        self._specs[dag_hash] = spec
+        self._dirty = True
+
+    def remove_spec(self, spec):
+        """Record that ``spec`` is no longer linked in the view."""
+        self._ensure_read()
+        dag_hash = spec.dag_hash()
+        entry = self._entries.pop(dag_hash, None)
+        if entry:
+            self._locations.pop((entry['projection'], entry['name']), None)
+            self._specs.pop(dag_hash, None)
+            self._dirty = True
+
+    def add_files(self, spec, paths):
+        """Record the files that ``spec`` added to the view."""
+        self._ensure_read()
+        files = self._files.setdefault(spec.dag_hash(), [])
+        files.extend(self._relative(p) for p in paths)
+        files.sort()
+        self._dirty = True
+
+    def remove_files(self, spec):
+        """Forget the files that ``spec`` added to the view."""
+        self._ensure_read()
+        if self._files.pop(spec.dag_hash(), None) is not None:
+            self._dirty = True
+
+    def files(self, spec):
+        """Absolute paths of the files that ``spec`` added to the view."""
+        self._ensure_read()
+        return [os.path.join(self.root, p)
+                for p in self._files.get(spec.dag_hash(), [])]
+
+    def _spec(self, dag_hash):
+        """Build the spec with some hash from the node dictionaries."""
+        spec = self._specs.get(dag_hash)
+        if spec is None:
+            spec = self._build_node(dag_hash, {})
+            spec._mark_concrete()
+            self._specs[dag_hash] = spec
+        return spec
+
+    def _build_node(self, dag_hash, built):
+        if dag_hash in built:
+            return built[dag_hash]
+
+        node_dict = self._nodes[dag_hash]
+        spec = spack.spec.Spec.from_node_dict(node_dict)
+        built[dag_hash] = spec
+
+        node = node_dict[spec.name]
+        for _, dep_hash, deptypes in spack.spec.Spec.read_yaml_dep_specs(
+                node.get('dependencies', {})):
+            spec._add_dependency(self._build_node(dep_hash, built), deptypes)
+        return spec
+
+    def specs(self):
+        """All the specs linked in the view."""
+        self._ensure_read()
+        return [self._spec(h) for h in sorted(self._entries)]
+
+    def get_spec(self, projection, name):
+        """The spec named ``name`` linked at ``projection``, or None."""
+        self._ensure_read()
+        dag_hash = self._locations.get((self._relative(projection), name))
+        return self._spec(dag_hash) if dag_hash else None
+
+
 #####################
 # utility functions #
 #####################
@@ -679,3 +1052,7 @@ def get_dependencies(specs):
 
 class ConflictingProjectionsError(SpackError):
     """Raised when a view has a projections file and is given one manually."""
+
+
+class ViewManifestError(SpackError):
+    """Raised when the manifest of a view can't be read."""
@@ -47,6 +47,7 @@ from heapq import heapify, heappop, heappush
 
 from llnl.util.tty.color import ColorStream
 
+import spack.repo
 from spack.dependency import all_deptypes, canonical_deptype
 
 
@@ -504,7 +505,7 @@ def graph_dot(specs, deptype='all', static=False, out=None):
     deptype = canonical_deptype(deptype)
 
     def static_graph(spec, deptype):
-        pkg = spec.package
+        pkg = spack.repo.path.get_pkg_metadata(spec.name)
         possible = pkg.possible_dependencies(
             expand_virtuals=True, deptype=deptype)
 
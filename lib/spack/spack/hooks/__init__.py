@@ -25,7 +25,9 @@
 import os.path
 
 import spack.paths
+import spack.store
 import spack.util.imp as simp
+import spack.util.prefix_files
 from llnl.util.lang import memoized, list_modules
 
 
@@ -54,13 +56,32 @@ class HookRunner(object):
                     hook(*args, **kwargs)
 
 
+class PrefixHookRunner(HookRunner):
+    """Runs hooks of a spec that share a single manifest of its prefix.
+
+    Hooks get the files of the prefix from
+    ``spack.util.prefix_files.files_in(spec.prefix)``.  Once they ran,
+    the manifest is updated with the files they changed and written in
+    the metadata directory of the prefix, unless the spec is external.
+    """
+
+    def __call__(self, spec, *args, **kwargs):
+        with spack.util.prefix_files.shared_listing(spec.prefix):
+            super(PrefixHookRunner, self).__call__(spec, *args, **kwargs)
+
+            metadata_dir = os.path.join(
+                spec.prefix, spack.store.layout.metadata_dir)
+            if not spec.external and os.path.isdir(metadata_dir):
+                spack.util.prefix_files.write_manifest(spec.prefix)
+
+
 #
 # Define some functions that can be called to fire off hooks.
 #
 pre_run = HookRunner('pre_run')
 
 pre_install = HookRunner('pre_install')
-post_install = HookRunner('post_install')
+post_install = PrefixHookRunner('post_install')
 
 pre_uninstall = HookRunner('pre_uninstall')
 post_uninstall = HookRunner('post_uninstall')
@@ -3,10 +3,10 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
-import spack.modules
-import spack.modules.common
 import llnl.util.tty as tty
 
+import spack.config
+
 try:
     enabled = spack.config.get('modules:enable')
 except KeyError:
@@ -16,6 +16,9 @@ except KeyError:
 
 def _for_each_enabled(spec, method_name):
     """Calls a method for each enabled module"""
+    # Module writers are only loaded when modules are written, so that
+    # the pre_run hooks don't pull them in on every command
+    import spack.modules
     for name in enabled:
         generator = spack.modules.module_types[name](spec)
         try:
@@ -10,12 +10,14 @@ import re
 import llnl.util.tty as tty
 
 import spack.paths
-import spack.modules
+import spack.util.prefix_files
 
 # Character limit for shebang line.  Using Linux's 127 characters
 # here, as it is the shortest I could find on a modern OS.
 shebang_limit = 127
 
+_exec_bits = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+
 
 def shebang_too_long(path):
     """Detects whether a file has a shebang line that is too long."""
@@ -93,6 +95,20 @@ def filter_shebangs_in_directory(directory, filenames=None):
             filter_shebang(path)
 
 
+def filter_shebangs_in_prefix(prefix):
+    """Patch the executable files of a prefix that have long shebangs.
+
+    The shebangs come from the manifest of the prefix, so files are not
+    read again.  Only executable files are run through their shebang,
+    and links are skipped: the files they point to in the prefix are in
+    the manifest too.
+    """
+    for entry in spack.util.prefix_files.files_in(prefix):
+        if (entry.isfile and entry.mode & _exec_bits and entry.shebang and
+                len(entry.shebang) > shebang_limit):
+            filter_shebang(entry.path)
+
+
 def post_install(spec):
     """This hook edits scripts so that they call /bin/bash
     $spack_prefix/bin/sbang instead of something longer than the
@@ -102,5 +118,4 @@ def post_install(spec):
         tty.debug('SKIP: shebang filtering [external package]')
         return
 
-    for directory, _, filenames in os.walk(spec.prefix):
-        filter_shebangs_in_directory(directory, filenames)
+    filter_shebangs_in_prefix(spec.prefix)
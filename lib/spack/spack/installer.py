@@ -0,0 +1,352 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Schedule the installation of whole DAGs of concrete specs.
+
+``PackageInstaller`` walks the DAGs of one or more concrete specs and
+installs every node once all of its dependencies are installed.  Nodes
+that do not depend on each other can be built at the same time, each in
+its own process.  Two settings in ``config.yaml`` control this:
+
+* ``build_jobs`` is the total number of ``make`` jobs Spack may use.  It
+  is split between the builds that run concurrently.
+
+* ``concurrent_builds`` is the maximum number of packages that are
+  built at the same time.  It defaults to 1, in which case packages are
+  installed one at a time in the current process.
+
+Each node is installed while holding the write lock on its prefix (see
+``Database.prefix_write_lock``).  If another Spack process -- possibly on
+another node of a shared filesystem -- is already installing a prefix,
+the installer moves on to other nodes and comes back to the locked one
+later.  By then the other process has usually finished, and
+``do_install`` just finds the package already installed.  In this way
+several ``spack install`` processes can work on the same DAG without
+building anything twice.
+
+Before building anything, the sources of all the nodes to build are
+downloaded at the same time by a ``spack.fetch_pool.FetchPool``.
+"""
+import time
+
+import multiprocessing
+
+import llnl.util.tty as tty
+import llnl.util.lock as lk
+
+import spack.binary_distribution
+import spack.config
+import spack.error
+import spack.fetch_pool
+import spack.store
+
+__all__ = ['PackageInstaller', 'InstallFailedError']
+
+#: Seconds to wait before retrying a node whose prefix is locked by
+#: another process
+locked_retry_interval = 1.0
+
+#: Seconds between two checks of the builds that are running
+poll_interval = 0.1
+
+#: Possible outcomes of installing a node
+_installed, _locked, _failed = 'installed', 'locked', 'failed'
+
+
+def _install_node(spec, install_kwargs, jobs=None):
+    """Install a single node of a DAG while holding its prefix lock.
+
+    Arguments:
+        spec (Spec): concrete spec to install
+        install_kwargs (dict): arguments for ``do_install()``
+        jobs (int, optional): number of ``make`` jobs for the build.  If
+            not given, ``config:build_jobs`` is used as is.
+
+    Returns:
+        (str): ``'installed'``, or ``'locked'`` if another process holds
+            the lock on the prefix of ``spec``
+    """
+    lock = spack.store.db.prefix_lock(spec)
+    try:
+        # Don't wait if another process is installing this prefix: there
+        # may be other work to do in the meantime.
+        lock.acquire_write(timeout=1e-9)
+    except lk.LockTimeoutError:
+        return _locked
+
+    try:
+        pkg = spec.package
+        if spack.config.get('config:install_missing_compilers', False):
+            pkg._install_bootstrap_compiler(pkg, **install_kwargs)
+
+        if jobs is None:
+            pkg.do_install(**install_kwargs)
+        else:
+            # Use a scope of our own: overriding a single option would
+            # replace any other 'overrides' scope that is active
+            scope = spack.config.InternalConfigScope(
+                'concurrent_build', {'config': {'build_jobs': jobs}})
+            with spack.config.override(scope):
+                pkg.do_install(**install_kwargs)
+    finally:
+        lock.release_write()
+
+    return _installed
+
+
+def _install_worker(conn, spec, install_kwargs, jobs):
+    """Body of the process that installs one node concurrently."""
+    try:
+        conn.send((_install_node(spec, install_kwargs, jobs), None))
+    except BaseException as e:
+        conn.send((_failed, str(e) or e.__class__.__name__))
+    finally:
+        conn.close()
+
+
+class PackageInstaller(object):
+    """Installs the DAGs of a list of concrete specs.
+
+    A node is installed only after all of its dependencies.  Each node is
+    installed by calling ``do_install()`` on its package without
+    dependencies, so everything that ``do_install()`` does for a single
+    package (binary caches, hooks, database updates, ...) is unchanged.
+    """
+
+    def __init__(self, specs, install_roots=True, install_deps=True,
+                 jobs=None, concurrent_builds=None):
+        """Create an installer for the DAGs of ``specs``.
+
+        Arguments:
+            specs (list): concrete specs to install
+            install_roots (bool): install the specs in ``specs``
+                themselves, and not only their dependencies
+            install_deps (bool): install the dependencies of ``specs``
+            jobs (int, optional): total number of ``make`` jobs for all
+                concurrent builds (defaults to ``config:build_jobs``)
+            concurrent_builds (int, optional): maximum number of packages
+                built at the same time (defaults to
+                ``config:concurrent_builds``)
+        """
+        for spec in specs:
+            if not spec.concrete:
+                raise ValueError(
+                    "Can only install concrete packages: %s." % spec.name)
+
+        self.jobs = max(1, jobs or spack.config.get('config:build_jobs'))
+        builds = concurrent_builds or spack.config.get(
+            'config:concurrent_builds', 1)
+        # Every build gets at least one job out of the budget
+        self.concurrent_builds = max(1, min(builds, self.jobs))
+
+        #: nodes to install, by DAG hash
+        self.specs = {}
+
+        #: DAG hashes of the dependencies of each node
+        self.dependencies = {}
+
+        #: DAG hashes of the specs that were requested
+        self.roots = set()
+
+        for root in specs:
+            root_hash = root.dag_hash()
+            self.roots.add(root_hash)
+            if install_roots:
+                self.specs[root_hash] = root
+            if not install_deps:
+                continue
+            for spec in root.traverse(order='post', root=False):
+                self.specs.setdefault(spec.dag_hash(), spec)
+
+        for key, spec in self.specs.items():
+            self.dependencies[key] = set(
+                d.dag_hash() for d in spec.dependencies()
+                if d.dag_hash() in self.specs)
+
+    def _node_kwargs(self, key, install_kwargs):
+        kwargs = install_kwargs.copy()
+        kwargs['install_deps'] = False
+        if key not in self.roots:
+            kwargs['explicit'] = False
+        return kwargs
+
+    def _already_installed(self, explicit):
+        """DAG hashes of the implicit nodes that need no work at all."""
+        installed = set()
+        with spack.store.db.read_transaction():
+            for key, spec in self.specs.items():
+                if explicit and key in self.roots:
+                    # do_install() may have to mark the record as explicit
+                    continue
+                pkg = spec.package
+                if not spec.external and (pkg.installed or
+                                          pkg.installed_upstream):
+                    installed.add(key)
+        return installed
+
+    def _prefetch(self, keys, install_kwargs):
+        """Download the sources of the nodes to build, all at once."""
+        # Fake installs need no sources, and neither do the nodes that
+        # will be installed from a binary cache.
+        if install_kwargs.get('fake'):
+            return
+        cached = set()
+        if install_kwargs.get('use_cache', True) and \
+           spack.config.get('mirrors'):
+            cached = set(s.dag_hash()
+                         for s in spack.binary_distribution.get_specs())
+
+        pool = spack.fetch_pool.FetchPool()
+        for key in keys:
+            if key not in cached:
+                pool.add_package(self.specs[key].package)
+        pool.fetch()
+
+    def _job_share(self, free_jobs, free_slots, ready):
+        """Number of ``make`` jobs for the next build to start.
+
+        The jobs that are not used by running builds are divided evenly
+        among the builds that can start now, so that the last build of a
+        DAG can use all the jobs.
+        """
+        return max(1, free_jobs // max(1, min(free_slots, ready)))
+
+    def install(self, **install_kwargs):
+        """Install all the nodes of the DAGs.
+
+        Arguments:
+            **install_kwargs: arguments passed to ``do_install()`` for
+                each node.  Dependencies are always installed with
+                ``explicit=False``.
+
+        Raises:
+            InstallFailedError: if some builds failed when building more
+                than one package at a time.  Otherwise the error of the
+                failing build is raised as is.
+        """
+        explicit = install_kwargs.get('explicit', False)
+        done = self._already_installed(explicit)
+        pending = set(self.specs) - done
+        self._prefetch(pending, install_kwargs)
+        failed = {}
+        retry_at = {}
+        running = {}
+        used_jobs = 0
+
+        try:
+            while pending or running:
+                now = time.time()
+                ready = sorted(
+                    k for k in pending
+                    if k not in running and retry_at.get(k, 0) <= now and
+                    self.dependencies[k] <= done)
+
+                progress = False
+                for key in ready:
+                    if failed:
+                        # Let running builds finish but don't start new ones
+                        break
+
+                    spec = self.specs[key]
+                    kwargs = self._node_kwargs(key, install_kwargs)
+
+                    if self.concurrent_builds == 1 or spec.external:
+                        status = _install_node(spec, kwargs)
+                    else:
+                        free_slots = self.concurrent_builds - len(running)
+                        free_jobs = self.jobs - used_jobs
+                        if free_slots < 1 or free_jobs < 1:
+                            break
+                        jobs = self._job_share(
+                            free_jobs, free_slots, len(ready))
+                        if not spec.package.parallel:
+                            jobs = 1
+                        running[key] = self._start(spec, kwargs, jobs)
+                        used_jobs += jobs
+                        continue
+
+                    progress = True
+                    if status == _locked:
+                        self._defer(spec, retry_at)
+                    else:
+                        pending.discard(key)
+                        done.add(key)
+
+                for key, (process, conn, jobs) in list(running.items()):
+                    status, message = self._poll(process, conn)
+                    if status is None:
+                        continue
+
+                    progress = True
+                    del running[key]
+                    used_jobs -= jobs
+                    if status == _locked:
+                        self._defer(self.specs[key], retry_at)
+                    elif status == _failed:
+                        pending.discard(key)
+                        failed[key] = message
+                        tty.error('Failed to install {0}: {1}'.format(
+                            self.specs[key].name, message))
+                    else:
+                        pending.discard(key)
+                        done.add(key)
+
+                if failed and not running:
+                    break
+
+                if not progress:
+                    time.sleep(poll_interval)
+
+        finally:
+            for process, conn, _ in running.values():
+                process.terminate()
+                process.join()
+                conn.close()
+
+        if failed:
+            raise InstallFailedError(
+                'Failed to install {0} package(s)'.format(len(failed)),
+                '\n'.join('{0}: {1}'.format(self.specs[k].format(
+                    '{name}{@version}{/hash:7}'), msg)
+                    for k, msg in sorted(failed.items())))
+
+    def _start(self, spec, kwargs, jobs):
+        tty.debug('Starting build of {0} with {1} jobs'.format(
+            spec.name, jobs))
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_install_worker, args=(child_conn, spec, kwargs, jobs))
+        process.start()
+        child_conn.close()
+        return process, parent_conn, jobs
+
+    def _poll(self, process, conn):
+        """Status and message of a finished build, or ``(None, None)``."""
+        if not conn.poll():
+            if process.is_alive():
+                return None, None
+            # The process may have sent its result right before exiting
+            if not conn.poll():
+                process.join()
+                conn.close()
+                return _failed, 'build process exited with code {0}'.format(
+                    process.exitcode)
+
+        try:
+            result = conn.recv()
+        except EOFError:
+            result = (_failed, 'build process exited without a result')
+        process.join()
+        conn.close()
+        return result
+
+    def _defer(self, spec, retry_at):
+        tty.msg('{0} is being installed by another process, waiting'.format(
+            spec.name))
+        retry_at[spec.dag_hash()] = time.time() + locked_retry_interval
+
+
+class InstallFailedError(spack.error.SpackError):
+    """Raised when some of the concurrent builds of a DAG fail."""
@@ -25,18 +25,16 @@ import llnl.util.tty.color as color
 from llnl.util.tty.log import log_output
 
 import spack
-import spack.architecture
 import spack.config
-import spack.cmd
-import spack.environment as ev
-import spack.hooks
 import spack.paths
-import spack.repo
-import spack.store
-import spack.util.debug
+import spack.util.lock
 import spack.util.path
 from spack.error import SpackError
 
+# Modules that pull in most of Spack (spack.cmd, spack.environment,
+# spack.architecture, ...) are imported where they are used, so that
+# e.g. ``spack --version`` doesn't have to load them.
+
 
 #: names of profile statistics
 stat_names = pstats.Stats.sort_arg_dict_default
@@ -103,12 +101,14 @@ def set_working_dir():
 
 def add_all_commands(parser):
     """Add all spack subcommands to the parser."""
+    import spack.cmd
     for cmd in spack.cmd.all_commands():
         parser.add_command(cmd)
 
 
 def index_commands():
     """create an index of commands by section for this help level"""
+    import spack.cmd
     index = {}
     for command in spack.cmd.all_commands():
         cmd_module = spack.cmd.get_module(command)
@@ -154,6 +154,7 @@ class SpackArgumentParser(argparse.ArgumentParser):
         Args:
             level (str): 'short' or 'long' (more commands shown for long)
         """
+        import spack.cmd
         if level not in levels:
             raise ValueError("level must be one of: %s" % levels)
 
@@ -268,6 +269,8 @@ class SpackArgumentParser(argparse.ArgumentParser):
 
     def add_command(self, cmd_name):
         """Add one subcommand to this parser."""
+        import spack.cmd
+
         # lazily initialize any subparsers
         if not hasattr(self, 'subparsers'):
             # remove the dummy "command" argument.
@@ -374,6 +377,9 @@ def make_argument_parser(**kwargs):
     parser.add_argument(
         '--lines', default=20, action='store',
         help="lines of profile output or 'all' (default: 20)")
+    parser.add_argument(
+        '--profile-imports', action='store_true',
+        help="report the time spent importing each module")
     parser.add_argument(
         '-v', '--verbose', action='store_true',
         help="print additional output during builds")
@@ -397,6 +403,10 @@ def send_warning_to_tty(message, *args):
 
 def setup_main_options(args):
     """Configure spack globals based on the basic options."""
+    import spack.repo
+    import spack.util.debug
+    import spack.util.lock
+
     # Assign a custom function to show warnings
     warnings.showwarning = send_warning_to_tty
 
@@ -529,15 +539,20 @@ class SpackCommand(object):
         return out.getvalue()
 
 
-def _profile_wrapper(command, parser, args, unknown_args):
-    import cProfile
-
+def _profile_lines(args):
+    """Number of lines of profile output, -1 for all of them."""
     try:
-        nlines = int(args.lines)
+        return int(args.lines)
     except ValueError:
         if args.lines != 'all':
             tty.die('Invalid number for --lines: %s' % args.lines)
-        nlines = -1
+        return -1
+
+
+def _profile_wrapper(command, parser, args, unknown_args):
+    import cProfile
+
+    nlines = _profile_lines(args)
 
     # allow comma-separated list of fields
     sortby = ['time']
@@ -573,6 +588,9 @@ def print_setup_info(*info):
     invoke spack in login scripts, and it needs to be quick.
 
     """
+    import spack.architecture
+    import spack.store
+
     shell = 'csh' if 'csh' in info else 'sh'
 
     def shell_set(var, value):
@@ -644,8 +662,30 @@ def main(argv=None):
     parser.add_argument('command', nargs=argparse.REMAINDER)
     args, unknown = parser.parse_known_args(argv)
 
+    if not args.profile_imports:
+        return _main(parser, args, argv)
+
+    # bin/spack already started the profiler, unless we weren't run by it
+    import spack.util.import_profile as import_profile
+    nlines = _profile_lines(args)
+    import_profile.start()
+    try:
+        return _main(parser, args, argv)
+    finally:
+        import_profile.stop()
+        import_profile.report(nlines)
+
+
+def _main(parser, args, argv):
+    """Run Spack once the basic arguments are parsed, see ``main()``."""
+    # -V doesn't need any of the rest of Spack
+    if args.version:
+        print(spack.spack_version)
+        return 0
+
     # activate an environment if one was specified on the command line
     if not args.no_env:
+        import spack.environment as ev
         env = ev.find_environment(args)
         if env:
             ev.activate(env, args.use_env_repo)
@@ -664,12 +704,9 @@ def main(argv=None):
         parser.print_help()
         return 1
 
-    # -h, -H, and -V are special as they do not require a command, but
-    # all the other options do nothing without a command.
-    if args.version:
-        print(spack.spack_version)
-        return 0
-    elif args.help:
+    # -h and -H are special as they do not require a command, but all
+    # the other options do nothing without a command.
+    if args.help:
         sys.stdout.write(parser.format_help(level=args.help))
         return 0
     elif not args.command:
@@ -699,7 +736,8 @@ def main(argv=None):
         set_working_dir()
 
         # pre-run hooks happen after we know we have a valid working dir
-        spack.hooks.pre_run()
+        import spack.hooks as hooks
+        hooks.pre_run()
 
         # now we can actually execute the command.
         if args.spack_profile or args.sorted_profile:
@@ -732,6 +770,10 @@ def main(argv=None):
             traceback.print_exc()
         return e.code
 
+    finally:
+        if args.debug:
+            spack.util.lock.debug_lock_waits()
+
 
 class SpackCommandError(Exception):
     """Raised when SpackCommand execution fails."""
@@ -18,6 +18,7 @@ from llnl.util.filesystem import mkdirp
 
 import spack.config
 import spack.error
+import spack.fetch_pool
 import spack.url as url
 import spack.fetch_strategy as fs
 from spack.spec import Spec
@@ -195,6 +196,13 @@ def create(path, specs, **kwargs):
         'error': []
     }
 
+    # Download everything at once; the loop below then finds it all in
+    # the fetch cache
+    pool = spack.fetch_pool.FetchPool()
+    for spec in version_specs:
+        pool.add_package(spec.package)
+    pool.fetch()
+
     mirror_cache = spack.caches.MirrorCache(mirror_root)
     try:
         spack.caches.mirror_cache = mirror_cache
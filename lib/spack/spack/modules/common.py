@@ -778,11 +778,12 @@ class BaseModuleFileWriter(object):
             llnl.util.filesystem.mkdirp(module_dir)
 
         # Get the template for the module
+        import jinja2
         template_name = self._get_template()
         try:
             env = tengine.make_environment()
             template = env.get_template(template_name)
-        except tengine.TemplateNotFound:
+        except jinja2.TemplateNotFound:
             # If the template was not found raise an exception with a little
             # more information
             msg = 'template \'{0}\' was not found for \'{1}\''
@@ -40,8 +40,10 @@ import spack.directory_layout
 import spack.error
 import spack.fetch_strategy as fs
 import spack.hooks
+import spack.installer
 import spack.mirror
 import spack.mixins
+import spack.package_metadata
 import spack.repo
 import spack.url
 import spack.util.web
@@ -51,7 +53,7 @@ import spack.binary_distribution as binary_distribution
 from llnl.util.filesystem import mkdirp, touch, chgrp
 from llnl.util.filesystem import working_dir, install_tree, install
 from llnl.util.lang import memoized
-from llnl.util.link_tree import LinkTree
+from llnl.util.link_tree import LinkTree, map_file_pairs
 from llnl.util.tty.log import log_output
 from llnl.util.tty.color import colorize
 from spack.filesystem_view import YamlFilesystemView
@@ -337,8 +339,7 @@ class PackageViewMixin(object):
         example if two packages include the same file, it should only be
         removed when both packages are removed.
         """
-        for src, dst in merge_map.items():
-            view.remove_file(src, dst)
+        map_file_pairs(view.remove_file, merge_map.items())
 
 
 class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
@@ -575,42 +576,15 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
         Note: the returned dict *includes* the package itself.
 
         """
-        deptype = spack.dependency.canonical_deptype(deptype)
-
-        if visited is None:
-            visited = {cls.name: set()}
-
-        for name, conditions in cls.dependencies.items():
-            # check whether this dependency could be of the type asked for
-            types = [dep.type for cond, dep in conditions.items()]
-            types = set.union(*types)
-            if not any(d in types for d in deptype):
-                continue
-
-            # expand virtuals if enabled, otherwise just stop at virtuals
-            if spack.repo.path.is_virtual(name):
-                if expand_virtuals:
-                    providers = spack.repo.path.providers_for(name)
-                    dep_names = [spec.name for spec in providers]
-                else:
-                    visited.setdefault(name, set())
-                    continue
-            else:
-                dep_names = [name]
-
-            # add the dependency names to the visited dict
-            visited.setdefault(cls.name, set()).update(set(dep_names))
+        dependency_types = dict(
+            (name, set.union(*[dep.type for dep in conditions.values()]))
+            for name, conditions in cls.dependencies.items())
 
-            # recursively traverse dependencies
-            for dep_name in dep_names:
-                if dep_name not in visited:
-                    visited.setdefault(dep_name, set())
-                    if transitive:
-                        dep_cls = spack.repo.path.get_pkg_class(dep_name)
-                        dep_cls.possible_dependencies(
-                            transitive, expand_virtuals, deptype, visited)
-
-        return visited
+        # Dependencies are looked up in the repository index, so that
+        # their package files don't need to be imported
+        return spack.package_metadata.possible_dependencies(
+            cls.name, dependency_types, transitive, expand_virtuals,
+            deptype, visited)
 
     # package_dir and module are *class* properties (see PackageMeta),
     # but to make them work on instances we need these defs as well.
@@ -1419,11 +1393,9 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
 
     def _update_explicit_entry_in_db(self, rec, explicit):
         if explicit and not rec.explicit:
-            with spack.store.db.write_transaction():
-                rec = spack.store.db.get_record(self.spec)
-                rec.explicit = True
-                message = '{s.name}@{s.version} : marking the package explicit'
-                tty.msg(message.format(s=self))
+            spack.store.db.update_explicit(self.spec, True)
+            message = '{s.name}@{s.version} : marking the package explicit'
+            tty.msg(message.format(s=self))
 
     def try_install_from_binary_cache(self, explicit):
         tty.msg('Searching for binary cache of %s' % self.name)
@@ -1554,11 +1526,9 @@ class PackageBase(with_metaclass(PackageMeta, PackageViewMixin, object)):
             tty.debug('Installing {0} dependencies'.format(self.name))
             dep_kwargs = kwargs.copy()
             dep_kwargs['explicit'] = False
-            dep_kwargs['install_deps'] = False
-            for dep in self.spec.traverse(order='post', root=False):
-                if spack.config.get('config:install_missing_compilers', False):
-                    Package._install_bootstrap_compiler(dep.package, **kwargs)
-                dep.package.do_install(**dep_kwargs)
+            installer = spack.installer.PackageInstaller(
+                [self.spec], install_roots=False)
+            installer.install(**dep_kwargs)
 
         # Then install the compiler if it is not already installed.
         if install_deps:
@@ -0,0 +1,356 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Directive data of packages that can be read without importing them.
+
+Most questions about a package -- its versions, variants, dependencies,
+what it provides or conflicts with -- are answered by the dictionaries
+that directives fill in on the package class.  Getting at them normally
+means importing the ``package.py`` file, which is slow when many
+packages are involved.
+
+``PackageMetadataIndex`` stores these dictionaries for all the packages
+in a repository.  It is kept in the misc cache by the repository's
+``RepoIndex``, so it is regenerated only for packages whose files have
+changed.  ``PackageMetadata`` wraps the entry of one package and exposes
+it with the same attribute names as a package class.
+"""
+import collections
+import re
+import textwrap
+
+from six import StringIO, string_types, iteritems
+
+import spack.dependency
+import spack.error
+import spack.fetch_strategy
+import spack.repo
+import spack.spec
+import spack.util.spack_json as sjson
+from spack.version import Version
+
+
+#: Read-only description of a variant, with the attributes of
+#: ``spack.variant.Variant`` that don't involve validation.
+VariantMetadata = collections.namedtuple('VariantMetadata', [
+    'name', 'default', 'description', 'values', 'multi', 'allowed_values'])
+
+
+def _is_json(value):
+    """Whether ``value`` can be stored as is in the index."""
+    if value is None or isinstance(value, (bool, int, float, string_types)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_json(v) for v in value)
+    return False
+
+
+def _json_dict(d):
+    """Keep the items of a keyword argument dictionary that are JSON."""
+    return dict((k, v) for k, v in d.items() if _is_json(v))
+
+
+def _spec(string):
+    """Parse a spec written in the index; the empty string is ``Spec()``."""
+    return spack.spec.Spec(string) if string else spack.spec.Spec()
+
+
+def package_to_dict(cls):
+    """Serialize the directive data of a package.
+
+    Only the dictionaries set by directives are read, so neither package
+    instances nor fetch strategies are created.
+
+    Args:
+        cls (type): class of the package
+
+    Returns:
+        (dict): data that ``PackageMetadata`` can be constructed from
+    """
+    versions = dict((str(version), _json_dict(args))
+                    for version, args in cls.versions.items())
+
+    variants = {}
+    for name, variant in cls.variants.items():
+        default = variant.default
+        values = variant.values
+        variants[name] = {
+            'default': default if _is_json(default) else str(default),
+            'description': variant.description,
+            'values': (list(values)
+                       if values is not None and _is_json(values) else None),
+            'multi': variant.multi,
+            'allowed_values': variant.allowed_values,
+        }
+
+    dependencies = {}
+    for name, conditions in cls.dependencies.items():
+        dependencies[name] = [
+            [str(when), str(dep.spec), sorted(dep.type)]
+            for when, dep in conditions.items()]
+
+    return {
+        'name': cls.name,
+        'doc': cls.__doc__,
+        'homepage': getattr(cls, 'homepage', None),
+        'maintainers': list(getattr(cls, 'maintainers', [])),
+        'tags': list(getattr(cls, 'tags', [])),
+        'build_system_class': cls.build_system_class,
+        'phases': list(getattr(cls, 'phases', None) or []),
+        'has_code': cls.has_code,
+        'versions': versions,
+        'variants': variants,
+        'dependencies': dependencies,
+        'provided': [
+            [str(vspec), [str(w) for w in whens]]
+            for vspec, whens in cls.provided.items()],
+        'conflicts': [
+            [str(spec), [[str(when), msg] for when, msg in whens]]
+            for spec, whens in cls.conflicts.items()],
+        'extendees': dict(
+            (name, [str(spec), _json_dict(kwargs)])
+            for name, (spec, kwargs) in cls.extendees.items()),
+        'patches': [
+            [str(when), [p.to_dict() for p in patches]]
+            for when, patches in cls.patches.items()],
+    }
+
+
+def possible_dependencies(name, dependency_types, transitive=True,
+                          expand_virtuals=True, deptype='all', visited=None):
+    """Return dict of possible dependencies of a package.
+
+    This implements ``PackageBase.possible_dependencies()``.  Packages
+    other than the first one are looked up in the repository index, so
+    none of them is imported.
+
+    Args:
+        name (str): name of the package
+        dependency_types (dict): maps the names of the direct
+            dependencies of the package to sets of dependency types
+        transitive (bool): return all transitive dependencies if True,
+            only direct dependencies if False.
+        expand_virtuals (bool): expand virtual dependencies into all
+            possible implementations.
+        deptype (str or tuple): dependency types to consider
+        visited (set): set of names of dependencies visited so far.
+    """
+    deptype = spack.dependency.canonical_deptype(deptype)
+
+    if visited is None:
+        visited = {name: set()}
+
+    for dep_name, types in dependency_types.items():
+        # check whether this dependency could be of the type asked for
+        if not any(d in types for d in deptype):
+            continue
+
+        # expand virtuals if enabled, otherwise just stop at virtuals
+        if spack.repo.path.is_virtual(dep_name):
+            if expand_virtuals:
+                providers = spack.repo.path.providers_for(dep_name)
+                dep_names = [spec.name for spec in providers]
+            else:
+                visited.setdefault(dep_name, set())
+                continue
+        else:
+            dep_names = [dep_name]
+
+        # add the dependency names to the visited dict
+        visited.setdefault(name, set()).update(set(dep_names))
+
+        # recursively traverse dependencies
+        for dep_name in dep_names:
+            if dep_name not in visited:
+                visited.setdefault(dep_name, set())
+                if transitive:
+                    dep = spack.repo.path.get_pkg_metadata(dep_name)
+                    possible_dependencies(
+                        dep_name, dep.dependency_types, transitive,
+                        expand_virtuals, deptype, visited)
+
+    return visited
+
+
+class PackageMetadata(object):
+    """Directive data of a package, without the package class.
+
+    Attributes have the same names and types as on package classes, so
+    this can be used in place of a class to answer questions that don't
+    need to run package code.  Patches are the exception: they are
+    plain dictionaries (see ``Patch.to_dict()``).
+    """
+
+    def __init__(self, data, namespace=None):
+        self.name = data['name']
+        self.namespace = namespace
+        self.__doc__ = data['doc']
+        self.homepage = data['homepage']
+        self.maintainers = data['maintainers']
+        self.tags = data['tags']
+        self.build_system_class = data['build_system_class']
+        self.phases = data['phases']
+        self.has_code = data['has_code']
+
+        self.versions = dict(
+            (Version(v), args) for v, args in data['versions'].items())
+        self.variants = dict(
+            (name, VariantMetadata(name=name, **v))
+            for name, v in data['variants'].items())
+
+        self._data = data
+        self._dependencies = None
+        self._provided = None
+        self._conflicts = None
+
+    @property
+    def fullname(self):
+        if self.namespace:
+            return '{0}.{1}'.format(self.namespace, self.name)
+        return self.name
+
+    def fetch_url(self, version):
+        """Description of the fetch strategy for a known version.
+
+        Fetch strategies depend on package code, so this imports the
+        package.
+        """
+        pkg = spack.repo.get(self.fullname)
+        return str(spack.fetch_strategy.for_package_version(pkg, version))
+
+    @property
+    def dependency_types(self):
+        """Maps names of dependencies to all their possible types."""
+        types = {}
+        for name, conditions in self._data['dependencies'].items():
+            types[name] = set()
+            for _, _, deptypes in conditions:
+                types[name].update(deptypes)
+        return types
+
+    def dependencies_of_type(self, *deptypes):
+        """Get dependencies that can possibly have these deptypes."""
+        return dict(
+            (name, types) for name, types in self.dependency_types.items()
+            if any(d in types for d in deptypes))
+
+    @property
+    def dependencies(self):
+        if self._dependencies is None:
+            self._dependencies = {}
+            for name, conditions in self._data['dependencies'].items():
+                self._dependencies[name] = dict(
+                    (_spec(when), spack.dependency.Dependency(
+                        self, _spec(spec), type=tuple(types)))
+                    for when, spec, types in conditions)
+        return self._dependencies
+
+    @property
+    def provided(self):
+        if self._provided is None:
+            self._provided = dict(
+                (_spec(vspec),
+                 set(_spec(w) for w in whens))
+                for vspec, whens in self._data['provided'])
+        return self._provided
+
+    @property
+    def conflicts(self):
+        if self._conflicts is None:
+            self._conflicts = dict(
+                (spec, [(_spec(when), msg) for when, msg in whens])
+                for spec, whens in self._data['conflicts'])
+        return self._conflicts
+
+    @property
+    def extendees(self):
+        return dict(
+            (name, (_spec(spec), kwargs))
+            for name, (spec, kwargs) in self._data['extendees'].items())
+
+    @property
+    def patches(self):
+        return dict(
+            (_spec(when), patches)
+            for when, patches in self._data['patches'])
+
+    def possible_dependencies(self, transitive=True, expand_virtuals=True,
+                              deptype='all', visited=None):
+        """Same as ``PackageBase.possible_dependencies()``."""
+        return possible_dependencies(
+            self.name, self.dependency_types, transitive, expand_virtuals,
+            deptype, visited)
+
+    def format_doc(self, **kwargs):
+        """Wrap doc string at 72 characters and format nicely"""
+        indent = kwargs.get('indent', 0)
+
+        if not self.__doc__:
+            return ""
+
+        doc = re.sub(r'\s+', ' ', self.__doc__)
+        lines = textwrap.wrap(doc, 72)
+        results = StringIO()
+        for line in lines:
+            results.write((" " * indent) + line + "\n")
+        return results.getvalue()
+
+    def __repr__(self):
+        return 'PackageMetadata(%r)' % self.fullname
+
+
+class PackageMetadataIndex(object):
+    """Directive data of all the packages in a repository.
+
+    The index is stored like this (as JSON)::
+
+        version: <format version>
+        packages:
+            package1: <output of package_to_dict()>
+            package2: ...
+    """
+
+    #: Version of the format of the entries of packages
+    format_version = 2
+
+    def __init__(self, data=None):
+        if data is None:
+            self.packages = {}
+        else:
+            if ('packages' not in data or
+                    data.get('version') != self.format_version):
+                raise PackageMetadataIndexError(
+                    'invalid package metadata index; try `spack clean -m`')
+            self.packages = data['packages']
+
+    @classmethod
+    def from_json(cls, stream):
+        return PackageMetadataIndex(sjson.load(stream))
+
+    def to_json(self, stream):
+        sjson.dump({'version': self.format_version,
+                    'packages': self.packages}, stream)
+
+    def update_package(self, pkg_fullname):
+        """Update the entry of a package, importing its class.
+
+        Args:
+            pkg_fullname (str): namespace-qualified name of the package
+        """
+        cls = spack.repo.path.get_pkg_class(pkg_fullname)
+        self.packages[cls.name] = package_to_dict(cls)
+
+    def __contains__(self, pkg_name):
+        return pkg_name in self.packages
+
+    def __getitem__(self, pkg_name):
+        return self.packages[pkg_name]
+
+    def items(self):
+        return iteritems(self.packages)
+
+
+class PackageMetadataIndexError(spack.error.SpackError):
+    """Raised when a serialized package metadata index can't be read."""
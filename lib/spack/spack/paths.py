@@ -36,6 +36,7 @@ compilers_path        = os.path.join(module_path, "compilers")
 build_systems_path    = os.path.join(module_path, 'build_systems')
 operating_system_path = os.path.join(module_path, 'operating_systems')
 test_path             = os.path.join(module_path, "test")
+benchmarks_path       = os.path.join(module_path, "benchmarks")
 hooks_path            = os.path.join(module_path, "hooks")
 var_path              = os.path.join(prefix, "var", "spack")
 repos_path            = os.path.join(var_path, "repos")
@@ -4,16 +4,58 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 
+import multiprocessing
 import os
 import re
 import platform
+import shutil
+import struct
+import tempfile
 import spack.repo
 import spack.cmd
+import spack.util.elf
+import spack.util.prefix_files
 import llnl.util.lang
-import llnl.util.filesystem as fs
+from llnl.util.multiproc import parmap
 from spack.util.executable import Executable, ProcessError
 import llnl.util.tty as tty
 
+#: Number of bytes read from the beginning of a file to classify it
+_magic_size = 8192
+
+#: Magic numbers of thin Mach-O files, in both byte orders
+_macho_magic = (b'\xfe\xed\xfa\xce', b'\xfe\xed\xfa\xcf',
+                b'\xce\xfa\xed\xfe', b'\xcf\xfa\xed\xfe')
+
+#: Magic number of fat Mach-O files (and of Java class files)
+_macho_fat_magic = b'\xca\xfe\xba\xbe'
+
+#: MIME subtypes of the types of ELF files
+_elf_subtypes = {
+    spack.util.elf.ET_REL: 'x-object',
+    spack.util.elf.ET_EXEC: 'x-executable',
+    spack.util.elf.ET_DYN: 'x-sharedlib',
+    spack.util.elf.ET_CORE: 'x-coredump',
+}
+
+#: Bytes that don't appear in text files, as in ``file``
+_binary_chars = bytes(bytearray(
+    [c for c in range(32) if c not in (7, 8, 9, 10, 11, 12, 13, 27)] +
+    [127]))
+
+#: Printable strings of at least 4 characters, as found by ``strings``
+_strings_re = re.compile(b'[\x20-\x7e\t]{4,}')
+
+#: Bytes that can be part of the printable strings of a file
+_printable_chars = bytes(bytearray(range(0x20, 0x7f))) + b'\t'
+
+#: Size of the blocks in which files are read when relocating them
+_block_size = 2 ** 20
+
+#: Text files are relocated by a pool of processes when there are at
+#: least this many of them
+_process_pool_threshold = 512
+
 
 class InstallRootStringException(spack.error.SpackError):
     """
@@ -84,19 +126,14 @@ def get_patchelf():
 
 def get_existing_elf_rpaths(path_name):
     """
-    Return the RPATHS returned by patchelf --print-rpath path_name
-    as a list of strings.
+    Return the RPATHS of the elf object path_name as a list of strings,
+    like patchelf --print-rpath path_name.
     """
-    patchelf = Executable(get_patchelf())
-    try:
-        output = patchelf('--print-rpath', '%s' %
-                          path_name, output=str, error=str)
-        return output.rstrip('\n').split(':')
-    except ProcessError as e:
-        tty.debug('patchelf --print-rpath produced an error on %s' %
-                  path_name, e)
+    rpaths = spack.util.elf.get_rpaths(path_name)
+    if rpaths is None:
+        tty.debug('%s is not an ELF file' % path_name)
         return []
-    return
+    return rpaths
 
 
 def get_relative_rpaths(path_name, orig_dir, orig_rpaths):
@@ -321,20 +358,78 @@ def modify_object_macholib(cur_path, old_dir, new_dir):
     return
 
 
+def strings(path_name):
+    """
+    Return the words in the printable strings of a file, like the output
+    of strings path_name split on whitespace.
+    """
+    words = set()
+    with open(path_name, 'rb') as f:
+        tail = b''
+        while True:
+            chunk = f.read(_block_size)
+            data = tail + chunk
+
+            # The printable bytes at the end of a block may be the
+            # beginning of a string that goes on in the next one
+            end = len(data.rstrip(_printable_chars)) if chunk else len(data)
+            if len(data) - end > _block_size:
+                # Within a long string, only its last word may go on: cut
+                # it at a whitespace with at least 4 bytes on both sides,
+                # so that both parts are strings of their own
+                end = max(end, data.rfind(b' ', end + 4, len(data) - 4),
+                          data.rfind(b'\t', end + 4, len(data) - 4))
+
+            for string in _strings_re.findall(data, 0, end):
+                words.update(string.decode('ascii').split())
+            tail = data[end:]
+
+            if not chunk:
+                return words
+
+
 def strings_contains_installroot(path_name, root_dir):
     """
     Check if the file contain the install root string.
     """
-    strings = Executable('strings')
-    output = strings('%s' % path_name,
-                     output=str, err=str)
-    return (root_dir in output or spack.paths.prefix in output)
+    # Paths are printable, so they are in the output of strings if and
+    # only if they are in the file
+    return _file_contains(path_name, [
+        path.encode('utf-8') for path in (root_dir, spack.paths.prefix)])
+
+
+def _file_contains(path_name, needles):
+    """Whether a file contains any of the byte strings in ``needles``.
+
+    The file is read in blocks of ``_block_size`` bytes, which overlap
+    by the length of the longest needle minus one.
+    """
+    overlap = max(len(n) for n in needles) - 1
+    with open(path_name, 'rb') as f:
+        tail = b''
+        while True:
+            chunk = f.read(_block_size)
+            if not chunk:
+                return False
+            data = tail + chunk
+            if any(needle in data for needle in needles):
+                return True
+            tail = data[max(0, len(data) - overlap):]
 
 
 def modify_elf_object(path_name, new_rpaths):
     """
     Replace orig_rpath with new_rpath in RPATH of elf object path_name
     """
+    try:
+        spack.util.elf.set_rpath(path_name, new_rpaths)
+        return
+    except spack.util.elf.ElfDynamicSectionUpdateFailed as e:
+        # patchelf can make room for a longer rpath
+        tty.debug(e)
+    except spack.util.elf.ElfParsingError as e:
+        tty.debug(e)
+
     new_joined = ':'.join(new_rpaths)
     patchelf = Executable(get_patchelf())
     try:
@@ -370,26 +465,50 @@ def replace_prefix_bin(path_name, old_dir, new_dir):
     in binary files by replacing with null terminated string
     that is the same length unless the old path is shorter
     """
+    old_dir = old_dir.encode('utf-8')
+    new_dir = new_dir.encode('utf-8')
 
     def replace(match):
         occurances = match.group().count(old_dir)
         padding = (len(old_dir) - len(new_dir)) * occurances
         if padding < 0:
-            return data
+            return match.group()
         return match.group().replace(old_dir, new_dir) + b'\0' * padding
 
+    pat = re.compile(re.escape(old_dir) + b'([^\0]*?)\0')
+    size = os.path.getsize(path_name)
+
+    # Strings end at a NUL, so the file is processed in blocks that end
+    # right after one, and only the blocks that change are written back
     with open(path_name, 'rb+') as f:
-        data = f.read()
-        f.seek(0)
-        original_data_len = len(data)
-        pat = re.compile(re.escape(old_dir) + b'([^\0]*?)\0')
-        ndata = pat.sub(replace, data)
-        new_data_len = len(ndata)
-        if not new_data_len == original_data_len:
-            raise BinaryStringReplacementException(
-                path_name, original_data_len, new_data_len)
-        f.write(data)
-        f.truncate()
+        offset = 0
+        data = b''
+        while True:
+            chunk = f.read(_block_size)
+            data += chunk
+            end = data.rfind(b'\0') + 1 if chunk else len(data)
+            if not end and len(data) > _block_size:
+                # Without a NUL, only the bytes from the first occurrence
+                # of old_dir on may still be part of a match, so the rest
+                # is let go of instead of piling up
+                start = data.find(old_dir)
+                end = len(data) - len(old_dir) + 1 if start < 0 else start
+            block, data = data[:end], data[end:]
+
+            if old_dir in block:
+                new_block = pat.sub(replace, block)
+                if not len(new_block) == len(block):
+                    raise BinaryStringReplacementException(
+                        path_name, size,
+                        size - len(block) + len(new_block))
+                position = f.tell()
+                f.seek(offset)
+                f.write(new_block)
+                f.seek(position)
+            offset += len(block)
+
+            if not chunk:
+                break
 
 
 def relocate_macho_binaries(path_names, old_dir, new_dir, allow_root):
@@ -443,7 +562,8 @@ def relocate_elf_binaries(path_names, old_dir, new_dir, allow_root):
     Account for the case where old_dir is now a placeholder
     """
     placeholder = set_placeholder(old_dir)
-    for path_name in path_names:
+
+    def relocate(path_name):
         orig_rpaths = get_existing_elf_rpaths(path_name)
         if orig_rpaths:
             # one pass to replace placeholder
@@ -452,7 +572,8 @@ def relocate_elf_binaries(path_names, old_dir, new_dir, allow_root):
             # one pass to replace old_dir
             new_rpaths = substitute_rpath(n_rpaths,
                                           old_dir, new_dir)
-            modify_elf_object(path_name, new_rpaths)
+            if new_rpaths != orig_rpaths:
+                modify_elf_object(path_name, new_rpaths)
             if not new_dir == old_dir:
                 if len(new_dir) <= len(old_dir):
                     replace_prefix_bin(path_name, old_dir, new_dir)
@@ -462,14 +583,25 @@ def relocate_elf_binaries(path_names, old_dir, new_dir, allow_root):
                              ' because %s is longer than %s.' %
                              (path_name, new_dir, old_dir))
 
+    # Each thread streams through one file at a time, in blocks of at
+    # most _block_size bytes (see replace_prefix_bin)
+    parmap(relocate, path_names)
+
+
+def relative_link_source(orig_path):
+    """
+    Return the source of the absolute link orig_path, made relative.
+    """
+    old_src = os.readlink(orig_path)
+    return os.path.relpath(old_src, orig_path)
+
 
 def make_link_relative(cur_path_names, orig_path_names):
     """
     Change absolute links to be relative.
     """
     for cur_path, orig_path in zip(cur_path_names, orig_path_names):
-        old_src = os.readlink(orig_path)
-        new_src = os.path.relpath(old_src, orig_path)
+        new_src = relative_link_source(orig_path)
 
         os.unlink(cur_path)
         os.symlink(new_src, cur_path)
@@ -503,7 +635,8 @@ def make_elf_binaries_relative(cur_path_names, orig_path_names, old_dir,
     """
     Replace old RPATHs with paths relative to old_dir in binary files
     """
-    for cur_path, orig_path in zip(cur_path_names, orig_path_names):
+    def make_relative(paths):
+        cur_path, orig_path = paths
         orig_rpaths = get_existing_elf_rpaths(cur_path)
         if orig_rpaths:
             new_rpaths = get_relative_rpaths(orig_path, old_dir,
@@ -513,18 +646,35 @@ def make_elf_binaries_relative(cur_path_names, orig_path_names, old_dir,
                 not file_is_relocatable(cur_path)):
             raise InstallRootStringException(cur_path, old_dir)
 
+    parmap(make_relative, zip(cur_path_names, orig_path_names))
+
 
 def check_files_relocatable(cur_path_names, allow_root):
     """
     Check binary files for the current install root
     """
-    for cur_path in cur_path_names:
-        if (not allow_root and
-                not file_is_relocatable(cur_path)):
+    if allow_root:
+        return
+    relocatable = parmap(file_is_relocatable, cur_path_names)
+    for cur_path, is_relocatable in zip(cur_path_names, relocatable):
+        if not is_relocatable:
             raise InstallRootStringException(
                 cur_path, spack.store.layout.root)
 
 
+def placeholder_link_source(cur_path, cur_dir, old_dir):
+    """
+    Return the source of the absolute link cur_path, relative to cur_dir,
+    under old_dir with the install root replaced by a placeholder.
+    """
+    placeholder = set_placeholder(spack.store.layout.root)
+    placeholder_prefix = old_dir.replace(spack.store.layout.root,
+                                         placeholder)
+    cur_src = os.readlink(cur_path)
+    rel_src = os.path.relpath(cur_src, cur_dir)
+    return os.path.join(placeholder_prefix, rel_src)
+
+
 def make_link_placeholder(cur_path_names, cur_dir, old_dir):
     """
     Replace old install path with placeholder in absolute links.
@@ -532,12 +682,7 @@ def make_link_placeholder(cur_path_names, cur_dir, old_dir):
     Links in ``cur_path_names`` must link to absolute paths.
     """
     for cur_path in cur_path_names:
-        placeholder = set_placeholder(spack.store.layout.root)
-        placeholder_prefix = old_dir.replace(spack.store.layout.root,
-                                             placeholder)
-        cur_src = os.readlink(cur_path)
-        rel_src = os.path.relpath(cur_src, cur_dir)
-        new_src = os.path.join(placeholder_prefix, rel_src)
+        new_src = placeholder_link_source(cur_path, cur_dir, old_dir)
 
         os.unlink(cur_path)
         os.symlink(new_src, cur_path)
@@ -564,14 +709,105 @@ def relocate_text(path_names, oldpath, newpath, oldprefix, newprefix):
     """
     Replace old path with new path in text file path_name
     """
-    fs.filter_file('%s' % oldpath, '%s' % newpath, *path_names,
-                   backup=False, string=True)
     sbangre = '#!/bin/bash %s/bin/sbang' % oldprefix
     sbangnew = '#!/bin/bash %s/bin/sbang' % newprefix
-    fs.filter_file(sbangre, sbangnew, *path_names,
-                   backup=False, string=True)
-    fs.filter_file(oldprefix, newprefix, *path_names,
-                   backup=False, string=True)
+    replacements = tuple(
+        (old, new) for old, new in ((oldpath, newpath),
+                                    (sbangre, sbangnew),
+                                    (oldprefix, newprefix))
+        if old != new)
+    if not replacements:
+        return
+
+    path_names = list(path_names)
+    jobs = min(multiprocessing.cpu_count(), len(path_names))
+    args = [(path_name, replacements) for path_name in path_names]
+    if (len(path_names) < _process_pool_threshold or jobs < 2 or
+            multiprocessing.current_process().daemon):
+        for arg in args:
+            _relocate_text_file(arg)
+        return
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        pool.map(_relocate_text_file, args,
+                 chunksize=max(1, len(args) // (4 * jobs)))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class PrefixReplacer(object):
+    """Replaces several prefixes in a single pass over a file.
+
+    The old prefixes are matched by one regular expression, longest
+    first, so a prefix that contains another one (e.g. the install root
+    and Spack's prefix) is replaced as a whole.  Nothing is replaced in
+    text that was already replaced.
+
+    Args:
+        replacements (tuple): pairs of old and new prefixes
+    """
+
+    def __init__(self, replacements):
+        self.replacements = dict(
+            (old.encode('utf-8'), new.encode('utf-8'))
+            for old, new in replacements)
+        olds = sorted(self.replacements, key=len, reverse=True)
+        self.regex = re.compile(b'|'.join(re.escape(old) for old in olds))
+
+        # A file needs to be rewritten only if it contains one of these
+        self.needles = [old for old in olds
+                        if not any(o != old and o in old for o in olds)]
+
+    def _replace(self, match):
+        return self.replacements[match.group()]
+
+    def needs_relocation(self, path_name):
+        """Whether the file contains any of the old prefixes."""
+        return _file_contains(path_name, self.needles)
+
+    def relocate(self, path_name):
+        """Replace the old prefixes in a file, if it contains any.
+
+        The new content is streamed into a temporary file next to the
+        original one, and then copied back over it.  The file is rewritten
+        in place, so it keeps its owner, group and hard links.
+
+        Returns:
+            (bool): whether the file was changed
+        """
+        if not self.needs_relocation(path_name):
+            return False
+
+        tty.debug('RELOCATE TEXT: {0}'.format(path_name))
+        dirname, basename = os.path.split(path_name)
+        fd, tmp = tempfile.mkstemp(prefix='.' + basename, dir=dirname)
+        try:
+            with os.fdopen(fd, 'w+b') as out:
+                with open(path_name, 'rb') as f:
+                    # Prefixes don't span lines
+                    for line in f:
+                        out.write(self.regex.sub(self._replace, line))
+
+                out.seek(0)
+                with open(path_name, 'r+b') as f:
+                    shutil.copyfileobj(out, f, _block_size)
+                    f.truncate()
+        finally:
+            os.remove(tmp)
+        return True
+
+
+@llnl.util.lang.memoized
+def _prefix_replacer(replacements):
+    return PrefixReplacer(replacements)
+
+
+def _relocate_text_file(args):
+    """Relocate one text file; a function of one argument, for Pool.map"""
+    path_name, replacements = args
+    _prefix_replacer(replacements).relocate(path_name)
 
 
 def substitute_rpath(orig_rpath, topdir, new_root_path):
@@ -607,15 +843,21 @@ def is_relocatable(spec):
         return False
 
     # Explore the installation prefix of the spec
-    for root, dirs, files in os.walk(spec.prefix, topdown=True):
-        dirs[:] = [d for d in dirs if d not in ('.spack', 'man')]
-        abs_files = [os.path.join(root, f) for f in files]
-        if not all(file_is_relocatable(f) for f in abs_files if is_binary(f)):
-            # If any of the file is not relocatable, the entire
-            # package is not relocatable
-            return False
+    binaries = [entry.path for entry in
+                spack.util.prefix_files.files_in(spec.prefix)
+                if entry.mime_type[0] == 'application' and
+                not _in_skipped_dir(entry.path, spec.prefix)]
 
-    return True
+    # If any of the file is not relocatable, the entire
+    # package is not relocatable
+    return all(parmap(file_is_relocatable, binaries))
+
+
+def _in_skipped_dir(path, prefix):
+    """Whether a path of a prefix is in a directory that relocation
+    skips: the metadata directory and man pages."""
+    dirs = os.path.relpath(path, prefix).split(os.sep)[:-1]
+    return '.spack' in dirs or 'man' in dirs
 
 
 def file_is_relocatable(file):
@@ -643,11 +885,12 @@ def file_is_relocatable(file):
     if not os.path.isabs(file):
         raise ValueError('{0} is not an absolute path'.format(file))
 
-    strings = Executable('strings')
-    patchelf = Executable(get_patchelf())
+    # Most files don't mention the install root at all
+    if not strings_contains_installroot(file, spack.store.layout.root):
+        return True
 
     # Remove the RPATHS from the strings in the executable
-    set_of_strings = set(strings(file, output=str).split())
+    set_of_strings = strings(file)
 
     m_type, m_subtype = mime_type(file)
     if m_type == 'application':
@@ -655,8 +898,8 @@ def file_is_relocatable(file):
 
     if platform.system().lower() == 'linux':
         if m_subtype == 'x-executable' or m_subtype == 'x-sharedlib':
-            rpaths = patchelf('--print-rpath', file, output=str).strip()
-            set_of_strings.discard(rpaths.strip())
+            rpaths = get_existing_elf_rpaths(file)
+            set_of_strings.discard(':'.join(rpaths))
     if platform.system().lower() == 'darwin':
         if m_subtype == 'x-mach-binary':
             rpaths, deps, idpath = macho_get_paths(file)
@@ -706,15 +949,69 @@ def is_binary(file):
 def mime_type(file):
     """Returns the mime type and subtype of a file.
 
+    The file is classified from its first bytes, like ``file -b -h
+    --mime-type`` would for the types relocation cares about: ELF and
+    Mach-O binaries, archives, symlinks and text.  Other files are
+    ``application/octet-stream``.
+
     Args:
         file: file to be analyzed
 
     Returns:
         Tuple containing the MIME type and subtype
     """
-    file_cmd = Executable('file')
-    output = file_cmd('-b', '-h', '--mime-type', file, output=str, error=str)
-    tty.debug('[MIME_TYPE] {0} -> {1}'.format(file, output.strip()))
-    if '/' not in output:
-        output += '/'
-    return tuple(output.strip().split('/'))
+    result = _magic_mime_type(file)
+    tty.debug('[MIME_TYPE] {0} -> {1}'.format(file, '/'.join(result)))
+    return result
+
+
+def _magic_mime_type(file):
+    if os.path.islink(file):
+        return 'inode', 'symlink'
+    if os.path.isdir(file):
+        return 'inode', 'directory'
+
+    try:
+        with open(file, 'rb') as f:
+            head = f.read(_magic_size)
+    except (IOError, OSError):
+        return 'inode', 'x-unreadable'
+
+    return mime_type_of_head(head)
+
+
+def mime_type_of_head(head):
+    """Returns the mime type and subtype of a file from its first bytes.
+
+    Args:
+        head (bytes): the beginning of a regular file, of which only the
+            first ``_magic_size`` bytes are used
+
+    Returns:
+        Tuple containing the MIME type and subtype
+    """
+    head = head[:_magic_size]
+    if not head:
+        return 'inode', 'x-empty'
+
+    if head.startswith(spack.util.elf.ELF_MAGIC) and len(head) >= 18:
+        byte_order = '<' if head[5:6] == b'\x01' else '>'
+        e_type, = struct.unpack(byte_order + 'H', head[16:18])
+        return 'application', _elf_subtypes.get(e_type, 'octet-stream')
+
+    if head[:4] in _macho_magic:
+        return 'application', 'x-mach-binary'
+    if head[:4] == _macho_fat_magic and len(head) >= 8:
+        # Java class files start with the same magic number, followed
+        # by a class file version much larger than a number of archs
+        nfat_arch, = struct.unpack('>I', head[4:8])
+        if nfat_arch < 20:
+            return 'application', 'x-mach-binary'
+
+    if head.startswith(b'!<arch>\n'):
+        return 'application', 'x-archive'
+
+    if len(head.translate(None, _binary_chars)) == len(head):
+        return 'text', 'plain'
+
+    return 'application', 'octet-stream'
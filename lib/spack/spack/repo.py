@@ -35,6 +35,7 @@ from llnl.util.filesystem import mkdirp, install
 import spack.config
 import spack.caches
 import spack.error
+import spack.package_metadata
 import spack.patch
 import spack.spec
 import spack.util.spack_json as sjson
@@ -340,6 +341,27 @@ class PatchIndexer(Indexer):
         self.index.update_package(pkg_fullname)
 
 
+class MetadataIndexer(Indexer):
+    """Lifecycle methods for the directive data of packages."""
+    def _create(self):
+        return spack.package_metadata.PackageMetadataIndex()
+
+    def read(self, stream):
+        # An index written by another version of Spack is a cache miss:
+        # leave it to the RepoIndex to rebuild it from scratch
+        try:
+            self.index = spack.package_metadata.PackageMetadataIndex.from_json(
+                stream)
+        except spack.package_metadata.PackageMetadataIndexError:
+            self.index = None
+
+    def update(self, pkg_fullname):
+        self.index.update_package(pkg_fullname)
+
+    def write(self, stream):
+        self.index.to_json(stream)
+
+
 class RepoIndex(object):
     """Container class that manages a set of Indexers for a Repo.
 
@@ -382,10 +404,26 @@ class RepoIndex(object):
             raise KeyError('no such index: %s' % name)
 
         if name not in self.indexes:
-            self._build_all_indexes()
+            if self._needs_update(name):
+                self._build_all_indexes()
+            else:
+                self.indexes[name] = self._build_index(name, indexer)
 
         return self.indexes[name]
 
+    def _cache_filename(self, name):
+        # Filename of the index cache (we assume they're all json)
+        return '{0}/{1}-index.json'.format(name, self.namespace)
+
+    def _needs_update(self, name):
+        """Names of the packages that changed since an index was cached."""
+        index_mtime = spack.caches.misc_cache.mtime(
+            self._cache_filename(name))
+        return [
+            x for x, sinfo in self.checker.items()
+            if sinfo.st_mtime > index_mtime
+        ]
+
     def _build_all_indexes(self):
         """Build all the indexes at once.
 
@@ -402,34 +440,34 @@ class RepoIndex(object):
     def _build_index(self, name, indexer):
         """Determine which packages need an update, and update indexes."""
 
-        # Filename of the provider index cache (we assume they're all json)
-        cache_filename = '{0}/{1}-index.json'.format(name, self.namespace)
+        cache_filename = self._cache_filename(name)
 
         # Compute which packages needs to be updated in the cache
         misc_cache = spack.caches.misc_cache
-        index_mtime = misc_cache.mtime(cache_filename)
-
-        needs_update = [
-            x for x, sinfo in self.checker.items()
-            if sinfo.st_mtime > index_mtime
-        ]
+        needs_update = self._needs_update(name)
 
         index_existed = misc_cache.init_entry(cache_filename)
         if index_existed and not needs_update:
             # If the index exists and doesn't need an update, read it
             with misc_cache.read_transaction(cache_filename) as f:
                 indexer.read(f)
+            if indexer.index is not None:
+                return indexer.index
 
-        else:
-            # Otherwise update it and rewrite the cache file
-            with misc_cache.write_transaction(cache_filename) as (old, new):
-                indexer.read(old) if old else indexer.create()
+        # Otherwise update it and rewrite the cache file
+        with misc_cache.write_transaction(cache_filename) as (old, new):
+            indexer.read(old) if old else indexer.create()
 
-                for pkg_name in needs_update:
-                    namespaced_name = '%s.%s' % (self.namespace, pkg_name)
-                    indexer.update(namespaced_name)
+            if indexer.index is None:
+                # The cached index couldn't be read: index every package
+                indexer.create()
+                needs_update = list(self.checker)
 
-                indexer.write(new)
+            for pkg_name in needs_update:
+                namespaced_name = '%s.%s' % (self.namespace, pkg_name)
+                indexer.update(namespaced_name)
+
+            indexer.write(new)
 
         return indexer.index
 
@@ -656,6 +694,10 @@ class RepoPath(object):
         """Find a class for the spec's package and return the class object."""
         return self.repo_for_pkg(pkg_name).get_pkg_class(pkg_name)
 
+    def get_pkg_metadata(self, pkg_name):
+        """Get the directive data of a package without importing it."""
+        return self.repo_for_pkg(pkg_name).get_pkg_metadata(pkg_name)
+
     @autospec
     def dump_provenance(self, spec, path):
         """Dump provenance information for a spec to a particular path.
@@ -744,6 +786,7 @@ class Repo(object):
         self._modules = {}
         self._classes = {}
         self._instances = {}
+        self._metadata = {}
 
         # Maps that goes from package name to corresponding file stat
         self._fast_package_checker = None
@@ -946,6 +989,7 @@ class Repo(object):
             self._repo_index.add_indexer('providers', ProviderIndexer())
             self._repo_index.add_indexer('tags', TagIndexer())
             self._repo_index.add_indexer('patches', PatchIndexer())
+            self._repo_index.add_indexer('metadata', MetadataIndexer())
         return self._repo_index
 
     @property
@@ -963,6 +1007,11 @@ class Repo(object):
         """Index of patches and packages they're defined on."""
         return self.index['patches']
 
+    @property
+    def metadata_index(self):
+        """Index of the directive data of all packages."""
+        return self.index['metadata']
+
     @autospec
     def providers_for(self, vpkg_spec):
         providers = self.provider_index.providers_for(vpkg_spec)
@@ -1100,6 +1149,33 @@ class Repo(object):
 
         return cls
 
+    def get_pkg_metadata(self, pkg_name):
+        """Get the directive data of a package without importing it.
+
+        Returns:
+            (spack.package_metadata.PackageMetadata): attributes of the
+                package class that are set by directives
+        """
+        namespace, _, pkg_name = pkg_name.rpartition('.')
+        if namespace and (namespace != self.namespace):
+            raise InvalidNamespaceError('Invalid namespace for %s repo: %s'
+                                        % (self.namespace, namespace))
+
+        if pkg_name not in self._metadata:
+            if not self.exists(pkg_name):
+                raise UnknownPackageError(pkg_name, self)
+            index = self.metadata_index
+            if pkg_name in index:
+                data = index[pkg_name]
+            else:
+                # The index may lag behind files whose mtime went back
+                data = spack.package_metadata.package_to_dict(
+                    self.get_pkg_class(pkg_name))
+            self._metadata[pkg_name] = spack.package_metadata.PackageMetadata(
+                data, self.namespace)
+
+        return self._metadata[pkg_name]
+
     def __str__(self):
         return "[Repo '%s' at '%s']" % (self.namespace, self.root)
 
@@ -51,14 +51,18 @@ properties = {
             },
             'source_cache': {'type': 'string'},
             'misc_cache': {'type': 'string'},
+            'concretization_cache': {'type': 'boolean'},
             'verify_ssl': {'type': 'boolean'},
             'install_missing_compilers': {'type': 'boolean'},
             'debug': {'type': 'boolean'},
             'checksum': {'type': 'boolean'},
             'locks': {'type': 'boolean'},
+            'blocking_locks': {'type': 'boolean'},
             'dirty': {'type': 'boolean'},
             'build_language': {'type': 'string'},
             'build_jobs': {'type': 'integer', 'minimum': 1},
+            'concurrent_builds': {'type': 'integer', 'minimum': 1},
+            'fetch_jobs': {'type': 'integer', 'minimum': 1},
             'ccache': {'type': 'boolean'},
             'db_lock_timeout': {'type': 'integer', 'minimum': 1},
             'package_lock_timeout': {
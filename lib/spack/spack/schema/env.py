@@ -101,6 +101,9 @@ schema = {
                                                 'type': 'string',
                                                 'pattern': '(roots|all)',
                                             },
+                                            'atomic': {
+                                                'type': 'boolean'
+                                            },
                                             'select': {
                                                 'type': 'array',
                                                 'items': {
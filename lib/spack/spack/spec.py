@@ -91,7 +91,7 @@ from operator import attrgetter
 
 from llnl.util.filesystem import find_headers, find_libraries, is_exe
 from llnl.util.lang import key_ordering, HashableMap, ObjectWrapper, dedupe
-from llnl.util.lang import check_kwargs, memoized
+from llnl.util.lang import check_kwargs, memoized, LRUCache
 from llnl.util.tty.color import cwrite, colorize, cescape, get_color_when
 import llnl.util.tty as tty
 
@@ -188,6 +188,18 @@ _any_version = VersionList([':'])
 #: Max integer helps avoid passing too large a value to cyaml.
 maxint = 2 ** (ctypes.sizeof(ctypes.c_int) * 8 - 1) - 1
 
+#: Abstract specs parsed from strings only to be compared against, e.g.
+#: the ``'+mpi'`` in ``'+mpi' in spec``.  Package code and concretization
+#: evaluate the same few strings over and over, so each is parsed once.
+_interned_specs = LRUCache(maxsize=4096)
+
+#: Compiler specs parsed from strings by ``CompilerSpec()``
+_interned_compiler_specs = LRUCache(maxsize=1024)
+
+#: If True, ``_spec_hash()`` also hashes the YAML text of every node and
+#: raises ``SpecHashMismatchError`` if the fast encoder disagrees with it.
+verify_spec_hashes = False
+
 default_format = '{name}{@version}'
 default_format += '{%compiler.name}{@compiler.version}{compiler_flags}'
 default_format += '{variants}{arch=architecture}'
@@ -499,9 +511,9 @@ class CompilerSpec(object):
             # If there is one argument, it's either another CompilerSpec
             # to copy or a string to parse
             if isinstance(arg, six.string_types):
-                c = SpecParser().parse_compiler(arg)
+                c = _interned_compiler_spec(arg)
                 self.name = c.name
-                self.versions = c.versions
+                self.versions = c.versions.copy()
 
             elif isinstance(arg, CompilerSpec):
                 self.name = arg.name
@@ -528,6 +540,9 @@ class CompilerSpec(object):
     def _autospec(self, compiler_spec_like):
         if isinstance(compiler_spec_like, CompilerSpec):
             return compiler_spec_like
+        if isinstance(compiler_spec_like, six.string_types):
+            # satisfies() and constrain() don't modify their argument
+            return _interned_compiler_spec(compiler_spec_like)
         return CompilerSpec(compiler_spec_like)
 
     def satisfies(self, other, strict=False):
@@ -591,6 +606,33 @@ class CompilerSpec(object):
         return str(self)
 
 
+def _interned_compiler_spec(string):
+    """Parse a compiler spec, sharing the result with earlier callers
+    that parsed the same string.  The result must not be modified."""
+    compiler_spec = _interned_compiler_specs.get(string)
+    if compiler_spec is None:
+        compiler_spec = SpecParser().parse_compiler(string)
+        _interned_compiler_specs[string] = compiler_spec
+    return compiler_spec
+
+
+def _interned_spec(string):
+    """Parse an abstract spec, sharing the result with earlier callers
+    that parsed the same string.  The result must not be modified.
+
+    Strings that refer to installed specs by hash or to spec files are
+    parsed every time, since what they mean can change.
+    """
+    if '/' in string or '.yaml' in string:
+        return Spec(string)
+
+    spec = _interned_specs.get(string)
+    if spec is None:
+        spec = Spec(string)
+        _interned_specs[string] = spec
+    return spec
+
+
 @key_ordering
 class DependencySpec(object):
     """DependencySpecs connect two nodes in the DAG, and contain deptypes.
@@ -1362,9 +1404,13 @@ class Spec(object):
         """
         # TODO: curently we strip build dependencies by default.  Rethink
         # this when we move to using package hashing on all specs.
-        yaml_text = syaml.dump(self.to_node_dict(hash=hash),
-                               default_flow_style=True, width=maxint)
-        sha = hashlib.sha1(yaml_text.encode('utf-8'))
+        node = self.to_node_dict(hash=hash)
+        sha = flow_sha1(node)
+        if sha is None or verify_spec_hashes:
+            yaml_sha = yaml_sha1(node)
+            if sha is not None and sha.digest() != yaml_sha.digest():
+                raise SpecHashMismatchError(self, hash)
+            sha = yaml_sha
         b32_hash = base64.b32encode(sha.digest()).lower()
 
         if sys.version_info[0] >= 3:
@@ -2130,6 +2176,10 @@ class Spec(object):
         Concretizing ensures that it is self-consistent and that it's
         consistent with requirements of its packages. See flatten() and
         normalize() for more details on this.
+
+        The result is kept in the concretization cache (see
+        ``spack.concretize.cache_key()``), and reused when the same spec
+        is concretized again with unchanged packages and configuration.
         """
         if not self.name:
             raise SpecError("Attempting to concretize anonymous spec")
@@ -2137,11 +2187,19 @@ class Spec(object):
         if self._concrete:
             return
 
+        # Reuse the result of concretizing the same spec with the same
+        # packages and configuration
+        import spack.concretize
+        cache_key = spack.concretize.cache_key(self, tests)
+        cached = spack.concretize.read_cached_spec(cache_key)
+        if cached is not None:
+            self._dup(cached)
+            return
+
         changed = True
         force = False
 
         user_spec_deps = self.flat_dependencies(copy=False)
-        import spack.concretize
         concretizer = spack.concretize.Concretizer(self.copy())
         while changed:
             changes = (self.normalize(force, tests=tests,
@@ -2261,6 +2319,8 @@ class Spec(object):
         # there are declared inconsistencies)
         self.architecture.target.optimization_flags(self.compiler)
 
+        spack.concretize.cache_spec(cache_key, self)
+
     def _mark_concrete(self, value=True):
         """Mark this spec and its dependencies as concrete.
 
@@ -2791,6 +2851,13 @@ class Spec(object):
             return spec_like
         return Spec(spec_like)
 
+    def _autospec_readonly(self, spec_like):
+        """Like ``_autospec()``, for callers that won't modify the
+        result, so that strings can be parsed once and then shared."""
+        if isinstance(spec_like, six.string_types):
+            return _interned_spec(spec_like)
+        return self._autospec(spec_like)
+
     def satisfies(self, other, deps=True, strict=False, strict_deps=False):
         """Determine if this spec satisfies all constraints of another.
 
@@ -2804,7 +2871,7 @@ class Spec(object):
           * `strict`: strict means that we *must* meet all the
             constraints specified on other.
         """
-        other = self._autospec(other)
+        other = self._autospec_readonly(other)
 
         # The only way to satisfy a concrete spec is to match its hash exactly.
         if other.concrete:
@@ -2882,7 +2949,7 @@ class Spec(object):
         """
         This checks constraints on common dependencies against each other.
         """
-        other = self._autospec(other)
+        other = self._autospec_readonly(other)
 
         # If there are no constraints to satisfy, we're done.
         if not other._dependencies:
@@ -3168,7 +3235,7 @@ class Spec(object):
         entire DAG -- we limit them to the root.
 
         """
-        spec = self._autospec(spec)
+        spec = self._autospec_readonly(spec)
 
         # if anonymous or same name, we only have to look at the root
         if not spec.name or spec.name == self.name:
@@ -3253,11 +3320,24 @@ class Spec(object):
           1. A tuple describing this node in the DAG.
           2. The hash of each of this node's dependencies' cmp_keys.
         """
+        return self._cmp_key_helper({})
+
+    def _cmp_key_helper(self, dep_hashes):
+        """Compute ``_cmp_key()``, reusing the hashes of the nodes in
+        ``dep_hashes`` (keyed by id) so that the key of a DAG is computed
+        in one pass even where sub-DAGs are shared."""
         if self._cmp_key_cache:
             return self._cmp_key_cache
 
+        def dep_hash(spec):
+            h = dep_hashes.get(id(spec))
+            if h is None:
+                h = hash(spec._cmp_key_helper(dep_hashes))
+                dep_hashes[id(spec)] = h
+            return h
+
         dep_tuple = tuple(
-            (d.spec.name, hash(d.spec), tuple(sorted(d.deptypes)))
+            (d.spec.name, dep_hash(d.spec), tuple(sorted(d.deptypes)))
             for name, d in sorted(self._dependencies.items()))
 
         key = (self._cmp_node(), dep_tuple)
@@ -4284,6 +4364,29 @@ def save_dependency_spec_yamls(
             fd.write(dep_spec.to_yaml(hash=ht.build_hash))
 
 
+def flow_sha1(node):
+    """SHA-1 of the flow style YAML text of a node dict, computed without
+    the YAML emitter.
+
+    Returns:
+        The ``hashlib`` object, or ``None`` if ``node`` holds data that
+        only ``yaml_sha1()`` can encode exactly.
+    """
+    sha = hashlib.sha1()
+    try:
+        for chunk in syaml.iter_flow(node):
+            sha.update(chunk.encode('utf-8'))
+    except syaml.UnsupportedFlowData:
+        return None
+    return sha
+
+
+def yaml_sha1(node):
+    """SHA-1 of the flow style YAML text of a node dict."""
+    yaml_text = syaml.dump(node, default_flow_style=True, width=maxint)
+    return hashlib.sha1(yaml_text.encode('utf-8'))
+
+
 def base32_prefix_bits(hash_string, bits):
     """Return the first <bits> bits of a base32 string as an integer."""
     if bits > len(hash_string) * 5:
@@ -4426,6 +4529,13 @@ class InvalidHashError(SpecError):
             % (hash, spec))
 
 
+class SpecHashMismatchError(SpecError):
+    def __init__(self, spec, hash):
+        super(SpecHashMismatchError, self).__init__(
+            "Fast and YAML encodings of %s differ for %s" % (hash.attr, spec),
+            "Please report this as a bug, along with the spec.")
+
+
 class NoSuchHashError(SpecError):
     def __init__(self, hash):
         super(NoSuchHashError, self).__init__(
@@ -138,6 +138,24 @@ def get_stage_root():
     return _stage_root
 
 
+def mirror_urls(mirror_path):
+    """URLs of an archive in all the configured mirrors.
+
+    Args:
+        mirror_path (str): path of the archive relative to a mirror root
+    """
+    mirrors = spack.config.get('mirrors')
+
+    # Join URLs of mirror roots with mirror paths. Because
+    # urljoin() will strip everything past the final '/' in
+    # the root, so we add a '/' if it is not present.
+    mir_roots = [
+        sup.substitute_path_variables(root) if root.endswith(os.sep)
+        else sup.substitute_path_variables(root) + os.sep
+        for root in mirrors.values()]
+    return [urljoin(root, mirror_path) for root in mir_roots]
+
+
 class Stage(object):
     """Manages a temporary stage directory for building.
 
@@ -372,16 +390,7 @@ class Stage(object):
         # TODO: CompositeFetchStrategy here.
         self.skip_checksum_for_mirror = True
         if self.mirror_path:
-            mirrors = spack.config.get('mirrors')
-
-            # Join URLs of mirror roots with mirror paths. Because
-            # urljoin() will strip everything past the final '/' in
-            # the root, so we add a '/' if it is not present.
-            mir_roots = [
-                sup.substitute_path_variables(root) if root.endswith(os.sep)
-                else sup.substitute_path_variables(root) + os.sep
-                for root in mirrors.values()]
-            urls = [urljoin(root, self.mirror_path) for root in mir_roots]
+            urls = mirror_urls(self.mirror_path)
 
             # If this archive is normally fetched from a tarball URL,
             # then use the same digest.  `spack mirror` ensures that
@@ -5,7 +5,6 @@
 import itertools
 import textwrap
 
-import jinja2
 import llnl.util.lang
 import six
 
@@ -13,9 +12,6 @@ import spack.config
 from spack.util.path import canonicalize_path
 
 
-TemplateNotFound = jinja2.TemplateNotFound
-
-
 class ContextMeta(type):
     """Meta class for Context. It helps reducing the boilerplate in
     client code.
@@ -70,6 +66,10 @@ class Context(six.with_metaclass(ContextMeta, object)):
 
 def make_environment(dirs=None):
     """Returns an configured environment for template rendering."""
+    # jinja2 is imported lazily as it is heavy to import
+    # and increases the start-up time
+    import jinja2
+
     if dirs is None:
         # Default directories where to search for templates
         builtins = spack.config.get('config:template_dirs')
@@ -0,0 +1,110 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import json
+import os
+
+import pytest
+
+import spack.benchmarks
+import spack.config
+import spack.repo
+import spack.store
+
+
+def results(**timings):
+    return {
+        'format': spack.benchmarks.results_format,
+        'repo': 'mock',
+        'benchmarks': dict(
+            (name, {'min': t, 'median': t, 'mean': t, 'times': [t]})
+            for name, t in timings.items()),
+    }
+
+
+def test_all_benchmarks_have_descriptions():
+    benchmarks = spack.benchmarks.all_benchmarks()
+    names = [b.name for b in benchmarks]
+    assert names == sorted(names)
+    assert 'spec.parse' in names
+    assert 'database.query' in names
+    assert all(b.description for b in benchmarks)
+
+
+def test_select_benchmarks():
+    selected = spack.benchmarks.select_benchmarks([r'^spec\.', 'repo'])
+    names = set(b.name for b in selected)
+    assert 'spec.concretize' in names
+    assert 'spec.concretize_stack' in names
+    assert 'repo.index' in names
+    assert not any(n.startswith('database') for n in names)
+
+    with pytest.raises(spack.benchmarks.BenchmarkError):
+        spack.benchmarks.select_benchmarks(['no-such-benchmark'])
+
+
+def test_workspace_restores_state():
+    config, repo_path, store = (
+        spack.config.config, spack.repo.path, spack.store.store)
+
+    with spack.benchmarks.Workspace('mock') as workspace:
+        assert os.path.isdir(workspace.root)
+        assert spack.store.store.root == workspace.path('store')
+        assert spack.repo.path.exists('mpileaks')
+
+    assert not os.path.exists(workspace.root)
+    assert spack.config.config is config
+    assert spack.repo.path is repo_path
+    assert spack.store.store is store
+
+
+def test_every_repository_has_stacks():
+    assert sorted(spack.benchmarks.stack_strings) == sorted(
+        spack.benchmarks.repo_paths)
+
+
+def test_run_and_save_results(tmpdir):
+    benchmarks = spack.benchmarks.select_benchmarks([r'^spec\.parse$'])
+    data = spack.benchmarks.run_benchmarks(benchmarks, repeat=2)
+
+    timing = data['benchmarks']['spec.parse']
+    assert len(timing['times']) == 2
+    assert timing['min'] == min(timing['times'])
+
+    path = str(tmpdir.join('results.json'))
+    spack.benchmarks.write_results(data, path)
+    assert spack.benchmarks.read_results(path) == json.loads(
+        json.dumps(data))
+
+
+def test_read_results_in_unknown_format(tmpdir):
+    path = tmpdir.join('results.json')
+    path.write('{"format": 0, "benchmarks": {}}')
+    with pytest.raises(spack.benchmarks.BenchmarkError):
+        spack.benchmarks.read_results(str(path))
+
+    path.write('not json')
+    with pytest.raises(spack.benchmarks.BenchmarkError):
+        spack.benchmarks.read_results(str(path))
+
+
+def test_compare():
+    baseline = results(a=1.0, b=1.0, c=1.0, removed=1.0)
+    current = results(a=1.05, b=1.5, c=0.5, added=1.0)
+
+    comparisons = spack.benchmarks.compare(baseline, current, threshold=0.1)
+    assert [c.name for c in comparisons] == ['a', 'b', 'c']
+    assert [c.regression for c in comparisons] == [False, True, False]
+    assert comparisons[1].ratio == 1.5
+
+    comparisons = spack.benchmarks.compare(baseline, current, threshold=0.6)
+    assert not any(c.regression for c in comparisons)
+
+
+def test_compare_different_repos():
+    other = results(a=1.0)
+    other['repo'] = 'builtin'
+    with pytest.raises(spack.benchmarks.BenchmarkError):
+        spack.benchmarks.compare(results(a=1.0), other)
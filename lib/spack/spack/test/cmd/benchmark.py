@@ -0,0 +1,56 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import spack.benchmarks
+from spack.main import SpackCommand
+
+benchmark = SpackCommand('benchmark')
+
+
+def write(tmpdir, name, **timings):
+    path = str(tmpdir.join(name))
+    spack.benchmarks.write_results({
+        'format': spack.benchmarks.results_format,
+        'repo': 'mock',
+        'benchmarks': dict(
+            (n, {'min': t, 'median': t, 'mean': t, 'times': [t]})
+            for n, t in timings.items()),
+    }, path)
+    return path
+
+
+def test_benchmark_list():
+    out = benchmark('list')
+    for name in ('spec.parse', 'database.read', 'view.add_specs'):
+        assert name in out
+
+    out = benchmark('list', 'database')
+    assert 'database.write' in out
+    assert 'spec.parse' not in out
+
+
+def test_benchmark_run(tmpdir):
+    path = str(tmpdir.join('results.json'))
+    out = benchmark('run', '-n', '1', '-o', path, 'spec.dag_hash')
+    assert 'spec.dag_hash' in out
+
+    results = spack.benchmarks.read_results(path)
+    assert list(results['benchmarks']) == ['spec.dag_hash']
+
+
+def test_benchmark_compare(tmpdir):
+    baseline = write(tmpdir, 'baseline.json', a=1.0, b=1.0)
+    faster = write(tmpdir, 'faster.json', a=0.5, b=1.05)
+    slower = write(tmpdir, 'slower.json', a=1.0, b=2.0)
+
+    out = benchmark('compare', baseline, faster)
+    assert benchmark.returncode == 0
+    assert '0.50' in out
+
+    benchmark('compare', baseline, slower, fail_on_error=False)
+    assert benchmark.returncode == 1
+
+    benchmark('compare', '-t', '1.5', baseline, slower)
+    assert benchmark.returncode == 0
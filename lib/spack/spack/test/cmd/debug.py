@@ -41,3 +41,10 @@ def test_create_db_tarball(tmpdir, database):
 
             spec_suffix = '%s/.spack/spec.yaml' % spec.dag_hash()
             assert spec_suffix in contents
+
+
+def test_spec_hashes(mock_packages, config):
+    # The command fails if the encoders disagree
+    for args in (['mpileaks'], []):
+        out = debug('spec-hashes', '-r', '1', *args)
+        assert 'speedup' in out
@@ -10,11 +10,14 @@ import pytest
 
 import llnl.util.filesystem as fs
 
+import spack.config
 import spack.hash_types as ht
 import spack.modules
+import spack.package_prefs
 import spack.environment as ev
 
 from spack.cmd.env import _env_create
+from spack.filesystem_view import YamlFilesystemView
 from spack.spec import Spec
 from spack.main import SpackCommand
 
@@ -117,6 +120,52 @@ def test_concretize():
     assert any(x.name == 'mpileaks' for x in env_specs)
 
 
+def test_concretize_in_parallel(monkeypatch):
+    monkeypatch.setattr(ev.multiprocessing, 'cpu_count', lambda: 4)
+    e = ev.create('test')
+    for name in ('mpileaks', 'libelf', 'dyninst', 'callpath'):
+        e.add(name)
+    concretized = e.concretize()
+
+    assert [str(s) for s, _ in concretized] == [
+        'mpileaks', 'libelf', 'dyninst', 'callpath']
+    for user_spec, concrete in concretized:
+        assert concrete.concrete
+        assert concrete.build_hash() == user_spec.concretized().build_hash()
+    assert e.concretized_order == [c.build_hash() for _, c in concretized]
+
+
+def test_concretize_cache(concretization_cache, monkeypatch):
+    e = ev.create('test')
+    e.add('mpileaks')
+    e.add('libelf')
+    e.concretize()
+    e.write()
+    hashes = e.concretized_order
+
+    def fail(constraints):
+        raise AssertionError('concretized %s again' % constraints)
+
+    # unchanged specs are read from the concretization cache when
+    # re-concretizing
+    monkeypatch.setattr(ev, '_concretize_from_constraints', fail)
+    e = ev.read('test')
+    e.concretize(force=True)
+    assert e.concretized_order == hashes
+    monkeypatch.undo()
+
+    # but concretized again when the configuration changes
+    with spack.config.override('packages:libelf', {'version': ['0.8.12']}):
+        spack.package_prefs.PackagePrefs.clear_caches()
+        e = ev.read('test')
+        e.concretize(force=True)
+    spack.package_prefs.PackagePrefs.clear_caches()
+
+    for h in e.concretized_order:
+        assert h not in hashes
+        assert e.specs_by_hash[h]['libelf'].satisfies('@0.8.12')
+
+
 def test_env_install_all(install_mockery, mock_fetch):
     e = ev.create('test')
     e.add('cmake-client')
@@ -940,6 +989,120 @@ def test_env_updates_view_force_remove(
     check_viewdir_removal(view_dir)
 
 
+def test_env_view_only_updates_changes(
+        tmpdir, mock_stage, mock_fetch, install_mockery, monkeypatch):
+    view_dir = tmpdir.mkdir('view')
+    env('create', '--with-view=%s' % view_dir, 'test')
+    with ev.read('test'):
+        install('--fake', 'mpileaks')
+    check_mpileaks_and_deps_in_view(view_dir)
+
+    added = []
+    original_add_specs = YamlFilesystemView.add_specs
+
+    def add_specs(self, *specs, **kwargs):
+        added.extend(specs)
+        return original_add_specs(self, *specs, **kwargs)
+    monkeypatch.setattr(YamlFilesystemView, 'add_specs', add_specs)
+
+    # Nothing changed, so nothing is linked again
+    test = ev.read('test')
+    test.regenerate_views()
+    assert not added
+
+    with ev.read('test'):
+        install('--fake', 'libelf@0.8.12')
+    assert [s.name for s in added] == ['libelf']
+    check_mpileaks_and_deps_in_view(view_dir)
+
+
+def test_env_atomic_view(tmpdir, mock_stage, mock_fetch, install_mockery):
+    view_link = tmpdir.join('view')
+    with tmpdir.as_cwd():
+        with open('spack.yaml', 'w') as f:
+            f.write("""\
+env:
+  view:
+    default:
+      root: %s
+      atomic: True
+""" % view_link)
+        env('create', 'test', './spack.yaml')
+
+    with ev.read('test'):
+        install('--fake', 'libdwarf')
+    assert os.path.islink(str(view_link))
+    first = os.path.realpath(str(view_link))
+    assert os.path.dirname(first) == str(tmpdir.join('._view'))
+    assert os.path.exists(str(view_link.join('.spack', 'libdwarf')))
+
+    with ev.read('test'):
+        install('--fake', 'mpileaks')
+    second = os.path.realpath(str(view_link))
+    assert second != first
+    assert not os.path.exists(first)
+    check_mpileaks_and_deps_in_view(view_link)
+
+    with ev.read('test'):
+        uninstall('-ay')
+    assert os.path.islink(str(view_link))
+    check_viewdir_removal(view_link)
+    assert os.listdir(str(tmpdir.join('._view'))) == [
+        os.path.basename(os.path.realpath(str(view_link)))]
+
+
+def test_env_atomic_view_with_linked_parent(
+        tmpdir, mock_stage, mock_fetch, install_mockery, capfd):
+    real = tmpdir.mkdir('real')
+    tmpdir.join('link').mksymlinkto(real)
+    view_link = tmpdir.join('link', 'view')
+    with tmpdir.as_cwd():
+        with open('spack.yaml', 'w') as f:
+            f.write("""\
+env:
+  view:
+    default:
+      root: %s
+      atomic: True
+""" % view_link)
+        env('create', 'test', './spack.yaml')
+
+    with ev.read('test'):
+        install('--fake', 'libdwarf')
+    first = os.path.realpath(str(view_link))
+    ino = os.stat(first).st_ino
+
+    # An update without changes leaves the view alone
+    capfd.readouterr()
+    ev.read('test').regenerate_views()
+    assert 'Updating view' not in capfd.readouterr()[0]
+    assert os.path.realpath(str(view_link)) == first
+    assert os.stat(first).st_ino == ino
+    assert os.path.exists(str(view_link.join('.spack', 'libdwarf')))
+
+    # Older versions are removed
+    with ev.read('test'):
+        install('--fake', 'mpileaks')
+    assert not os.path.exists(first)
+    assert os.listdir(str(real.join('._view'))) == [
+        os.path.basename(os.path.realpath(str(view_link)))]
+
+
+def test_env_atomic_view_over_directory(tmpdir, install_mockery):
+    view_dir = tmpdir.mkdir('view')
+    with tmpdir.as_cwd():
+        with open('spack.yaml', 'w') as f:
+            f.write("""\
+env:
+  view:
+    default:
+      root: %s
+      atomic: True
+""" % view_dir)
+        with pytest.raises(ev.SpackEnvironmentError):
+            env('create', 'test', './spack.yaml')
+
+
 def test_env_activate_view_fails(
         tmpdir, mock_stage, mock_fetch, install_mockery, env_deactivate):
     """Sanity check on env activate to make sure it requires shell support"""
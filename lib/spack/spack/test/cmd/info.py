@@ -72,3 +72,12 @@ def test_info_fields(pkg_query, parser, info_lines):
     for text in expected_fields:
         match = [x for x in info_lines if text in x]
         assert match
+
+
+@pytest.mark.usefixtures('mock_print')
+def test_info_untagged_package(parser, info_lines):
+    args = parser.parse_args(['zlib'])
+    spack.cmd.info.info(parser, args)
+
+    tags = info_lines.index(next(x for x in info_lines if 'Tags:' in x))
+    assert info_lines[tags + 1] == '    None'
@@ -18,6 +18,7 @@ import spack.config
 import spack.hash_types as ht
 import spack.package
 import spack.cmd.install
+import spack.util.prefix_files
 from spack.error import SpackError
 from spack.spec import Spec
 from spack.main import SpackCommand
@@ -27,6 +28,13 @@ from six.moves.urllib.error import HTTPError, URLError
 install = SpackCommand('install')
 
 
+def _hash_prefix(prefix):
+    """Hash of the files of a prefix, except the manifest that records
+    when they were written."""
+    manifest = spack.util.prefix_files.manifest_path(prefix)
+    return fs.hash_directory(prefix, ignore=lambda path: path == manifest)
+
+
 @pytest.fixture(scope='module')
 def parser():
     """Returns the parser for the module command"""
@@ -195,21 +203,21 @@ def test_install_overwrite(
     install('libdwarf')
 
     assert os.path.exists(spec.prefix)
-    expected_md5 = fs.hash_directory(spec.prefix)
+    expected_md5 = _hash_prefix(spec.prefix)
 
     # Modify the first installation to be sure the content is not the same
     # as the one after we reinstalled
     with open(os.path.join(spec.prefix, 'only_in_old'), 'w') as f:
         f.write('This content is here to differentiate installations.')
 
-    bad_md5 = fs.hash_directory(spec.prefix)
+    bad_md5 = _hash_prefix(spec.prefix)
 
     assert bad_md5 != expected_md5
 
     install('--overwrite', '-y', 'libdwarf')
     assert os.path.exists(spec.prefix)
-    assert fs.hash_directory(spec.prefix) == expected_md5
-    assert fs.hash_directory(spec.prefix) != bad_md5
+    assert _hash_prefix(spec.prefix) == expected_md5
+    assert _hash_prefix(spec.prefix) != bad_md5
 
 
 def test_install_overwrite_not_installed(
@@ -240,10 +248,10 @@ def test_install_overwrite_multiple(
     install('cmake')
 
     assert os.path.exists(libdwarf.prefix)
-    expected_libdwarf_md5 = fs.hash_directory(libdwarf.prefix)
+    expected_libdwarf_md5 = _hash_prefix(libdwarf.prefix)
 
     assert os.path.exists(cmake.prefix)
-    expected_cmake_md5 = fs.hash_directory(cmake.prefix)
+    expected_cmake_md5 = _hash_prefix(cmake.prefix)
 
     # Modify the first installation to be sure the content is not the same
     # as the one after we reinstalled
@@ -252,8 +260,8 @@ def test_install_overwrite_multiple(
     with open(os.path.join(cmake.prefix, 'only_in_old'), 'w') as f:
         f.write('This content is here to differentiate installations.')
 
-    bad_libdwarf_md5 = fs.hash_directory(libdwarf.prefix)
-    bad_cmake_md5 = fs.hash_directory(cmake.prefix)
+    bad_libdwarf_md5 = _hash_prefix(libdwarf.prefix)
+    bad_cmake_md5 = _hash_prefix(cmake.prefix)
 
     assert bad_libdwarf_md5 != expected_libdwarf_md5
     assert bad_cmake_md5 != expected_cmake_md5
@@ -261,10 +269,10 @@ def test_install_overwrite_multiple(
     install('--overwrite', '-y', 'libdwarf', 'cmake')
     assert os.path.exists(libdwarf.prefix)
     assert os.path.exists(cmake.prefix)
-    assert fs.hash_directory(libdwarf.prefix) == expected_libdwarf_md5
-    assert fs.hash_directory(cmake.prefix) == expected_cmake_md5
-    assert fs.hash_directory(libdwarf.prefix) != bad_libdwarf_md5
-    assert fs.hash_directory(cmake.prefix) != bad_cmake_md5
+    assert _hash_prefix(libdwarf.prefix) == expected_libdwarf_md5
+    assert _hash_prefix(cmake.prefix) == expected_cmake_md5
+    assert _hash_prefix(libdwarf.prefix) != bad_libdwarf_md5
+    assert _hash_prefix(cmake.prefix) != bad_cmake_md5
 
 
 @pytest.mark.usefixtures(
@@ -7,7 +7,9 @@ import pytest
 import llnl.util.lang
 
 import spack.architecture
+import spack.caches
 import spack.concretize
+import spack.config
 import spack.repo
 
 from spack.concretize import find_spec, NoValidVersionError
@@ -596,3 +598,54 @@ class TestConcretize(object):
         with spack.concretize.disable_compiler_existence_check():
             s = Spec(spec).concretized()
             assert str(s.architecture.target) == str(expected)
+
+
+def test_concretization_cache(concretization_cache, monkeypatch):
+    first = Spec('mpileaks ^mpich').concretized()
+    key = spack.concretize.cache_key(Spec('mpileaks ^mpich'))
+    assert spack.caches.misc_cache.init_entry(key)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('concretized a cached spec')
+
+    # The second concretization is read from the cache
+    monkeypatch.setattr(spack.concretize.Concretizer, '__init__', fail)
+    second = Spec('mpileaks ^mpich').concretized()
+    assert second.concrete
+    assert second.build_hash() == first.build_hash()
+    assert second['mpich'].concrete
+
+
+def test_concretization_cache_key(concretization_cache):
+    key = spack.concretize.cache_key(Spec('mpileaks'))
+    assert key == spack.concretize.cache_key(Spec('mpileaks'))
+    assert key != spack.concretize.cache_key(Spec('mpileaks ^mpich'))
+    assert key != spack.concretize.cache_key(Spec('mpileaks'), tests=True)
+
+    with spack.config.override('packages:mpich', {'version': ['1.0']}):
+        assert key != spack.concretize.cache_key(Spec('mpileaks'))
+
+    # Specs with concrete dependencies are not cached
+    spec = Spec('mpileaks')
+    spec._add_dependency(Spec('callpath').concretized(), ('build', 'link'))
+    assert spack.concretize.cache_key(spec) is None
+
+    with spack.config.override('config:concretization_cache', False):
+        assert spack.concretize.cache_key(Spec('mpileaks')) is None
+
+
+def test_concretization_cache_key_spack_code(
+        concretization_cache, monkeypatch):
+    key = spack.concretize.cache_key(Spec('mpileaks'))
+    monkeypatch.setattr(spack.concretize, '_spack_code_hash', lambda: 'x')
+    assert key != spack.concretize.cache_key(Spec('mpileaks'))
+
+
+def test_concretization_cache_imported_packages(concretization_cache):
+    imported = spack.concretize._imported_packages
+    assert imported(['patch-inheritance']) == set(
+        ['patch-inheritance', 'patch'])
+    # recursively
+    assert imported(['multimethod-inheritor', 'libelf']) == set(
+        ['multimethod-inheritor', 'multimethod', 'multimethod-base',
+         'libelf'])
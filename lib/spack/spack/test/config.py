@@ -408,6 +408,79 @@ def test_internal_config_update(mock_config, write_config_file):
     assert after['install_tree'] == 'foo/bar'
 
 
+def test_merged_config_cache(mock_config, write_config_file):
+    write_config_file('config', config_low, 'low')
+    assert mock_config.get('config:install_tree') == 'install_tree_path'
+
+    # Changing the data that was returned doesn't change the cache
+    data = mock_config.get('config')
+    data['install_tree'] = 'changed'
+    assert mock_config.get('config:install_tree') == 'install_tree_path'
+
+    # Nor does changing nested data
+    data = mock_config.get('config')
+    data['build_stage'].append('changed')
+    assert 'changed' not in mock_config.get('config')['build_stage']
+    mock_config.get('config:build_stage').append('changed')
+    assert 'changed' not in mock_config.get('config:build_stage')
+
+    # Pushing, setting and popping scopes are all seen
+    scope = spack.config.InternalConfigScope('higher', {
+        'config': {'install_tree': 'higher_path'}})
+    mock_config.push_scope(scope)
+    assert mock_config.get('config:install_tree') == 'higher_path'
+
+    mock_config.set('config:install_tree', 'set_path', scope='higher')
+    assert mock_config.get('config:install_tree') == 'set_path'
+    assert mock_config.get('config:install_tree', scope='low') == \
+        'install_tree_path'
+
+    assert mock_config.pop_scope() is scope
+    assert mock_config.get('config:install_tree') == 'install_tree_path'
+
+    with spack.config.override('config:install_tree', 'override_path'):
+        assert spack.config.get('config:install_tree') == 'override_path'
+    assert spack.config.get('config:install_tree') == 'install_tree_path'
+
+
+def test_config_file_cache(tmpdir, monkeypatch):
+    config_yaml = tmpdir.join('config.yaml')
+    config_yaml.write("""\
+config:
+    install_tree:: dummy_tree_value
+""")
+    schema = spack.schema.config.schema
+    data = spack.config._read_config_file(str(config_yaml), schema)
+
+    # The second read comes from the cache, with overrides and marks
+    def fail(*args, **kwargs):
+        raise AssertionError('config file should not be parsed')
+    monkeypatch.setattr(syaml, 'load', fail)
+    monkeypatch.setattr(spack.config, 'validate', fail)
+
+    cached = spack.config._read_config_file(str(config_yaml), schema)
+    assert cached == data
+    key = next(k for k in cached['config'] if k == 'install_tree')
+    assert spack.config._override(key)
+    assert cached['config']['install_tree']._start_mark.line == 1
+
+    # A change to the file invalidates the cache
+    monkeypatch.undo()
+    config_yaml.write("""\
+config:
+    install_tree: another_tree_value
+""")
+    data = spack.config._read_config_file(str(config_yaml), schema)
+    assert data['config']['install_tree'] == 'another_tree_value'
+
+    # So does a change to the schema
+    monkeypatch.setattr(spack.config, 'validate', fail)
+    with pytest.raises(AssertionError):
+        spack.config._read_config_file(
+            str(config_yaml), spack.schema.env.schema)
+    monkeypatch.undo()
+
+
 def test_internal_config_filename(mock_config, write_config_file):
     write_config_file('config', config_low, 'low')
     mock_config.push_scope(spack.config.InternalConfigScope('command_line'))
@@ -29,9 +29,11 @@ import spack.environment as ev
 import spack.package_prefs
 import spack.paths
 import spack.platforms.test
+import spack.provider_index
 import spack.repo
 import spack.stage
 import spack.util.executable
+import spack.util.file_cache
 from spack.util.pattern import Bunch
 from spack.dependency import Dependency
 from spack.package import PackageBase
@@ -62,6 +64,15 @@ def clean_user_environment():
         ev.activate(active)
 
 
+@pytest.fixture(scope='session', autouse=True)
+def mock_config_file_cache(tmpdir_factory):
+    """Keep parsed configuration files out of the user's ~/.spack."""
+    saved = spack.config.file_cache_path
+    spack.config.file_cache_path = str(tmpdir_factory.mktemp('config-cache'))
+    yield
+    spack.config.file_cache_path = saved
+
+
 # Hooks to add command line options or set other custom behaviors.
 # They must be placed here to be found by pytest. See:
 #
@@ -219,12 +230,20 @@ def check_for_leftover_stage_files(request, mock_stage, ignore_stage_files):
         assert not files_in_stage
 
 
+@pytest.fixture(scope='session')
+def mock_fetch_cache_root(tmpdir_factory):
+    return str(tmpdir_factory.mktemp('mock-fetch-cache'))
+
+
 @pytest.fixture(autouse=True)
-def mock_fetch_cache(monkeypatch):
+def mock_fetch_cache(monkeypatch, mock_fetch_cache_root):
     """Substitutes spack.paths.fetch_cache with a mock object that does nothing
     and raises on fetch.
     """
     class MockCache(object):
+        # Files downloaded by spack.fetch_pool end up here, and are ignored
+        root = mock_fetch_cache_root
+
         def store(self, copy_cmd, relative_dest):
             pass
 
@@ -387,6 +406,17 @@ def mutable_config(tmpdir_factory, configuration_dir, monkeypatch):
     spack.package_prefs.PackagePrefs.clear_caches()
 
 
+@pytest.fixture()
+def concretization_cache(config, mock_packages, tmpdir, monkeypatch):
+    """Enables the concretization cache, in a temporary misc_cache."""
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    enabled = spack.config.InternalConfigScope(
+        'concretization_cache', {'config': {'concretization_cache': True}})
+    with spack.config.override(enabled):
+        yield
+
+
 @pytest.fixture()
 def mock_config(tmpdir):
     """Mocks two configuration scopes: 'low' and 'high'."""
@@ -939,6 +969,9 @@ class MockPackageMultiRepo(object):
         self.spec_to_pkg.update(
             dict(('mockrepo.' + x.name, x) for x in packages))
 
+        # no virtual packages
+        self.provider_index = spack.provider_index.ProviderIndex()
+
     def get(self, spec):
         if not isinstance(spec, spack.spec.Spec):
             spec = Spec(spec)
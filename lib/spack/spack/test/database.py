@@ -21,6 +21,8 @@ import spack.store
 import spack.database
 import spack.package
 import spack.spec
+import spack.util.compact_index
+import spack.util.lock
 from spack.test.conftest import MockPackage, MockPackageMultiRepo
 from spack.util.executable import Executable
 
@@ -657,3 +659,343 @@ def test_uninstall_by_spec(mutable_database):
             else:
                 mutable_database.remove(spec)
     assert len(mutable_database.query()) == 0
+
+
+@pytest.fixture()
+def compact_journal(monkeypatch):
+    """Compact the database journal into the index at every write."""
+    monkeypatch.setattr(spack.database, '_journal_min_compaction_size', -1)
+    monkeypatch.setattr(spack.database, '_journal_compaction_ratio', -1)
+
+
+def test_compact_index_is_written(mutable_database, compact_journal):
+    """Writing the DB also writes a compact index in sync with the JSON."""
+    _mock_remove('mpileaks ^zmpi')
+
+    assert os.path.exists(mutable_database._compact_index_path)
+    index = spack.util.compact_index.CompactIndex(
+        mutable_database._compact_index_path)
+    assert len(index) == len(mutable_database._data)
+    assert index.metadata['source'] == mutable_database._index_stamp()
+
+    for key, rec in mutable_database._data.items():
+        entry = index.find(key)
+        assert entry.name == rec.spec.name
+        assert entry.path == rec.path
+        assert entry.installed == rec.installed
+        assert entry.explicit == rec.explicit
+        assert entry.ref_count == rec.ref_count
+        assert sorted(entry.dependencies) == sorted(rec.dependency_hashes())
+    assert index.find('not-a-hash') is None
+
+
+def test_compact_index_read_is_lazy(mutable_database):
+    """Reading the compact index builds specs only when they are used."""
+    _mock_remove('mpileaks ^zmpi')
+
+    with mutable_database.read_transaction():
+        records = list(mutable_database._data.values())
+        assert all(isinstance(r, spack.database.LazyInstallRecord)
+                   for r in records)
+        assert not any(r.materialized for r in records)
+
+        rec = next(r for r in records if r.name == 'callpath')
+        assert rec.materialized is False
+        assert rec.spec.concrete
+        assert rec.materialized
+
+        # Dependencies share nodes with their own records
+        for dep in rec.spec.dependencies():
+            dep_rec = mutable_database._data[dep.dag_hash()]
+            assert dep_rec.materialized
+            assert dep_rec.spec is dep
+            assert dep.concrete
+
+        assert not all(r.materialized for r in records)
+
+    _check_db_sanity(mutable_database)
+
+
+def test_compact_index_fallback_to_json(mutable_database):
+    """A stale compact index is ignored and regenerated from the JSON."""
+    _mock_remove('mpileaks ^zmpi')
+    with open(mutable_database._compact_index_path, 'rb') as f:
+        stale = f.read()
+
+    _mock_remove('mpileaks ^mpich2')
+    with open(mutable_database._compact_index_path, 'wb') as f:
+        f.write(stale)
+
+    with mutable_database.read_transaction():
+        assert len(mutable_database.query('mpileaks ^mpich2')) == 0
+
+    index = spack.util.compact_index.CompactIndex(
+        mutable_database._compact_index_path)
+    assert index.metadata['source'] == mutable_database._index_stamp()
+
+    # A corrupt compact index is ignored too
+    with open(mutable_database._compact_index_path, 'wb') as f:
+        f.write(b'garbage')
+    _check_db_sanity(mutable_database)
+
+
+@pytest.mark.parametrize('query_spec', [
+    'mpileaks', 'mpi', 'mpich', 'callpath ^mpich2', 'fake', 'externaltool',
+    '%gcc', '%clang', 'mpileaks%gcc', 'arch=test-debian6-x86_64',
+    'os=debian6', 'platform=test', 'platform=darwin', 'libelf os=redhat6',
+    'not-installed'
+])
+def test_indexed_query_matches_full_scan(database, query_spec):
+    """Narrowing queries with the indexes does not change their results."""
+    spec = spack.spec.Spec(query_spec)
+    with database.read_transaction():
+        expected = sorted(rec.spec for rec in database._data.values()
+                          if rec.installed and rec.spec.satisfies(spec))
+        assert database.query(query_spec) == expected
+
+        # Constraining also by flags and dates should agree as well
+        explicit = sorted(s for s in expected
+                          if database._data[s.dag_hash()].explicit)
+        assert database.query(query_spec, explicit=True) == explicit
+        assert database.query(
+            query_spec, start_date=datetime.datetime.min,
+            end_date=datetime.datetime.max) == expected
+
+
+def test_name_query_builds_only_matching_specs(mutable_database):
+    """A query by name does not build the specs of other packages."""
+    with mutable_database.read_transaction():
+        results = mutable_database.query('mpileaks')
+        assert len(results) == 3
+
+        needed = set(s.dag_hash() for r in results for s in r.traverse())
+        for key, rec in mutable_database._data.items():
+            assert rec.materialized == (key in needed)
+        assert len(needed) < len(mutable_database._data)
+
+        # Specs handed out by queries know all their dependents
+        libelf = mutable_database.query_one('libelf')
+        parents = set(s.name for s in libelf.traverse(direction='parents'))
+        assert parents == set(
+            ['libelf', 'libdwarf', 'dyninst', 'callpath', 'mpileaks'])
+
+
+def test_dependents_are_built_lazily(mutable_database):
+    """Querying a common dependency doesn't build its dependents until
+    they are looked at."""
+    # Make the database read its records again, lazily
+    _mock_remove('externaltest')
+
+    with mutable_database.read_transaction():
+        libelf = mutable_database.query_one('libelf')
+        built = [rec.name for rec in mutable_database._data.values()
+                 if rec.materialized]
+        assert built == ['libelf']
+
+        assert set(s.name for s in libelf.dependents()) == set(
+            ['libdwarf', 'dyninst'])
+        assert not any(rec.materialized
+                       for rec in mutable_database._data.values()
+                       if rec.name in ('callpath', 'mpileaks'))
+
+        parents = set(s.name for s in libelf.traverse(direction='parents'))
+        assert parents == set(
+            ['libelf', 'libdwarf', 'dyninst', 'callpath', 'mpileaks'])
+
+
+def test_indexes_follow_updates(mutable_database):
+    """Indexes stay in sync when records are added and removed."""
+    with mutable_database.write_transaction():
+        index = mutable_database._record_index()
+        assert len(mutable_database.query('mpileaks%gcc')) == 3
+        assert index._spec_indexes is not None
+
+        _mock_remove('mpileaks ^mpich')
+        assert len(mutable_database.query('mpileaks%gcc')) == 2
+        assert len(mutable_database.query('mpileaks', explicit=True)) == 2
+
+        _mock_install('mpileaks ^mpich')
+        assert len(mutable_database.query('mpileaks%gcc')) == 3
+        assert len(mutable_database.query('mpileaks', explicit=True)) == 2
+        assert len(mutable_database.query('mpileaks', explicit=False)) == 1
+
+        # Fresh indexes agree with the ones updated along the way
+        fresh = spack.database._RecordIndex(mutable_database._data)
+        assert fresh.by_name == index.by_name
+        assert fresh.explicit == index.explicit
+        assert fresh.by_time == index.by_time
+        assert fresh.spec_indexes[0]['gcc'] == index.spec_indexes[0]['gcc']
+
+
+def test_virtual_query_uses_provider_index(mutable_database, monkeypatch):
+    """Queries for virtual packages don't load the installed packages, and
+    the index of providers follows updates."""
+    def no_class(*args, **kwargs):
+        raise AssertionError('package classes should not be needed')
+    monkeypatch.setattr(spack.repo.path, 'get_pkg_class', no_class)
+
+    with mutable_database.write_transaction():
+        index = mutable_database._record_index()
+        index._by_virtual = None
+        mpis = mutable_database.query('mpi')
+        assert set(s.name for s in mpis) == set(['mpich', 'mpich2', 'zmpi'])
+        assert index.names_providing('mpi') == set(
+            ['mpich', 'mpich2', 'zmpi'])
+
+        monkeypatch.undo()
+        for spec in ('mpileaks ^mpich', 'callpath ^mpich', 'mpich'):
+            _mock_remove(spec)
+        assert 'mpich' not in index.names_providing('mpi')
+
+        fresh = spack.database._RecordIndex(mutable_database._data)
+        assert fresh.by_virtual == index.by_virtual
+
+
+def test_write_appends_to_journal(mutable_database):
+    """Write transactions append to the journal instead of rewriting the
+    index, and reads replay the journal."""
+    db = mutable_database
+    stamp = db._index_stamp()
+    assert not db._journal_paths()
+
+    _mock_remove('mpileaks ^zmpi')
+    _mock_remove('mpileaks ^mpich2')
+    assert db._index_stamp() == stamp
+
+    # Each record is in the journal of its shard
+    lines = 0
+    for path in db._journal_paths():
+        shard = int(os.path.basename(path), 16)
+        with open(path) as f:
+            for line in f:
+                lines += 1
+                keys = json.loads(line)['records']
+                assert all(spack.database._shard_of(k) == shard for k in keys)
+    assert lines >= 2
+
+    # A fresh database object sees the changes
+    other = spack.database.Database(db.root)
+    with other.read_transaction():
+        assert len(other.query('mpileaks')) == 1
+        assert other.query_one('callpath ^zmpi').dag_hash() in other._data
+        other._check_ref_counts()
+    _check_db_sanity(db)
+
+    # Add back a removed spec, including its record
+    _mock_install('mpileaks ^zmpi')
+    with other.read_transaction():
+        assert len(other.query('mpileaks')) == 2
+        other._check_ref_counts()
+
+
+def test_journal_ignores_stale_and_partial_entries(mutable_database):
+    db = mutable_database
+    _mock_remove('mpileaks ^zmpi')
+
+    # An entry for another version of the index is ignored, and so is
+    # a line that was not completely written
+    removed = []
+    for path in db._journal_paths():
+        with open(path) as f:
+            line = f.read()
+        removed.extend(
+            k for k, v in json.loads(line)['records'].items() if not v)
+        stale = line.replace(db._index_stamp(), 'not-the-index')
+        with open(path, 'w') as f:
+            f.write(stale)
+            f.write(line[:len(line) // 2])
+    assert removed
+
+    with db.read_transaction():
+        assert len(db.query('mpileaks')) == 3
+        assert all(k in db._data for k in removed)
+
+
+def test_journal_is_compacted(mutable_database, monkeypatch):
+    """The journal is merged into the index once it grows large."""
+    db = mutable_database
+    _mock_remove('mpileaks ^zmpi')
+    assert db._journal_paths()
+    stamp = db._index_stamp()
+
+    monkeypatch.setattr(spack.database, '_journal_min_compaction_size', 0)
+    monkeypatch.setattr(spack.database, '_journal_compaction_ratio', 0)
+    _mock_remove('mpileaks ^mpich2')
+
+    assert not db._journal_paths()
+    assert db._index_stamp() != stamp
+    with open(db._index_path) as f:
+        installs = json.load(f)['database']['installs']
+    assert len(installs) == len(db._data)
+    _check_db_sanity(db)
+
+
+def _shards_of(spec):
+    return set(spack.database._shard_of(s.dag_hash())
+               for s in spec.traverse(deptype=('link', 'run')))
+
+
+def _specs_in_different_shards(db):
+    specs = db.query()
+    for a in specs:
+        for b in specs:
+            if not _shards_of(a) & _shards_of(b):
+                return a, b
+    pytest.skip('no specs with records in different shards')
+
+
+def test_writers_of_different_shards(mutable_database):
+    """A writer can change records while another one holds the locks of
+    other shards, but readers wait for both."""
+    db = mutable_database
+    a, b = _specs_in_different_shards(db)
+    explicit = not db.get_record(b).explicit
+    locked, done = multiprocessing.Event(), multiprocessing.Event()
+
+    def hold_shards():
+        with db._shard_transaction([s.dag_hash() for s in a.traverse()]):
+            locked.set()
+            done.wait(10)
+
+    holder = multiprocessing.Process(target=hold_shards)
+    holder.start()
+    try:
+        assert locked.wait(10)
+        db.db_lock_timeout = 1
+        db.update_explicit(b, explicit)
+
+        with pytest.raises(spack.util.lock.LockTimeoutError):
+            with spack.util.lock.ReadTransaction(db.lock, timeout=0.1):
+                pass
+    finally:
+        done.set()
+        holder.join()
+    assert holder.exitcode == 0
+
+    with db.read_transaction():
+        assert db._data[b.dag_hash()].explicit == explicit
+
+
+def test_change_outside_of_locked_shards(mutable_database):
+    """A transaction that changes records of shards it did not lock is
+    done again with the whole database locked."""
+    db = mutable_database
+    a, b = _specs_in_different_shards(db)
+    explicit = not db.get_record(b).explicit
+
+    db._write_records(a, db._update_explicit, b, explicit)
+
+    other = spack.database.Database(db.root)
+    with other.read_transaction():
+        assert other._data[b.dag_hash()].explicit == explicit
+
+
+def test_shard_of_short_hashes(mutable_database):
+    """Hashes that aren't full length have the shard of their prefix."""
+    for spec in mutable_database.query():
+        h = spec.dag_hash()
+        shard = spack.spec.base32_prefix_bits(h, spack.database._db_shard_bits)
+        assert spack.database._shard_of(h) == shard
+        assert spack.database._shard_of(h[:2]) == shard
+
+    assert spack.database._shard_of('x') == spack.database._shard_of('xa')
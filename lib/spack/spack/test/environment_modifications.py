@@ -234,6 +234,45 @@ def test_extra_arguments(env):
     assert 'dummy value' == os.environ['A']
 
 
+def test_caller_context(env):
+    """Tests that the code requesting a modification is found when it
+    is reported."""
+    env.set('A', 'first')
+    env.append_path('A', '/path')
+    env.set('A', 'second')
+
+    messages = []
+    environment.validate(env, messages.append)
+
+    assert len(messages) == 4
+    assert __file__.rstrip('c') in messages[3]
+    assert "env.set('A', 'second')" in messages[3]
+    assert messages[3].startswith('\t--->')
+
+
+def test_coalesced_modifications(env):
+    """Tests that modifications of the same variable, done on a single
+    list of directories, give the same value as done one at a time."""
+    os.environ['COALESCED_PATH'] = '/a:/b:/usr/bin'
+    env.prepend_path('COALESCED_PATH', '/c')
+    env.append_path('COALESCED_PATH', '/d/')
+    env.remove_path('COALESCED_PATH', '/b')
+    env.append_flags('COALESCED_PATH', '/usr/bin', sep=':')
+    env.prune_duplicate_paths('COALESCED_PATH')
+    env.deprioritize_system_paths('COALESCED_PATH')
+    env.append_path('COALESCED_PATH', '/e', separator=';')
+    env.set_path('COALESCED_PATH', ['/f', '/g'])
+    env.prepend_path('COALESCED_PATH', '/h')
+
+    one_at_a_time = {'COALESCED_PATH': os.environ['COALESCED_PATH']}
+    for item in env:
+        item.execute(one_at_a_time)
+
+    env.apply_modifications()
+    assert os.environ['COALESCED_PATH'] == one_at_a_time['COALESCED_PATH']
+    assert os.environ['COALESCED_PATH'] == '/h:/f:/g'
+
+
 def test_extend(env):
     """Tests that we can construct a list of environment modifications
     starting from another list.
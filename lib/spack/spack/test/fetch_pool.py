@@ -0,0 +1,224 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from six.moves import socketserver
+from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+import spack.caches
+import spack.config
+import spack.fetch_pool
+import spack.fetch_strategy
+import spack.repo
+from spack.fetch_pool import Download, FetchPool
+from spack.spec import Spec
+from spack.version import ver
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the files in ``server.root``, after answering with the
+    status codes in ``server.errors[path]`` first."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            errors = server.errors.get(self.path)
+            if errors:
+                self.send_error(errors.pop(0))
+                return
+
+            path = os.path.join(server.root, self.path.lstrip('/'))
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def http_server(tmpdir):
+    """A local HTTP server standing in for a mirror."""
+    root = tmpdir.mkdir('www')
+    server = _Server(('127.0.0.1', 0), _Handler)
+    server.root = str(root)
+    server.url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    server.lock = threading.Lock()
+    server.requests = []
+    server.errors = {}
+    server.delay = 0
+    server.active = server.max_active = 0
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def fetch_cache(tmpdir, monkeypatch):
+    cache = spack.fetch_strategy.FsCache(str(tmpdir.join('cache')))
+    monkeypatch.setattr(spack.caches, 'fetch_cache', cache)
+    monkeypatch.setattr(spack.fetch_pool, 'retry_delay', 0)
+    return cache
+
+
+def _serve(server, name, content=b'archive contents'):
+    with open(os.path.join(server.root, name), 'wb') as f:
+        f.write(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_fetch_into_cache(http_server, fetch_cache):
+    pool = FetchPool(jobs=4)
+    for i in range(8):
+        name = 'a-{0}.tar.gz'.format(i)
+        digest = _serve(http_server, name, name.encode('utf-8'))
+        url = '{0}/{1}'.format(http_server.url, name)
+        pool.add(Download([url], digest, os.path.join('a', name)))
+
+    assert pool.fetch() == []
+    for i in range(8):
+        path = os.path.join(fetch_cache.root, 'a', 'a-{0}.tar.gz'.format(i))
+        with open(path) as f:
+            assert f.read() == 'a-{0}.tar.gz'.format(i)
+
+    # Nothing to do for files that are already in the cache
+    pool.add(Download(['{0}/a-0.tar.gz'.format(http_server.url)],
+                      None, os.path.join('a', 'a-0.tar.gz')))
+    assert not pool.downloads
+
+
+def test_checksum_mismatch_tries_next_url(http_server, fetch_cache):
+    digest = _serve(http_server, 'good.tar.gz')
+    _serve(http_server, 'bad.tar.gz', b'something else')
+    bad, good = ['{0}/{1}.tar.gz'.format(http_server.url, n)
+                 for n in ('bad', 'good')]
+
+    pool = FetchPool()
+    pool.add(Download([bad, good], digest, 'x.tar.gz'))
+    assert pool.fetch() == []
+    assert os.path.exists(os.path.join(fetch_cache.root, 'x.tar.gz'))
+
+    download = Download([bad], digest, 'y.tar.gz')
+    pool.add(download)
+    assert pool.fetch() == [download]
+    assert sorted(os.listdir(fetch_cache.root)) == ['x.tar.gz']
+
+
+def test_no_checksum_verification(http_server, fetch_cache):
+    _serve(http_server, 'a.tar.gz')
+    url = '{0}/a.tar.gz'.format(http_server.url)
+
+    pool = FetchPool()
+    pool.add(Download([url], 'not-the-checksum', 'a.tar.gz'))
+    with spack.config.override('config:checksum', False):
+        assert pool.fetch() == []
+
+
+def test_transient_errors_are_retried(http_server, fetch_cache):
+    digest = _serve(http_server, 'a.tar.gz')
+    http_server.errors['/a.tar.gz'] = [503, 500]
+
+    pool = FetchPool()
+    pool.add(Download(['{0}/a.tar.gz'.format(http_server.url)],
+                      digest, 'a.tar.gz'))
+    assert pool.fetch() == []
+    assert http_server.requests.count('/a.tar.gz') == 3
+
+
+def test_permanent_errors_are_not_retried(http_server, fetch_cache):
+    download = Download(['{0}/missing.tar.gz'.format(http_server.url)],
+                        'abcd', 'missing.tar.gz')
+    pool = FetchPool()
+    pool.add(download)
+    assert pool.fetch() == [download]
+    assert http_server.requests == ['/missing.tar.gz']
+
+
+def test_connections_per_host(http_server, fetch_cache, monkeypatch):
+    monkeypatch.setattr(spack.fetch_pool, 'connections_per_host', 2)
+    http_server.delay = 0.05
+
+    pool = FetchPool(jobs=8)
+    for i in range(8):
+        name = 'a-{0}.tar.gz'.format(i)
+        digest = _serve(http_server, name)
+        pool.add(Download(['{0}/{1}'.format(http_server.url, name)],
+                          digest, name))
+
+    assert pool.fetch() == []
+    assert http_server.max_active == 2
+
+
+def test_package_downloads(mock_packages, config):
+    spec = Spec('patch-several-dependencies').concretized()
+    downloads = spack.fetch_pool.package_downloads(spec['fake'].package)
+
+    urls = sorted(d.urls[-1] for d in downloads)
+    assert urls == [
+        'http://example.com/urlpatch.patch',
+        'http://example.com/urlpatch2.patch.gz',
+        'http://www.fake-spack-example.org/downloads/fake-1.0.tar.gz']
+
+    # Compressed patches are checked against the archive's checksum
+    digests = dict((d.urls[-1], d.digest) for d in downloads)
+    assert digests['http://example.com/urlpatch2.patch.gz'] == 'abcd' * 16
+
+    # Mirrors are tried first
+    with spack.config.override('mirrors', {'test': 'file:///mirror'}):
+        downloads = spack.fetch_pool.package_downloads(spec['fake'].package)
+    for d in downloads:
+        assert d.urls[0] == 'file:///mirror/' + d.cache_path
+
+
+def test_stage_uses_prefetched_archive(
+        http_server, fetch_cache, mutable_mock_packages, config):
+    digest = _serve(http_server, 'url-test.tar.gz')
+    url = '{0}/url-test.tar.gz'.format(http_server.url)
+
+    spec = Spec('url-test').concretized()
+    pkg = spack.repo.get('url-test')
+    pkg.url = url
+    pkg.versions[ver('test')] = {'sha256': digest, 'url': url}
+    pkg.spec = spec
+
+    pool = FetchPool()
+    pool.add_package(pkg)
+    assert pool.fetch() == []
+
+    # The stage doesn't need the server anymore
+    http_server.errors['/url-test.tar.gz'] = [404]
+    with pkg.stage:
+        pkg.do_fetch()
+        assert os.path.exists(pkg.stage.archive_file)
+    assert http_server.requests == ['/url-test.tar.gz']
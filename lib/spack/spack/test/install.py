@@ -14,6 +14,7 @@ from spack.package import \
 import spack.patch
 import spack.repo
 import spack.store
+import spack.util.prefix_files
 from spack.spec import Spec
 from spack.package import _spack_build_envfile, _spack_build_logfile
 
@@ -299,6 +300,17 @@ def test_store(install_mockery, mock_fetch):
     pkg.do_install()
 
 
+def test_install_writes_manifest(install_mockery, mock_fetch):
+    spec = Spec('trivial-install-test-package').concretized()
+    spec.package.do_install()
+
+    manifest = spack.util.prefix_files.read_manifest(spec.prefix)
+    assert any(entry.path == spec.prefix for entry in manifest)
+
+    # Files changed by the post-install hooks are up to date in it
+    assert spack.util.prefix_files.changed_files(spec.prefix) == []
+
+
 @pytest.mark.disable_clean_stage_check
 def test_failing_build(install_mockery, mock_fetch):
     spec = Spec('failing-build').concretized()
@@ -0,0 +1,185 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import multiprocessing
+
+import pytest
+
+import spack.binary_distribution
+import spack.config
+import spack.fetch_pool
+import spack.installer
+import spack.store
+from spack.package import PackageBase
+from spack.spec import Spec
+
+
+@pytest.fixture()
+def install_order(monkeypatch):
+    """Records the names of the packages passed to do_install()."""
+    order = []
+    do_install = PackageBase.do_install
+
+    def _do_install(pkg, **kwargs):
+        order.append(pkg.name)
+        return do_install(pkg, **kwargs)
+
+    monkeypatch.setattr(PackageBase, 'do_install', _do_install)
+    return order
+
+
+def _check_order(spec, order):
+    for node in spec.traverse():
+        for dep in node.dependencies():
+            assert order.index(dep.name) < order.index(node.name)
+
+
+def test_dependencies_are_installed_first(
+        install_mockery, mock_fetch, install_order):
+    spec = Spec('mpileaks').concretized()
+    spack.installer.PackageInstaller([spec]).install(fake=True)
+
+    assert sorted(install_order) == sorted(s.name for s in spec.traverse())
+    _check_order(spec, install_order)
+    assert all(s.package.installed for s in spec.traverse())
+
+    # Nothing is explicit unless requested
+    explicit = [s for s in spec.traverse()
+                if spack.store.db.get_record(s).explicit]
+    assert explicit == []
+
+
+def test_install_dependencies_only(
+        install_mockery, mock_fetch, install_order):
+    spec = Spec('mpileaks').concretized()
+    spack.installer.PackageInstaller(
+        [spec], install_roots=False).install(fake=True, explicit=True)
+
+    assert 'mpileaks' not in install_order
+    assert not spec.package.installed
+    for dep in spec.traverse(root=False):
+        assert dep.package.installed
+        assert not spack.store.db.get_record(dep).explicit
+
+
+def test_installed_nodes_are_skipped(
+        install_mockery, mock_fetch, install_order):
+    spec = Spec('mpileaks').concretized()
+    spec['libelf'].package.do_install(fake=True)
+    del install_order[:]
+
+    spack.installer.PackageInstaller([spec]).install(fake=True)
+    assert 'libelf' not in install_order
+
+
+def test_concurrent_builds(install_mockery, mock_fetch):
+    spec = Spec('mpileaks').concretized()
+    installer = spack.installer.PackageInstaller(
+        [spec], jobs=4, concurrent_builds=4)
+    installer.install(fake=True)
+
+    with spack.store.db.read_transaction():
+        for node in spec.traverse():
+            assert node.package.installed
+
+
+@pytest.mark.disable_clean_stage_check
+def test_concurrent_build_failure(install_mockery, mock_fetch):
+    spec = Spec('failing-build').concretized()
+    installer = spack.installer.PackageInstaller(
+        [spec], jobs=2, concurrent_builds=2)
+
+    with pytest.raises(spack.installer.InstallFailedError):
+        installer.install()
+    assert not spec.package.installed
+
+
+def test_prefetch_skips_binary_cache_entries(
+        install_mockery, mock_fetch, monkeypatch):
+    """Only the sources of nodes that aren't in a binary cache are
+    downloaded ahead of the builds."""
+    spec = Spec('mpileaks').concretized()
+    monkeypatch.setattr(spack.binary_distribution, 'get_specs',
+                        lambda: [spec['libelf'], spec['mpich']])
+
+    fetched = []
+    monkeypatch.setattr(spack.fetch_pool.FetchPool, 'add_package',
+                        lambda self, pkg: fetched.append(pkg.name))
+    monkeypatch.setattr(spack.fetch_pool.FetchPool, 'fetch',
+                        lambda self: None)
+
+    # install_mockery already has an 'overrides' scope
+    mirrors = spack.config.InternalConfigScope(
+        'mirrors', {'mirrors': {'test': 'file:///mirror'}})
+    installer = spack.installer.PackageInstaller([spec])
+    with spack.config.override(mirrors):
+        installer._prefetch(set(installer.specs), {})
+    expected = set(s.name for s in spec.traverse()) - set(['libelf', 'mpich'])
+    assert set(fetched) == expected
+
+    del fetched[:]
+    with spack.config.override(mirrors):
+        installer._prefetch(set(installer.specs), {'use_cache': False})
+    assert set(fetched) == set(s.name for s in spec.traverse())
+
+
+@pytest.mark.parametrize('free_jobs,free_slots,ready,expected', [
+    (16, 4, 4, 4),    # the budget is split among the builds
+    (16, 4, 1, 16),   # a lone build gets all the jobs
+    (16, 4, 8, 4),    # no more builds than free slots
+    (2, 4, 4, 1),     # every build gets at least one job
+])
+def test_job_share(free_jobs, free_slots, ready, expected):
+    installer = spack.installer.PackageInstaller([])
+    assert installer._job_share(free_jobs, free_slots, ready) == expected
+
+
+def test_concurrent_builds_limited_by_jobs():
+    installer = spack.installer.PackageInstaller(
+        [], jobs=2, concurrent_builds=8)
+    assert installer.concurrent_builds == 2
+
+
+def _hold_prefix_lock(spec, locked, release):
+    lock = spack.store.db.prefix_lock(spec)
+    lock.acquire_write()
+    locked.set()
+    release.wait(60)
+    lock.release_write()
+
+
+def test_locked_prefix_is_deferred(
+        install_mockery, mock_fetch, install_order, monkeypatch):
+    """A prefix locked by another process is installed after the nodes
+    that don't depend on it."""
+    monkeypatch.setattr(spack.installer, 'locked_retry_interval', 0.01)
+    monkeypatch.setattr(spack.installer, 'poll_interval', 0.01)
+
+    spec = Spec('mpileaks').concretized()
+    locked, release = multiprocessing.Event(), multiprocessing.Event()
+    holder = multiprocessing.Process(
+        target=_hold_prefix_lock, args=(spec['mpich'], locked, release))
+    holder.start()
+    assert locked.wait(60)
+
+    # Release the lock once everything that doesn't need mpich is done
+    do_install = PackageBase.do_install
+
+    def _do_install(pkg, **kwargs):
+        do_install(pkg, **kwargs)
+        if pkg.name == 'dyninst':
+            release.set()
+
+    monkeypatch.setattr(PackageBase, 'do_install', _do_install)
+
+    try:
+        spack.installer.PackageInstaller([spec]).install(fake=True)
+    finally:
+        release.set()
+        holder.join()
+
+    assert install_order.index('dyninst') < install_order.index('mpich')
+    _check_order(spec, install_order)
+    assert spec['mpich'].package.installed
@@ -130,3 +130,17 @@ def test_load_modules_from_file(module_path):
     foo = llnl.util.lang.load_module_from_file('foo', module_path)
     assert foo.value == 1
     assert foo.path == os.path.join('/usr', 'bin')
+
+
+def test_lru_cache():
+    cache = llnl.util.lang.LRUCache(maxsize=2)
+    cache['a'] = 1
+    cache['b'] = 2
+
+    # Looking up 'a' makes 'b' the least recently used item
+    assert cache.get('a') == 1
+    cache['c'] = 3
+    assert len(cache) == 2
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+    assert cache.get('b', 'missing') == 'missing'
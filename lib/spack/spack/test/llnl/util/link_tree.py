@@ -7,7 +7,7 @@ import os
 
 import pytest
 from llnl.util.filesystem import working_dir, mkdirp, touchp
-from llnl.util.link_tree import LinkTree
+from llnl.util.link_tree import LinkTree, map_file_pairs
 from spack.stage import Stage
 
 
@@ -166,3 +166,10 @@ def test_ignore(stage, link_tree):
 
         assert os.path.isfile('source/.spec')
         assert os.path.isfile('dest/.spec')
+
+
+def test_map_file_pairs():
+    pairs = [(str(i), str(i * 2)) for i in range(200)]
+    seen = []
+    map_file_pairs(lambda src, dest: seen.append((src, dest)), pairs)
+    assert sorted(seen) == sorted(pairs)
@@ -43,9 +43,11 @@ actually on a shared filesystem.
 
 """
 import os
+import signal
 import socket
 import shutil
 import tempfile
+import time
 import traceback
 import glob
 import getpass
@@ -292,9 +294,9 @@ def acquire_read(lock_path, start=0, length=0):
     return fn
 
 
-def timeout_write(lock_path, start=0, length=0):
+def timeout_write(lock_path, start=0, length=0, blocking=False):
     def fn(barrier):
-        lock = lk.Lock(lock_path, start, length)
+        lock = lk.Lock(lock_path, start, length, blocking=blocking)
         barrier.wait()  # wait for lock acquire in first process
         with pytest.raises(lk.LockTimeoutError):
             lock.acquire_write(lock_fail_timeout)
@@ -302,9 +304,9 @@ def timeout_write(lock_path, start=0, length=0):
     return fn
 
 
-def timeout_read(lock_path, start=0, length=0):
+def timeout_read(lock_path, start=0, length=0, blocking=False):
     def fn(barrier):
-        lock = lk.Lock(lock_path, start, length)
+        lock = lk.Lock(lock_path, start, length, blocking=blocking)
         barrier.wait()  # wait for lock acquire in first process
         with pytest.raises(lk.LockTimeoutError):
             lock.acquire_read(lock_fail_timeout)
@@ -645,6 +647,134 @@ def test_upgrade_read_to_write_fails_with_readonly_file(private_lock_path):
             lock.acquire_write()
 
 
+def test_locks_on_same_range_share_state(private_lock_path):
+    """Test that locks of a process on the same range are only taken and
+    released once."""
+    lock = lk.Lock(private_lock_path)
+    same_range = lk.Lock(private_lock_path)
+    other_range = lk.Lock(private_lock_path, 0, 1)
+
+    assert lock.acquire_write()
+    assert not same_range.acquire_read()
+    assert other_range.acquire_read()
+
+    assert not lock.release_write()
+    assert same_range._file is not None
+    assert same_range.release_read()
+    assert lock._file is None
+    assert lock._reads == 0 and lock._writes == 0
+
+    assert other_range.release_read()
+
+
+def test_locks_on_removed_file_dont_share_state(private_lock_path):
+    """Test that a lock held on a removed lock file doesn't stand for the
+    locks on a new file at the same path."""
+    lock = lk.Lock(private_lock_path)
+    assert lock.acquire_read()
+    os.unlink(private_lock_path)
+
+    new_lock = lk.Lock(private_lock_path)
+    assert new_lock._reads == 0
+    assert new_lock.acquire_write()
+    assert new_lock.release_write()
+
+    # The lock on the removed file can still be released
+    assert lock.release_read()
+
+
+#
+# Blocking locks wait for other processes with a blocking lockf() call,
+# and time out with an interval timer.
+#
+def test_blocking_write_lock_timeout_on_write(lock_path):
+    multiproc_test(
+        acquire_write(lock_path),
+        timeout_write(lock_path, blocking=True),
+        timeout_read(lock_path, blocking=True))
+
+
+def test_blocking_tiny_timeout_restores_signal_handler(lock_path):
+    def p1(barrier):
+        lock = lk.Lock(lock_path)
+        lock.acquire_write()
+        barrier.wait()  # ---------------------------------------- 1
+        barrier.wait()  # ---------------------------------------- 2
+        lock.release_write()
+
+    def p2(barrier):
+        lock = lk.Lock(lock_path, blocking=True)
+        barrier.wait()  # ---------------------------------------- 1
+        for _ in range(100):
+            with pytest.raises(lk.LockTimeoutError):
+                lock.acquire_write(1e-9)
+            assert signal.getitimer(signal.ITIMER_REAL)[0] == 0
+            assert signal.getsignal(signal.SIGALRM) == signal.SIG_DFL
+        barrier.wait()  # ---------------------------------------- 2
+
+    multiproc_test(p1, p2)
+
+
+def test_blocking_upgrade_timeout_keeps_read_lock(lock_path):
+    def p1(barrier):
+        lock = lk.Lock(lock_path, blocking=True)
+        lock.acquire_read()
+        barrier.wait()  # ---------------------------------------- 1
+        with pytest.raises(lk.LockTimeoutError):
+            lock.acquire_write(lock_fail_timeout)
+        assert signal.getitimer(signal.ITIMER_REAL)[0] == 0
+        assert signal.getsignal(signal.SIGALRM) == signal.SIG_DFL
+        barrier.wait()  # ---------------------------------------- 2
+        barrier.wait()  # ---------------------------------------- 3
+        barrier.wait()  # ---------------------------------------- 4
+        lock.release_read()
+
+    def p2(barrier):
+        lock = lk.Lock(lock_path)
+        lock.acquire_read()
+        barrier.wait()  # ---------------------------------------- 1
+        barrier.wait()  # ---------------------------------------- 2
+        lock.release_read()
+        barrier.wait()  # ---------------------------------------- 3
+        barrier.wait()  # ---------------------------------------- 4
+
+    def p3(barrier):
+        lock = lk.Lock(lock_path)
+        barrier.wait()  # ---------------------------------------- 1
+        barrier.wait()  # ---------------------------------------- 2
+        barrier.wait()  # ---------------------------------------- 3
+
+        # p1 still holds its read lock
+        with pytest.raises(lk.LockTimeoutError):
+            lock.acquire_write(lock_fail_timeout)
+        barrier.wait()  # ---------------------------------------- 4
+
+    multiproc_test(p1, p2, p3)
+
+
+def test_blocking_lock_records_wait(lock_path):
+    def p1(barrier):
+        lock = lk.Lock(lock_path, debug=True)
+        lock.acquire_write()
+        barrier.wait()  # ---------------------------------------- 1
+        time.sleep(0.2)
+        lock.release_write()
+
+    def p2(barrier):
+        lock = lk.Lock(lock_path, debug=True, blocking=True)
+        barrier.wait()  # ---------------------------------------- 1
+        with lk.ReadTransaction(lock, timeout=barrier_timeout):
+            pass
+
+        waits, = lk.lock_waits()
+        assert waits.path == lock_path
+        assert waits.count == 1
+        assert 0.1 < waits.total < barrier_timeout
+        assert waits.holders == set([(lock.pid, socket.getfqdn())])
+
+    multiproc_test(p1, p2)
+
+
 #
 # Longer test case that ensures locks are reusable. Ordering is
 # enforced by barriers throughout -- steps are shown with numbers.
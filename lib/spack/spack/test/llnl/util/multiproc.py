@@ -0,0 +1,29 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import pytest
+
+import llnl.util.tty as tty
+from llnl.util.multiproc import parmap
+
+
+def test_parmap():
+    assert parmap(lambda x: x * x, range(100), jobs=8) == [
+        x * x for x in range(100)]
+    assert parmap(lambda x: x, [], jobs=8) == []
+
+
+def test_parmap_reraises_errors():
+    def fail(x):
+        if x == 42:
+            raise ValueError('bad value')
+        return x
+
+    with pytest.raises(ValueError):
+        parmap(fail, range(100), jobs=8)
+
+    # tty.die() in a thread still exits
+    with pytest.raises(SystemExit):
+        parmap(lambda x: tty.die('failed'), range(10), jobs=4)
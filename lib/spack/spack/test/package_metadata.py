@@ -0,0 +1,88 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import pytest
+
+import spack.caches
+import spack.paths
+import spack.repo
+import spack.util.file_cache
+import spack.util.spack_json as sjson
+
+
+@pytest.mark.parametrize('name', [
+    'mpileaks', 'mpich', 'dtbuild1', 'multivalue_variant', 'conflict',
+    'patch-several-dependencies', 'extension1', 'a'
+])
+def test_metadata_matches_package_class(mock_packages, name):
+    cls = spack.repo.path.get_pkg_class(name)
+    meta = spack.repo.path.get_pkg_metadata(name)
+
+    assert meta.name == cls.name
+    assert meta.fullname == cls.fullname
+    assert meta.__doc__ == cls.__doc__
+    assert meta.homepage == cls.homepage
+    assert meta.versions == cls.versions
+
+    assert sorted(meta.variants) == sorted(cls.variants)
+    for vname, variant in cls.variants.items():
+        assert meta.variants[vname].default == variant.default
+        # Values may be a set, so their order changes across processes
+        assert (sorted(meta.variants[vname].allowed_values.split(', ')) ==
+                sorted(variant.allowed_values.split(', ')))
+
+    assert sorted(meta.dependencies) == sorted(cls.dependencies)
+    for dname, conditions in cls.dependencies.items():
+        assert sorted(meta.dependencies[dname]) == sorted(conditions)
+        for when, dep in conditions.items():
+            assert meta.dependencies[dname][when].spec == dep.spec
+            assert meta.dependencies[dname][when].type == dep.type
+
+    assert meta.provided == cls.provided
+    assert meta.conflicts == cls.conflicts
+    assert sorted(meta.extendees) == sorted(cls.extendees)
+    assert sorted(meta.patches) == sorted(cls.patches)
+
+
+def test_metadata_does_not_import_packages(mock_packages):
+    # Make sure the index in the misc cache is up to date
+    spack.repo.path.get_pkg_metadata('mpileaks')
+
+    repo = spack.repo.Repo(spack.paths.mock_packages_path)
+    meta = repo.get_pkg_metadata('mpileaks')
+    meta.possible_dependencies()
+    assert 'mpileaks' in repo.metadata_index
+    assert not repo._modules
+
+
+def test_stale_metadata_index_is_rebuilt(mock_packages, tmpdir, monkeypatch):
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+    repo = spack.repo.Repo(spack.paths.mock_packages_path)
+
+    # Write an index in an older format, newer than every package file
+    cache_filename = 'metadata/{0}-index.json'.format(repo.namespace)
+    misc_cache = spack.caches.misc_cache
+    misc_cache.init_entry(cache_filename)
+    with misc_cache.write_transaction(cache_filename) as (old, new):
+        sjson.dump({'version': 1, 'packages': {}}, new)
+
+    assert 'mpileaks' in repo.metadata_index
+    with misc_cache.read_transaction(cache_filename) as f:
+        data = sjson.load(f)
+    assert data['version'] == 2
+    assert 'mpileaks' in data['packages']
+
+
+def test_metadata_unknown_package(mock_packages):
+    with pytest.raises(spack.repo.UnknownPackageError):
+        spack.repo.path.get_pkg_metadata('not-a-real-package')
+
+
+def test_fetch_url(mock_packages):
+    meta = spack.repo.path.get_pkg_metadata('mpich')
+    for version in meta.versions:
+        assert meta.fetch_url(version).endswith(
+            'mpich-{0}.tar.gz'.format(version))
@@ -6,12 +6,15 @@
 """
 This test checks the binary packaging infrastructure
 """
+import io
 import os
 import stat
 import sys
 import shutil
+import tarfile
 import pytest
 import argparse
+from contextlib import closing
 
 from llnl.util.filesystem import mkdirp
 
@@ -401,3 +404,54 @@ def test_relocate_macho(tmpdir):
             'libncurses.5.4.dylib',
             rpaths, deps, idpath,
             nrpaths, ndeps, nid)
+
+
+def test_package_tarball_round_trip(tmpdir):
+    prefix = tmpdir.join('opt', 'pkg-1.0-abcdef')
+    prefix.ensure('bin', 'tool').write('#!/bin/sh\n', ensure=True)
+    prefix.join('bin', 'tool').chmod(0o755)
+    prefix.ensure('lib', 'libfoo.so').write('original')
+    prefix.ensure('.spack', 'binary_distribution').write('stale')
+    prefix.ensure('empty', dir=True)
+    os.symlink(str(prefix.join('bin', 'tool')), str(prefix.join('link')))
+    os.link(str(prefix.join('lib', 'libfoo.so')),
+            str(prefix.join('lib', 'libfoo.so.1')))
+    relative = tmpdir.ensure('work', 'lib', 'libfoo.so')
+    relative.write('made relative')
+
+    tarball = str(tmpdir.join('pkg.tar.gz'))
+    bindist.write_package_tarball(
+        str(prefix), tarball, {'relocate_links': ['link']},
+        files={os.path.join('lib', 'libfoo.so'): str(relative)},
+        links={'link': 'bin/tool'})
+
+    # The prefix is unchanged
+    assert prefix.join('lib', 'libfoo.so').read() == 'original'
+    assert os.readlink(str(prefix.join('link'))) == str(
+        prefix.join('bin', 'tool'))
+
+    # Extract under a different name
+    new_prefix = tmpdir.join('new', 'pkg-1.0-abcdef')
+    with open(tarball, 'rb') as f:
+        bindist.extract_package_tarball(f, str(new_prefix))
+
+    assert new_prefix.join('lib', 'libfoo.so').read() == 'made relative'
+    assert new_prefix.join('lib', 'libfoo.so.1').read() == 'original'
+    assert os.readlink(str(new_prefix.join('link'))) == 'bin/tool'
+    assert os.stat(str(new_prefix.join('bin', 'tool'))).st_mode & 0o777 == \
+        0o755
+    assert new_prefix.join('empty').isdir()
+    assert bindist.read_buildinfo_file(str(new_prefix)) == {
+        'relocate_links': ['link']}
+
+
+def test_extract_package_tarball_unsafe_paths(tmpdir):
+    tarball = str(tmpdir.join('evil.tar.gz'))
+    with closing(tarfile.open(tarball, 'w:gz')) as tar:
+        info = tarfile.TarInfo('pkg/../../evil')
+        tar.addfile(info, io.BytesIO(b''))
+
+    with open(tarball, 'rb') as f:
+        with pytest.raises(tarfile.ExtractError):
+            bindist.extract_package_tarball(f, str(tmpdir.join('pkg')))
+    assert not tmpdir.join('evil').exists()
@@ -3,6 +3,7 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import multiprocessing
 import os.path
 import platform
 import shutil
@@ -14,9 +15,17 @@ import spack.paths
 import spack.relocate
 import spack.store
 import spack.tengine
+import spack.util.elf
 import spack.util.executable
 
 
+#: Environment to compile test programs, without the variables that
+#: other tests may have set
+compiler_env = {
+    'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'
+}
+
+
 @pytest.fixture(params=[True, False])
 def is_relocatable(request):
     return request.param
@@ -45,15 +54,10 @@ def source_file(tmpdir, is_relocatable):
     return src
 
 
-@pytest.mark.requires_executables(
-    '/usr/bin/gcc', 'patchelf', 'strings', 'file'
-)
+@pytest.mark.requires_executables('/usr/bin/gcc')
 def test_file_is_relocatable(source_file, is_relocatable):
     compiler = spack.util.executable.Executable('/usr/bin/gcc')
     executable = str(source_file).replace('.c', '.x')
-    compiler_env = {
-        'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'
-    }
     compiler(str(source_file), '-o', executable, env=compiler_env)
 
     assert spack.relocate.is_binary(executable)
@@ -78,3 +82,182 @@ def test_file_is_relocatable_errors(tmpdir):
         with pytest.raises(ValueError) as exc_info:
             spack.relocate.file_is_relocatable('delete.me')
         assert 'is not an absolute path' in str(exc_info.value)
+
+
+@pytest.mark.requires_executables('/usr/bin/gcc')
+def test_mime_type(tmpdir):
+    with tmpdir.as_cwd():
+        with open('hello.c', 'w') as f:
+            f.write('int main() { return 0; }\n')
+        gcc = spack.util.executable.Executable('/usr/bin/gcc')
+        gcc('-c', 'hello.c', '-o', 'hello.o', env=compiler_env)
+        gcc('-shared', '-fPIC', 'hello.c', '-o', 'libhello.so',
+            env=compiler_env)
+        os.symlink('libhello.so', 'libhello.so.1')
+        open('empty', 'w').close()
+        with open('data', 'wb') as f:
+            f.write(b'\x00\x01\x02')
+
+        mime_type = spack.relocate._magic_mime_type
+        assert mime_type('hello.c') == ('text', 'plain')
+        assert mime_type('hello.o') == ('application', 'x-object')
+        assert mime_type('libhello.so') == ('application', 'x-sharedlib')
+        assert mime_type('libhello.so.1') == ('inode', 'symlink')
+        assert mime_type('empty') == ('inode', 'x-empty')
+        assert mime_type('data') == ('application', 'octet-stream')
+
+
+@pytest.mark.requires_executables('/usr/bin/gcc')
+def test_relocate_elf_binaries(tmpdir):
+    old_dir = '/home/spack/opt/spack'
+    new_dir = '/opt/spack'
+    placeholder = spack.relocate.set_placeholder(old_dir)
+
+    src = tmpdir.join('main.c')
+    src.write('int main() { return 0; }\n')
+    gcc = spack.util.executable.Executable('/usr/bin/gcc')
+    binaries = []
+    for i, prefix in enumerate([old_dir, placeholder] * 4):
+        binary = str(tmpdir.join('main-{0}'.format(i)))
+        gcc(str(src), '-o', binary,
+            '-Wl,-rpath,{0}/lib:/usr/lib'.format(prefix), env=compiler_env)
+        binaries.append(binary)
+
+    spack.relocate.relocate_elf_binaries(binaries, old_dir, new_dir, False)
+    for binary in binaries:
+        assert spack.util.elf.get_rpaths(binary) == [
+            '/opt/spack/lib', '/usr/lib']
+        with open(binary, 'rb') as f:
+            assert old_dir.encode('utf-8') not in f.read()
+        spack.util.executable.Executable(binary)()
+
+
+def test_relocate_elf_binaries_without_rpaths(tmpdir, monkeypatch):
+    """Like patchelf did, only binaries with RPATHs are relocated."""
+    binaries = {'with-rpath': ['/old/lib'], 'without-rpath': []}
+    monkeypatch.setattr(spack.relocate, 'get_existing_elf_rpaths',
+                        lambda path: binaries[os.path.basename(path)])
+    monkeypatch.setattr(spack.relocate, 'modify_elf_object',
+                        lambda path, rpaths: None)
+    warnings = []
+    monkeypatch.setattr(spack.relocate.tty, 'warn',
+                        lambda msg: warnings.append(msg))
+
+    paths = [str(tmpdir.join(name)) for name in sorted(binaries)]
+    spack.relocate.relocate_elf_binaries(paths, '/old', '/longer', False)
+    assert len(warnings) == 1
+    assert paths[0] in warnings[0]
+
+
+@pytest.mark.parametrize('threshold', [512, 0])
+def test_relocate_text(tmpdir, monkeypatch, threshold):
+    # With a threshold of 0, files are relocated by a pool of processes
+    monkeypatch.setattr(spack.relocate, '_process_pool_threshold', threshold)
+    monkeypatch.setattr(multiprocessing, 'cpu_count', lambda: 2)
+    old_root, new_root = '/old/spack/opt/spack', '/new/spack/opt'
+    old_prefix, new_prefix = '/old/spack', '/new/spack/opt/spack'
+
+    script = tmpdir.join('script.sh')
+    script.write('#!/bin/bash /old/spack/bin/sbang\n'
+                 'exec /old/spack/opt/spack/bin/tool /old/spack/etc')
+    script.chmod(0o755)
+    other = tmpdir.join('other.txt')
+    other.write('/old/spack/opt/nothing/here\n')
+    untouched = tmpdir.join('untouched.txt')
+    untouched.write('nothing to relocate\n')
+    inode = os.stat(str(untouched)).st_ino
+
+    paths = [str(p) for p in (script, other, untouched)]
+    spack.relocate.relocate_text(paths, old_root, new_root,
+                                 old_prefix, new_prefix)
+
+    # All prefixes are replaced in one pass: the new install root isn't
+    # replaced again even though it contains the old Spack prefix
+    assert script.read() == (
+        '#!/bin/bash /new/spack/opt/spack/bin/sbang\n'
+        'exec /new/spack/opt/bin/tool /new/spack/opt/spack/etc')
+    assert os.stat(str(script)).st_mode & 0o777 == 0o755
+    assert other.read() == '/new/spack/opt/spack/opt/nothing/here\n'
+    assert os.stat(str(untouched)).st_ino == inode
+    assert sorted(os.listdir(str(tmpdir))) == [
+        'other.txt', 'script.sh', 'untouched.txt']
+
+
+def test_prefix_replacer_block_boundaries(tmpdir, monkeypatch):
+    monkeypatch.setattr(spack.relocate, '_block_size', 4)
+    replacer = spack.relocate.PrefixReplacer((('/old/prefix', '/new'),))
+
+    path = tmpdir.join('file.txt')
+    path.write('0123456/old/prefix/lib\n')
+    assert replacer.needs_relocation(str(path))
+    assert replacer.relocate(str(path))
+    assert path.read() == '0123456/new/lib\n'
+    assert not replacer.relocate(str(path))
+
+
+def test_prefix_replacer_rewrites_in_place(tmpdir):
+    """Relocated files keep their inode, so hard links to them see the
+    new contents, and their owner and group are unchanged."""
+    replacer = spack.relocate.PrefixReplacer((('/old/prefix', '/new'),))
+
+    path = tmpdir.join('file.txt')
+    path.write('/old/prefix/lib\n' * 3)
+    link = tmpdir.join('link.txt')
+    os.link(str(path), str(link))
+    before = os.stat(str(path))
+
+    assert replacer.relocate(str(path))
+    after = os.stat(str(path))
+    assert after.st_ino == before.st_ino
+    assert (after.st_uid, after.st_gid) == (before.st_uid, before.st_gid)
+    assert link.read() == '/new/lib\n' * 3
+    assert sorted(os.listdir(str(tmpdir))) == ['file.txt', 'link.txt']
+
+
+def test_replace_prefix_bin_without_nul(tmpdir, monkeypatch):
+    """Long runs of bytes without a NUL don't pile up in memory."""
+    monkeypatch.setattr(spack.relocate, '_block_size', 8)
+    path = tmpdir.join('binary')
+    data = b'x' * 100 + b'/old/prefix/lib' + b'y' * 20 + b'\0z'
+    path.write_binary(data)
+
+    spack.relocate.replace_prefix_bin(str(path), '/old/prefix', '/new')
+    assert path.read_binary() == (
+        b'x' * 100 + b'/new/lib' + b'y' * 20 + b'\0' * 8 + b'z')
+
+
+def test_replace_prefix_bin(tmpdir, monkeypatch):
+    monkeypatch.setattr(spack.relocate, '_block_size', 8)
+    path = tmpdir.join('binary')
+    data = (b'\x7fELF\0\0/old/prefix/lib\0' + b'x' * 30 +
+            b'\0/old/prefix/bin:/old/prefix/lib64\0\0')
+    path.write_binary(data)
+
+    spack.relocate.replace_prefix_bin(str(path), '/old/prefix', '/new')
+    assert path.read_binary() == (
+        b'\x7fELF\0\0/new/lib\0' + b'\0' * 7 + b'x' * 30 +
+        b'\0/new/bin:/new/lib64\0' + b'\0' * 14 + b'\0')
+
+
+@pytest.mark.parametrize('block_size', [4, 7, 16, 2 ** 20])
+def test_strings(tmpdir, monkeypatch, block_size):
+    monkeypatch.setattr(spack.relocate, '_block_size', block_size)
+    path = tmpdir.join('binary')
+    path.write_binary(
+        b'\x7fELF\0ab\0/usr/lib:/opt/lib\x01' +
+        b'a very long string of words that spans blocks' +
+        b'\0xyz\0' + b'z' * 40 + b'\0 tab\tsep')
+
+    assert spack.relocate.strings(str(path)) == set(
+        ['/usr/lib:/opt/lib', 'a', 'very', 'long', 'string', 'of', 'words',
+         'that', 'spans', 'blocks', 'z' * 40, 'tab', 'sep'])
+
+
+def test_strings_contains_installroot(tmpdir, monkeypatch):
+    monkeypatch.setattr(spack.relocate, '_block_size', 4)
+    path = tmpdir.join('binary')
+    path.write_binary(b'\x7fELF\0/some/install/root/lib\0')
+
+    contains = spack.relocate.strings_contains_installroot
+    assert contains(str(path), '/some/install/root')
+    assert not contains(str(path), '/other/install/root')
@@ -17,6 +17,7 @@ from llnl.util.filesystem import mkdirp
 
 import spack.paths
 from spack.hooks.sbang import shebang_too_long, filter_shebangs_in_directory
+from spack.hooks.sbang import filter_shebangs_in_prefix
 from spack.util.executable import which
 
 
@@ -157,3 +158,28 @@ def test_shebang_handles_non_writable_files(script_dir):
 
     st = os.stat(script_dir.long_shebang)
     assert oct(not_writable_mode) == oct(st.st_mode)
+
+
+def test_shebang_filtering_in_prefix(script_dir):
+    # Only executable files are patched
+    executables = [script_dir.long_shebang, script_dir.lua_shebang,
+                   script_dir.short_shebang, script_dir.has_sbang,
+                   script_dir.binary]
+    for path in executables:
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    os.symlink(script_dir.node_shebang,
+               os.path.join(script_dir.directory, 'link'))
+
+    filter_shebangs_in_prefix(script_dir.tempdir)
+
+    for path, first_line in ((script_dir.long_shebang, long_line),
+                             (script_dir.lua_shebang, lua_line_patched)):
+        with open(path, 'r') as f:
+            assert f.readline() == sbang_line
+            assert f.readline() == first_line
+
+    for path, first_line in ((script_dir.short_shebang, short_line),
+                             (script_dir.has_sbang, sbang_line),
+                             (script_dir.node_shebang, node_line)):
+        with open(path, 'r') as f:
+            assert f.readline() == first_line
@@ -7,6 +7,8 @@
 
 import pytest
 
+import llnl.util.lang
+
 import spack.util.spack_yaml as syaml
 
 
@@ -89,3 +91,49 @@ def test_yaml_aliases():
 
     # ensure no YAML aliases appear in syaml dumps.
     assert '*id' not in string
+
+
+@pytest.mark.parametrize('data', [
+    {},
+    [],
+    {'b': 1, 'a': [True, False, None, -3], 'c': {}, 'd': []},
+    syaml.syaml_dict([('z', 'x'), ('a', syaml.syaml_list(['y']))]),
+    {'strings': ['', 'true', 'no', '1.0', '0x1f', 'null', '~', 'a: b',
+                 '- x', '#c', 'a #b', ' lead', 'trail ', "it's", '"q"',
+                 '@x', '%x', '*', '&a', '!t', '{a}', '[b]', 'a,b', '1.2.3',
+                 '2019-01-01', '12:30', '<<', '? x', '---', u'e\xe9', 'a\tb',
+                 '$ORIGIN/../lib', 'foo=bar', 'x' * 200]},
+    syaml.syaml_dict([('true', 1), ('1.0', 2), ('a b', 3), ("it's", 4),
+                      (1, 5), (False, 6)]),
+    {'package_hash': b'abcdefghijklmnop' * 5},
+])
+def test_dump_flow(data):
+    expected = syaml.dump(data, default_flow_style=True, width=syaml.maxint)
+    assert syaml.dump_flow(data) == expected
+
+
+@pytest.mark.parametrize('data', [
+    'not a collection',
+    {'multi\nline': 1},
+    {'value': 'multi\nline'},
+    {'': 1},
+    {'x' * 128: 1},
+    {'float': 1.5},
+    {'tuple': (1, 2)},
+])
+def test_dump_flow_unsupported(data):
+    with pytest.raises(syaml.UnsupportedFlowData):
+        syaml.dump_flow(data)
+
+
+def test_dump_flow_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(syaml, '_flow_scalars',
+                        llnl.util.lang.LRUCache(maxsize=4))
+    data = {'strings': ['value%d' % i for i in range(10)] + ['true']}
+
+    expected = syaml.dump(data, default_flow_style=True, width=syaml.maxint)
+    assert syaml.dump_flow(data) == expected
+    assert len(syaml._flow_scalars) == 4
+
+    # Results are the same once the cache is full
+    assert syaml.dump_flow(data) == expected
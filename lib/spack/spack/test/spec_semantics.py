@@ -976,3 +976,29 @@ class TestSpecSematics(object):
     def test_target_constraints(self, spec, constraint, expected_result):
         s = Spec(spec)
         assert s.satisfies(constraint) is expected_result
+
+    def test_interned_specs_are_not_modified(self):
+        # Strings that specs are compared against are parsed only once,
+        # so constraining with the same string must not modify them
+        s = Spec('mpileaks ^mpich')
+        assert s.satisfies('%gcc@4.5:')
+        s.constrain('%gcc@4.5:')
+        s.compiler.constrain('gcc@4.5.2')
+        assert s.compiler.satisfies('gcc@4.5.2')
+
+        t = Spec('mpileaks')
+        t.constrain('%gcc@4.5:')
+        assert str(t.compiler) == 'gcc@4.5:'
+        assert '%gcc@4.5:' in t
+        assert spack.spec.CompilerSpec('gcc@4.5.2') is not \
+            spack.spec.CompilerSpec('gcc@4.5.2')
+
+    def test_cmp_key_of_shared_dependencies(self):
+        # Hashes of dependencies are computed once per DAG, which must
+        # give the same key as computing the key of each node separately
+        s = Spec('mpileaks ^mpich')
+        s.normalize()
+        libelf_hash = hash(s['libelf']._cmp_key())
+        dyninst_deps = s['dyninst']._cmp_key()[1]
+        assert ('libelf', libelf_hash, ('build', 'link')) in dyninst_deps
+        assert s._cmp_key() == s.copy()._cmp_key()
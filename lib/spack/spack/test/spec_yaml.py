@@ -12,7 +12,10 @@ import os
 
 from collections import Iterable, Mapping
 
+import pytest
+
 import spack.hash_types as ht
+import spack.spec
 import spack.util.spack_json as sjson
 import spack.util.spack_yaml as syaml
 
@@ -249,3 +252,26 @@ def test_save_dependency_spec_yamls_subset(tmpdir, config):
 
         assert check_specs_equal(b_spec, os.path.join(output_path, 'b.yaml'))
         assert check_specs_equal(c_spec, os.path.join(output_path, 'c.yaml'))
+
+
+@pytest.mark.parametrize('hash_type', [
+    ht.dag_hash, ht.build_hash, ht.full_hash])
+def test_fast_hash_matches_yaml(config, mock_packages, hash_type):
+    spec = Spec('mpileaks ^zmpi cflags=-O3').concretized()
+    for node in spec.traverse(deptype='all'):
+        node_dict = node.to_node_dict(hash=hash_type)
+        fast = spack.spec.flow_sha1(node_dict)
+        assert fast is not None
+        assert fast.digest() == spack.spec.yaml_sha1(node_dict).digest()
+
+
+def test_verify_spec_hashes(config, mock_packages, monkeypatch):
+    monkeypatch.setattr(spack.spec, 'verify_spec_hashes', True)
+    spec = Spec('mpileaks').concretized()
+    spec.full_hash()
+
+    # A fast encoder that disagrees with the YAML text is caught
+    monkeypatch.setattr(spack.spec, 'flow_sha1',
+                        lambda node: spack.spec.yaml_sha1({'other': node}))
+    with pytest.raises(spack.spec.SpecHashMismatchError):
+        spec.copy().dag_hash()
@@ -0,0 +1,37 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import gzip
+import io
+import os
+
+import pytest
+
+from spack.util.compression import ParallelGzipWriter
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_parallel_gzip_writer(tmpdir, jobs):
+    data = b''.join(os.urandom(100) * (i + 1) for i in range(200))
+
+    path = str(tmpdir.join('data.gz'))
+    with open(path, 'wb') as f:
+        writer = ParallelGzipWriter(f, jobs=jobs, block_size=4096)
+        for i in range(0, len(data), 1000):
+            writer.write(data[i:i + 1000])
+        writer.close()
+
+    # The blocks make up a single gzip member
+    with open(path, 'rb') as f:
+        assert gzip.GzipFile(fileobj=f).read() == data
+
+    with pytest.raises(ValueError):
+        writer.write(b'closed')
+
+
+def test_parallel_gzip_writer_empty():
+    buf = io.BytesIO()
+    ParallelGzipWriter(buf).close()
+    assert gzip.GzipFile(fileobj=io.BytesIO(buf.getvalue())).read() == b''
@@ -0,0 +1,85 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import pytest
+
+import spack.util.elf as elf
+import spack.util.executable
+
+pytestmark = pytest.mark.requires_executables('/usr/bin/gcc')
+
+
+def compile_c(tmpdir, name, *args):
+    """Compile a program that prints hello with /usr/bin/gcc."""
+    src = tmpdir.join('hello.c')
+    src.write('#include <stdio.h>\n'
+              'int main() { puts("hello"); return 0; }\n')
+    gcc = spack.util.executable.Executable('/usr/bin/gcc')
+    output = str(tmpdir.join(name))
+    # Keep the environment of other tests (e.g. LD_RUN_PATH) out of here
+    gcc(str(src), '-o', output, *args, env={
+        'PATH': '/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'
+    })
+    return output
+
+
+@pytest.mark.parametrize('dtags,attribute', [
+    ('--disable-new-dtags', 'rpath'),
+    ('--enable-new-dtags', 'runpath'),
+])
+def test_parse_elf(tmpdir, dtags, attribute):
+    path = compile_c(tmpdir, 'hello',
+                     '-Wl,{0},-rpath,/opt/a/lib:/opt/b/lib'.format(dtags))
+
+    parsed = elf.parse_elf(path)
+    assert parsed.elf_type in (elf.ET_EXEC, elf.ET_DYN)
+    assert any(lib.startswith('libc.so') for lib in parsed.needed)
+    assert getattr(parsed, attribute) == ['/opt/a/lib', '/opt/b/lib']
+    assert parsed.rpaths == ['/opt/a/lib', '/opt/b/lib']
+    assert parsed.rpath_capacity == len('/opt/a/lib:/opt/b/lib')
+
+
+def test_parse_shared_library(tmpdir):
+    path = compile_c(tmpdir, 'libhello.so', '-shared', '-fPIC',
+                     '-Wl,-soname,libhello.so.1')
+    parsed = elf.parse_elf(path)
+    assert parsed.elf_type == elf.ET_DYN
+    assert parsed.soname == 'libhello.so.1'
+    assert parsed.rpaths == []
+
+
+def test_parse_non_elf_file(tmpdir):
+    path = tmpdir.join('text')
+    path.write('\x7fELF is not enough')
+    with pytest.raises(elf.ElfParsingError):
+        elf.parse_elf(str(path))
+    assert elf.get_rpaths(str(path)) is None
+
+
+def test_set_rpath(tmpdir):
+    path = compile_c(tmpdir, 'hello',
+                     '-Wl,--enable-new-dtags,-rpath,/opt/a/lib:/opt/b/lib')
+
+    elf.set_rpath(path, ['/c/lib', '$ORIGIN/../lib'])
+    parsed = elf.parse_elf(path)
+    assert parsed.rpath == ['/c/lib', '$ORIGIN/../lib']
+    assert parsed.runpath is None
+    # The old string is cleared, and the program still works
+    with open(path, 'rb') as f:
+        assert b'/opt/a/lib' not in f.read()
+    assert spack.util.executable.Executable(path)(output=str) == 'hello\n'
+
+    elf.set_rpath(path, ['/d/lib'], force_rpath=False)
+    assert elf.get_rpaths(path) == ['/d/lib']
+
+
+def test_set_rpath_does_not_fit(tmpdir):
+    path = compile_c(tmpdir, 'hello', '-Wl,-rpath,/opt/a/lib')
+    with pytest.raises(elf.ElfDynamicSectionUpdateFailed):
+        elf.set_rpath(path, ['/a/much/longer/path/than/before/lib'])
+
+    path = compile_c(tmpdir, 'no-rpath')
+    with pytest.raises(elf.ElfDynamicSectionUpdateFailed):
+        elf.set_rpath(path, ['/opt/a/lib'])
@@ -0,0 +1,59 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+import subprocess
+import sys
+
+import six
+
+import spack.paths
+import spack.util.import_profile as import_profile
+
+
+def test_import_profile(tmpdir, monkeypatch):
+    pkg = tmpdir.mkdir('profiled_pkg')
+    pkg.join('__init__.py').write('from . import child\n')
+    pkg.join('child.py').write('import time\ntime.sleep(0.05)\n')
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.setattr(import_profile, '_records', {})
+    monkeypatch.setattr(import_profile, '_total', [0.0])
+
+    import_profile.start()
+    try:
+        __import__('profiled_pkg')
+        # Already imported, so not recorded again
+        __import__('profiled_pkg')
+    finally:
+        import_profile.stop()
+        sys.modules.pop('profiled_pkg', None)
+        sys.modules.pop('profiled_pkg.child', None)
+
+    records = import_profile._records
+    assert sorted(records) == ['profiled_pkg', 'profiled_pkg.child']
+    parent, child = records['profiled_pkg'], records['profiled_pkg.child']
+    assert child[0] >= 0.05
+    assert parent[0] >= child[0]
+    assert parent[1] < parent[0] - child[0] + 0.001
+
+    out = six.StringIO()
+    import_profile.report(1, stream=out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].startswith('2 imports recorded')
+    assert len(lines) == 3
+    assert lines[2].endswith('  profiled_pkg')
+
+
+def test_profile_imports_option():
+    spack_script = spack.paths.spack_script
+    output = subprocess.check_output(
+        [sys.executable, spack_script, '--profile-imports', '--lines', 'all',
+         '--version'])
+    output = output.decode('utf-8')
+    assert 'imports recorded' in output
+    assert '  spack.main\n' in output
+
+    # Nothing needed to print the version loads environments or templates
+    assert '  spack.environment\n' not in output
+    assert '  jinja2\n' not in output
@@ -0,0 +1,163 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Test the manifests of the files in installation prefixes."""
+import hashlib
+import os
+
+import pytest
+
+from llnl.util.filesystem import mkdirp
+
+import spack.util.prefix_files as prefix_files
+
+
+@pytest.fixture()
+def prefix(tmpdir):
+    """An installation prefix with a script, a binary and a link."""
+    prefix = str(tmpdir.join('prefix'))
+    mkdirp(os.path.join(prefix, '.spack'))
+    mkdirp(os.path.join(prefix, 'bin'))
+    with open(os.path.join(prefix, 'bin', 'script'), 'w') as f:
+        f.write('#!/bin/sh\necho hello\n')
+    with open(os.path.join(prefix, 'bin', 'binary'), 'wb') as f:
+        f.write(b'\x7fELF\x02\x01\x01' + b'\0' * 9 + b'\x03\0' + b'\0' * 64)
+    os.symlink('script', os.path.join(prefix, 'bin', 'link'))
+    return prefix
+
+
+def _by_path(entries, prefix):
+    return dict((os.path.relpath(e.path, prefix), e) for e in entries)
+
+
+def test_scan_prefix(prefix):
+    entries = prefix_files.scan_prefix(prefix, jobs=2)
+    assert entries[0].path == prefix and entries[0].isdir
+
+    entries = _by_path(entries, prefix)
+    assert set(entries) == set(['.', '.spack', 'bin', 'bin/script',
+                                'bin/binary', 'bin/link'])
+
+    script = entries['bin/script']
+    assert script.isfile
+    assert script.type == 'text/plain'
+    assert script.shebang == '#!/bin/sh\n'
+    assert script.size == 21
+    assert script.hash is None
+
+    assert entries['bin/binary'].mime_type == ('application', 'x-sharedlib')
+    assert entries['bin/binary'].shebang is None
+    assert entries['bin/link'].islink
+    assert entries['bin/link'].type == 'inode/symlink'
+    assert entries['bin'].type == 'inode/directory'
+
+
+def test_scan_prefix_hashes(prefix):
+    entries = _by_path(prefix_files.scan_prefix(prefix, hashes=True), prefix)
+    assert entries['bin/script'].hash == hashlib.sha256(
+        b'#!/bin/sh\necho hello\n').hexdigest()
+    assert entries['bin/script'].shebang == '#!/bin/sh\n'
+    assert entries['bin/link'].hash == hashlib.sha256(b'script').hexdigest()
+    assert entries['bin'].hash is None
+
+
+def test_manifest_reuses_unchanged_files(prefix, monkeypatch):
+    written = prefix_files.write_manifest(prefix)
+    assert os.path.exists(prefix_files.manifest_path(prefix))
+    assert prefix_files.read_manifest(prefix) == written
+
+    # The manifest file isn't in the manifest
+    assert all(e.path != prefix_files.manifest_path(prefix)
+               for e in prefix_files.files_in(prefix))
+
+    read = []
+    describe_files = prefix_files._describe_files
+    monkeypatch.setattr(prefix_files, '_describe_files',
+                        lambda entries, hashes: read.extend(entries) or
+                        describe_files(entries, hashes))
+
+    script = os.path.join(prefix, 'bin', 'script')
+    with open(script, 'a') as f:
+        f.write('echo world\n')
+
+    entries = _by_path(prefix_files.files_in(prefix), prefix)
+    assert [e.path for e in read] == [script]
+    assert entries['bin/script'].size == 32
+    assert entries['bin/binary'] == _by_path(written, prefix)['bin/binary']
+
+    # Files are read again to hash them if the manifest has no hashes
+    del read[:]
+    prefix_files.write_manifest(prefix, hashes=True)
+    assert sorted(e.path for e in read) == sorted(
+        os.path.join(prefix, 'bin', name) for name in ('script', 'binary'))
+
+    del read[:]
+    prefix_files.write_manifest(prefix, hashes=True)
+    assert not read
+
+
+def test_shared_listing(prefix, monkeypatch):
+    scans = []
+    scan_prefix = prefix_files.scan_prefix
+    monkeypatch.setattr(prefix_files, 'scan_prefix',
+                        lambda prefix, **kwargs: scans.append(prefix) or
+                        scan_prefix(prefix, **kwargs))
+
+    with prefix_files.shared_listing(prefix):
+        assert not scans
+        listing = prefix_files.files_in(prefix)
+        with prefix_files.shared_listing(prefix):
+            assert prefix_files.files_in(prefix) is listing
+        assert prefix_files.files_in(prefix) is listing
+        assert len(scans) == 1
+
+        # Writing the manifest updates the shared listing
+        os.remove(os.path.join(prefix, 'bin', 'link'))
+        written = prefix_files.write_manifest(prefix)
+        assert prefix_files.files_in(prefix) is written
+        assert len(written) == len(listing) - 1
+
+    prefix_files.files_in(prefix)
+    assert len(scans) == 3
+
+
+def test_changed_files(prefix):
+    with pytest.raises(prefix_files.MissingManifestError):
+        prefix_files.changed_files(prefix)
+
+    prefix_files.write_manifest(prefix, hashes=True)
+    assert prefix_files.changed_files(prefix) == []
+
+    # Same size and modification time, but different contents
+    script = os.path.join(prefix, 'bin', 'script')
+    st = os.stat(script)
+    with open(script, 'w') as f:
+        f.write('#!/bin/sh\necho HELLO\n')
+    os.utime(script, (st.st_atime, st.st_mtime))
+
+    os.remove(os.path.join(prefix, 'bin', 'link'))
+    with open(os.path.join(prefix, 'bin', 'new'), 'w') as f:
+        f.write('new\n')
+
+    assert prefix_files.changed_files(prefix) == sorted(
+        os.path.join(prefix, 'bin', name)
+        for name in ('script', 'link', 'new'))
+
+
+def test_changed_files_without_hashes(prefix):
+    prefix_files.write_manifest(prefix)
+    assert prefix_files.changed_files(prefix) == []
+
+    # Without hashes, files are compared by size and modification time
+    script = os.path.join(prefix, 'bin', 'script')
+    st = os.stat(script)
+    with open(script, 'w') as f:
+        f.write('#!/bin/sh\necho HELLO\n')
+    os.utime(script, (st.st_atime, st.st_mtime))
+    assert prefix_files.changed_files(prefix) == []
+
+    with open(script, 'a') as f:
+        f.write('echo world\n')
+    assert prefix_files.changed_files(prefix) == [script]
@@ -5,12 +5,15 @@
 
 """Tests for Spack's wrapper module around llnl.util.lock."""
 import os
+import subprocess
+import sys
 
 import pytest
 
 from llnl.util.filesystem import group_ids
 
 import spack.config
+import spack.paths
 import spack.util.lock as lk
 
 
@@ -106,3 +109,10 @@ def test_lock_checks_group(tmpdir):
     # safe
     tmpdir.chmod(0o477)
     lk.check_lock_safety(path)
+
+
+def test_debug_reports_lock_waits_on_exit():
+    """Ensure that ``spack -d`` still runs commands that don't lock."""
+    output = subprocess.check_output(
+        [sys.executable, spack.paths.spack_script, '-d', '-V'])
+    assert output.decode('utf-8').strip() == spack.spack_version
@@ -560,3 +560,21 @@ def test_list_highest():
     assert vl2.highest_numeric() is None
     assert vl2.preferred() == Version('develop')
     assert vl2.lowest() == Version('master')
+
+
+def test_versions_are_interned():
+    assert ver('1.2.3') is ver('1.2.3')
+    assert ver('1.2:1.4') is ver('1.2:1.4')
+
+    # Lists can be modified, so each caller gets its own
+    assert ver('1.2,1.4') is not ver('1.2,1.4')
+
+
+def test_memoized_intersection_is_not_shared():
+    a, b = VersionList(['1.2:1.6']), VersionList(['1.4:2.0'])
+    first = a.intersection(b)
+    first.add(ver('3.0'))
+
+    assert a.intersection(b) == VersionList(['1.4:1.6'])
+    assert a.satisfies(b)
+    assert not a.satisfies(b, strict=True)
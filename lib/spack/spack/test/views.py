@@ -5,6 +5,8 @@
 
 import os
 
+import spack.store
+from spack.filesystem_view import YamlFilesystemView
 from spack.spec import Spec
 
 
@@ -27,3 +29,50 @@ def test_global_activation(install_mockery, mock_fetch):
         extendee_spec.prefix, '.spack', 'extensions.yaml')
     assert (view.extensions_layout.extension_file_path(extendee_spec) ==
             expected_path)
+
+
+def test_view_manifest(tmpdir, install_mockery, mock_fetch, monkeypatch):
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install(fake=True)
+
+    root = str(tmpdir.join('view'))
+    view = YamlFilesystemView(root, spack.store.layout)
+    view.add_specs(spec)
+    assert os.path.exists(os.path.join(root, '.spack', 'manifest.json'))
+
+    libelf = spec['libelf']
+    files = view.manifest.files(libelf)
+    assert files and all(os.path.islink(f) for f in files)
+
+    # A new view object reads the manifest instead of walking the view
+    def no_walk(*args, **kwargs):
+        raise AssertionError('the view was walked')
+    monkeypatch.setattr(os, 'walk', no_walk)
+
+    view = YamlFilesystemView(root, spack.store.layout)
+    assert set(view.get_all_specs()) == set([spec, libelf])
+    assert view.get_spec(libelf) == libelf
+    assert view.get_spec('mpich') is None
+
+    view.remove_specs(spec, with_dependents=False)
+    assert YamlFilesystemView(
+        root, spack.store.layout).get_all_specs() == [libelf]
+
+    view.remove_specs(libelf)
+    assert not any(os.path.lexists(f) for f in files)
+    assert not os.path.exists(os.path.join(root, '.spack', 'manifest.json'))
+
+
+def test_view_manifest_of_old_view(tmpdir, install_mockery, mock_fetch):
+    spec = Spec('libdwarf').concretized()
+    spec.package.do_install(fake=True)
+
+    root = str(tmpdir.join('view'))
+    YamlFilesystemView(root, spack.store.layout).add_specs(spec)
+
+    # Views without a manifest are walked once to make one
+    manifest = os.path.join(root, '.spack', 'manifest.json')
+    os.remove(manifest)
+    view = YamlFilesystemView(root, spack.store.layout)
+    assert set(view.get_all_specs()) == set([spec, spec['libelf']])
+    assert os.path.exists(manifest)
@@ -5,8 +5,15 @@
 
 """Tests for web.py."""
 import os
+import threading
+import time
+
+import pytest
+from six.moves import BaseHTTPServer, socketserver
 
 import spack.paths
+import spack.util.file_cache
+import spack.util.web
 from spack.util.web import spider, find_versions_of_archive
 from spack.version import ver
 
@@ -141,3 +148,131 @@ def test_find_exotic_versions_of_archive_3():
     assert ver('2.0.0b2') in versions
     assert ver('3.0a1') in versions
     assert ver('4.5-rc5') in versions
+
+
+class _PageServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Serves the test pages over HTTP, with ETags, and records how many
+    requests it got and how many it handled at the same time."""
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(
+            self, ('127.0.0.1', 0), _PageHandler)
+        self.url = 'http://127.0.0.1:{0}'.format(self.server_address[1])
+        self.lock = threading.Lock()
+        self.delay = 0
+        self.requests = []
+        self.active = 0
+        self.peak = 0
+
+
+class _PageHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def _respond(self, body):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path))
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            time.sleep(server.delay)
+
+            path = os.path.join(web_data_path, self.path.lstrip('/'))
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+            with open(path, 'rb') as f:
+                content = f.read()
+
+            etag = '"{0}"'.format(len(content))
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header('Content-type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            if body:
+                self.wfile.write(content)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def page_server(tmpdir, monkeypatch):
+    """Local HTTP server of the test pages, with an empty page cache."""
+    monkeypatch.setattr(spack.caches, 'misc_cache',
+                        spack.util.file_cache.FileCache(str(tmpdir)))
+
+    server = _PageServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_spider_http(page_server):
+    http_root = page_server.url + '/index.html'
+    pages, links = spider(http_root, depth=3)
+
+    assert set(pages) == set(
+        page_server.url + '/' + name for name in
+        ('index.html', '1.html', '2.html', '3.html', '4.html'))
+    assert "This is page 4." in pages[page_server.url + '/4.html']
+    assert http_root in links
+
+    # every page is fetched once, even though page 3 links back to root
+    gets = [path for method, path in page_server.requests if method == 'GET']
+    assert sorted(gets) == sorted(set(gets))
+
+
+def test_spider_revalidates_cached_pages(page_server):
+    http_root = page_server.url + '/index.html'
+    first = spider(http_root, depth=3)
+    del page_server.requests[:]
+
+    # Cached pages are requested again with their ETag, and the server
+    # only answers that they did not change.
+    assert spider(http_root, depth=3) == first
+    assert len(page_server.requests) == 5
+    assert all(method == 'GET' for method, path in page_server.requests)
+
+
+def test_find_versions_resumes_from_cached_pages(page_server):
+    http_root = page_server.url + '/index.html'
+    tarball = page_server.url + '/foo-0.0.0.tar.gz'
+    versions = find_versions_of_archive(tarball, http_root, list_depth=3)
+    assert ver('4.5') in versions
+    fetched = set(path for method, path in page_server.requests
+                  if method == 'GET')
+    del page_server.requests[:]
+
+    # Recent listing pages are reused without any request
+    assert find_versions_of_archive(
+        tarball, http_root, list_depth=3) == versions
+    assert len(fetched) == 5
+    assert not any(path in fetched for method, path in page_server.requests)
+
+
+def test_spider_connections_per_host(page_server, monkeypatch):
+    monkeypatch.setattr(spack.util.web, 'connections_per_host', 1)
+    page_server.delay = 0.05
+
+    spider(page_server.url + '/index.html', depth=3)
+    assert page_server.peak == 1
@@ -0,0 +1,222 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Compact binary format for Spack's install database index.
+
+The JSON index is the interchange format for the database, but reading
+it requires parsing the whole file and building every spec before the
+first query can run.  This module implements a memory-mappable table of
+fixed-size records, sorted by DAG hash, that point into a table of
+interned strings.  A reader can look at record metadata (name, path,
+install status, ...) without decoding the serialized specs at all.
+
+The layout of a file is::
+
+    header | string offsets | records | string blob
+
+All integers are little-endian.  Each string is stored exactly once in
+the blob, and both records and metadata refer to strings by index.
+"""
+import collections
+import mmap
+import struct
+import sys
+
+import spack.error
+
+__all__ = ['IndexEntry', 'CompactIndex', 'write', 'CompactIndexError']
+
+#: Magic bytes at the start of every compact index
+_magic = b'SPACKIDX'
+
+#: Version of the binary layout (not of the database contents)
+_format_version = 1
+
+#: magic, format version, number of strings, number of records,
+#: number of metadata entries
+_header = struct.Struct('<8sIIII')
+
+#: offset and length of each string in the blob
+_string_entry = struct.Struct('<II')
+
+#: key, name, path, spec, dependencies, ref_count, flags, installation time
+_record = struct.Struct('<IIIIIiB3xd')
+
+#: metadata entries are pairs of string indices
+_metadata_entry = struct.Struct('<II')
+
+#: placeholder index for fields that are ``None``
+_none = 0xFFFFFFFF
+
+_installed_flag = 0x1
+_explicit_flag = 0x2
+
+
+#: One record of the index.  ``spec`` is the index of the serialized
+#: spec in the string table (see ``CompactIndex.string()``), and
+#: ``dependencies`` is a list of the keys of the record's dependencies.
+IndexEntry = collections.namedtuple('IndexEntry', [
+    'key', 'name', 'path', 'spec', 'dependencies', 'ref_count', 'installed',
+    'explicit', 'installation_time'])
+
+
+def write(stream, entries, metadata=None):
+    """Write a compact index to a binary stream.
+
+    Arguments:
+        stream (file): binary stream to write to
+        entries (iterable): ``IndexEntry`` objects, where the ``spec``
+            field holds the serialized spec as a string
+        metadata (dict, optional): string keys and values stored along
+            with the records
+    """
+    strings = []
+    string_ids = {}
+
+    def intern(s):
+        if s is None:
+            return _none
+        idx = string_ids.get(s)
+        if idx is None:
+            idx = string_ids[s] = len(strings)
+            strings.append(s)
+        return idx
+
+    metadata = metadata or {}
+    meta = [(intern(k), intern(v)) for k, v in sorted(metadata.items())]
+
+    records = []
+    for e in sorted(entries, key=lambda e: e.key):
+        flags = ((_installed_flag if e.installed else 0) |
+                 (_explicit_flag if e.explicit else 0))
+        records.append(_record.pack(
+            intern(e.key), intern(e.name), intern(e.path), intern(e.spec),
+            intern(' '.join(e.dependencies)), e.ref_count, flags,
+            e.installation_time))
+
+    blob = []
+    offsets = []
+    offset = 0
+    for s in strings:
+        data = s.encode('utf-8') if not isinstance(s, bytes) else s
+        offsets.append(_string_entry.pack(offset, len(data)))
+        blob.append(data)
+        offset += len(data)
+
+    stream.write(_header.pack(
+        _magic, _format_version, len(strings), len(records), len(meta)))
+    for entry in meta:
+        stream.write(_metadata_entry.pack(*entry))
+    stream.write(b''.join(offsets))
+    stream.write(b''.join(records))
+    stream.write(b''.join(blob))
+
+
+class CompactIndex(object):
+    """Read-only view of a compact index file.
+
+    The file is memory-mapped, so opening an index costs a constant
+    amount of work regardless of how many records it holds.  Strings are
+    decoded and interned only when they are first requested.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error) as e:
+                raise CompactIndexError(
+                    "Cannot map compact index %s" % path, str(e))
+
+        if len(self._map) < _header.size:
+            raise CompactIndexError("Truncated compact index: %s" % path)
+
+        magic, version, nstrings, nrecords, nmeta = _header.unpack_from(
+            self._map, 0)
+        if magic != _magic or version != _format_version:
+            raise CompactIndexError("Not a compact index: %s" % path)
+
+        self._nstrings = nstrings
+        self._nrecords = nrecords
+
+        meta_offset = _header.size
+        self._strings_offset = meta_offset + nmeta * _metadata_entry.size
+        self._records_offset = (
+            self._strings_offset + nstrings * _string_entry.size)
+        self._blob_offset = self._records_offset + nrecords * _record.size
+        if self._blob_offset > len(self._map):
+            raise CompactIndexError("Truncated compact index: %s" % path)
+
+        self._cache = {}
+
+        self.metadata = {}
+        for i in range(nmeta):
+            k, v = _metadata_entry.unpack_from(
+                self._map, meta_offset + i * _metadata_entry.size)
+            self.metadata[self.string(k)] = self.string(v)
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self._nrecords
+
+    def string(self, idx):
+        """Return the string at index ``idx`` in the string table."""
+        if idx == _none:
+            return None
+
+        s = self._cache.get(idx)
+        if s is None:
+            if not 0 <= idx < self._nstrings:
+                raise CompactIndexError(
+                    "Invalid string reference in %s" % self.path)
+            offset, length = _string_entry.unpack_from(
+                self._map, self._strings_offset + idx * _string_entry.size)
+            start = self._blob_offset + offset
+            s = self._map[start:start + length]
+            if sys.version_info[0] >= 3:
+                s = s.decode('utf-8')
+            self._cache[idx] = s
+        return s
+
+    def _key(self, i):
+        idx, = struct.unpack_from(
+            '<I', self._map, self._records_offset + i * _record.size)
+        return self.string(idx)
+
+    def entry(self, i):
+        """Return the ``i``-th record, in hash order."""
+        key, name, path, spec, deps, ref_count, flags, inst_time = \
+            _record.unpack_from(
+                self._map, self._records_offset + i * _record.size)
+        return IndexEntry(
+            self.string(key), self.string(name), self.string(path), spec,
+            self.string(deps).split(), ref_count,
+            bool(flags & _installed_flag), bool(flags & _explicit_flag),
+            inst_time)
+
+    def find(self, key):
+        """Binary search for the record with hash ``key``, or ``None``."""
+        lo, hi = 0, self._nrecords
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = self._key(mid)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return self.entry(mid)
+        return None
+
+    def __iter__(self):
+        for i in range(self._nrecords):
+            yield self.entry(i)
+
+
+class CompactIndexError(spack.error.SpackError):
+    """Raised when a compact index cannot be read."""
@@ -3,8 +3,13 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+import collections
+import multiprocessing
+import multiprocessing.pool
 import re
 import os
+import struct
+import zlib
 from itertools import product
 from spack.util.executable import which
 
@@ -61,3 +66,102 @@ def extension(path):
         if re.search(suffix, path):
             return t
     return None
+
+
+def _deflate(block, level):
+    """Raw deflate data for ``block`` that ends on a byte boundary, so that
+    it can be followed by the deflate data of the next block."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipWriter(object):
+    """Write-only file object that gzips its data with a pool of threads.
+
+    Like ``pigz``, the data is split into blocks that are compressed
+    independently, and the results are joined in a single gzip member.
+    Any gzip reader can read the output.  ``zlib`` releases the GIL
+    while it compresses, so the blocks are compressed in parallel.
+
+    The underlying file is not closed by ``close()``, as with
+    ``gzip.GzipFile(fileobj=...)``.
+
+    Args:
+        fileobj: binary file object the compressed data is written to
+        jobs (int, optional): number of threads.  Defaults to the number
+            of CPUs.
+        level (int): compression level, from 1 to 9
+        block_size (int): size of the blocks of uncompressed data
+    """
+
+    def __init__(self, fileobj, jobs=None, level=6, block_size=2 ** 20):
+        if jobs is None:
+            jobs = multiprocessing.cpu_count()
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.closed = False
+
+        self._pool = None
+        if jobs > 1:
+            self._pool = multiprocessing.pool.ThreadPool(jobs)
+        # Compressed blocks that are waiting to be written, in order.
+        # Limiting them bounds the memory used by a fast producer.
+        self._pending = collections.deque()
+        self._max_pending = 2 * jobs
+        self._buffer = []
+        self._buffered = 0
+        self._crc = zlib.crc32(b'')
+        self._size = 0
+
+        # Header: magic number, deflate, no flags, no mtime, unknown OS
+        fileobj.write(b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff')
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to closed file')
+        data = bytes(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.block_size:
+            self._compress(b''.join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def _compress(self, block):
+        if self._pool is None:
+            self.fileobj.write(_deflate(block, self.level))
+            return
+
+        self._pending.append(
+            self._pool.apply_async(_deflate, (block, self.level)))
+        while len(self._pending) > self._max_pending:
+            self.fileobj.write(self._pending.popleft().get())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Compress what is left and write the gzip trailer."""
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._compress(b''.join(self._buffer))
+                self._buffer = []
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().get())
+
+            # An empty final block ends the deflate stream
+            compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            self.fileobj.write(compressor.flush(zlib.Z_FINISH))
+            self.fileobj.write(struct.pack(
+                '<II', self._crc & 0xffffffff, self._size & 0xffffffff))
+        finally:
+            self.closed = True
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
@@ -0,0 +1,316 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Read and modify the dynamic section of ELF files.
+
+Relocating a binary only needs the strings referenced by its dynamic
+section: ``DT_RPATH``, ``DT_RUNPATH``, ``DT_NEEDED`` and ``DT_SONAME``.
+Reading them here, rather than running ``patchelf`` on every file,
+avoids spawning a process per binary.
+
+Only the headers, the program headers, the dynamic segment and the
+dynamic string table are read, so parsing is cheap even for very large
+files.  The rpath can be changed in place as long as the new value fits
+in the space of the old string, which is the common case when
+relocating to a prefix that is not longer than the original one.
+Anything else (e.g. growing the string table) is left to ``patchelf``.
+"""
+import struct
+
+import spack.error
+
+__all__ = ['ElfFile', 'parse_elf', 'get_rpaths', 'set_rpath']
+
+#: First bytes of every ELF file
+ELF_MAGIC = b'\x7fELF'
+
+# Values of e_ident[EI_CLASS] and e_ident[EI_DATA]
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+# Values of e_type
+ET_REL = 1
+ET_EXEC = 2
+ET_DYN = 3
+ET_CORE = 4
+
+# Values of p_type
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+# Values of d_tag
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+#: struct formats of the ELF header (after e_ident), the program headers
+#: and the dynamic entries, keyed by ELF class
+_formats = {
+    ELFCLASS32: ('HHIIIIIHHHHHH', 'IIIIIIII', 'iI'),
+    ELFCLASS64: ('HHIQQQIHHHHHH', 'IIQQQQQQ', 'qQ'),
+}
+
+
+class ElfFile(object):
+    """What Spack needs to know about an ELF file.
+
+    Attributes:
+        path (str): path of the file
+        is_64_bit (bool): whether this is an ELFCLASS64 file
+        is_little_endian (bool): byte order of the file
+        elf_type (int): ``ET_EXEC``, ``ET_DYN``, etc.
+        needed (list): libraries in ``DT_NEEDED`` entries
+        soname (str): value of ``DT_SONAME``, if any
+        rpath (list): directories in ``DT_RPATH``, if any
+        runpath (list): directories in ``DT_RUNPATH``, if any
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.is_64_bit = False
+        self.is_little_endian = True
+        self.elf_type = None
+        self.needed = []
+        self.soname = None
+        self.rpath = None
+        self.runpath = None
+
+        # Byte order prefix for struct formats
+        self._byte_order = '<'
+        # (file offset, d_tag) of the DT_RPATH and DT_RUNPATH entries
+        self._rpath_entries = []
+        # (file offset, size) of the strings they point to
+        self._rpath_strings = []
+        # Size in bytes of a dynamic entry
+        self._entry_size = 8
+
+    @property
+    def rpaths(self):
+        """Run-time search path, as reported by ``patchelf --print-rpath``.
+
+        This is ``DT_RUNPATH`` if the file has one, since the dynamic
+        linker ignores ``DT_RPATH`` in that case.
+        """
+        if self.runpath is not None:
+            return self.runpath
+        if self.rpath is not None:
+            return self.rpath
+        return []
+
+    @property
+    def rpath_capacity(self):
+        """Longest rpath, in bytes, that can be written in place."""
+        if not self._rpath_strings:
+            return 0
+        return min(size for _, size in self._rpath_strings)
+
+
+class ElfParsingError(spack.error.SpackError):
+    """Raised when a file is not an ELF file, or is malformed."""
+
+
+class ElfDynamicSectionUpdateFailed(spack.error.SpackError):
+    """Raised when the dynamic section can't be changed in place."""
+
+
+def _unpack(f, fmt, offset, byte_order):
+    fmt = byte_order + fmt
+    f.seek(offset)
+    data = f.read(struct.calcsize(fmt))
+    if len(data) != struct.calcsize(fmt):
+        raise ElfParsingError('Unexpected end of file')
+    return struct.unpack(fmt, data)
+
+
+def _read_string(f, offset):
+    """Read a NUL terminated string at ``offset``."""
+    f.seek(offset)
+    chunks = []
+    while True:
+        chunk = f.read(256)
+        if not chunk:
+            raise ElfParsingError('Unterminated string in string table')
+        end = chunk.find(b'\0')
+        if end >= 0:
+            chunks.append(chunk[:end])
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def _decode(string):
+    return string.decode('utf-8', 'replace')
+
+
+def _parse(f, path):
+    elf = ElfFile(path)
+
+    ident = f.read(16)
+    if len(ident) < 16 or ident[:4] != ELF_MAGIC:
+        raise ElfParsingError('{0} is not an ELF file'.format(path))
+
+    elf_class = bytearray(ident)[4]
+    elf_data = bytearray(ident)[5]
+    if elf_class not in _formats or elf_data not in (ELFDATA2LSB,
+                                                     ELFDATA2MSB):
+        raise ElfParsingError('{0} has an unknown ELF class'.format(path))
+
+    elf.is_64_bit = elf_class == ELFCLASS64
+    elf.is_little_endian = elf_data == ELFDATA2LSB
+    byte_order = elf._byte_order = '<' if elf.is_little_endian else '>'
+    header_fmt, phdr_fmt, dyn_fmt = _formats[elf_class]
+    elf._entry_size = struct.calcsize(dyn_fmt)
+
+    header = _unpack(f, header_fmt, 16, byte_order)
+    elf.elf_type = header[0]
+    phoff, phentsize, phnum = header[4], header[8], header[9]
+
+    # Program headers: loadable segments map virtual addresses to file
+    # offsets, PT_DYNAMIC is where the dynamic entries are
+    segments = []
+    dynamic = None
+    for i in range(phnum):
+        phdr = _unpack(f, phdr_fmt, phoff + i * phentsize, byte_order)
+        if elf.is_64_bit:
+            p_type, _, p_offset, p_vaddr, _, p_filesz = phdr[:6]
+        else:
+            p_type, p_offset, p_vaddr, _, p_filesz = phdr[:5]
+        if p_type == PT_LOAD:
+            segments.append((p_vaddr, p_offset, p_filesz))
+        elif p_type == PT_DYNAMIC:
+            dynamic = (p_offset, p_filesz)
+
+    # Statically linked executables, object files, ...
+    if dynamic is None:
+        return elf
+
+    entries = []
+    offset, end = dynamic
+    end += offset
+    while offset + elf._entry_size <= end:
+        tag, value = _unpack(f, dyn_fmt, offset, byte_order)
+        if tag == DT_NULL:
+            break
+        entries.append((offset, tag, value))
+        offset += elf._entry_size
+
+    tags = dict((tag, value) for _, tag, value in entries)
+    if DT_STRTAB not in tags:
+        return elf
+
+    strtab = None
+    for vaddr, file_offset, size in segments:
+        if vaddr <= tags[DT_STRTAB] < vaddr + size:
+            strtab = tags[DT_STRTAB] - vaddr + file_offset
+            break
+    if strtab is None:
+        raise ElfParsingError(
+            '{0}: string table is not in a loadable segment'.format(path))
+
+    for offset, tag, value in entries:
+        if tag not in (DT_NEEDED, DT_SONAME, DT_RPATH, DT_RUNPATH):
+            continue
+        string = _read_string(f, strtab + value)
+        if tag == DT_NEEDED:
+            elf.needed.append(_decode(string))
+        elif tag == DT_SONAME:
+            elf.soname = _decode(string)
+        else:
+            paths = _decode(string).split(':') if string else []
+            if tag == DT_RPATH:
+                elf.rpath = paths
+            else:
+                elf.runpath = paths
+            elf._rpath_entries.append((offset, tag))
+            elf._rpath_strings.append((strtab + value, len(string)))
+
+    return elf
+
+
+def parse_elf(path):
+    """Read the dynamic section of an ELF file.
+
+    Args:
+        path (str): path of the file
+
+    Returns:
+        (ElfFile): the parsed file
+
+    Raises:
+        ElfParsingError: if the file is not an ELF file or is malformed
+    """
+    with open(path, 'rb') as f:
+        try:
+            return _parse(f, path)
+        except struct.error as e:
+            raise ElfParsingError('{0}: {1}'.format(path, e))
+
+
+def get_rpaths(path):
+    """Run-time search path of an ELF file, or ``None`` if it is not one.
+
+    Args:
+        path (str): path of the file
+
+    Returns:
+        (list or None): directories in the rpath of the file
+    """
+    try:
+        return parse_elf(path).rpaths
+    except ElfParsingError:
+        return None
+
+
+def set_rpath(path, rpaths, force_rpath=True):
+    """Replace the rpath of an ELF file, without changing its size.
+
+    The new rpath is written over the old string, and the rest of the old
+    string is cleared.  Like ``patchelf --force-rpath``, a ``DT_RUNPATH``
+    entry becomes a ``DT_RPATH`` entry unless ``force_rpath`` is False.
+
+    Args:
+        path (str): path of the file
+        rpaths (list): new directories in the rpath
+        force_rpath (bool): whether to use ``DT_RPATH``
+
+    Raises:
+        ElfParsingError: if the file is not an ELF file or is malformed
+        ElfDynamicSectionUpdateFailed: if the file has no rpath, or the
+            new one is longer than the old one
+    """
+    elf = parse_elf(path)
+    if not elf._rpath_entries:
+        raise ElfDynamicSectionUpdateFailed(
+            '{0} has no rpath to replace'.format(path))
+
+    new_string = ':'.join(rpaths).encode('utf-8')
+    if len(new_string) > elf.rpath_capacity:
+        raise ElfDynamicSectionUpdateFailed(
+            'rpath of {0} is too long to be replaced in place'.format(path),
+            '{0} bytes needed, {1} available'.format(
+                len(new_string), elf.rpath_capacity))
+
+    _, _, dyn_fmt = _formats[ELFCLASS64 if elf.is_64_bit else ELFCLASS32]
+    dyn_fmt = elf._byte_order + dyn_fmt
+
+    with open(path, 'rb+') as f:
+        for offset, size in elf._rpath_strings:
+            f.seek(offset)
+            f.write(new_string + b'\0' * (size - len(new_string)))
+
+        if force_rpath:
+            for offset, tag in elf._rpath_entries:
+                if tag == DT_RPATH:
+                    continue
+                f.seek(offset)
+                _, value = struct.unpack(
+                    dyn_fmt, f.read(struct.calcsize(dyn_fmt)))
+                f.seek(offset)
+                f.write(struct.pack(dyn_fmt, DT_RPATH, value))
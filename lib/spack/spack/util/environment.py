@@ -6,8 +6,8 @@
 """Utilities for setting and modifying environment variables."""
 import collections
 import contextlib
-import inspect
 import json
+import linecache
 import os
 import re
 import sys
@@ -226,64 +226,93 @@ class UnsetEnv(NameModifier):
         env.pop(self.name, None)
 
 
-class SetPath(NameValueModifier):
+class PathModifier(object):
+    """Modification of a path list, that can be done on the list of its
+    directories.  Consecutive modifications of the same path list are
+    done on the same list, which is only split and joined once.
+    """
+
+    def modify_paths(self, directories):
+        """Returns the list of directories after the modification."""
+        raise NotImplementedError
 
     def execute(self, env):
+        directories = _split_path_list(env.get(self.name, ''), self.separator)
+        env[self.name] = self.separator.join(self.modify_paths(directories))
+
+
+class SetPath(PathModifier, NameValueModifier):
+
+    def modify_paths(self, directories):
         string_path = concatenate_paths(self.value, separator=self.separator)
-        env[self.name] = string_path
+        return _split_path_list(string_path, self.separator)
 
 
-class AppendPath(NameValueModifier):
+class AppendPath(PathModifier, NameValueModifier):
 
-    def execute(self, env):
-        environment_value = env.get(self.name, '')
-        directories = environment_value.split(
-            self.separator) if environment_value else []
+    def modify_paths(self, directories):
         directories.append(os.path.normpath(self.value))
-        env[self.name] = self.separator.join(directories)
+        return directories
 
 
-class PrependPath(NameValueModifier):
+class PrependPath(PathModifier, NameValueModifier):
 
-    def execute(self, env):
-        environment_value = env.get(self.name, '')
-        directories = environment_value.split(
-            self.separator) if environment_value else []
-        directories = [os.path.normpath(self.value)] + directories
-        env[self.name] = self.separator.join(directories)
+    def modify_paths(self, directories):
+        directories.insert(0, os.path.normpath(self.value))
+        return directories
 
 
-class RemovePath(NameValueModifier):
+class RemovePath(PathModifier, NameValueModifier):
 
-    def execute(self, env):
-        environment_value = env.get(self.name, '')
-        directories = environment_value.split(
-            self.separator) if environment_value else []
-        directories = [os.path.normpath(x) for x in directories
-                       if x != os.path.normpath(self.value)]
-        env[self.name] = self.separator.join(directories)
+    def modify_paths(self, directories):
+        return [os.path.normpath(x) for x in directories
+                if x != os.path.normpath(self.value)]
 
 
-class DeprioritizeSystemPaths(NameModifier):
+class DeprioritizeSystemPaths(PathModifier, NameModifier):
 
-    def execute(self, env):
-        environment_value = env.get(self.name, '')
-        directories = environment_value.split(
-            self.separator) if environment_value else []
-        directories = deprioritize_system_paths([os.path.normpath(x)
-                                                 for x in directories])
-        env[self.name] = self.separator.join(directories)
+    def modify_paths(self, directories):
+        return deprioritize_system_paths([os.path.normpath(x)
+                                          for x in directories])
 
 
-class PruneDuplicatePaths(NameModifier):
+class PruneDuplicatePaths(PathModifier, NameModifier):
+
+    def modify_paths(self, directories):
+        return prune_duplicate_paths([os.path.normpath(x)
+                                      for x in directories])
 
-    def execute(self, env):
-        environment_value = env.get(self.name, '')
-        directories = environment_value.split(
-            self.separator) if environment_value else []
-        directories = prune_duplicate_paths([os.path.normpath(x)
-                                             for x in directories])
-        env[self.name] = self.separator.join(directories)
+
+def _split_path_list(value, separator):
+    return value.split(separator) if value else []
+
+
+def _execute_on_variable(modifications, env):
+    """Executes the modifications of one variable on ``env``.
+
+    Runs of path modifications with the same separator are done on a
+    single list of directories, instead of splitting and joining the
+    value of the variable for each of them.
+    """
+    directories, separator = None, None
+    for item in modifications:
+        if isinstance(item, PathModifier):
+            if directories is not None and item.separator != separator:
+                env[item.name] = separator.join(directories)
+                directories = None
+            if directories is None:
+                separator = item.separator
+                directories = _split_path_list(
+                    env.get(item.name, ''), separator)
+            directories = item.modify_paths(directories)
+        else:
+            if directories is not None:
+                env[item.name] = separator.join(directories)
+                directories = None
+            item.execute(env)
+
+    if directories is not None:
+        env[item.name] = separator.join(directories)
 
 
 class EnvironmentModifications(object):
@@ -294,7 +323,9 @@ class EnvironmentModifications(object):
 
         * 'filename' : filename of the module where the caller is defined
         * 'lineno': line number where the request occurred
-        * 'context' : line of code that issued the request that failed
+
+    The line of code that issued a request is only read from its file
+    when it is needed, see ``caller_context()``.
     """
 
     def __init__(self, other=None):
@@ -326,15 +357,17 @@ class EnvironmentModifications(object):
                 'other must be an instance of EnvironmentModifications')
 
     def _get_outside_caller_attributes(self):
-        stack = inspect.stack()
+        # This is called for every modification, so it only looks at the
+        # frame of the caller instead of using inspect.stack(), which
+        # reads the source of every frame of the stack.
         try:
-            _, filename, lineno, _, context, index = stack[2]
-            context = context[index].strip()
+            frame = sys._getframe(2)
+            filename = frame.f_code.co_filename
+            lineno = frame.f_lineno
         except Exception:
             filename = 'unknown file'
             lineno = 'unknown line'
-            context = 'unknown context'
-        args = {'filename': filename, 'lineno': lineno, 'context': context}
+        args = {'filename': filename, 'lineno': lineno}
         return args
 
     def set(self, name, value, **kwargs):
@@ -472,8 +505,7 @@ class EnvironmentModifications(object):
         modifications = self.group_by_name()
         # Apply modifications one variable at a time
         for name, actions in sorted(modifications.items()):
-            for x in actions:
-                x.execute(os.environ)
+            _execute_on_variable(actions, os.environ)
 
     def shell_modifications(self, shell='sh'):
         """Return shell code to apply the modifications and clears the list."""
@@ -481,8 +513,7 @@ class EnvironmentModifications(object):
         new_env = os.environ.copy()
 
         for name, actions in sorted(modifications.items()):
-            for x in actions:
-                x.execute(new_env)
+            _execute_on_variable(actions, new_env)
 
         cmds = ''
         for name in set(new_env) & set(os.environ):
@@ -682,6 +713,17 @@ def concatenate_paths(paths, separator=':'):
     return separator.join(str(item) for item in paths)
 
 
+def caller_context(item):
+    """Returns the line of code that requested a modification."""
+    context = item.args.get('context')
+    if context is None:
+        lineno = item.args.get('lineno')
+        if isinstance(lineno, int):
+            context = linecache.getline(item.args['filename'], lineno)
+        context = context.strip() if context else 'unknown context'
+    return context
+
+
 def set_or_unset_not_first(variable, changes, errstream):
     """Check if we are going to set or unset something after other
     modifications have already been requested.
@@ -697,7 +739,8 @@ def set_or_unset_not_first(variable, changes, errstream):
         errstream(message.format(var=variable))
         for ii, item in enumerate(changes):
             print_format = nogood if ii in indexes else good
-            errstream(print_format.format(**item.args))
+            args = dict(item.args, context=caller_context(item))
+            errstream(print_format.format(**args))
 
 
 def validate(env, errstream):
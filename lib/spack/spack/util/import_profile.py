@@ -0,0 +1,130 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Measure how long Spack spends importing each module.
+
+``spack --profile-imports`` starts the profiler in ``bin/spack``, before
+``spack.main`` is imported, and prints a report when the command is done.
+
+The profiler wraps ``__import__``.  An import is recorded only when it
+loads new modules, under the name of the module that was asked for.
+Its cumulative time includes the modules it imported for the first time;
+its own time doesn't.  Modules loaded without ``__import__`` (packages
+from repositories, hooks) are not recorded themselves, but the imports
+they do are.
+
+This module is imported before everything else, so it must not import
+any other part of Spack.
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from six.moves import builtins
+
+__all__ = ['start', 'stop', 'report']
+
+#: Default ``level`` of ``__import__`` (implicit relative imports on 2.x)
+_default_level = 0 if sys.version_info[0] >= 3 else -1
+
+#: Module name -> [cumulative seconds, own seconds]
+_records = {}
+
+#: Time spent in recorded imports done by each import on the stack
+_stack = []
+
+#: Total time spent in top-level imports
+_total = [0.0]
+
+#: ``__import__`` before ``start()`` replaced it
+_original_import = None
+
+
+def _module_name(name, globals, level):
+    """Absolute name of the module that ``__import__`` was asked for."""
+    if level <= 0 or not globals:
+        return name
+
+    package = globals.get('__package__')
+    if not package:
+        package = globals.get('__name__', '')
+        if '__path__' not in globals:
+            package = package.rpartition('.')[0]
+
+    base = package.rsplit('.', level - 1)[0]
+    return '{0}.{1}'.format(base, name) if name else base
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(),
+                  level=_default_level):
+    key = _module_name(name, globals, level)
+
+    # "from package import module" may load submodules of a loaded package
+    submodules = []
+    if fromlist and key in sys.modules:
+        submodules = ['{0}.{1}'.format(key, item) for item in fromlist]
+        submodules = [m for m in submodules if m not in sys.modules]
+
+    modules = len(sys.modules)
+    _stack.append(0.0)
+    start = time.time()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.time() - start
+        children = _stack.pop()
+
+        # Imports of modules that are already loaded are just lookups
+        if len(sys.modules) != modules:
+            loaded = [m for m in submodules if m in sys.modules]
+            if loaded:
+                key = ', '.join(loaded)
+
+            record = _records.setdefault(key, [0.0, 0.0])
+            record[0] += elapsed
+            record[1] += elapsed - children
+
+            if _stack:
+                _stack[-1] += elapsed
+            else:
+                _total[0] += elapsed
+
+
+def start():
+    """Start recording imports, if not already started."""
+    global _original_import
+    if _original_import is None:
+        _original_import = builtins.__import__
+        builtins.__import__ = _timed_import
+
+
+def stop():
+    """Stop recording imports."""
+    global _original_import
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+        _original_import = None
+
+
+def report(lines=20, stream=None):
+    """Print the slowest imports, by cumulative time.
+
+    Args:
+        lines (int): number of modules to show, or -1 for all of them
+        stream (file): where to print (default: ``sys.stdout``)
+    """
+    stream = stream or sys.stdout
+    records = sorted(_records.items(), key=lambda item: -item[1][0])
+    if lines >= 0:
+        records = records[:lines]
+
+    print('{0} imports recorded in {1:.3f} s'.format(
+        len(_records), _total[0]), file=stream)
+    print('{0:>12} {1:>12}  {2}'.format(
+        'cumulative', 'self', 'module'), file=stream)
+    for name, (cumulative, own) in records:
+        print('{0:>9.1f} ms {1:>9.1f} ms  {2}'.format(
+            cumulative * 1000, own * 1000, name), file=stream)
@@ -8,6 +8,7 @@ import os
 import stat
 
 import llnl.util.lock
+import llnl.util.tty as tty
 from llnl.util.lock import *  # noqa
 
 import spack.config
@@ -23,6 +24,8 @@ class Lock(llnl.util.lock.Lock):
     the actual locking mechanism can be disabled via ``_enable_locks``.
     """
     def __init__(self, *args, **kwargs):
+        kwargs.setdefault(
+            'blocking', spack.config.get('config:blocking_locks', True))
         super(Lock, self).__init__(*args, **kwargs)
         self._enable = spack.config.get('config:locks', True)
 
@@ -42,6 +45,21 @@ class Lock(llnl.util.lock.Lock):
             super(Lock, self)._debug(*args)
 
 
+def debug_lock_waits():
+    """Print the time this process spent waiting for contended locks."""
+    waits = llnl.util.lock.lock_waits()
+    if not waits:
+        return
+
+    tty.debug('LOCK WAITS:')
+    for w in waits:
+        holders = ', '.join('pid={0},host={1}'.format(*h)
+                            for h in sorted(w.holders))
+        tty.debug('  {0}: {1} waits, {2:0.2f}s total, {3:0.2f}s longest{4}'
+                  .format(w.path, w.count, w.total, w.longest,
+                          ' (held by {0})'.format(holders) if holders else ''))
+
+
 def check_lock_safety(path):
     """Do some extra checks to ensure disabling locks is safe.
 
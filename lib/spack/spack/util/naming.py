@@ -10,6 +10,8 @@ import itertools
 import re
 from six import StringIO
 
+from llnl.util.lang import memoized
+
 import spack.error
 
 __all__ = [
@@ -30,6 +32,7 @@ _valid_module_re = r'^\w[\w-]*$'
 _valid_fully_qualified_module_re = r'^(\w[\w-]*)(\.\w[\w-]*)*$'
 
 
+@memoized
 def mod_to_class(mod_name):
     """Convert a name from module style to class name style.  Spack mostly
        follows `PEP-8 <http://legacy.python.org/dev/peps/pep-0008/>`_:
@@ -0,0 +1,348 @@
+# Copyright 2013-2019 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""Manifest of the files in an installation prefix, shared by the steps
+that look at every file after an install.
+
+The manifest lists the prefix and everything below it with the mode,
+size and modification time of each entry, the MIME type and shebang
+line of files, and the hash of the target of links.  Only the beginning
+of files is read to classify them: hashing their whole contents is
+opt-in.  The manifest is written in the metadata directory of the
+prefix after the post-install hooks, and it is used to:
+
+  * share a single scan of the prefix between the post-install hooks
+    (permissions, shebang filtering, ...): within
+    ``shared_listing(prefix)``, the first call to ``files_in(prefix)``
+    scans the prefix and the later calls reuse its result;
+  * avoid reading files again that didn't change since the manifest was
+    written, e.g. when creating a build cache or relocating binaries;
+  * check that an installation wasn't modified, with ``changed_files()``,
+    which compares the contents of files if their hashes were written
+    in the manifest.
+"""
+import collections
+import contextlib
+import hashlib
+import io
+import os
+import stat
+
+from llnl.util.multiproc import parmap
+
+import spack.error
+import spack.relocate
+import spack.store
+import spack.util.spack_json as sjson
+
+__all__ = ['PrefixFile', 'scan_prefix', 'files_in', 'shared_listing',
+           'manifest_path', 'read_manifest', 'write_manifest',
+           'changed_files', 'MissingManifestError']
+
+#: Name of the manifest file in the metadata directory of a prefix
+manifest_name = 'install_manifest.json'
+
+#: Version of the format of manifest files
+_manifest_version = 1
+
+#: Number of files each thread reads at a time when scanning a prefix
+_chunk_size = 64
+
+#: Size of the blocks in which files are read to hash them
+_block_size = 2 ** 20
+
+#: Number of bytes kept from the beginning of files, to classify them
+#: and read their shebang
+_head_size = 8192
+
+#: Listings shared by the active ``shared_listing()`` contexts, by prefix
+_listings = {}
+
+
+class PrefixFile(collections.namedtuple(
+        'PrefixFile',
+        ['path', 'mode', 'size', 'mtime', 'type', 'shebang', 'hash'])):
+    """An entry of a prefix manifest.
+
+    ``path`` is absolute, and ``mode``, ``size`` and ``mtime`` come from
+    ``lstat()``.  ``type`` is a MIME type like ``relocate.mime_type()``
+    returns, e.g. ``application/x-sharedlib``, ``text/plain`` or
+    ``inode/symlink``.  ``shebang`` is the first line of files that start
+    with ``#!``, and ``hash`` is the sha256 of the target of links, or
+    of the contents of files when they were hashed (None otherwise).
+    """
+    __slots__ = ()
+
+    @property
+    def isdir(self):
+        return stat.S_ISDIR(self.mode)
+
+    @property
+    def isfile(self):
+        return stat.S_ISREG(self.mode)
+
+    @property
+    def islink(self):
+        return stat.S_ISLNK(self.mode)
+
+    @property
+    def mime_type(self):
+        """MIME type and subtype, as a tuple"""
+        return tuple(self.type.split('/', 1))
+
+
+def _lstat_entry(path):
+    st = os.lstat(path)
+    return PrefixFile(path, st.st_mode, st.st_size, st.st_mtime,
+                      None, None, None)
+
+
+def _describe_link(entry):
+    target = os.readlink(entry.path)
+    if not isinstance(target, bytes):
+        target = target.encode('utf-8')
+    return entry._replace(
+        type='inode/symlink',
+        hash=hashlib.sha256(target).hexdigest())
+
+
+def _describe_files(entries, hashes=False):
+    """Fill in the type and shebang of regular files, and their hash if
+    ``hashes`` is True.
+
+    Only the first ``_head_size`` bytes of files are read to classify
+    them.  Files that are hashed are read whole, in blocks, all into the
+    same buffer.
+    """
+    block = bytearray(_block_size if hashes else _head_size)
+    view = memoryview(block)
+    described = []
+    for entry in entries:
+        checksum = hashlib.sha256() if hashes else None
+        try:
+            with io.open(entry.path, 'rb', buffering=0) as f:
+                length = f.readinto(block) or 0
+                head = bytes(view[:min(length, _head_size)])
+                while checksum and length:
+                    checksum.update(view[:length])
+                    length = f.readinto(block)
+        except (IOError, OSError):
+            described.append(entry._replace(type='inode/x-unreadable'))
+            continue
+
+        shebang = None
+        if head.startswith(b'#!'):
+            # Lines are cut after _head_size bytes, which is more than
+            # any limit on the length of shebangs
+            shebang = head[:head.find(b'\n') + 1 or None].decode('latin-1')
+        described.append(entry._replace(
+            type='/'.join(spack.relocate.mime_type_of_head(head)),
+            shebang=shebang,
+            hash=checksum.hexdigest() if checksum else None))
+    return described
+
+
+def scan_prefix(prefix, previous=None, jobs=None, hashes=False):
+    """List and describe the prefix and everything below it.
+
+    Links are not followed.  Each entry costs a single ``lstat()``, and
+    regular files are read by a pool of threads, unless an entry of
+    ``previous`` for the same path has the same size and modification
+    time (and a hash, if hashes are requested): its description is
+    reused then.
+
+    Arguments:
+        prefix (str): installation prefix
+        previous (list, optional): ``PrefixFile`` entries of an earlier
+            scan, e.g. from ``read_manifest()``
+        jobs (int, optional): maximum number of threads (see ``parmap``)
+        hashes (bool, optional): whether to hash the whole contents of
+            regular files, instead of reading only their beginning
+
+    Returns:
+        (list): ``PrefixFile`` entries, starting with the prefix itself
+    """
+    prefix = os.path.abspath(prefix)
+    manifest = manifest_path(prefix)
+    known = dict((e.path, e) for e in previous or [])
+
+    entries = [_lstat_entry(prefix)]
+    for root, dirs, files in os.walk(prefix, followlinks=False):
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            if path == manifest:
+                continue
+            try:
+                entries.append(_lstat_entry(path))
+            except OSError:
+                # removed while we were walking
+                pass
+
+    to_read = []
+    for i, entry in enumerate(entries):
+        old = known.get(entry.path)
+        if (old and old.type and old.size == entry.size and
+                old.mtime == entry.mtime and
+                stat.S_IFMT(old.mode) == stat.S_IFMT(entry.mode) and
+                (old.hash or not (hashes and old.isfile))):
+            entries[i] = old._replace(mode=entry.mode)
+        elif entry.isdir:
+            entries[i] = entry._replace(type='inode/directory')
+        elif entry.islink:
+            entries[i] = _describe_link(entry)
+        elif entry.isfile:
+            to_read.append(i)
+        else:
+            entries[i] = entry._replace(type='inode/x-special')
+
+    chunks = [to_read[i:i + _chunk_size]
+              for i in range(0, len(to_read), _chunk_size)]
+    described = parmap(
+        lambda chunk: _describe_files([entries[i] for i in chunk], hashes),
+        chunks, jobs)
+    for chunk, chunk_entries in zip(chunks, described):
+        for i, entry in zip(chunk, chunk_entries):
+            entries[i] = entry
+    return entries
+
+
+def files_in(prefix):
+    """Return the manifest of a prefix, scanning it only if it isn't shared.
+
+    Only the beginning of files is read, to classify them, and they are
+    not hashed.  Files that didn't change since the manifest of the
+    prefix was written aren't read again.  Within a ``shared_listing()``
+    context, the prefix is scanned once for the whole context, so
+    callers must not rely on it to see files that were created, modified
+    or removed since then.
+    """
+    prefix = os.path.abspath(prefix)
+    if prefix not in _listings:
+        return scan_prefix(prefix, previous=read_manifest(prefix))
+
+    if _listings[prefix] is None:
+        _listings[prefix] = scan_prefix(prefix, previous=read_manifest(prefix))
+    return _listings[prefix]
+
+
+@contextlib.contextmanager
+def shared_listing(prefix):
+    """Share a single scan of ``prefix`` between calls to ``files_in``.
+
+    The prefix is scanned lazily, so contexts where nobody asks for the
+    manifest (e.g. for external packages) cost nothing.
+    """
+    prefix = os.path.abspath(prefix)
+    if prefix in _listings:
+        # nested context: the outer one owns the listing
+        yield
+        return
+
+    _listings[prefix] = None
+    try:
+        yield
+    finally:
+        del _listings[prefix]
+
+
+def manifest_path(prefix):
+    """Path of the manifest file of a prefix."""
+    return os.path.join(
+        prefix, spack.store.layout.metadata_dir, manifest_name)
+
+
+def read_manifest(prefix):
+    """Read the manifest of a prefix.
+
+    Paths in the manifest file are relative, so that it stays valid when
+    the prefix is moved (e.g. in a build cache).
+
+    Returns:
+        (list or None): ``PrefixFile`` entries, or None if the prefix
+            has no manifest
+    """
+    prefix = os.path.abspath(prefix)
+    try:
+        with open(manifest_path(prefix)) as f:
+            data = sjson.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if data.get('version') != _manifest_version:
+        return None
+    return [PrefixFile(os.path.normpath(os.path.join(prefix, path)), **attrs)
+            for path, attrs in data['files']]
+
+
+def write_manifest(prefix, hashes=False):
+    """Scan a prefix and write its manifest in its metadata directory.
+
+    Within a ``shared_listing()`` context, the files that changed since
+    the prefix was scanned are read again, and the shared listing is
+    updated.
+
+    Arguments:
+        prefix (str): installation prefix
+        hashes (bool, optional): whether to write the hashes of the
+            contents of files, so that ``changed_files()`` can compare
+            them
+
+    Returns:
+        (list): ``PrefixFile`` entries of the prefix
+    """
+    prefix = os.path.abspath(prefix)
+    previous = _listings.get(prefix) or read_manifest(prefix)
+    entries = scan_prefix(prefix, previous=previous, hashes=hashes)
+    if prefix in _listings:
+        _listings[prefix] = entries
+
+    files = [(os.path.relpath(e.path, prefix),
+              dict((k, v) for k, v in e._asdict().items() if k != 'path'))
+             for e in entries]
+    path = manifest_path(prefix)
+    tmp = '%s.tmp' % path
+    with open(tmp, 'w') as f:
+        sjson.dump({'version': _manifest_version, 'files': files}, f)
+    os.rename(tmp, path)
+    return entries
+
+
+def changed_files(prefix):
+    """Paths in a prefix that were added, removed or modified since its
+    manifest was written.
+
+    If the manifest has the hashes of files, every file is read again,
+    whatever its modification time, and their contents are compared.
+    Otherwise, files are compared by size and modification time.
+
+    Raises:
+        MissingManifestError: if the prefix has no manifest
+    """
+    stored = read_manifest(prefix)
+    if stored is None:
+        raise MissingManifestError(prefix)
+
+    hashes = any(e.isfile and e.hash for e in stored)
+    stored = dict((e.path, e) for e in stored)
+    current = dict((e.path, e) for e in scan_prefix(prefix, hashes=hashes))
+
+    def modified(a, b):
+        if a.isfile and b.isfile and not hashes:
+            return (a.mode, a.size, a.mtime) != (b.mode, b.size, b.mtime)
+        return (a.mode, a.type, a.hash) != (b.mode, b.type, b.hash)
+
+    return sorted(
+        path for path in set(stored) | set(current)
+        if path not in stored or path not in current or
+        modified(stored[path], current[path]))
+
+
+class MissingManifestError(spack.error.SpackError):
+    """Raised when a prefix has no manifest to check it against."""
+
+    def __init__(self, prefix):
+        super(MissingManifestError, self).__init__(
+            'No manifest of the files in {0}'.format(prefix),
+            'It was installed before Spack wrote manifests.')
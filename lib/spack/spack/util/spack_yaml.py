@@ -12,7 +12,11 @@
   default unorderd dict.
 
 """
+import base64
+import ctypes
+
 from ordereddict_backport import OrderedDict
+import six
 from six import string_types, StringIO
 
 import ruamel.yaml as yaml
@@ -20,12 +24,13 @@ from ruamel.yaml import Loader, Dumper
 from ruamel.yaml.nodes import MappingNode, SequenceNode, ScalarNode
 from ruamel.yaml.constructor import ConstructorError
 
+from llnl.util.lang import LRUCache
 from llnl.util.tty.color import colorize, clen, cextra
 
 import spack.error
 
 # Only export load and dump
-__all__ = ['load', 'dump', 'SpackYAMLError']
+__all__ = ['load', 'dump', 'dump_flow', 'iter_flow', 'SpackYAMLError']
 
 # Make new classes so we can add custom attributes.
 # Also, use OrderedDict instead of just dict.
@@ -359,6 +364,156 @@ def dump_annotated(data, stream=None, *args, **kwargs):
         return getvalue()
 
 
+#: Width that keeps the YAML emitter from ever wrapping lines
+maxint = 2 ** (ctypes.sizeof(ctypes.c_int) * 8 - 1) - 1
+
+#: Keys at least this long can't be simple keys, see Emitter.check_simple_key
+_max_simple_key_length = 128
+
+#: Emitter used to analyze scalars, created on first use
+_flow_emitter = None
+
+#: Cache of the flow style text of strings.  Most scalars in specs
+#: (names, versions, variant values) come up over and over.
+_flow_scalars = LRUCache(maxsize=8192)
+
+
+class UnsupportedFlowData(TypeError):
+    """Raised by ``iter_flow()`` for data it can't emit like ``dump()``."""
+
+
+def _flow_scalar(value, key=False):
+    """Text of a string as ``dump(..., default_flow_style=True)`` writes it
+    in a flow collection."""
+    global _flow_emitter
+
+    if six.PY2 and isinstance(value, str):
+        # The representer writes non-ASCII byte strings as python/str
+        try:
+            value = value.decode('ascii')
+        except UnicodeDecodeError:
+            raise UnsupportedFlowData('non-ASCII string: %r' % value)
+
+    cached = _flow_scalars.get(value)
+    if cached is not None:
+        text, simple = cached
+    else:
+        if _flow_emitter is None:
+            _flow_emitter = OrderedLineDumper(
+                StringIO(), default_flow_style=True, width=maxint)
+
+        analysis = _flow_emitter.analyze_scalar(value)
+        simple = not (analysis.empty or analysis.multiline or
+                      len(value) >= _max_simple_key_length)
+        if analysis.multiline:
+            # Line breaks are indented relative to the enclosing collection
+            text = None
+        elif analysis.allow_flow_plain and _flow_emitter.resolve(
+                ScalarNode, value, (True, False)) == 'tag:yaml.org,2002:str':
+            text = value
+        else:
+            # Quoting is rare; let the emitter pick the style
+            text = yaml.dump([value], Dumper=OrderedLineDumper,
+                             default_flow_style=True, width=maxint)
+            text = text[1:-2]
+            if six.PY2 and isinstance(text, str):
+                text = text.decode('utf-8')
+        _flow_scalars[value] = (text, simple)
+
+    if text is None or (key and not simple):
+        raise UnsupportedFlowData('string needs a complex layout: %r' % value)
+    return text
+
+
+def _iter_flow(data, key=False):
+    data_type = type(data)
+    if data_type in (dict, syaml_dict):
+        if not key:
+            items = list(data.items())
+            if data_type is dict:
+                items.sort()
+            if not items:
+                yield u'{}'
+                return
+            yield u'{'
+            for i, (k, v) in enumerate(items):
+                if i:
+                    yield u', '
+                for chunk in _iter_flow(k, key=True):
+                    yield chunk
+                yield u': '
+                for chunk in _iter_flow(v):
+                    yield chunk
+            yield u'}'
+            return
+    elif data_type in (list, syaml_list):
+        if not key:
+            if not data:
+                yield u'[]'
+                return
+            yield u'['
+            for i, item in enumerate(data):
+                if i:
+                    yield u', '
+                for chunk in _iter_flow(item):
+                    yield chunk
+            yield u']'
+            return
+    elif data_type in (str, syaml_str, six.text_type):
+        yield _flow_scalar(data, key)
+        return
+    elif data_type is bool:
+        yield u'true' if data else u'false'
+        return
+    elif data_type in six.integer_types or data_type is syaml_int:
+        yield six.text_type(int(data))
+        return
+    elif data is None:
+        yield u'null'
+        return
+    elif six.PY3 and data_type is bytes and not key:
+        # Like Representer.represent_binary, in a flow collection
+        text = base64.encodebytes(data).decode('ascii')
+        yield u'!!binary "%s"' % text.replace(u'\n', u'\\n')
+        return
+
+    raise UnsupportedFlowData(
+        'cannot emit %s as a %s' % (data_type.__name__,
+                                    'key' if key else 'value'))
+
+
+def iter_flow(data):
+    """Text of ``dump(data, default_flow_style=True, width=maxint)``,
+    in chunks.
+
+    This is much faster than the YAML emitter, and it is meant for the
+    plain data that is hashed or compared as YAML text: dicts, lists,
+    strings, integers, booleans and ``None``.  ``syaml_dict`` keeps its
+    order, and plain dicts are sorted, like ``OrderedLineDumper`` does.
+
+    Raises:
+        UnsupportedFlowData: if ``data`` contains anything that the
+            emitter would lay out differently (other types, multi-line
+            strings, complex keys, ...).  Callers should discard what
+            was yielded so far and fall back to ``dump()``.
+    """
+    if type(data) not in (dict, syaml_dict, list, syaml_list):
+        raise UnsupportedFlowData('only collections are supported')
+
+    for chunk in _iter_flow(data):
+        yield chunk
+    yield u'\n'
+
+
+def dump_flow(data):
+    """Same as ``dump(data, default_flow_style=True, width=maxint)``.
+
+    Raises:
+        UnsupportedFlowData: see ``iter_flow()``
+    """
+    return u''.join(iter_flow(data))
+
+
 class SpackYAMLError(spack.error.SpackError):
     """Raised when there are issues with YAML parsing."""
     def __init__(self, msg, yaml_error):
@@ -9,13 +9,15 @@ import re
 import os
 import ssl
 import sys
+import threading
+import time
 import traceback
 import hashlib
 
+from six.moves import queue
 from six.moves.urllib.request import urlopen, Request
-from six.moves.urllib.error import URLError
-from six.moves.urllib.parse import urljoin
-import multiprocessing.pool
+from six.moves.urllib.error import HTTPError, URLError
+from six.moves.urllib.parse import urljoin, urlparse
 
 try:
     # Python 2 had these in the HTMLParser package.
@@ -30,18 +32,34 @@ except ImportError:
 
 import llnl.util.tty as tty
 
+import spack.caches
 import spack.config
 import spack.cmd
 import spack.url
 import spack.stage
 import spack.error
 import spack.util.crypto
+import spack.util.spack_json as sjson
 from spack.util.compression import ALLOWED_ARCHIVE_TYPES
 
 
 # Timeout in seconds for web requests
 _timeout = 10
 
+#: Maximum number of pages the spider fetches from the same host at a time
+connections_per_host = 4
+
+#: Seconds during which ``find_versions_of_archive()`` reuses the listing
+#: pages it fetched, without asking the server whether they changed.  An
+#: interrupted or repeated search resumes from the pages it already has.
+listing_max_age = 600
+
+#: Directory of the cache of web pages in the misc_cache
+_page_cache_dir = 'web'
+
+#: URL schemes of the pages that are cached
+_cached_schemes = ('http', 'https')
+
 
 class LinkParser(HTMLParser):
     """This parser just takes an HTML page and strips out the hrefs on the
@@ -58,35 +76,9 @@ class LinkParser(HTMLParser):
                     self.links.append(val)
 
 
-class NonDaemonProcess(multiprocessing.Process):
-    """Process tha allows sub-processes, so pools can have sub-pools."""
-    @property
-    def daemon(self):
-        return False
-
-    @daemon.setter
-    def daemon(self, value):
-        pass
-
-
-if sys.version_info[0] < 3:
-    class NonDaemonPool(multiprocessing.pool.Pool):
-        """Pool that uses non-daemon processes"""
-        Process = NonDaemonProcess
-else:
-
-    class NonDaemonContext(type(multiprocessing.get_context())):
-        Process = NonDaemonProcess
-
-    class NonDaemonPool(multiprocessing.pool.Pool):
-        """Pool that uses non-daemon processes"""
-
-        def __init__(self, *args, **kwargs):
-            kwargs['context'] = NonDaemonContext()
-            super(NonDaemonPool, self).__init__(*args, **kwargs)
-
-
-def _read_from_url(url, accept_content_type=None):
+def ssl_context():
+    """SSL context to pass to ``urlopen()``, according to the
+    ``verify_ssl`` configuration."""
     context = None
     verify_ssl = spack.config.get('config:verify_ssl')
     pyver = sys.version_info
@@ -101,10 +93,23 @@ def _read_from_url(url, accept_content_type=None):
         context = ssl.create_default_context()
     else:
         context = ssl._create_unverified_context()
+    return context
+
+
+def _read_from_url(url, accept_content_type=None, headers=None):
+    """Read a page, and return its URL after redirects, its text and the
+    headers of the response.
+
+    ``headers`` are added to the request.  They are validators of a
+    cached page, so no HEAD request is made to check its content type.
+    """
+    context = ssl_context()
 
     req = Request(url)
+    for name, value in (headers or {}).items():
+        req.add_header(name, value)
 
-    if accept_content_type:
+    if accept_content_type and not headers:
         # Make a HEAD request first to check the content type.  This lets
         # us ignore tarballs and gigantic files.
         # It would be nice to do this with the HTTP Accept header to avoid
@@ -115,12 +120,12 @@ def _read_from_url(url, accept_content_type=None):
 
         if "Content-type" not in resp.headers:
             tty.debug("ignoring page " + url)
-            return None, None
+            return None, None, None
 
         if not resp.headers["Content-type"].startswith(accept_content_type):
             tty.debug("ignoring page " + url + " with content type " +
                       resp.headers["Content-type"])
-            return None, None
+            return None, None, None
 
     # Do the real GET request when we know it's just HTML.
     req.get_method = lambda: "GET"
@@ -130,117 +135,262 @@ def _read_from_url(url, accept_content_type=None):
     # Read the page and and stick it in the map we'll return
     page = response.read().decode('utf-8')
 
-    return response_url, page
+    return response_url, page, response.headers
 
 
 def read_from_url(url, accept_content_type=None):
-    resp_url, contents = _read_from_url(url, accept_content_type)
+    resp_url, contents, _ = _read_from_url(url, accept_content_type)
     return contents
 
 
-def _spider(url, visited, root, depth, max_depth, raise_on_error):
-    """Fetches URL and any pages it links to up to max_depth.
+def _page_cache_key(url):
+    """Key of a page in the misc_cache."""
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return '{0}/{1}.json'.format(_page_cache_dir, digest)
 
-       depth should initially be zero, and max_depth is the max depth of
-       links to follow from the root.
 
-       Prints out a warning only if the root can't be fetched; it ignores
-       errors with pages that the root links to.
+def _read_cached_page(url):
+    """Return the cache entry of a page, or ``None``."""
+    cache = spack.caches.misc_cache
+    key = _page_cache_key(url)
+    try:
+        if not cache.init_entry(key):
+            return None
+        with cache.read_transaction(key) as f:
+            entry = sjson.load(f)
+    except (EnvironmentError, ValueError, spack.error.SpackError) as e:
+        tty.debug('Ignoring cached page of {0}: {1}'.format(url, e))
+        return None
 
-       Returns a tuple of:
-       - pages: dict of pages visited (URL) mapped to their full text.
-       - links: set of links encountered while visiting the pages.
-    """
-    pages = {}     # dict from page URL -> text content.
-    links = set()  # set of all links seen on visited pages.
+    return entry if entry.get('url') == url else None
 
-    # root may end with index.html -- chop that off.
-    if root.endswith('/index.html'):
-        root = re.sub('/index.html$', '', root)
 
+def _write_cached_page(entry):
+    cache = spack.caches.misc_cache
+    key = _page_cache_key(entry['url'])
     try:
-        response_url, page = _read_from_url(url, 'text/html')
+        cache.init_entry(key)
+        with cache.write_transaction(key) as (old, new):
+            sjson.dump(entry, stream=new)
+    except (EnvironmentError, spack.error.SpackError) as e:
+        tty.debug('Could not cache the page {0}: {1}'.format(
+            entry['url'], e))
 
-        if not response_url or not page:
-            return pages, links
 
-        pages[response_url] = page
+def _read_page(url, max_age=0):
+    """Read an HTML page for the spider, through the page cache.
 
-        # Parse out the links in the page
-        link_parser = LinkParser()
-        subcalls = []
-        link_parser.feed(page)
+    Cached pages newer than ``max_age`` seconds are used as they are.
+    Older ones are requested again with their ``ETag`` and
+    ``Last-Modified`` validators, so that the server only sends them
+    again if they changed.
 
-        while link_parser.links:
-            raw_link = link_parser.links.pop()
-            abs_link = urljoin(response_url, raw_link.strip())
+    Returns:
+        (tuple): the URL of the page after redirects and its text, or
+            ``(None, None)`` if it is not an HTML page
+    """
+    if urlparse(url).scheme not in _cached_schemes:
+        response_url, page, _ = _read_from_url(url, 'text/html')
+        return response_url, page
 
-            links.add(abs_link)
+    entry = _read_cached_page(url)
+    if entry and time.time() - entry['time'] < max_age:
+        return entry['response_url'], entry['page']
 
-            # Skip stuff that looks like an archive
-            if any(raw_link.endswith(suf) for suf in ALLOWED_ARCHIVE_TYPES):
-                continue
+    validators = {}
+    if entry and entry['etag']:
+        validators['If-None-Match'] = entry['etag']
+    if entry and entry['last_modified']:
+        validators['If-Modified-Since'] = entry['last_modified']
 
-            # Skip things outside the root directory
-            if not abs_link.startswith(root):
-                continue
+    try:
+        response_url, page, headers = _read_from_url(
+            url, 'text/html', validators)
+    except HTTPError as e:
+        if e.code != 304 or not entry:
+            raise
+        tty.debug('Page {0} did not change'.format(url))
+        entry['time'] = time.time()
+        _write_cached_page(entry)
+        return entry['response_url'], entry['page']
+
+    if page is not None:
+        _write_cached_page({
+            'url': url,
+            'response_url': response_url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'time': time.time(),
+            'page': page,
+        })
+    return response_url, page
 
-            # Skip already-visited links
-            if abs_link in visited:
-                continue
 
-            # If we're not at max depth, follow links.
-            if depth < max_depth:
-                subcalls.append((abs_link, visited, root,
-                                 depth + 1, max_depth, raise_on_error))
-                visited.add(abs_link)
+class _Spider(object):
+    """Fetches web pages and the pages they link to with a pool of threads.
 
-        if subcalls:
-            pool = NonDaemonPool(processes=len(subcalls))
-            try:
-                results = pool.map(_spider_wrapper, subcalls)
+    The threads share the set of visited URLs, so every page is fetched
+    once, and at most ``connections_per_host`` pages are fetched from the
+    same server at a time.
+
+    Arguments:
+        max_depth (int): maximum depth of links to follow from the roots
+        max_age (int): seconds during which cached pages are used without
+            asking the server whether they changed (see ``_read_page()``)
+        jobs (int, optional): maximum number of pages fetched at a time.
+            Defaults to ``config:fetch_jobs``.
+    """
 
-                for sub_pages, sub_links in results:
-                    pages.update(sub_pages)
-                    links.update(sub_links)
+    def __init__(self, max_depth=0, max_age=0, jobs=None):
+        if jobs is None:
+            jobs = spack.config.get('config:fetch_jobs', 8)
+        self.jobs = max(1, jobs)
+        self.max_depth = max_depth
+        self.max_age = max_age
+
+        self.pages = {}     # dict from page URL -> text content.
+        self.links = set()  # set of all links seen on visited pages.
+
+        self._visited = set()
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        self._todo = queue.Queue()
+        self._pending = 0
+        self._done = threading.Event()
+
+    def crawl(self, root_urls):
+        """Fetch pages from root URLs, and follow their links up to
+        ``max_depth``.
+
+        Links are only followed to pages under the directory of the root
+        they were found from.  Errors are ignored, except in debug mode.
+
+        Returns:
+            (tuple): a dict of the pages visited (URL) mapped to their full
+                text, and the set of links encountered on these pages
+        """
+        for url in root_urls:
+            # root may end with index.html -- chop that off.
+            root = re.sub('/index.html$', '', url)
+            if url not in self._visited:
+                self._visited.add(url)
+                self._put(url, root, 0)
+
+        if self._pending:
+            threads = [threading.Thread(target=self._worker)
+                       for i in range(self.jobs)]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+
+            # Wait with a timeout so that the main thread still gets
+            # KeyboardInterrupt on Python 2
+            while not self._done.is_set():
+                self._done.wait(1)
+
+            for thread in threads:
+                self._todo.put(None)
+            for thread in threads:
+                thread.join()
+
+        return self.pages, self.links
+
+    def _put(self, url, root, depth):
+        with self._lock:
+            self._pending += 1
+            self._done.clear()
+        self._todo.put((url, root, depth))
+
+    def _worker(self):
+        while True:
+            item = self._todo.get()
+            if item is None:
+                return
 
+            try:
+                self._visit(*item)
             finally:
-                pool.terminate()
-                pool.join()
+                with self._lock:
+                    self._pending -= 1
+                    if not self._pending:
+                        self._done.set()
+
+    def _host_slot(self, url):
+        """Semaphore limiting the connections to the server of ``url``."""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                # Local files don't need a limit beyond the pool's
+                limit = connections_per_host if host else self.jobs
+                self._host_slots[host] = threading.BoundedSemaphore(limit)
+            return self._host_slots[host]
+
+    def _visit(self, url, root, depth):
+        """Fetch one page, and queue the links to follow from it."""
+        try:
+            with self._host_slot(url):
+                response_url, page = _read_page(url, self.max_age)
+
+            if not response_url or not page:
+                return
+
+            # Parse out the links in the page
+            link_parser = LinkParser()
+            link_parser.feed(page)
 
-    except URLError as e:
-        tty.debug(e)
+            links = set()
+            follow = []
+            for raw_link in link_parser.links:
+                abs_link = urljoin(response_url, raw_link.strip())
+                links.add(abs_link)
 
-        if hasattr(e, 'reason') and isinstance(e.reason, ssl.SSLError):
-            tty.warn("Spack was unable to fetch url list due to a certificate "
-                     "verification problem. You can try running spack -k, "
-                     "which will not check SSL certificates. Use this at your "
-                     "own risk.")
+                # Skip stuff that looks like an archive
+                if any(raw_link.endswith(s) for s in ALLOWED_ARCHIVE_TYPES):
+                    continue
 
-        if raise_on_error:
-            raise NoNetworkConnectionError(str(e), url)
+                # Skip things outside the root directory
+                if not abs_link.startswith(root):
+                    continue
 
-    except HTMLParseError as e:
-        # This error indicates that Python's HTML parser sucks.
-        msg = "Got an error parsing HTML."
+                # If we're not at max depth, follow links.
+                if depth < self.max_depth:
+                    follow.append(abs_link)
 
-        # Pre-2.7.3 Pythons in particular have rather prickly HTML parsing.
-        if sys.version_info[:3] < (2, 7, 3):
-            msg += " Use Python 2.7.3 or newer for better HTML parsing."
+            with self._lock:
+                self.pages[response_url] = page
+                self.links.update(links)
 
-        tty.warn(msg, url, "HTMLParseError: " + str(e))
+                # Skip already-visited links
+                follow = [l for l in follow if l not in self._visited]
+                self._visited.update(follow)
 
-    except Exception as e:
-        # Other types of errors are completely ignored, except in debug mode.
-        tty.debug("Error in _spider: %s:%s" % (type(e), e),
-                  traceback.format_exc())
+            for link in follow:
+                self._put(link, root, depth + 1)
 
-    return pages, links
+        except URLError as e:
+            tty.debug(e)
 
+            if hasattr(e, 'reason') and isinstance(e.reason, ssl.SSLError):
+                tty.warn("Spack was unable to fetch url list due to a "
+                         "certificate verification problem. You can try "
+                         "running spack -k, which will not check SSL "
+                         "certificates. Use this at your own risk.")
 
-def _spider_wrapper(args):
-    """Wrapper for using spider with multiprocessing."""
-    return _spider(*args)
+        except HTMLParseError as e:
+            # This error indicates that Python's HTML parser sucks.
+            msg = "Got an error parsing HTML."
+
+            # Pre-2.7.3 Pythons in particular have rather prickly HTML parsing.
+            if sys.version_info[:3] < (2, 7, 3):
+                msg += " Use Python 2.7.3 or newer for better HTML parsing."
+
+            tty.warn(msg, url, "HTMLParseError: " + str(e))
+
+        except Exception as e:
+            # Other types of errors are completely ignored, except in debug
+            # mode.
+            tty.debug("Error in spider: %s:%s" % (type(e), e),
+                      traceback.format_exc())
 
 
 def _urlopen(*args, **kwargs):
@@ -258,12 +408,11 @@ def spider(root_url, depth=0):
        If depth is specified (e.g., depth=2), then this will also follow
        up to <depth> levels of links from the root.
 
-       This will spawn processes to fetch the children, for much improved
+       Pages are fetched by a pool of threads, for much improved
        performance over a sequential fetch.
 
     """
-    pages, links = _spider(root_url, set(), root_url, 0, depth, False)
-    return pages, links
+    return _Spider(depth).crawl([root_url])
 
 
 def find_versions_of_archive(archive_urls, list_url=None, list_depth=0):
@@ -301,13 +450,9 @@ def find_versions_of_archive(archive_urls, list_url=None, list_depth=0):
             additional_list_urls.add(lurl + '/')
     list_urls |= additional_list_urls
 
-    # Grab some web pages to scrape.
-    pages = {}
-    links = set()
-    for lurl in list_urls:
-        pg, lnk = spider(lurl, depth=list_depth)
-        pages.update(pg)
-        links.update(lnk)
+    # Grab some web pages to scrape, reusing recently fetched ones.
+    spider = _Spider(list_depth, max_age=listing_max_age)
+    pages, links = spider.crawl(sorted(list_urls))
 
     # Scrape them for archive URLs
     regexes = []
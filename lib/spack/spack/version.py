@@ -30,6 +30,8 @@ from bisect import bisect_left
 from functools import wraps
 from six import string_types
 
+from llnl.util.lang import LRUCache
+
 import spack.error
 from spack.util.spack_yaml import syaml_dict
 
@@ -42,6 +44,15 @@ VALID_VERSION = r'[A-Za-z0-9_.-]'
 # Infinity-like versions. The order in the list implies the comparison rules
 infinity_versions = ['develop', 'master', 'head', 'trunk']
 
+#: Versions and ranges are immutable, so the ones parsed from the same
+#: string are shared.  Besides saving the parsing, this makes comparing
+#: them (e.g. as parts of the keys below) an identity check.
+_interned_versions = LRUCache(maxsize=8192)
+
+#: Memoized results of ``VersionList.satisfies()`` and
+#: ``VersionList.intersection()``, keyed on the versions in the lists
+_version_list_memo = LRUCache(maxsize=16384)
+
 
 def int_if_int(string):
     """Convert a string to int if possible.  Otherwise, return a string."""
@@ -708,6 +719,15 @@ class VersionList(object):
            If strict is specified, this version list must lie entirely
            *within* the other in order to satisfy it.
         """
+        key = ('satisfies', tuple(self.versions), tuple(other.versions),
+               strict)
+        result = _version_list_memo.get(key)
+        if result is None:
+            result = self._satisfies(other, strict)
+            _version_list_memo[key] = result
+        return result
+
+    def _satisfies(self, other, strict):
         if not other or not self:
             return False
 
@@ -737,11 +757,20 @@ class VersionList(object):
 
     @coerced
     def intersection(self, other):
-        # TODO: make this faster.  This is O(n^2).
+        key = ('intersection', tuple(self.versions), tuple(other.versions))
+        versions = _version_list_memo.get(key)
+        if versions is None:
+            # TODO: make this faster.  This is O(n^2).
+            result = VersionList()
+            for s in self:
+                for o in other:
+                    result.add(s.intersection(o))
+            versions = tuple(result.versions)
+            _version_list_memo[key] = versions
+
+        # The memo is shared, so the caller gets a list of its own
         result = VersionList()
-        for s in self:
-            for o in other:
-                result.add(s.intersection(o))
+        result.versions = list(versions)
         return result
 
     @coerced
@@ -825,14 +854,17 @@ def _string_to_version(string):
     if ',' in string:
         return VersionList(string.split(','))
 
-    elif ':' in string:
-        s, e = string.split(':')
-        start = Version(s) if s else None
-        end = Version(e) if e else None
-        return VersionRange(start, end)
-
-    else:
-        return Version(string)
+    version = _interned_versions.get(string)
+    if version is None:
+        if ':' in string:
+            s, e = string.split(':')
+            start = Version(s) if s else None
+            end = Version(e) if e else None
+            version = VersionRange(start, end)
+        else:
+            version = Version(string)
+        _interned_versions[string] = version
+    return version
 
 
 def ver(obj):
@@ -99,7 +99,7 @@ function _spack {
                     -d --debug --pdb -e --env -D --env-dir -E --no-env
                     --use-env-repo -k --insecure -l --enable-locks
                     -L --disable-locks -m --mock -p --profile
-                    --sorted-profile --lines -v --verbose --stacktrace
+                    --sorted-profile --lines --profile-imports -v --verbose --stacktrace
                     -V --version --print-shell-vars" -- "$cur"
     else
         compgen -W "$(_subcommands)" -- "$cur"
@@ -129,6 +129,28 @@ function _spack_arch {
                 -t --target --known-targets" -- "$cur"
 }
 
+function _spack_benchmark {
+    if $list_options
+    then
+        compgen -W "-h --help" -- "$cur"
+    else
+        compgen -W "compare list run" -- "$cur"
+    fi
+}
+
+function _spack_benchmark_compare {
+    compgen -W "-h --help -t --threshold" -- "$cur"
+}
+
+function _spack_benchmark_list {
+    compgen -W "-h --help" -- "$cur"
+}
+
+function _spack_benchmark_run {
+    compgen -W "-h --help -r --repo -n --repeat -o --output
+                -b --baseline -t --threshold" -- "$cur"
+}
+
 function _spack_blame {
     if $list_options
     then
@@ -371,7 +393,7 @@ function _spack_debug {
     then
         compgen -W "-h --help" -- "$cur"
     else
-        compgen -W "create-db-tarball" -- "$cur"
+        compgen -W "create-db-tarball spec-hashes" -- "$cur"
     fi
 }
 
@@ -379,6 +401,15 @@ function _spack_debug_create_db_tarball {
     compgen -W "-h --help" -- "$cur"
 }
 
+function _spack_debug_spec_hashes {
+    if $list_options
+    then
+        compgen -W "-h --help -r --repeat" -- "$cur"
+    else
+        compgen -W "$(_all_packages)" -- "$cur"
+    fi
+}
+
 function _spack_dependencies {
     if $list_options
     then
@@ -512,7 +543,7 @@ function _spack_fetch {
     if $list_options
     then
         compgen -W "-h --help -n --no-checksum -m --missing
-                    -D --dependencies" -- "$cur"
+                    -D --dependencies -j --jobs" -- "$cur"
     else
         compgen -W "$(_all_packages)" -- "$cur"
     fi